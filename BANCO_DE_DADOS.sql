@@ -54,6 +54,7 @@ CREATE TABLE `bot_config` (
   `id` int(11) NOT NULL,
   `config_key` varchar(100) NOT NULL,
   `config_value` text DEFAULT NULL,
+  `revision` int(11) NOT NULL DEFAULT 0,
   `created_at` timestamp NOT NULL DEFAULT current_timestamp(),
   `updated_at` timestamp NOT NULL DEFAULT current_timestamp() ON UPDATE current_timestamp()
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
@@ -81,6 +82,29 @@ INSERT INTO `bot_config` (`id`, `config_key`, `config_value`, `created_at`, `upd
 
 -- --------------------------------------------------------
 
+--
+-- Estrutura para tabela `broadcast_jobs`
+--
+
+CREATE TABLE `broadcast_jobs` (
+  `id` int(11) NOT NULL,
+  `flow_id` int(11) NOT NULL,
+  `segment` varchar(20) NOT NULL DEFAULT 'all',
+  `status` enum('pending','running','paused','done','cancelled','failed') DEFAULT 'pending',
+  `last_user_id` int(11) DEFAULT 0,
+  `total` int(11) DEFAULT 0,
+  `sent` int(11) DEFAULT 0,
+  `failed` int(11) DEFAULT 0,
+  `blocked` int(11) DEFAULT 0,
+  `created_by` bigint(20) DEFAULT NULL,
+  `report_chat_id` bigint(20) DEFAULT NULL,
+  `report_message_id` int(11) DEFAULT NULL,
+  `created_at` timestamp NOT NULL DEFAULT current_timestamp(),
+  `updated_at` timestamp NOT NULL DEFAULT current_timestamp() ON UPDATE current_timestamp()
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
 --
 -- Estrutura para tabela `buttons`
 --
@@ -126,6 +150,7 @@ CREATE TABLE `flow_steps` (
   `step_type` enum('text','image','video','video_note','document','audio','button') NOT NULL,
   `content` text DEFAULT NULL,
   `media_url` varchar(500) DEFAULT NULL,
+  `file_id` varchar(255) DEFAULT NULL,
   `button_text` varchar(100) DEFAULT NULL,
   `button_url` varchar(500) DEFAULT NULL,
   `button_callback` varchar(100) DEFAULT NULL,
@@ -136,6 +161,61 @@ CREATE TABLE `flow_steps` (
 
 -- --------------------------------------------------------
 
+--
+-- Estrutura para tabela `media_metadata`
+--
+
+CREATE TABLE `media_metadata` (
+  `id` int(11) NOT NULL,
+  `media_path` varchar(500) NOT NULL,
+  `duration` float DEFAULT NULL,
+  `width` int(11) DEFAULT NULL,
+  `height` int(11) DEFAULT NULL,
+  `codec` varchar(50) DEFAULT NULL,
+  `size_bytes` bigint(20) DEFAULT NULL,
+  `sha256` char(64) DEFAULT NULL,
+  `is_video_note_ready` tinyint(1) DEFAULT 0,
+  `created_at` timestamp NOT NULL DEFAULT current_timestamp()
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
+--
+-- Estrutura para tabela `schema_version`
+--
+
+CREATE TABLE `schema_version` (
+  `version` int(11) NOT NULL,
+  `description` varchar(200) NOT NULL,
+  `applied_at` timestamp NOT NULL DEFAULT current_timestamp()
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+--
+-- Despejando dados para a tabela `schema_version`
+--
+
+INSERT INTO `schema_version` (`version`, `description`, `applied_at`) VALUES
+(1, 'Esquema base de BANCO_DE_DADOS.sql', '2025-07-30 22:30:00'),
+(2, 'Índices de users (created_at, is_active)', '2025-07-30 22:30:00'),
+(3, 'Cache de conversões (transcode_cache)', '2025-07-30 22:30:00'),
+(4, 'Revisão das configurações (bot_config.revision)', '2025-07-30 22:30:00');
+
+-- --------------------------------------------------------
+
+--
+-- Estrutura para tabela `transcode_cache`
+--
+
+CREATE TABLE `transcode_cache` (
+  `id` int(11) NOT NULL,
+  `source_sha256` char(64) NOT NULL,
+  `preset` varchar(100) NOT NULL,
+  `output_path` varchar(500) NOT NULL,
+  `created_at` timestamp NOT NULL DEFAULT current_timestamp()
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
 --
 -- Estrutura para tabela `users`
 --
@@ -167,6 +247,26 @@ INSERT INTO `users` (`id`, `telegram_id`, `username`, `first_name`, `last_name`,
 (1, 6423539592, 'saikathesun', 'SAIKA', NULL, 1, '2025-07-26 22:26:12', '2025-07-30 22:24:24', NULL, NULL, NULL, NULL, 1, 1, '2025-07-28 23:24:46', 0),
 (2, 123456789, NULL, NULL, NULL, 1, '2025-07-30 21:39:44', '2025-07-30 21:39:44', NULL, NULL, NULL, NULL, 0, 0, NULL, 0);
 
+-- --------------------------------------------------------
+
+--
+-- Estrutura para tabela `webhook_outbox`
+--
+
+CREATE TABLE `webhook_outbox` (
+  `id` bigint(20) NOT NULL,
+  `event_type` varchar(50) NOT NULL,
+  `telegram_id` bigint(20) DEFAULT NULL,
+  `webhook_url` varchar(500) NOT NULL,
+  `payload` text NOT NULL,
+  `status` enum('pending','sent','dead') DEFAULT 'pending',
+  `attempts` int(11) DEFAULT 0,
+  `next_attempt_at` datetime NOT NULL,
+  `last_error` varchar(500) DEFAULT NULL,
+  `created_at` timestamp NOT NULL DEFAULT current_timestamp(),
+  `sent_at` datetime DEFAULT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
 --
 -- Índices para tabelas despejadas
 --
@@ -185,6 +285,13 @@ ALTER TABLE `bot_config`
   ADD PRIMARY KEY (`id`),
   ADD UNIQUE KEY `config_key` (`config_key`);
 
+--
+-- Índices de tabela `broadcast_jobs`
+--
+ALTER TABLE `broadcast_jobs`
+  ADD PRIMARY KEY (`id`),
+  ADD KEY `idx_status` (`status`);
+
 --
 -- Índices de tabela `buttons`
 --
@@ -205,12 +312,42 @@ ALTER TABLE `flow_steps`
   ADD PRIMARY KEY (`id`),
   ADD KEY `idx_flow_order` (`flow_id`,`step_order`);
 
+--
+-- Índices de tabela `media_metadata`
+--
+ALTER TABLE `media_metadata`
+  ADD PRIMARY KEY (`id`),
+  ADD UNIQUE KEY `media_path` (`media_path`);
+
+--
+-- Índices de tabela `schema_version`
+--
+ALTER TABLE `schema_version`
+  ADD PRIMARY KEY (`version`);
+
+--
+-- Índices de tabela `transcode_cache`
+--
+ALTER TABLE `transcode_cache`
+  ADD PRIMARY KEY (`id`),
+  ADD UNIQUE KEY `idx_source_preset` (`source_sha256`,`preset`);
+
 --
 -- Índices de tabela `users`
 --
 ALTER TABLE `users`
   ADD PRIMARY KEY (`id`),
-  ADD UNIQUE KEY `telegram_id` (`telegram_id`);
+  ADD UNIQUE KEY `telegram_id` (`telegram_id`),
+  ADD KEY `idx_created_at` (`created_at`),
+  ADD KEY `idx_active_created` (`is_active`,`created_at`);
+
+--
+-- Índices de tabela `webhook_outbox`
+--
+ALTER TABLE `webhook_outbox`
+  ADD PRIMARY KEY (`id`),
+  ADD KEY `idx_status_next` (`status`,`next_attempt_at`),
+  ADD KEY `idx_user_event` (`telegram_id`,`event_type`);
 
 --
 -- AUTO_INCREMENT para tabelas despejadas
@@ -228,6 +365,12 @@ ALTER TABLE `admin_config`
 ALTER TABLE `bot_config`
   MODIFY `id` int(11) NOT NULL AUTO_INCREMENT, AUTO_INCREMENT=16;
 
+--
+-- AUTO_INCREMENT de tabela `broadcast_jobs`
+--
+ALTER TABLE `broadcast_jobs`
+  MODIFY `id` int(11) NOT NULL AUTO_INCREMENT;
+
 --
 -- AUTO_INCREMENT de tabela `buttons`
 --
@@ -246,12 +389,30 @@ ALTER TABLE `flows`
 ALTER TABLE `flow_steps`
   MODIFY `id` int(11) NOT NULL AUTO_INCREMENT, AUTO_INCREMENT=30;
 
+--
+-- AUTO_INCREMENT de tabela `media_metadata`
+--
+ALTER TABLE `media_metadata`
+  MODIFY `id` int(11) NOT NULL AUTO_INCREMENT;
+
+--
+-- AUTO_INCREMENT de tabela `transcode_cache`
+--
+ALTER TABLE `transcode_cache`
+  MODIFY `id` int(11) NOT NULL AUTO_INCREMENT;
+
 --
 -- AUTO_INCREMENT de tabela `users`
 --
 ALTER TABLE `users`
   MODIFY `id` int(11) NOT NULL AUTO_INCREMENT, AUTO_INCREMENT=3;
 
+--
+-- AUTO_INCREMENT de tabela `webhook_outbox`
+--
+ALTER TABLE `webhook_outbox`
+  MODIFY `id` bigint(20) NOT NULL AUTO_INCREMENT;
+
 --
 -- Restrições para tabelas despejadas
 --
@@ -1,6 +1,5 @@
 import os
-from database import create_connection
-from mysql.connector import Error
+from database import create_connection, Error
 
 def add_admin(telegram_id):
     """Adiciona um administrador ao sistema"""
@@ -27,6 +26,7 @@ def add_admin(telegram_id):
         connection.commit()
         
         print(f"✅ Admin com ID {telegram_id} adicionado com sucesso!")
+        print(f"ℹ️ O bot em execução reconhece o novo admin em até {os.getenv('ADMIN_REFRESH_INTERVAL', '60')} segundos.")
         return True
         
     except Error as e:
@@ -1,19 +1,43 @@
 import os
-import asyncio
 import logging
 import aiohttp
 import aiofiles
+import tempfile
+import hashlib
+import threading
+from collections import OrderedDict
 from pathlib import Path
+from dotenv import load_dotenv
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto, InputMediaVideo, KeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
-from mysql.connector import Error
-from database import create_connection
+from database import create_connection, get_pool_stats, run_db, Error
+from migrations import run_migrations
+from media_worker import media_pool, MediaJobError
+from media_downloader import media_downloader
+from media_sender import local_media_sender
+from media_store import media_store, store_media, get_cached_transcode, save_cached_transcode
+from transcode_queue import transcode_queue, TranscodeQueueFull
+from webhook_outbox import webhook_dispatcher, get_outbox_stats, retry_dead_webhooks
+from update_processor import update_processor
+from send_scheduler import send_scheduler
+from callback_router import callback_router, safe_edit_message
+from user_writes import user_write_buffer
+from conversation import State, ADMIN_STATES, get_conversation
+from broadcast import (
+    broadcast_engine, create_broadcast_job, get_broadcast_job, get_recent_broadcast_jobs,
+    update_broadcast_job, count_broadcast_users, format_broadcast_progress, SEGMENTS,
+    create_broadcast_menu_keyboard, create_broadcast_flow_keyboard,
+    create_broadcast_segment_keyboard, create_broadcast_control_keyboard
+)
+from media_engine import validate_video_note, transcode_video_note, inspect_media, check_video_note_info, VIDEO_NOTE_SIZE, VIDEO_NOTE_PRESET
 from flow_manager import (
-    FlowManager, 
+    AsyncFlowManager,
     create_admin_keyboard, 
     create_flow_management_keyboard, 
     create_message_step_keyboard,
     create_simple_flow_control_keyboard,
+    create_flow_control_keyboard,
+    create_step_preview_keyboard,
     create_default_flow_keyboard,
     create_delete_flow_keyboard,
     create_edit_flow_keyboard,
@@ -38,13 +62,23 @@ from flow_manager import (
     is_signup_required,
     is_welcome_enabled,
     get_welcome_message,
+    set_welcome_media,
+    update_step_file_id,
+    save_media_metadata,
+    extract_file_id,
     send_welcome_message,
     is_webhook_enabled,
     get_webhook_url,
     send_webhook,
     is_webhook_already_sent,
     mark_webhook_as_sent,
-    get_flow_content
+    reset_all_welcome_video_sent,
+    build_step_keyboard,
+    get_flow_plan,
+    get_default_flow_plan,
+    get_flow_content,
+    load_admin_ids,
+    get_admin_cache_stats
 )
 
 # Configuração de logging
@@ -54,6 +88,28 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Carregar variáveis de ambiente
+load_dotenv()
+
+# Modo de recebimento de updates: 'polling' (padrão) ou 'webhook'
+BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+
+# Endereços da Bot API (podem apontar para uma Bot API local ou falsa em testes)
+TELEGRAM_BASE_URL = os.getenv('TELEGRAM_BASE_URL', 'https://api.telegram.org/bot')
+TELEGRAM_BASE_FILE_URL = os.getenv('TELEGRAM_BASE_FILE_URL', 'https://api.telegram.org/file/bot')
+
+# Servidor HTTP do modo webhook (Railway informa a porta em PORT)
+TELEGRAM_WEBHOOK_LISTEN = os.getenv('TELEGRAM_WEBHOOK_LISTEN', '0.0.0.0')
+TELEGRAM_WEBHOOK_PORT = int(os.getenv('PORT', 8000))
+TELEGRAM_WEBHOOK_PATH = os.getenv('TELEGRAM_WEBHOOK_PATH', 'telegram')
+TELEGRAM_WEBHOOK_MAX_CONNECTIONS = int(os.getenv('TELEGRAM_WEBHOOK_MAX_CONNECTIONS', 40))  # conexões simultâneas do Telegram (1-100)
+
+# Perfis já gravados (digest de username, first_name e last_name por telegram_id)
+USER_PROFILE_CACHE_SIZE = int(os.getenv('USER_PROFILE_CACHE_SIZE', 50000))  # usuários lembrados (LRU)
+
+_user_profiles = OrderedDict()
+_user_profiles_lock = threading.Lock()
+
 # Configuração da pasta de uploads
 UPLOADS_DIR = Path("uploads")
 UPLOADS_DIR.mkdir(exist_ok=True)
@@ -67,6 +123,10 @@ async def download_and_save_file(file_url, file_type, file_id):
         file_type: Tipo do arquivo (image, video, video_note, document)
         file_id: ID do arquivo no Telegram
     
+    O arquivo baixado é movido para o armazenamento por conteúdo
+    (uploads/store/), então o mesmo conteúdo recebido com outro file_id
+    reaproveita o arquivo já existente.
+    
     Returns:
         str: Caminho local do arquivo salvo ou None se houver erro
     """
@@ -93,25 +153,14 @@ async def download_and_save_file(file_url, file_type, file_id):
         # Garantir que o caminho use barras normais
         file_path = Path(str(file_path).replace('\\', '/'))
         
-        # Verificar se o arquivo já existe
-        if file_path.exists():
-            print(f"Arquivo já existe: {file_path}")
-            return str(file_path)
+        # Baixar o arquivo direto para o disco (sessão compartilhada, com retomada)
+        if not await media_downloader.download(file_url, file_path):
+            return None
+        
+        stored_path = await store_media(file_path)
+        print(f"Arquivo salvo: {stored_path}")
+        return stored_path
         
-        # Baixar o arquivo
-        async with aiohttp.ClientSession() as session:
-            async with session.get(file_url) as response:
-                if response.status == 200:
-                    # Salvar o arquivo
-                    async with aiofiles.open(file_path, 'wb') as f:
-                        await f.write(await response.read())
-                    
-                    print(f"Arquivo salvo: {file_path}")
-                    return str(file_path)
-                else:
-                    print(f"Erro ao baixar arquivo: HTTP {response.status}")
-                    return None
-                    
     except Exception as e:
         print(f"Erro ao baixar e salvar arquivo: {e}")
         return None
@@ -121,332 +170,166 @@ def normalize_path(path):
     return str(path).replace('\\', '/')
 
 # Função para validar requisitos do video note
+async def write_temp_video(file_data):
+    """Grava os bytes de um vídeo em um arquivo temporário e retorna o caminho"""
+    fd, temp_path = tempfile.mkstemp(suffix='.mp4')
+    os.close(fd)
+    async with aiofiles.open(temp_path, 'wb') as f:
+        await f.write(file_data)
+    return temp_path
+
+def remove_temp_files(*paths):
+    """Remove arquivos temporários, ignorando os que não existem"""
+    for path in paths:
+        if path and os.path.exists(path):
+            os.unlink(path)
+
 async def validate_video_note_requirements(file_data, file_path=None):
     """
-    Valida se o video note atende aos requisitos obrigatórios do Telegram:
-    - Formato Quadrado (1:1 aspect ratio)
-    - Duração Máxima: 60 segundos
-    - Tamanho Máximo: 100MB para bots
-    - Codec: H.264/MPEG-4
-    - Resolução recomendada: 512x512 px
+    Valida se o video note atende aos requisitos obrigatórios do Telegram
+    (quadrado, até 60 segundos, até 100MB, H.264/MPEG-4, mínimo 256px).
+    
+    Lê apenas os cabeçalhos do arquivo com ffprobe.
+    
+    Args:
+        file_data: Bytes do vídeo (ou None para usar file_path)
+        file_path: Caminho do vídeo no disco
+    
+    Returns:
+        tuple: (válido, mensagem)
     """
+    temp_path = None
     try:
-        import cv2
-        import tempfile
-        from moviepy.editor import VideoFileClip
-        
         print(f"🔍 DEBUG: Iniciando validação de video note")
         
-        # Verificar tamanho do arquivo
-        file_size = len(file_data) if file_data else os.path.getsize(file_path)
-        file_size_mb = file_size / (1024 * 1024)
-        
-        print(f"🔍 DEBUG: Tamanho do arquivo: {file_size_mb:.2f} MB")
-        
-        if file_size_mb > 100:
-            return False, f"❌ Tamanho do arquivo ({file_size_mb:.2f} MB) excede o limite de 100MB para bots"
-        
-        # Criar arquivo temporário para análise
-        with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as temp_file:
-            if file_data:
-                temp_file.write(file_data)
-            else:
-                with open(file_path, 'rb') as f:
-                    temp_file.write(f.read())
-            temp_file_path = temp_file.name
-        
-        try:
-            # Verificar duração
-            video_clip = VideoFileClip(temp_file_path)
-            duration = video_clip.duration
-            
-            print(f"🔍 DEBUG: Duração do vídeo: {duration:.2f} segundos")
-            
-            if duration > 60:
-                video_clip.close()
-                return False, f"❌ Duração do vídeo ({duration:.2f}s) excede o limite de 60 segundos"
-            
-            # Verificar dimensões
-            width = video_clip.w
-            height = video_clip.h
-            
-            print(f"🔍 DEBUG: Dimensões do vídeo: {width}x{height}")
-            
-            # Verificar se é quadrado (1:1 aspect ratio)
-            aspect_ratio = width / height
-            if not (0.95 <= aspect_ratio <= 1.05):  # Permitir pequena tolerância
-                video_clip.close()
-                return False, f"❌ Vídeo não é quadrado (aspect ratio: {aspect_ratio:.2f}). Deve ser 1:1"
-            
-            # Verificar resolução recomendada (512x512)
-            if width < 256 or height < 256:
-                video_clip.close()
-                return False, f"❌ Resolução muito baixa ({width}x{height}). Recomendado: 512x512"
-            
-            # Verificar codec usando OpenCV
-            cap = cv2.VideoCapture(temp_file_path)
-            fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
-            codec_name = "".join([chr((fourcc >> 8 * i) & 0xFF) for i in range(4)])
-            cap.release()
-            
-            print(f"🔍 DEBUG: Codec detectado: {codec_name}")
-            
-            # Verificar se é H.264/MPEG-4
-            # Aceitar variações do codec H.264 (h264, H264, avc1, etc.)
-            h264_variants = ['avc1', 'H264', 'h264', 'mp4v', 'XVID', 'mp4a']
-            if codec_name.lower() not in [codec.lower() for codec in h264_variants]:
-                video_clip.close()
-                return False, f"❌ Codec não suportado: {codec_name}. Use H.264/MPEG-4"
-            
-            video_clip.close()
-            
-            print(f"🔍 DEBUG: ✅ Video note atende a todos os requisitos")
-            return True, "✅ Video note válido"
-            
-        finally:
-            # Limpar arquivo temporário
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
-                
-    except ImportError as e:
-        print(f"🔍 DEBUG: Bibliotecas de validação não disponíveis: {e}")
-        # Se as bibliotecas não estiverem disponíveis, fazer validação básica
-        file_size = len(file_data) if file_data else os.path.getsize(file_path)
-        file_size_mb = file_size / (1024 * 1024)
-        
-        if file_size_mb > 100:
-            return False, f"❌ Tamanho do arquivo ({file_size_mb:.2f} MB) excede o limite de 100MB para bots"
+        if file_data:
+            temp_path = await write_temp_video(file_data)
         
-        return True, "✅ Validação básica passou (bibliotecas não disponíveis)"
+        return await validate_video_note(temp_path or file_path)
         
     except Exception as e:
         print(f"🔍 DEBUG: Erro na validação: {e}")
         return False, f"❌ Erro na validação: {str(e)}"
+    finally:
+        remove_temp_files(temp_path)
 
-# Função para converter vídeo para formato de video note
-async def convert_video_to_video_note(file_data, file_path=None):
+# Função para normalizar video notes no upload
+async def normalize_video_note_upload(source_path, output_name, on_progress=None):
     """
-    Converte um vídeo para o formato de video note do Telegram:
-    - Redimensiona para 512x512 (quadrado)
-    - Limita duração para 60 segundos
-    - Converte para H.264/MPEG-4
-    - Comprime para menos de 100MB
+    Normaliza um video note no momento do upload. Vídeos que já atendem aos
+    requisitos são mantidos; os demais são convertidos uma única vez. Os dados
+    do ffprobe e o sha256 do arquivo final ficam em media_metadata, assim o
+    envio para os usuários não precisa validar nem converter nada.
+    
+    A conversão fica em transcode_cache por (sha256 da origem, preset): o
+    mesmo vídeo enviado de novo reaproveita o arquivo já convertido.
+    
+    Args:
+        source_path: Caminho do vídeo baixado
+        output_name: Nome temporário do arquivo convertido em uploads/video_note
+                     (o resultado vai para o armazenamento por conteúdo)
+        on_progress: Recebe a fração convertida lida do ffmpeg (opcional)
+    
+    Returns:
+        tuple: (sucesso, caminho final, mensagem)
     """
     try:
-        import cv2
-        import tempfile
-        from moviepy.editor import VideoFileClip, CompositeVideoClip
-        from moviepy.video.fx import resize
-        
-        print(f"🔧 DEBUG: Iniciando conversão de vídeo para video note")
-        
-        # Criar arquivo temporário para processamento
-        with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as temp_input:
-            if file_data:
-                temp_input.write(file_data)
-            else:
-                with open(file_path, 'rb') as f:
-                    temp_input.write(f.read())
-            temp_input_path = temp_input.name
-        
-        # Criar arquivo temporário para saída
-        with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as temp_output:
-            temp_output_path = temp_output.name
+        info = await inspect_media(source_path)
+    except (MediaJobError, ValueError, OSError) as e:
+        return False, None, f"❌ Erro na validação: {str(e)}"
+    
+    final_path = source_path
+    is_valid, message = check_video_note_info(info)
+    if not is_valid:
+        cached_path = await run_db(get_cached_transcode, info['sha256'], VIDEO_NOTE_PRESET)
+        if cached_path:
+            return True, cached_path, "✅ Vídeo convertido com sucesso (conversão reaproveitada)"
+        
+        source_sha256 = info['sha256']
+        video_note_dir = UPLOADS_DIR / "video_note"
+        video_note_dir.mkdir(exist_ok=True)
+        final_path = normalize_path(video_note_dir / output_name)
+        
+        success, message = await transcode_video_note(source_path, final_path, on_progress)
+        if not success:
+            return False, None, message
         
         try:
-            # Carregar vídeo
-            video_clip = VideoFileClip(temp_input_path)
-            
-            # Verificar duração e cortar se necessário
-            if video_clip.duration > 60:
-                print(f"🔧 DEBUG: Cortando vídeo de {video_clip.duration:.2f}s para 60s")
-                video_clip = video_clip.subclip(0, 60)
-            
-            # Redimensionar para 512x512 (quadrado)
-            print(f"🔧 DEBUG: Redimensionando de {video_clip.w}x{video_clip.h} para 512x512")
-            video_clip = video_clip.resize((512, 512))
-            
-            # Configurar codec e qualidade para otimizar tamanho
-            video_clip.write_videofile(
-                temp_output_path,
-                codec='libx264',
-                audio_codec='aac',
-                bitrate='400k',  # Bitrate ainda mais baixo para garantir < 100MB
-                fps=20,  # FPS reduzido para economizar espaço
-                preset='ultrafast',  # Preset rápido
-                threads=2,
-                ffmpeg_params=['-crf', '28']  # Compressão adicional
-            )
-            
-            video_clip.close()
-            
-            # Verificar tamanho do arquivo convertido
-            converted_size = os.path.getsize(temp_output_path)
-            converted_size_mb = converted_size / (1024 * 1024)
-            
-            print(f"🔧 DEBUG: Arquivo convertido: {converted_size_mb:.2f} MB")
-            
-            # Se ainda estiver muito grande, comprimir mais
-            if converted_size_mb > 100:
-                print(f"🔧 DEBUG: Comprimindo mais para reduzir tamanho...")
-                
-                # Ler o arquivo convertido
-                with open(temp_output_path, 'rb') as f:
-                    video_data = f.read()
-                
-                # Tentar com bitrate ainda menor
-                video_clip = VideoFileClip(temp_output_path)
-                video_clip.write_videofile(
-                    temp_output_path,
-                    codec='libx264',
-                    audio_codec='aac',
-                    bitrate='250k',  # Bitrate ainda menor
-                    fps=18,  # FPS ainda menor
-                    preset='ultrafast',
-                    threads=2,
-                    ffmpeg_params=['-crf', '30']  # Compressão mais agressiva
-                )
-                video_clip.close()
-                
-                # Verificar tamanho final
-                final_size = os.path.getsize(temp_output_path)
-                final_size_mb = final_size / (1024 * 1024)
-                print(f"🔧 DEBUG: Tamanho final após compressão: {final_size_mb:.2f} MB")
-                
-                if final_size_mb > 100:
-                    print(f"🔧 DEBUG: Ainda muito grande, tentando sem áudio...")
-                    # Tentar sem áudio
-                    video_clip = VideoFileClip(temp_output_path)
-                    video_clip.write_videofile(
-                        temp_output_path,
-                        codec='libx264',
-                        audio=False,  # Sem áudio
-                        bitrate='150k',  # Bitrate muito baixo
-                        fps=15,
-                        preset='ultrafast',
-                        threads=2,
-                        ffmpeg_params=['-crf', '32', '-movflags', '+faststart']  # Compressão máxima + otimização
-                    )
-                    video_clip.close()
-            
-            # Ler o arquivo convertido
-            with open(temp_output_path, 'rb') as f:
-                converted_data = f.read()
-            
-            final_size_mb = len(converted_data) / (1024 * 1024)
-            print(f"🔧 DEBUG: ✅ Conversão concluída: {final_size_mb:.2f} MB")
-            
-            return True, converted_data, f"✅ Vídeo convertido com sucesso ({final_size_mb:.2f} MB)"
-            
-        finally:
-            # Limpar arquivos temporários
-            if os.path.exists(temp_input_path):
-                os.unlink(temp_input_path)
-            if os.path.exists(temp_output_path):
-                os.unlink(temp_output_path)
-                
-    except ImportError as e:
-        print(f"🔧 DEBUG: Bibliotecas de conversão não disponíveis: {e}")
-        return False, None, "❌ Bibliotecas de conversão não disponíveis"
+            info = await inspect_media(final_path)
+        except (MediaJobError, ValueError, OSError) as e:
+            return False, None, f"❌ Erro na conversão: {str(e)}"
         
-    except Exception as e:
-        print(f"🔧 DEBUG: Erro na conversão: {e}")
-        return False, None, f"❌ Erro na conversão: {str(e)}"
+        final_path = await store_media(final_path, info['sha256'])
+        await run_db(save_cached_transcode, source_sha256, VIDEO_NOTE_PRESET, final_path)
+    
+    await run_db(save_media_metadata, final_path, info, True)
+    return True, final_path, message
 
-# Função para criar as tabelas
-def create_tables():
-    connection = create_connection()
-    if connection is None:
-        return False
+async def convert_video_note_in_queue(query, source_path, output_name, title, retry_callback, cancel_callback):
+    """
+    Coloca a conversão do video note na fila de conversões e acompanha o
+    andamento editando a mensagem do callback (posição na fila e progresso).
     
+    Returns:
+        tuple: (sucesso, caminho final, mensagem), ou None se a fila estiver
+        cheia (o admin já foi avisado e pode tentar de novo)
+    """
     try:
-        cursor = connection.cursor()
-        
-        # Criar tabela bot_config
-        create_bot_config_table = """
-        CREATE TABLE IF NOT EXISTS bot_config (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            config_key VARCHAR(100) NOT NULL UNIQUE,
-            config_value TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        job = transcode_queue.submit(
+            lambda on_progress: normalize_video_note_upload(source_path, output_name, on_progress),
+            owner=query.from_user.id
         )
-        """
-        
-        # Criar tabela users
-        create_users_table = """
-        CREATE TABLE IF NOT EXISTS users (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            telegram_id BIGINT NOT NULL UNIQUE,
-            username VARCHAR(100),
-            first_name VARCHAR(100),
-            last_name VARCHAR(100),
-            name VARCHAR(200),
-            phone VARCHAR(20),
-            email VARCHAR(200),
-            additional_data TEXT,
-            is_active BOOLEAN DEFAULT TRUE,
-            welcome_video_sent BOOLEAN DEFAULT FALSE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    except TranscodeQueueFull:
+        await safe_edit_message(
+            query,
+            "⏳ **Fila de conversões cheia**\n\n"
+            "Outras conversões estão em andamento. Tente novamente em alguns minutos.",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("🔄 Tentar novamente", callback_data=retry_callback)],
+                [InlineKeyboardButton("🔙 Cancelar", callback_data=cancel_callback)]
+            ])
         )
-        """
-        
-        cursor.execute(create_bot_config_table)
-        cursor.execute(create_users_table)
-        connection.commit()
-        
-        print("Tabelas criadas com sucesso!")
-        return True
-        
-    except Error as e:
-        print(f"Erro ao criar tabelas: {e}")
-        return False
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
+        return None
+    
+    processing_keyboard = InlineKeyboardMarkup([[
+        InlineKeyboardButton("⏳ Processando...", callback_data="processing")
+    ]])
+    return await transcode_queue.wait(
+        job,
+        lambda job: safe_edit_message(query, f"{title}\n\n{job.describe()}", reply_markup=processing_keyboard)
+    )
 
 # Função para inserir/atualizar usuário
+def profile_unchanged(telegram_id, digest):
+    """Indica se o perfil do usuário é igual ao último gravado"""
+    with _user_profiles_lock:
+        if _user_profiles.get(telegram_id) != digest:
+            return False
+        _user_profiles.move_to_end(telegram_id)
+        return True
+
+def remember_profile(telegram_id, digest):
+    """Guarda o digest do perfil gravado, descartando os menos usados"""
+    with _user_profiles_lock:
+        _user_profiles[telegram_id] = digest
+        _user_profiles.move_to_end(telegram_id)
+        while len(_user_profiles) > USER_PROFILE_CACHE_SIZE:
+            _user_profiles.popitem(last=False)
+
 def save_user(telegram_id, username=None, first_name=None, last_name=None):
-    connection = create_connection()
-    if connection is None:
-        return False
-    
-    try:
-        cursor = connection.cursor()
-        
-        # Verificar se o usuário já existe
-        check_user = "SELECT id FROM users WHERE telegram_id = %s"
-        cursor.execute(check_user, (telegram_id,))
-        user_exists = cursor.fetchone()
-        
-        if user_exists:
-            # Atualizar usuário existente
-            update_user = """
-            UPDATE users 
-            SET username = %s, first_name = %s, last_name = %s, updated_at = CURRENT_TIMESTAMP
-            WHERE telegram_id = %s
-            """
-            cursor.execute(update_user, (username, first_name, last_name, telegram_id))
-        else:
-            # Inserir novo usuário
-            insert_user = """
-            INSERT INTO users (telegram_id, username, first_name, last_name)
-            VALUES (%s, %s, %s, %s)
-            """
-            cursor.execute(insert_user, (telegram_id, username, first_name, last_name))
-        
-        connection.commit()
+    """
+    Grava o usuário (upsert em lote pelo user_write_buffer); perfis sem mudanças não são reescritos.
+    O usuário sempre volta a ficar ativo: quem bloqueou o bot e deu /start de novo
+    volta a receber as transmissões.
+    """
+    digest = hash((username, first_name, last_name))
+    if profile_unchanged(telegram_id, digest):
+        user_write_buffer.update(telegram_id, is_active=True)
         return True
-        
-    except Error as e:
-        print(f"Erro ao salvar usuário: {e}")
-        return False
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
+    
+    user_write_buffer.update(telegram_id, username=username, first_name=first_name, last_name=last_name, is_active=True)
+    remember_profile(telegram_id, digest)
+    return True
 
 # Handlers do bot
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -454,7 +337,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     
     # Salvar usuário no banco de dados
-    save_user(
+    await run_db(
+        save_user,
         telegram_id=user.id,
         username=user.username,
         first_name=user.first_name,
@@ -468,12 +352,12 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         'first_name': user.first_name,
         'last_name': user.last_name
     }
-    send_webhook('bot_access', user_data)
+    await send_webhook('bot_access', user_data)
     
     # Verificar configurações de coleta de dados
-    require_signup = is_signup_required()
-    collect_phone = is_phone_collection_enabled()
-    collect_email = is_email_collection_enabled()
+    require_signup = await run_db(is_signup_required)
+    collect_phone = await run_db(is_phone_collection_enabled)
+    collect_email = await run_db(is_email_collection_enabled)
     
     print(f"🔍 DEBUG: start - Usuário {user.id} - Configurações:")
     print(f"🔍 DEBUG: require_signup: {require_signup}")
@@ -484,14 +368,13 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     needs_signup = require_signup or collect_phone or collect_email
     print(f"🔍 DEBUG: needs_signup: {needs_signup}")
     
-    # Verificar se existe um fluxo padrão
-    flow_manager = FlowManager()
-    default_flow = flow_manager.get_default_flow()
-    print(f"🔍 DEBUG: default_flow: {default_flow}")
+    # Verificar se existe um fluxo padrão (compilado e em cache)
+    default_plan = await run_db(get_default_flow_plan)
+    print(f"🔍 DEBUG: default_flow: {default_plan.name if default_plan else None}")
     
     if needs_signup:
         # Verificar se o usuário já tem as informações necessárias
-        user_data = get_user_data(user.id)
+        user_data = await run_db(get_user_data, user.id)
         print(f"🔍 DEBUG: Dados do usuário {user.id}: {user_data}")
         
         missing_data = []
@@ -511,22 +394,20 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         else:
             # Se não há dados faltantes, verificar se há fluxo padrão
-            if default_flow:
+            if default_plan:
                 # Executar o fluxo padrão completo
-                steps = flow_manager.get_flow_steps(default_flow['id'])
-                if steps:
-                    await execute_complete_flow(update, steps)
+                if default_plan.steps:
+                    await execute_complete_flow(update, default_plan.steps)
                     return
             else:
                 # Se não há fluxo padrão, enviar mensagem de boas-vindas normal
                 await send_welcome_message(update, context)
     else:
         # Se não precisa de cadastro, verificar se há fluxo padrão
-        if default_flow:
+        if default_plan:
             # Executar o fluxo padrão completo
-            steps = flow_manager.get_flow_steps(default_flow['id'])
-            if steps:
-                await execute_complete_flow(update, steps)
+            if default_plan.steps:
+                await execute_complete_flow(update, default_plan.steps)
                 return
         else:
             # Se não há fluxo padrão, enviar mensagem de boas-vindas normal
@@ -570,12 +451,11 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await update.message.reply_text(help_text)
 
-async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Comando /status"""
+def get_status_counts():
+    """Conta usuários e configurações para o comando /status"""
     connection = create_connection()
     if connection is None:
-        await update.message.reply_text("❌ Erro: Não foi possível conectar ao banco de dados.")
-        return
+        return None
     
     try:
         cursor = connection.cursor()
@@ -588,928 +468,776 @@ async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
         cursor.execute("SELECT COUNT(*) FROM bot_config")
         config_count = cursor.fetchone()[0]
         
-        status_message = f"""
-        📊 **Status do Bot**
-        
-        ✅ Banco de dados: Conectado
-        👥 Usuários registrados: {user_count}
-        ⚙️ Configurações: {config_count}
-        
-        Bot funcionando normalmente! 🚀
-        """
-        
-        await update.message.reply_text(status_message)
+        return user_count, config_count
         
     except Error as e:
-        await update.message.reply_text(f"❌ Erro ao verificar status: {e}")
+        print(f"Erro ao verificar status: {e}")
+        return None
     finally:
         if connection.is_connected():
             cursor.close()
             connection.close()
 
+async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Comando /status"""
+    counts = await run_db(get_status_counts)
+    if counts is None:
+        await update.message.reply_text("❌ Erro: Não foi possível consultar o banco de dados.")
+        return
+    
+    user_count, config_count = counts
+    pool_stats = get_pool_stats()
+    media_stats = media_pool.get_stats()
+    outbox_stats = await run_db(get_outbox_stats)
+    update_stats = update_processor.get_stats()
+    send_stats = send_scheduler.get_stats()
+    broadcast_stats = broadcast_engine.get_stats()
+    callback_stats = callback_router.get_stats()
+    admin_stats = get_admin_cache_stats()
+    write_stats = user_write_buffer.get_stats()
+    download_stats = media_downloader.get_stats()
+    upload_stats = local_media_sender.get_stats()
+    store_stats = media_store.get_stats()
+    transcode_stats = transcode_queue.get_stats()
+    
+    status_message = f"""
+    📊 **Status do Bot**
+    
+    ✅ Banco de dados: Conectado
+    🔌 Pool ({pool_stats['backend']}): {pool_stats['in_use']}/{pool_stats['size']} em uso (pico {pool_stats['peak_in_use']}, esperas {pool_stats['waits']})
+    ⚡ Updates: {update_stats['running']} em andamento, até {update_stats['max']} em paralelo ({update_stats['chats']} chats ativos)
+    📤 Envios: {send_stats['queued']} na fila, {send_stats['retry_after']} flood controls
+    📣 Transmissões: {broadcast_stats['running']} em andamento
+    🧭 Botões: {callback_stats['calls']} cliques em {callback_stats['routes']} rotas ({callback_stats['avg_ms']:.0f} ms em média, {callback_stats['errors']} erros, {callback_stats['unmatched']} sem rota)
+    👑 Admins em cache: {admin_stats['admins']}
+    🎬 Conversões: {media_stats['running']}/{media_stats['workers']} em andamento ({media_stats['waiting']} na fila)
+    🎞️ Fila de conversões: {transcode_stats['running']} em andamento, {transcode_stats['queued']}/{transcode_stats['max_queued']} aguardando ({transcode_stats['rejected']} recusadas)
+    📥 Downloads: {download_stats['running']}/{download_stats['concurrency']} em andamento ({download_stats['waiting']} na fila, {download_stats['resumed']} retomados)
+    📎 Uploads: {upload_stats['uploads']} feitos, {upload_stats['reused']} envios pelo file_id
+    🗂️ Mídias: {store_stats['runs']} coletas, {store_stats['removed']} órfãs removidas ({store_stats['freed_bytes'] / (1024 * 1024):.1f} MB liberados)
+    🔗 Webhooks: {outbox_stats['pending']} na fila, {outbox_stats['dead']} com falha
+    💾 Gravações de usuários: {write_stats['pending']} pendentes, {write_stats['dropped']} descartadas ({write_stats['updates']} alterações em {write_stats['statements']} instruções)
+    👥 Usuários registrados: {user_count}
+    ⚙️ Configurações: {config_count}
+    
+    Bot funcionando normalmente! 🚀
+    """
+    
+    await update.message.reply_text(status_message)
+
 async def echo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Eco de mensagens"""
     await update.message.reply_text(f"Você disse: {update.message.text}")
 
 async def handle_contact_shared(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler para processar dados de contato e localização compartilhados"""
-    user = update.effective_user
-    
-
+    conversation = get_conversation(context)
+    contact = update.message.contact
     
-    # Verificar se está esperando por contato
-    if 'waiting_for_contact' in context.user_data and context.user_data['waiting_for_contact']:
-        contact = update.message.contact
+    if contact and contact.phone_number:
+        # Processar telefone compartilhado (mesmo fora do cadastro)
+        conversation.phone = contact.phone_number
         
-        if contact and contact.phone_number:
-            # Processar telefone compartilhado
-            context.user_data['collected_phone'] = contact.phone_number
-            context.user_data.pop('waiting_for_contact', None)
-            
-
-            
-            # Voltar para a tela de coleta de dados para mostrar botões atualizados
-            if 'missing_data' in context.user_data:
-                missing_data = context.user_data['missing_data']
-                await request_missing_data(update, context, missing_data)
-            else:
-                # Se não há mais dados, finalizar
-                await finish_data_collection(update, context)
+        # Voltar para a tela de coleta de dados para mostrar botões atualizados
+        if conversation.missing_data is not None:
+            await request_missing_data(update, context, conversation.missing_data)
         else:
-            await update.message.reply_text(
-                "❌ Erro ao processar contato. Tente novamente.",
-                reply_markup=ReplyKeyboardRemove()
-            )
-        return
+            # Se não há mais dados, finalizar
+            await finish_data_collection(update, context)
     else:
-        # Contato compartilhado mas não estava esperando
-
-        
-        if update.message.contact and update.message.contact.phone_number:
-            # Processar telefone compartilhado mesmo assim
-            context.user_data['collected_phone'] = update.message.contact.phone_number
-            
-
-            
-            # Voltar para a tela de coleta de dados para mostrar botões atualizados
-            if 'missing_data' in context.user_data:
-                missing_data = context.user_data['missing_data']
-                await request_missing_data(update, context, missing_data)
-            else:
-                # Se não há mais dados, finalizar
-                await finish_data_collection(update, context)
-        else:
-            await update.message.reply_text(
-                "❌ Erro ao processar contato. Tente novamente.",
-                reply_markup=ReplyKeyboardRemove()
-            )
-        return
-    
+        await update.message.reply_text(
+            "❌ Erro ao processar contato. Tente novamente.",
+            reply_markup=ReplyKeyboardRemove()
+        )
 
 
 async def handle_media_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler para processar mídias enviadas (fotos, vídeos, documentos)"""
-    user = update.effective_user
-    flow_manager = FlowManager()
+    conversation = get_conversation(context)
+    handler = MEDIA_HANDLERS.get(conversation.state)
     
-    # Verificar se está configurando mídia da mensagem de boas-vindas
-    if 'configuring_welcome_media' in context.user_data and context.user_data['configuring_welcome_media']:
-        if not flow_manager.is_admin(user.id):
-            return
+    # Mídias só são esperadas em conversas de administrador
+    if handler is None or not await AsyncFlowManager().is_admin(update.effective_user.id):
+        return
+    
+    await handler(update, context, conversation)
+
+async def handle_welcome_media_input(update: Update, context: ContextTypes.DEFAULT_TYPE, conversation):
+    """Mídia da mensagem de boas-vindas"""
+    try:
+        expected_type = conversation.media_type or ''
+        media_type = None
+        file_id = None
+        file_url = None
         
-        try:
-            expected_type = context.user_data.get('welcome_media_type', '')
-            media_type = None
-            file_id = None
-            file_url = None
-            file_data = None
+        # Processar foto
+        if update.message.photo:
+            if expected_type and expected_type != 'photo':
+                await update.message.reply_text(
+                    f"❌ **Tipo de mídia incorreto.**\n\nEsperado: {expected_type}\nEnviado: foto\n\nEnvie o tipo correto de mídia.",
+                    reply_markup=await run_db(create_config_welcome_keyboard)
+                )
+                return
             
-            # Processar foto
-            if update.message.photo:
-                if expected_type and expected_type != 'photo':
-                    await update.message.reply_text(
-                        f"❌ **Tipo de mídia incorreto.**\n\nEsperado: {expected_type}\nEnviado: foto\n\nEnvie o tipo correto de mídia.",
-                        reply_markup=create_config_welcome_keyboard()
-                    )
-                    return
-                
-                media_type = 'photo'
-                photo = update.message.photo[-1]  # Pegar a maior resolução
-                file_id = photo.file_id
-                file = await context.bot.get_file(file_id)
-                file_url = file.file_path
-                
-            # Processar vídeo
-            elif update.message.video:
-                if expected_type == 'video_note':
-                    # Permitir vídeo normal para vídeo redondo (conversão automática)
-                    media_type = 'video_note'
-                elif expected_type and expected_type != 'video':
-                    await update.message.reply_text(
-                        f"❌ **Tipo de mídia incorreto.**\n\nEsperado: {expected_type}\nEnviado: vídeo\n\nEnvie o tipo correto de mídia.",
-                        reply_markup=create_config_welcome_keyboard()
-                    )
-                    return
-                else:
-                    media_type = 'video'
-                
-                video = update.message.video
-                file_id = video.file_id
-                file = await context.bot.get_file(file_id)
-                file_url = file.file_path
-                
-            # Processar vídeo redondo
-            elif update.message.video_note:
-                if expected_type and expected_type != 'video_note':
-                    await update.message.reply_text(
-                        f"❌ **Tipo de mídia incorreto.**\n\nEsperado: {expected_type}\nEnviado: vídeo redondo\n\nEnvie o tipo correto de mídia.",
-                        reply_markup=create_config_welcome_keyboard()
-                    )
-                    return
-                
+            media_type = 'photo'
+            photo = update.message.photo[-1]  # Pegar a maior resolução
+            file_id = photo.file_id
+            file = await context.bot.get_file(file_id)
+            file_url = file.file_path
+            
+        # Processar vídeo
+        elif update.message.video:
+            if expected_type == 'video_note':
+                # Permitir vídeo normal para vídeo redondo (conversão automática)
                 media_type = 'video_note'
-                video_note = update.message.video_note
-                file_id = video_note.file_id
-                file = await context.bot.get_file(file_id)
-                file_url = file.file_path
-                
-            # Processar documento
-            elif update.message.document:
-                if expected_type and expected_type != 'document':
+            elif expected_type and expected_type != 'video':
+                await update.message.reply_text(
+                    f"❌ **Tipo de mídia incorreto.**\n\nEsperado: {expected_type}\nEnviado: vídeo\n\nEnvie o tipo correto de mídia.",
+                    reply_markup=await run_db(create_config_welcome_keyboard)
+                )
+                return
+            else:
+                media_type = 'video'
+            
+            video = update.message.video
+            file_id = video.file_id
+            file = await context.bot.get_file(file_id)
+            file_url = file.file_path
+            
+        # Processar vídeo redondo
+        elif update.message.video_note:
+            if expected_type and expected_type != 'video_note':
+                await update.message.reply_text(
+                    f"❌ **Tipo de mídia incorreto.**\n\nEsperado: {expected_type}\nEnviado: vídeo redondo\n\nEnvie o tipo correto de mídia.",
+                    reply_markup=await run_db(create_config_welcome_keyboard)
+                )
+                return
+            
+            media_type = 'video_note'
+            video_note = update.message.video_note
+            file_id = video_note.file_id
+            file = await context.bot.get_file(file_id)
+            file_url = file.file_path
+            
+        # Processar documento
+        elif update.message.document:
+            if expected_type and expected_type != 'document':
+                await update.message.reply_text(
+                    f"❌ **Tipo de mídia incorreto.**\n\nEsperado: {expected_type}\nEnviado: documento\n\nEnvie o tipo correto de mídia.",
+                    reply_markup=await run_db(create_config_welcome_keyboard)
+                )
+                return
+            
+            media_type = 'document'
+            document = update.message.document
+            file_id = document.file_id
+            file = await context.bot.get_file(file_id)
+            file_url = file.file_path
+        
+        if media_type and file_id and file_url:
+            # Verificar se a URL é válida
+            if not file_url.startswith('http'):
+                file_url = f"{TELEGRAM_BASE_FILE_URL}{context.bot.token}/{file_url}"
+            
+            # Baixar e salvar arquivo localmente
+            local_path = await download_and_save_file(file_url, media_type, file_id)
+            
+            # Vídeo redondo: normalizar uma única vez no upload
+            if media_type == 'video_note':
+                if not local_path:
                     await update.message.reply_text(
-                        f"❌ **Tipo de mídia incorreto.**\n\nEsperado: {expected_type}\nEnviado: documento\n\nEnvie o tipo correto de mídia.",
-                        reply_markup=create_config_welcome_keyboard()
+                        "❌ **Erro ao baixar vídeo para conversão.**\n\nTente novamente.",
+                        reply_markup=await run_db(create_config_welcome_keyboard)
                     )
                     return
                 
-                media_type = 'document'
-                document = update.message.document
-                file_id = document.file_id
-                file = await context.bot.get_file(file_id)
-                file_url = file.file_path
-            
-            if media_type and file_id and file_url:
-                # Verificar se a URL é válida
-                if not file_url.startswith('http'):
-                    file_url = f"https://api.telegram.org/file/bot{context.bot.token}/{file_url}"
-                
-                # Baixar e salvar arquivo localmente
-                local_path = await download_and_save_file(file_url, media_type, file_id)
-                
-                # Se for vídeo redondo e foi enviado um vídeo normal, converter
-                if media_type == 'video_note' and update.message.video:
-                    try:
-                        # Baixar o arquivo para conversão
-                        import requests
-                        response = requests.get(file_url)
-                        if response.status_code == 200:
-                            file_data = response.content
-                            
-                            # Validar e converter para vídeo redondo
-                            is_valid, validation_message = await validate_video_note_requirements(file_data)
-                            if not is_valid:
-                                await update.message.reply_text(
-                                    f"⚠️ **Vídeo não atende aos requisitos:**\n\n{validation_message}\n\n"
-                                    f"Deseja converter mesmo assim?",
-                                    reply_markup=InlineKeyboardMarkup([
-                                        [InlineKeyboardButton("✅ Sim, converter", callback_data="convert_welcome_video_note")],
-                                        [InlineKeyboardButton("❌ Cancelar", callback_data="config_welcome")]
-                                    ])
-                                )
-                                # Salvar dados temporários para conversão
-                                context.user_data['temp_welcome_video_data'] = {
-                                    'file_data': file_data,
-                                    'local_path': local_path,
-                                    'file_url': file_url
-                                }
-                                return
-                            
-                            # Converter automaticamente
-                            conversion_success, converted_data, conversion_message = await convert_video_to_video_note(file_data)
-                            if conversion_success:
-                                # Salvar o vídeo convertido
-                                import os
-                                from pathlib import Path
-                                UPLOADS_DIR = Path("uploads")
-                                video_note_dir = UPLOADS_DIR / "video_note"
-                                video_note_dir.mkdir(parents=True, exist_ok=True)
-                                
-                                temp_filename = f"welcome_video_note_{file_id}.mp4"
-                                temp_path = video_note_dir / temp_filename
-                                
-                                with open(temp_path, 'wb') as f:
-                                    f.write(converted_data)
-                                
-                                local_path = str(temp_path)
-                                await update.message.reply_text(
-                                    f"✅ **Vídeo Redondo da Mensagem de Boas-vindas Configurado!**\n\n"
-                                    f"O vídeo foi convertido automaticamente para formato redondo.\n"
-                                    f"Arquivo: {local_path}",
-                                    reply_markup=create_config_welcome_keyboard()
-                                )
-                            else:
-                                await update.message.reply_text(
-                                    f"❌ **Erro na conversão:** {conversion_message}\n\nTente novamente.",
-                                    reply_markup=create_config_welcome_keyboard()
-                                )
-                                return
-                        else:
-                            await update.message.reply_text(
-                                "❌ **Erro ao baixar vídeo para conversão.**\n\nTente novamente.",
-                                reply_markup=create_config_welcome_keyboard()
-                            )
-                            return
-                    except Exception as e:
+                # Vídeo normal fora dos requisitos: confirmar a conversão
+                if update.message.video:
+                    is_valid, validation_message = await validate_video_note_requirements(None, local_path)
+                    if not is_valid:
                         await update.message.reply_text(
-                            f"❌ **Erro na conversão:** {str(e)}\n\nTente novamente.",
-                            reply_markup=create_config_welcome_keyboard()
+                            f"⚠️ **Vídeo não atende aos requisitos:**\n\n{validation_message}\n\n"
+                            f"Deseja converter mesmo assim?",
+                            reply_markup=InlineKeyboardMarkup([
+                                [InlineKeyboardButton("✅ Sim, converter", callback_data="convert_welcome_video_note")],
+                                [InlineKeyboardButton("❌ Cancelar", callback_data="config_welcome")]
+                            ])
                         )
+                        # Salvar dados temporários para conversão
+                        conversation.pending_video = {
+                            'local_path': local_path,
+                            'file_id': file_id
+                        }
                         return
                 
-                # Salvar configurações
-                if set_config_value('welcome_media_url', local_path or file_url) and set_config_value('welcome_media_type', media_type):
-                    context.user_data.pop('configuring_welcome_media', None)
-                    context.user_data.pop('welcome_media_type', None)
-                    context.user_data.pop('temp_welcome_video_data', None)
-                    
-                    media_type_text = {
-                        'photo': '🖼️ Foto',
-                        'video': '🎬 Vídeo',
-                        'video_note': '⭕ Vídeo Redondo',
-                        'document': '📄 Documento'
-                    }.get(media_type, media_type)
-                    
-                    await update.message.reply_text(
-                        f"✅ **{media_type_text} da Mensagem de Boas-vindas Configurado!**\n\n"
-                        f"Tipo: {media_type}\n"
-                        f"Arquivo: {local_path or file_url}",
-                        reply_markup=create_config_welcome_keyboard()
-                    )
-                else:
+                success, local_path, conversion_message = await normalize_video_note_upload(
+                    local_path, f"welcome_video_note_{file_id}.mp4"
+                )
+                if not success:
                     await update.message.reply_text(
-                        "❌ **Erro ao salvar mídia da mensagem de boas-vindas.**\n\nTente novamente.",
-                        reply_markup=create_config_welcome_keyboard()
+                        f"❌ **Erro na conversão:** {conversion_message}\n\nTente novamente.",
+                        reply_markup=await run_db(create_config_welcome_keyboard)
                     )
-            else:
-                expected_type_text = {
-                    'photo': 'foto',
-                    'video': 'vídeo',
-                    'video_note': 'vídeo redondo',
-                    'document': 'documento'
-                }.get(expected_type, 'mídia')
+                    return
+            
+            # Salvar configurações
+            if await run_db(set_welcome_media, local_path or file_url, media_type):
+                conversation.to(State.IDLE, media_type=None, pending_video=None)
+                
+                media_type_text = {
+                    'photo': '🖼️ Foto',
+                    'video': '🎬 Vídeo',
+                    'video_note': '⭕ Vídeo Redondo',
+                    'document': '📄 Documento'
+                }.get(media_type, media_type)
                 
                 await update.message.reply_text(
-                    f"❌ **Tipo de mídia não suportado.**\n\nEnvie uma {expected_type_text}.",
-                    reply_markup=create_config_welcome_keyboard()
+                    f"✅ **{media_type_text} da Mensagem de Boas-vindas Configurado!**\n\n"
+                    f"Tipo: {media_type}\n"
+                    f"Arquivo: {local_path or file_url}",
+                    reply_markup=await run_db(create_config_welcome_keyboard)
                 )
-        except Exception as e:
+            else:
+                await update.message.reply_text(
+                    "❌ **Erro ao salvar mídia da mensagem de boas-vindas.**\n\nTente novamente.",
+                    reply_markup=await run_db(create_config_welcome_keyboard)
+                )
+        else:
+            expected_type_text = {
+                'photo': 'foto',
+                'video': 'vídeo',
+                'video_note': 'vídeo redondo',
+                'document': 'documento'
+            }.get(expected_type, 'mídia')
+            
             await update.message.reply_text(
-                f"❌ **Erro ao processar mídia:** {str(e)}\n\nTente novamente.",
-                reply_markup=create_config_welcome_keyboard()
+                f"❌ **Tipo de mídia não suportado.**\n\nEnvie uma {expected_type_text}.",
+                reply_markup=await run_db(create_config_welcome_keyboard)
             )
-        return
-    
-    if not flow_manager.is_admin(user.id):
-        return
+    except Exception as e:
+        await update.message.reply_text(
+            f"❌ **Erro ao processar mídia:** {str(e)}\n\nTente novamente.",
+            reply_markup=await run_db(create_config_welcome_keyboard)
+        )
+
+async def handle_step_media_input(update: Update, context: ContextTypes.DEFAULT_TYPE, conversation):
+    """Mídia da etapa em criação (imagem, vídeo ou vídeo redondo)"""
+    step_type = conversation.step_type
     
-    # Verificar se está configurando etapa
-    if 'current_step_type' in context.user_data:
-        step_type = context.user_data['current_step_type']
-        
-        if 'current_step_data' not in context.user_data:
-            context.user_data['current_step_data'] = {}
+    # Processar foto
+    if update.message.photo and step_type in ['message_image', 'message_image_button']:
+        photo = update.message.photo[-1]  # Pegar a maior resolução
+        file_id = photo.file_id
         
-        # Processar foto
-        if update.message.photo and step_type in ['message_image', 'message_image_button']:
-            photo = update.message.photo[-1]  # Pegar a maior resolução
-            file_id = photo.file_id
+        try:
+            # Obter URL do arquivo
+            file = await context.bot.get_file(file_id)
+            file_url = file.file_path
             
-            try:
-                # Obter URL do arquivo
-                file = await context.bot.get_file(file_id)
-                file_url = file.file_path
-                
-                # Verificar se a URL é válida
-                if not file_url.startswith('http'):
-                    file_url = f"https://api.telegram.org/file/bot{context.bot.token}/{file_url}"
+            # Verificar se a URL é válida
+            if not file_url.startswith('http'):
+                file_url = f"{TELEGRAM_BASE_FILE_URL}{context.bot.token}/{file_url}"
+            
+            # Baixar e salvar arquivo localmente
+            local_path = await download_and_save_file(file_url, 'image', file_id)
+            
+            # Salvar informações da mídia
+            conversation.step['media_url'] = local_path or file_url
+            conversation.step['type'] = 'image'
+            conversation.step['file_id'] = file_id  # Backup do file_id
+            
+            await update.message.reply_text(
+                "📝 **Digite o texto da imagem:**",
+                reply_markup=InlineKeyboardMarkup([[
+                    InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+                ]])
+            )
+            conversation.await_caption()
+            return
+            
+        except Exception as e:
+            print(f"🔍 DEBUG: Erro ao obter arquivo: {e}")
+            # Em caso de erro, usar apenas o file_id
+            conversation.step['file_id'] = file_id
+            conversation.step['type'] = 'image'
+            
+            await update.message.reply_text(
+                "📝 **Digite o texto da imagem:**\n\n⚠️ **Aviso:** Houve um problema ao obter a URL da imagem, mas ela será salva usando o ID interno.",
+                reply_markup=InlineKeyboardMarkup([[
+                    InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+                ]])
+            )
+            conversation.await_caption()
+            return
+    
+    # Processar vídeo (normal ou para conversão para vídeo redondo)
+    elif update.message.video and step_type in ['message_video', 'message_video_button', 'message_video_note', 'message_video_note_button']:
+        video = update.message.video
+        file_id = video.file_id
+        
+        # Determinar o tipo baseado no step_type
+        if step_type in ['message_video_note', 'message_video_note_button']:
+            target_type = 'video_note'
+            message_text = "📝 **Digite o texto do vídeo redondo:**"
+        else:
+            target_type = 'video'
+            message_text = "📝 **Digite o texto do vídeo:**"
+        
+        try:
+            # Obter URL do arquivo
+            file = await context.bot.get_file(file_id)
+            file_url = file.file_path
+            
+            # Verificar se a URL é válida
+            if not file_url.startswith('http'):
+                file_url = f"{TELEGRAM_BASE_FILE_URL}{context.bot.token}/{file_url}"
+            
+            # Baixar e salvar arquivo localmente
+            local_path = await download_and_save_file(file_url, target_type, file_id)
+            
+            # Vídeo redondo: converter agora, uma única vez, e não a cada envio
+            if target_type == 'video_note':
+                if not local_path:
+                    raise Exception("Falha ao baixar o vídeo para conversão")
                 
-                # Baixar e salvar arquivo localmente
-                local_path = await download_and_save_file(file_url, 'image', file_id)
+                success, local_path, conversion_message = await normalize_video_note_upload(
+                    local_path, f"{file_id}_video_note.mp4"
+                )
+                if not success:
+                    await update.message.reply_text(
+                        f"❌ **Erro na Conversão**\n\n{conversion_message}\n\n"
+                        "Tente enviar um vídeo diferente ou verifique os requisitos.",
+                        reply_markup=InlineKeyboardMarkup([[
+                            InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+                        ]])
+                    )
+                    return
+                message_text = f"✅ {conversion_message}\n\n{message_text}"
+            
+            # Salvar informações da mídia
+            conversation.step['media_url'] = local_path or file_url
+            conversation.step['type'] = target_type
+            conversation.step['file_id'] = file_id  # Backup do file_id
+            
+            await update.message.reply_text(
+                message_text,
+                reply_markup=InlineKeyboardMarkup([[
+                    InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+                ]])
+            )
+            conversation.await_caption()
+            return
+            
+        except Exception as e:
+            print(f"🔍 DEBUG: Erro ao obter arquivo de vídeo: {e}")
+            # Em caso de erro, usar apenas o file_id
+            conversation.step['file_id'] = file_id
+            conversation.step['type'] = target_type
+            conversation.step['original_video'] = True
+            
+            await update.message.reply_text(
+                f"{message_text}\n\n⚠️ **Aviso:** Houve um problema ao obter a URL do vídeo, mas ele será salvo usando o ID interno.",
+                reply_markup=InlineKeyboardMarkup([[
+                    InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+                ]])
+            )
+            conversation.await_caption()
+            return
+    
+    # Processar vídeo redondo
+    elif update.message.video_note and step_type in ['message_video_note', 'message_video_note_button']:
+        video_note = update.message.video_note
+        file_id = video_note.file_id
+        
+        try:
+            # Obter URL do arquivo
+            file = await context.bot.get_file(file_id)
+            file_url = file.file_path
+            
+            # Verificar se a URL é válida
+            if not file_url.startswith('http'):
+                file_url = f"{TELEGRAM_BASE_FILE_URL}{context.bot.token}/{file_url}"
+            
+            # Baixar e salvar arquivo localmente
+            local_path = await download_and_save_file(file_url, 'video_note', file_id)
+            if not local_path:
+                raise Exception("Falha ao baixar o vídeo redondo")
+            
+            # Validar requisitos do video note
+            print(f"🔍 DEBUG: Validando requisitos do video note...")
+            is_valid, validation_message = await validate_video_note_requirements(None, local_path)
+            
+            if not is_valid:
+                # Oferecer conversão automática
+                await update.message.reply_text(
+                    f"❌ **Video Note Inválido**\n\n{validation_message}\n\n"
+                    "📋 **Requisitos obrigatórios:**\n"
+                    "• Formato quadrado (1:1)\n"
+                    "• Duração máxima: 60 segundos\n"
+                    "• Tamanho máximo: 100MB\n"
+                    "• Codec: H.264/MPEG-4\n"
+                    "• Resolução recomendada: 512x512px\n\n"
+                    "🔄 **Deseja converter automaticamente?**",
+                    reply_markup=InlineKeyboardMarkup([
+                        [InlineKeyboardButton("✅ Sim, converter", callback_data="convert_video_note")],
+                        [InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")]
+                    ])
+                )
                 
-                # Salvar informações da mídia
-                context.user_data['current_step_data']['media_url'] = local_path or file_url
-                context.user_data['current_step_data']['type'] = 'image'
-                context.user_data['current_step_data']['file_id'] = file_id  # Backup do file_id
+                # Salvar dados do vídeo para conversão
+                conversation.pending_video = {
+                    'local_path': local_path,
+                    'file_id': file_id,
+                    'step_type': step_type
+                }
+                return
+            
+            # Registrar os metadados: o envio passa a ser apenas uma consulta
+            success, local_path, validation_message = await normalize_video_note_upload(
+                local_path, f"{file_id}_video_note.mp4"
+            )
+            if not success:
+                raise Exception(validation_message)
+            print(f"🔍 DEBUG: {validation_message}")
+            
+            # Salvar informações da mídia
+            conversation.step['media_url'] = local_path
+            conversation.step['type'] = 'video_note'
+            conversation.step['file_id'] = file_id  # Backup do file_id
+            
+            await update.message.reply_text(
+                f"✅ **Video Note Válido!**\n\n{validation_message}\n\n"
+                "📝 **Digite o texto do vídeo redondo:**",
+                reply_markup=InlineKeyboardMarkup([[
+                    InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+                ]])
+            )
+            conversation.await_caption()
+            return
+            
+        except Exception as e:
+            print(f"🔍 DEBUG: Erro ao obter arquivo de vídeo redondo: {e}")
+            # Em caso de erro, usar apenas o file_id
+            conversation.step['file_id'] = file_id
+            conversation.step['type'] = 'video_note'
+            
+            await update.message.reply_text(
+                "📝 **Digite o texto do vídeo redondo:**\n\n⚠️ **Aviso:** Houve um problema ao obter a URL do vídeo redondo, mas ele será salvo usando o ID interno.",
+                reply_markup=InlineKeyboardMarkup([[
+                    InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+                ]])
+            )
+            conversation.await_caption()
+            return
+    
+    # Processar documento
+    elif update.message.document and step_type in ['message_image', 'message_video', 'message_video_note', 'message_image_button', 'message_video_button', 'message_video_note_button']:
+        document = update.message.document
+        file_id = document.file_id
+        
+        try:
+            # Obter URL do arquivo
+            file = await context.bot.get_file(file_id)
+            file_url = file.file_path
+            
+            if step_type in ['message_image', 'message_image_button']:
+                media_type = 'image'
+            elif step_type in ['message_video', 'message_video_button']:
+                media_type = 'video'
+            elif step_type in ['message_video_note', 'message_video_note_button']:
+                media_type = 'video_note'
+            
+            # Verificar se a URL é válida
+            if not file_url.startswith('http'):
+                file_url = f"{TELEGRAM_BASE_FILE_URL}{context.bot.token}/{file_url}"
+            
+            # Baixar e salvar arquivo localmente
+            local_path = await download_and_save_file(file_url, media_type, file_id)
+            
+            if media_type == 'video_note' and local_path:
+                success, local_path, conversion_message = await normalize_video_note_upload(
+                    local_path, f"{file_id}_video_note.mp4"
+                )
+                if not success:
+                    raise Exception(conversion_message)
+            
+            conversation.step['media_url'] = local_path or file_url
+            conversation.step['type'] = media_type
+            
+            await update.message.reply_text(
+                f"📝 **Digite o texto do {media_type}:**",
+                reply_markup=InlineKeyboardMarkup([[
+                    InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+                ]])
+            )
+            conversation.await_caption()
+            return
+            
+        except Exception as e:
+            print(f"🔍 DEBUG: Erro ao obter arquivo de documento: {e}")
+            # Em caso de erro, usar apenas o file_id
+            if step_type in ['message_image', 'message_image_button']:
+                media_type = 'image'
+            elif step_type in ['message_video', 'message_video_button']:
+                media_type = 'video'
+            elif step_type in ['message_video_note', 'message_video_note_button']:
+                media_type = 'video_note'
+            
+            conversation.step['file_id'] = file_id
+            conversation.step['type'] = media_type
+            
+            await update.message.reply_text(
+                f"📝 **Digite o texto do {media_type}:**\n\n⚠️ **Aviso:** Houve um problema ao obter a URL do arquivo, mas ele será salvo usando o ID interno.",
+                reply_markup=InlineKeyboardMarkup([[
+                    InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+                ]])
+            )
+            conversation.await_caption()
+            return
+
+async def handle_edit_step_media_input(update: Update, context: ContextTypes.DEFAULT_TYPE, conversation):
+    """Nova mídia para uma etapa existente"""
+    step_id = conversation.step_id
+    
+    # Processar foto para edição
+    if update.message.photo:
+        photo = update.message.photo[-1]  # Pegar a maior resolução
+        file_id = photo.file_id
+        
+        try:
+            # Obter URL do arquivo
+            file = await context.bot.get_file(file_id)
+            file_url = file.file_path
+            
+            # Verificar se a URL é válida
+            if not file_url.startswith('http'):
+                file_url = f"{TELEGRAM_BASE_FILE_URL}{context.bot.token}/{file_url}"
+            
+            # Baixar e salvar arquivo localmente
+            local_path = await download_and_save_file(file_url, 'image', file_id)
+            
+            if await run_db(update_step_media_url, step_id, local_path or file_url):
+                conversation.to(State.IDLE, step_id=None)
                 
                 await update.message.reply_text(
-                    "📝 **Digite o texto da imagem:**",
+                    "✅ **Mídia da Etapa Atualizada!**\n\nA nova imagem foi salva com sucesso.",
                     reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+                        InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
                     ]])
                 )
-                context.user_data['waiting_for_image_text'] = True
-                if step_type == 'message_image_button':
-                    context.user_data['waiting_for_button'] = True
-                    print(f"🔍 DEBUG: handle_media_input - step_type: {step_type}, waiting_for_button definido como True")
-                else:
-                    print(f"🔍 DEBUG: handle_media_input - step_type: {step_type}, waiting_for_button NÃO definido")
-                return
-                
-            except Exception as e:
-                print(f"🔍 DEBUG: Erro ao obter arquivo: {e}")
-                # Em caso de erro, usar apenas o file_id
-                context.user_data['current_step_data']['file_id'] = file_id
-                context.user_data['current_step_data']['type'] = 'image'
-                
+            else:
                 await update.message.reply_text(
-                    "📝 **Digite o texto da imagem:**\n\n⚠️ **Aviso:** Houve um problema ao obter a URL da imagem, mas ela será salva usando o ID interno.",
+                    "❌ Erro ao atualizar mídia da etapa.",
                     reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+                        InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
                     ]])
                 )
-                context.user_data['waiting_for_image_text'] = True
-                if step_type == 'message_image_button':
-                    context.user_data['waiting_for_button'] = True
-                return
+            return
+            
+        except Exception as e:
+            print(f"🔍 DEBUG: Erro ao obter arquivo para edição: {e}")
+            await update.message.reply_text(
+                "❌ **Erro ao processar imagem!**\n\nHouve um problema de conexão. Tente novamente ou envie uma imagem menor.",
+                reply_markup=InlineKeyboardMarkup([[
+                    InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
+                ]])
+            )
+            return
+    
+    # Processar vídeo para edição
+    elif update.message.video:
+        video = update.message.video
+        file_id = video.file_id
         
-        # Processar vídeo (normal ou para conversão para vídeo redondo)
-        elif update.message.video and step_type in ['message_video', 'message_video_button', 'message_video_note', 'message_video_note_button']:
-            video = update.message.video
-            file_id = video.file_id
+        try:
+            # Obter URL do arquivo
+            file = await context.bot.get_file(file_id)
+            file_url = file.file_path
             
-            # Determinar o tipo baseado no step_type
-            if step_type in ['message_video_note', 'message_video_note_button']:
-                target_type = 'video_note'
-                message_text = "📝 **Digite o texto do vídeo redondo:**"
-                waiting_flag = 'waiting_for_video_note_text'
-            else:
-                target_type = 'video'
-                message_text = "📝 **Digite o texto do vídeo:**"
-                waiting_flag = 'waiting_for_video_text'
+            # Verificar se a URL é válida
+            if not file_url.startswith('http'):
+                file_url = f"{TELEGRAM_BASE_FILE_URL}{context.bot.token}/{file_url}"
             
-            try:
-                # Obter URL do arquivo
-                file = await context.bot.get_file(file_id)
-                file_url = file.file_path
-                
-                # Verificar se a URL é válida
-                if not file_url.startswith('http'):
-                    file_url = f"https://api.telegram.org/file/bot{context.bot.token}/{file_url}"
-                
-                # Baixar e salvar arquivo localmente
-                local_path = await download_and_save_file(file_url, target_type, file_id)
-                
-                # Salvar informações da mídia
-                context.user_data['current_step_data']['media_url'] = local_path or file_url
-                context.user_data['current_step_data']['type'] = target_type
-                context.user_data['current_step_data']['file_id'] = file_id  # Backup do file_id
-                
-                # Marcar como vídeo original se for para vídeo redondo
-                if step_type in ['message_video_note', 'message_video_note_button']:
-                    context.user_data['current_step_data']['original_video'] = True
+            # Baixar e salvar arquivo localmente
+            local_path = await download_and_save_file(file_url, 'video', file_id)
+            
+            if await run_db(update_step_media_url, step_id, local_path or file_url):
+                conversation.to(State.IDLE, step_id=None)
                 
                 await update.message.reply_text(
-                    message_text,
+                    "✅ **Mídia da Etapa Atualizada!**\n\nO novo vídeo foi salvo com sucesso.",
                     reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+                        InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
                     ]])
                 )
-                context.user_data[waiting_flag] = True
-                if step_type in ['message_video_button', 'message_video_note_button']:
-                    context.user_data['waiting_for_button'] = True
-                return
-                
-            except Exception as e:
-                print(f"🔍 DEBUG: Erro ao obter arquivo de vídeo: {e}")
-                # Em caso de erro, usar apenas o file_id
-                context.user_data['current_step_data']['file_id'] = file_id
-                context.user_data['current_step_data']['type'] = target_type
-                context.user_data['current_step_data']['original_video'] = True
-                
+            else:
                 await update.message.reply_text(
-                    f"{message_text}\n\n⚠️ **Aviso:** Houve um problema ao obter a URL do vídeo, mas ele será salvo usando o ID interno.",
+                    "❌ Erro ao atualizar mídia da etapa.",
                     reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+                        InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
                     ]])
                 )
-                context.user_data[waiting_flag] = True
-                if step_type in ['message_video_button', 'message_video_note_button']:
-                    context.user_data['waiting_for_button'] = True
-                return
-        
-        # Processar vídeo redondo
-        elif update.message.video_note and step_type in ['message_video_note', 'message_video_note_button']:
-            video_note = update.message.video_note
-            file_id = video_note.file_id
+            return
             
-            # Garantir que current_step_data existe
-            if 'current_step_data' not in context.user_data:
-                context.user_data['current_step_data'] = {}
+        except Exception as e:
+            print(f"🔍 DEBUG: Erro ao obter arquivo de vídeo para edição: {e}")
+            await update.message.reply_text(
+                "❌ **Erro ao processar vídeo!**\n\nHouve um problema de conexão. Tente novamente ou envie um vídeo menor.",
+                reply_markup=InlineKeyboardMarkup([[
+                    InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
+                ]])
+            )
+            return
+    
+    # Processar vídeo redondo para edição
+    elif update.message.video_note:
+        video_note = update.message.video_note
+        file_id = video_note.file_id
+        
+        try:
+            # Obter URL do arquivo
+            file = await context.bot.get_file(file_id)
+            file_url = file.file_path
+            
+            # Verificar se a URL é válida
+            if not file_url.startswith('http'):
+                file_url = f"{TELEGRAM_BASE_FILE_URL}{context.bot.token}/{file_url}"
+            
+            # Baixar e salvar arquivo localmente
+            local_path = await download_and_save_file(file_url, 'video_note', file_id)
+            if not local_path:
+                raise Exception("Falha ao baixar o vídeo redondo")
+            
+            # Normalizar uma única vez no upload (converte se necessário)
+            print(f"🔍 DEBUG: Normalizando video note para edição...")
+            success, local_path, validation_message = await normalize_video_note_upload(
+                local_path, f"{file_id}_video_note.mp4"
+            )
             
-            try:
-                # Obter URL do arquivo
-                file = await context.bot.get_file(file_id)
-                file_url = file.file_path
-                
-                # Verificar se a URL é válida
-                if not file_url.startswith('http'):
-                    file_url = f"https://api.telegram.org/file/bot{context.bot.token}/{file_url}"
-                
-                # Baixar arquivo para validação
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(file_url) as response:
-                        if response.status == 200:
-                            file_data = await response.read()
-                            
-                            # Validar requisitos do video note
-                            print(f"🔍 DEBUG: Validando requisitos do video note...")
-                            is_valid, validation_message = await validate_video_note_requirements(file_data)
-                            
-                            if not is_valid:
-                                # Oferecer conversão automática
-                                await update.message.reply_text(
-                                    f"❌ **Video Note Inválido**\n\n{validation_message}\n\n"
-                                    "📋 **Requisitos obrigatórios:**\n"
-                                    "• Formato quadrado (1:1)\n"
-                                    "• Duração máxima: 60 segundos\n"
-                                    "• Tamanho máximo: 100MB\n"
-                                    "• Codec: H.264/MPEG-4\n"
-                                    "• Resolução recomendada: 512x512px\n\n"
-                                    "🔄 **Deseja converter automaticamente?**",
-                                    reply_markup=InlineKeyboardMarkup([
-                                        [InlineKeyboardButton("✅ Sim, converter", callback_data="convert_video_note")],
-                                        [InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")]
-                                    ])
-                                )
-                                
-                                # Salvar dados do vídeo para conversão
-                                context.user_data['video_to_convert'] = {
-                                    'file_data': file_data,
-                                    'step_type': step_type
-                                }
-                                return
-                            
-                            print(f"🔍 DEBUG: {validation_message}")
-                            
-                            # Salvar arquivo localmente após validação
-                            local_path = await download_and_save_file(file_url, 'video_note', file_id)
-                            
-                            # Salvar informações da mídia
-                            context.user_data['current_step_data']['media_url'] = local_path or file_url
-                            context.user_data['current_step_data']['type'] = 'video_note'
-                            context.user_data['current_step_data']['file_id'] = file_id  # Backup do file_id
-                            
-                            await update.message.reply_text(
-                                f"✅ **Video Note Válido!**\n\n{validation_message}\n\n"
-                                "📝 **Digite o texto do vídeo redondo:**",
-                                reply_markup=InlineKeyboardMarkup([[
-                                    InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
-                                ]])
-                            )
-                            context.user_data['waiting_for_video_note_text'] = True
-                            if step_type == 'message_video_note_button':
-                                context.user_data['waiting_for_button'] = True
-                            return
-                        else:
-                            raise Exception(f"HTTP {response.status}")
-                
-            except Exception as e:
-                print(f"🔍 DEBUG: Erro ao obter arquivo de vídeo redondo: {e}")
-                # Em caso de erro, usar apenas o file_id
-                context.user_data['current_step_data']['file_id'] = file_id
-                context.user_data['current_step_data']['type'] = 'video_note'
-                
+            if not success:
                 await update.message.reply_text(
-                    "📝 **Digite o texto do vídeo redondo:**\n\n⚠️ **Aviso:** Houve um problema ao obter a URL do vídeo redondo, mas ele será salvo usando o ID interno.",
+                    f"❌ **Video Note Inválido**\n\n{validation_message}\n\n"
+                    "📋 **Requisitos obrigatórios:**\n"
+                    "• Formato quadrado (1:1)\n"
+                    "• Duração máxima: 60 segundos\n"
+                    "• Tamanho máximo: 100MB\n"
+                    "• Codec: H.264/MPEG-4\n"
+                    "• Resolução recomendada: 512x512px",
                     reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+                        InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
                     ]])
                 )
-                context.user_data['waiting_for_video_note_text'] = True
-                if step_type == 'message_video_note_button':
-                    context.user_data['waiting_for_button'] = True
                 return
-        
-        # Processar documento
-        elif update.message.document and step_type in ['message_image', 'message_video', 'message_video_note', 'message_image_button', 'message_video_button', 'message_video_note_button']:
-            document = update.message.document
-            file_id = document.file_id
             
-            try:
-                # Obter URL do arquivo
-                file = await context.bot.get_file(file_id)
-                file_url = file.file_path
-                
-                if step_type in ['message_image', 'message_image_button']:
-                    media_type = 'image'
-                elif step_type in ['message_video', 'message_video_button']:
-                    media_type = 'video'
-                elif step_type in ['message_video_note', 'message_video_note_button']:
-                    media_type = 'video_note'
-                
-                # Verificar se a URL é válida
-                if not file_url.startswith('http'):
-                    file_url = f"https://api.telegram.org/file/bot{context.bot.token}/{file_url}"
-                
-                # Baixar e salvar arquivo localmente
-                local_path = await download_and_save_file(file_url, media_type, file_id)
-                
-                context.user_data['current_step_data']['media_url'] = local_path or file_url
-                context.user_data['current_step_data']['type'] = media_type
+            print(f"🔍 DEBUG: {validation_message}")
+            
+            if await run_db(update_step_media_url, step_id, local_path):
+                conversation.to(State.IDLE, step_id=None)
                 
                 await update.message.reply_text(
-                    f"📝 **Digite o texto do {media_type}:**",
+                    f"✅ **Mídia da Etapa Atualizada!**\n\n{validation_message}\n\nO novo vídeo redondo foi salvo com sucesso.",
                     reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+                        InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
                     ]])
                 )
-                context.user_data[f'waiting_for_{media_type}_text'] = True
-                if step_type in ['message_image_button', 'message_video_button', 'message_video_note_button']:
-                    context.user_data['waiting_for_button'] = True
-                return
-                
-            except Exception as e:
-                print(f"🔍 DEBUG: Erro ao obter arquivo de documento: {e}")
-                # Em caso de erro, usar apenas o file_id
-                if step_type in ['message_image', 'message_image_button']:
-                    media_type = 'image'
-                elif step_type in ['message_video', 'message_video_button']:
-                    media_type = 'video'
-                elif step_type in ['message_video_note', 'message_video_note_button']:
-                    media_type = 'video_note'
-                
-                context.user_data['current_step_data']['file_id'] = file_id
-                context.user_data['current_step_data']['type'] = media_type
-                
+            else:
                 await update.message.reply_text(
-                    f"📝 **Digite o texto do {media_type}:**\n\n⚠️ **Aviso:** Houve um problema ao obter a URL do arquivo, mas ele será salvo usando o ID interno.",
+                    "❌ Erro ao atualizar mídia da etapa.",
                     reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+                        InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
                     ]])
                 )
-                context.user_data[f'waiting_for_{media_type}_text'] = True
-                if step_type in ['message_image_button', 'message_video_button', 'message_video_note_button']:
-                    context.user_data['waiting_for_button'] = True
-                return
+            return
+            
+        except Exception as e:
+            print(f"🔍 DEBUG: Erro ao obter arquivo de vídeo redondo para edição: {e}")
+            await update.message.reply_text(
+                "❌ **Erro ao processar vídeo redondo!**\n\nHouve um problema de conexão. Tente novamente ou envie um vídeo menor.",
+                reply_markup=InlineKeyboardMarkup([[
+                    InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
+                ]])
+            )
+            return
     
-    # Verificar se está editando mídia de etapa
-    if 'editing_step_media' in context.user_data and context.user_data['editing_step_media']:
-        step_id = context.user_data['editing_step_id']
+    # Processar documento para edição
+    elif update.message.document:
+        document = update.message.document
+        file_id = document.file_id
         
-        # Processar foto para edição
-        if update.message.photo:
-            photo = update.message.photo[-1]  # Pegar a maior resolução
-            file_id = photo.file_id
+        try:
+            # Obter URL do arquivo
+            file = await context.bot.get_file(file_id)
+            file_url = file.file_path
             
-            try:
-                # Obter URL do arquivo
-                file = await context.bot.get_file(file_id)
-                file_url = file.file_path
-                
-                # Verificar se a URL é válida
-                if not file_url.startswith('http'):
-                    file_url = f"https://api.telegram.org/file/bot{context.bot.token}/{file_url}"
-                
-                # Baixar e salvar arquivo localmente
-                local_path = await download_and_save_file(file_url, 'image', file_id)
-                
-                if update_step_media_url(step_id, local_path or file_url):
-                    context.user_data.pop('editing_step_media', None)
-                    context.user_data.pop('editing_step_id', None)
-                    
-                    await update.message.reply_text(
-                        "✅ **Mídia da Etapa Atualizada!**\n\nA nova imagem foi salva com sucesso.",
-                        reply_markup=InlineKeyboardMarkup([[
-                            InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
-                        ]])
-                    )
-                else:
-                    await update.message.reply_text(
-                        "❌ Erro ao atualizar mídia da etapa.",
-                        reply_markup=InlineKeyboardMarkup([[
-                            InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
-                        ]])
-                    )
-                return
+            # Verificar se a URL é válida
+            if not file_url.startswith('http'):
+                file_url = f"{TELEGRAM_BASE_FILE_URL}{context.bot.token}/{file_url}"
+            
+            # Baixar e salvar arquivo localmente
+            local_path = await download_and_save_file(file_url, 'document', file_id)
+            
+            if await run_db(update_step_media_url, step_id, local_path or file_url):
+                conversation.to(State.IDLE, step_id=None)
                 
-            except Exception as e:
-                print(f"🔍 DEBUG: Erro ao obter arquivo para edição: {e}")
                 await update.message.reply_text(
-                    "❌ **Erro ao processar imagem!**\n\nHouve um problema de conexão. Tente novamente ou envie uma imagem menor.",
+                    "✅ **Mídia da Etapa Atualizada!**\n\nO novo arquivo foi salvo com sucesso.",
                     reply_markup=InlineKeyboardMarkup([[
                         InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
                     ]])
                 )
-                return
-        
-        # Processar vídeo para edição
-        elif update.message.video:
-            video = update.message.video
-            file_id = video.file_id
-            
-            try:
-                # Obter URL do arquivo
-                file = await context.bot.get_file(file_id)
-                file_url = file.file_path
-                
-                # Verificar se a URL é válida
-                if not file_url.startswith('http'):
-                    file_url = f"https://api.telegram.org/file/bot{context.bot.token}/{file_url}"
-                
-                # Baixar e salvar arquivo localmente
-                local_path = await download_and_save_file(file_url, 'video', file_id)
-                
-                if update_step_media_url(step_id, local_path or file_url):
-                    context.user_data.pop('editing_step_media', None)
-                    context.user_data.pop('editing_step_id', None)
-                    
-                    await update.message.reply_text(
-                        "✅ **Mídia da Etapa Atualizada!**\n\nO novo vídeo foi salvo com sucesso.",
-                        reply_markup=InlineKeyboardMarkup([[
-                            InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
-                        ]])
-                    )
-                else:
-                    await update.message.reply_text(
-                        "❌ Erro ao atualizar mídia da etapa.",
-                        reply_markup=InlineKeyboardMarkup([[
-                            InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
-                        ]])
-                    )
-                return
-                
-            except Exception as e:
-                print(f"🔍 DEBUG: Erro ao obter arquivo de vídeo para edição: {e}")
-                await update.message.reply_text(
-                    "❌ **Erro ao processar vídeo!**\n\nHouve um problema de conexão. Tente novamente ou envie um vídeo menor.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
-                    ]])
-                )
-                return
-        
-        # Processar vídeo redondo para edição
-        elif update.message.video_note:
-            video_note = update.message.video_note
-            file_id = video_note.file_id
-            
-            try:
-                # Obter URL do arquivo
-                file = await context.bot.get_file(file_id)
-                file_url = file.file_path
-                
-                # Verificar se a URL é válida
-                if not file_url.startswith('http'):
-                    file_url = f"https://api.telegram.org/file/bot{context.bot.token}/{file_url}"
-                
-                # Baixar arquivo para validação
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(file_url) as response:
-                        if response.status == 200:
-                            file_data = await response.read()
-                            
-                            # Validar requisitos do video note
-                            print(f"🔍 DEBUG: Validando requisitos do video note para edição...")
-                            is_valid, validation_message = await validate_video_note_requirements(file_data)
-                            
-                            if not is_valid:
-                                await update.message.reply_text(
-                                    f"❌ **Video Note Inválido**\n\n{validation_message}\n\n"
-                                    "📋 **Requisitos obrigatórios:**\n"
-                                    "• Formato quadrado (1:1)\n"
-                                    "• Duração máxima: 60 segundos\n"
-                                    "• Tamanho máximo: 100MB\n"
-                                    "• Codec: H.264/MPEG-4\n"
-                                    "• Resolução recomendada: 512x512px",
-                                    reply_markup=InlineKeyboardMarkup([[
-                                        InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
-                                    ]])
-                                )
-                                return
-                            
-                            print(f"🔍 DEBUG: {validation_message}")
-                            
-                            # Salvar arquivo localmente após validação
-                            local_path = await download_and_save_file(file_url, 'video_note', file_id)
-                            
-                            if update_step_media_url(step_id, local_path or file_url):
-                                context.user_data.pop('editing_step_media', None)
-                                context.user_data.pop('editing_step_id', None)
-                                
-                                await update.message.reply_text(
-                                    f"✅ **Mídia da Etapa Atualizada!**\n\n{validation_message}\n\nO novo vídeo redondo foi salvo com sucesso.",
-                                    reply_markup=InlineKeyboardMarkup([[
-                                        InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
-                                    ]])
-                                )
-                            else:
-                                await update.message.reply_text(
-                                    "❌ Erro ao atualizar mídia da etapa.",
-                                    reply_markup=InlineKeyboardMarkup([[
-                                        InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
-                                    ]])
-                                )
-                            return
-                        else:
-                            raise Exception(f"HTTP {response.status}")
-                
-            except Exception as e:
-                print(f"🔍 DEBUG: Erro ao obter arquivo de vídeo redondo para edição: {e}")
+            else:
                 await update.message.reply_text(
-                    "❌ **Erro ao processar vídeo redondo!**\n\nHouve um problema de conexão. Tente novamente ou envie um vídeo menor.",
+                    "❌ Erro ao atualizar mídia da etapa.",
                     reply_markup=InlineKeyboardMarkup([[
                         InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
                     ]])
                 )
-                return
-        
-        # Processar documento para edição
-        elif update.message.document:
-            document = update.message.document
-            file_id = document.file_id
+            return
             
-            try:
-                # Obter URL do arquivo
-                file = await context.bot.get_file(file_id)
-                file_url = file.file_path
-                
-                # Verificar se a URL é válida
-                if not file_url.startswith('http'):
-                    file_url = f"https://api.telegram.org/file/bot{context.bot.token}/{file_url}"
-                
-                # Baixar e salvar arquivo localmente
-                local_path = await download_and_save_file(file_url, 'document', file_id)
-                
-                if update_step_media_url(step_id, local_path or file_url):
-                    context.user_data.pop('editing_step_media', None)
-                    context.user_data.pop('editing_step_id', None)
-                    
-                    await update.message.reply_text(
-                        "✅ **Mídia da Etapa Atualizada!**\n\nO novo arquivo foi salvo com sucesso.",
-                        reply_markup=InlineKeyboardMarkup([[
-                            InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
-                        ]])
-                    )
-                else:
-                    await update.message.reply_text(
-                        "❌ Erro ao atualizar mídia da etapa.",
-                        reply_markup=InlineKeyboardMarkup([[
-                            InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
-                        ]])
-                    )
-                return
-                
-            except Exception as e:
-                print(f"🔍 DEBUG: Erro ao obter arquivo de documento para edição: {e}")
-                await update.message.reply_text(
-                    "❌ **Erro ao processar arquivo!**\n\nHouve um problema de conexão. Tente novamente ou envie um arquivo menor.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
-                    ]])
-                )
-                return
+        except Exception as e:
+            print(f"🔍 DEBUG: Erro ao obter arquivo de documento para edição: {e}")
+            await update.message.reply_text(
+                "❌ **Erro ao processar arquivo!**\n\nHouve um problema de conexão. Tente novamente ou envie um arquivo menor.",
+                reply_markup=InlineKeyboardMarkup([[
+                    InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
+                ]])
+            )
+            return
 
 async def handle_text_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler para processar entrada de texto durante criação de fluxos"""
-    user = update.effective_user
-    text = update.message.text
-    flow_manager = FlowManager()
-    
-    print(f"DEBUG: ENTRANDO NA FUNÇÃO handle_text_input - Texto: {text}")
-    
-    # Verificar se está configurando mensagem de boas-vindas
-    if 'configuring_welcome_text' in context.user_data and context.user_data['configuring_welcome_text']:
-        if set_config_value('welcome_text', text):
-            context.user_data.pop('configuring_welcome_text', None)
-            await update.message.reply_text(
-                "✅ **Texto da Mensagem de Boas-vindas Salvo!**\n\n"
-                f"Texto configurado:\n{text}",
-                reply_markup=create_config_welcome_keyboard()
-            )
-        else:
-            await update.message.reply_text(
-                "❌ **Erro ao salvar texto da mensagem de boas-vindas.**\n\nTente novamente.",
-                reply_markup=create_config_welcome_keyboard()
-            )
-        return
-    
-    # Verificar se está coletando dados do usuário (não apenas admins)
-    if 'waiting_for_name' in context.user_data and context.user_data['waiting_for_name']:
-        # Processar nome
-        context.user_data['collected_name'] = text
-        context.user_data.pop('waiting_for_name', None)
-        
-        # Remover teclado personalizado
-        await update.message.reply_text(
-            "✅ Nome salvo!",
-            reply_markup=ReplyKeyboardRemove()
-        )
-        
-        # Voltar para a tela de coleta de dados para mostrar botões atualizados
-        if 'missing_data' in context.user_data:
-            missing_data = context.user_data['missing_data']
-            await request_missing_data(update, context, missing_data)
-        else:
-            # Se não há mais dados, finalizar
-            await finish_data_collection(update, context)
-        return
+    conversation = get_conversation(context)
+    handler = TEXT_HANDLERS.get(conversation.state, handle_idle_text)
     
-    elif 'waiting_for_phone' in context.user_data and context.user_data['waiting_for_phone']:
-        # Processar telefone
-        context.user_data['collected_phone'] = text
-        context.user_data.pop('waiting_for_phone', None)
-        
-        # Remover teclado personalizado
-        await update.message.reply_text(
-            "✅ Telefone salvo!",
-            reply_markup=ReplyKeyboardRemove()
-        )
-        
-        # Voltar para a tela de coleta de dados para mostrar botões atualizados
-        if 'missing_data' in context.user_data:
-            missing_data = context.user_data['missing_data']
-            await request_missing_data(update, context, missing_data)
-        else:
-            # Se não há mais dados, finalizar
-            await finish_data_collection(update, context)
+    # Estados de configuração e criação de fluxos são exclusivos de admins
+    if conversation.state in ADMIN_STATES and not await AsyncFlowManager().is_admin(update.effective_user.id):
+        logger.debug("Estado %s descartado: usuário não é admin", conversation.state.value)
+        conversation.reset()
         return
     
-    elif 'waiting_for_email' in context.user_data and context.user_data['waiting_for_email']:
-        # Processar email
-        context.user_data['collected_email'] = text
-        context.user_data.pop('waiting_for_email', None)
-        
-        # Remover teclado personalizado
-        await update.message.reply_text(
-            "✅ Email salvo!",
-            reply_markup=ReplyKeyboardRemove()
-        )
-        
-        # Voltar para a tela de coleta de dados para mostrar botões atualizados
-        if 'missing_data' in context.user_data:
-            missing_data = context.user_data['missing_data']
-            await request_missing_data(update, context, missing_data)
-        else:
-            # Se não há mais dados, finalizar
-            await finish_data_collection(update, context)
+    await handler(update, context, conversation)
+
+async def handle_idle_text(update: Update, context: ContextTypes.DEFAULT_TYPE, conversation):
+    """Texto fora de qualquer conversa: botões do teclado de cadastro ou eco (admins)"""
+    if update.message.text in SIGNUP_MENU_BUTTONS:
+        await handle_signup_menu_text(update, context, conversation)
         return
     
-    elif 'waiting_for_email_or_contact' in context.user_data and context.user_data['waiting_for_email_or_contact']:
-        # Processar email ou contato
-        if text == "📧 Digitar Email":
-            # Usuário escolheu digitar email
-            await update.message.reply_text(
-                "📧 **Digite seu email:**\n\nExemplo: usuario@exemplo.com",
-                reply_markup=ReplyKeyboardRemove()
-            )
-            context.user_data.pop('waiting_for_email_or_contact', None)
-            context.user_data['waiting_for_email'] = True
-        elif text == "📱 Compartilhar Telefone":
-            # Usuário escolheu compartilhar telefone
-            keyboard = [[KeyboardButton("📱 Compartilhar Telefone", request_contact=True)]]
-            reply_markup = ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
-            
-            await update.message.reply_text(
-                "📱 **Toque no botão abaixo para compartilhar seu telefone:**",
-                reply_markup=reply_markup
-            )
-            context.user_data.pop('waiting_for_email_or_contact', None)
-            context.user_data['waiting_for_contact'] = True
-        elif text == "🔙 Voltar":
-            # Usuário escolheu voltar
-            await update.message.reply_text(
-                "🔙 Voltando...",
-                reply_markup=ReplyKeyboardRemove()
-            )
-            
-            if 'missing_data' in context.user_data:
-                missing_data = context.user_data['missing_data']
-                await request_missing_data(update, context, missing_data)
-            else:
-                await update.message.reply_text("❌ Erro na coleta de dados.")
-        else:
-            # Usuário digitou um email diretamente
-            context.user_data['collected_email'] = text
-            context.user_data.pop('waiting_for_email_or_contact', None)
-            context.user_data['current_data_index'] += 1
-            
-            # Remover teclado personalizado
-            await update.message.reply_text(
-                "✅ Email salvo!",
-                reply_markup=ReplyKeyboardRemove()
-            )
-            
-            # Verificar se há mais dados para coletar
-            missing_data = context.user_data.get('missing_data', [])
-            current_index = context.user_data['current_data_index']
-            
-            if current_index >= len(missing_data):
-                # Todos os dados foram coletados
-                await finish_data_collection(update, context)
-        return
+    if await AsyncFlowManager().is_admin(update.effective_user.id):
+        await echo(update, context)
+
+async def continue_data_collection(update, context, conversation):
+    """Volta para a tela de coleta de dados, ou finaliza se não há mais dados"""
+    if conversation.missing_data is not None:
+        await request_missing_data(update, context, conversation.missing_data)
+    else:
+        await finish_data_collection(update, context)
+
+async def handle_signup_menu_text(update: Update, context: ContextTypes.DEFAULT_TYPE, conversation):
+    """Botões do teclado personalizado de cadastro"""
+    text = update.message.text
     
-    # Processar botões do teclado personalizado
-    elif text == "📧 Enviar Email":
+    if text == "📧 Enviar Email":
         # Solicitar email
         keyboard = [
             [KeyboardButton("🔙 Voltar")]
@@ -1520,19 +1248,15 @@ async def handle_text_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "📧 **Digite seu email:**\n\nExemplo: usuario@exemplo.com",
             reply_markup=reply_markup
         )
-        context.user_data['waiting_for_email'] = True
-        return
-    
-
+        conversation.to(State.SIGNUP_EMAIL)
     
     elif text == "❌ Cancelar":
         # Cancelar coleta de dados
-        context.user_data.clear()
+        conversation.reset()
         await update.message.reply_text(
             "❌ **Coleta de Dados Cancelada**\n\nVocê pode tentar novamente enviando /start",
             reply_markup=ReplyKeyboardRemove()
         )
-        return
     
     elif text == "🔙 Voltar":
         # Voltar para a tela inicial de coleta de dados
@@ -1541,632 +1265,296 @@ async def handle_text_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_markup=ReplyKeyboardRemove()
         )
         
-        if 'missing_data' in context.user_data:
-            missing_data = context.user_data['missing_data']
-            await request_missing_data(update, context, missing_data)
+        if conversation.missing_data is not None:
+            await request_missing_data(update, context, conversation.missing_data)
         else:
             await update.message.reply_text("❌ Erro na coleta de dados.")
-        return
     
-    # Verificar se é admin para outras funcionalidades
-    if not flow_manager.is_admin(user.id):
-        print("DEBUG: Usuário não é admin, saindo da função")
-        return
+    else:
+        await handle_idle_text(update, context, conversation)
+
+async def handle_signup_field_text(update: Update, context: ContextTypes.DEFAULT_TYPE, conversation):
+    """Nome, telefone ou email digitado durante o cadastro"""
+    text = update.message.text
     
-    # Debug: verificar estados atuais
-    print(f"DEBUG: Estados atuais - waiting_for_image_text: {context.user_data.get('waiting_for_image_text', False)}")
-    print(f"DEBUG: Estados atuais - waiting_for_button_text: {context.user_data.get('waiting_for_button_text', False)}")
-    print(f"DEBUG: Estados atuais - waiting_for_button: {context.user_data.get('waiting_for_button', False)}")
-    print(f"DEBUG: Estados atuais - waiting_for_video_text: {context.user_data.get('waiting_for_video_text', False)}")
-    print(f"DEBUG: Estados atuais - waiting_for_name: {context.user_data.get('waiting_for_name', False)}")
-    print(f"DEBUG: Estados atuais - waiting_for_phone: {context.user_data.get('waiting_for_phone', False)}")
-    print(f"DEBUG: Estados atuais - waiting_for_email: {context.user_data.get('waiting_for_email', False)}")
-    print(f"DEBUG: Texto recebido: {text}")
-    
-    # Verificar se está coletando dados do usuário
-    if 'waiting_for_name' in context.user_data and context.user_data['waiting_for_name']:
-        # Processar nome
-        context.user_data['collected_name'] = text
-        context.user_data.pop('waiting_for_name', None)
-        context.user_data['current_data_index'] += 1
-        
-        # Verificar se há mais dados para coletar
-        missing_data = context.user_data.get('missing_data', [])
-        current_index = context.user_data['current_data_index']
-        
-        if current_index < len(missing_data):
-            # Próximo dado
-            next_data_type = missing_data[current_index]
-            if next_data_type == "telefone":
-                await update.message.reply_text(
-                    "📱 **Digite seu número de telefone:**\n\nFormato: (11) 99999-9999",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Cancelar", callback_data="cancel_data_collection")
-                    ]])
-                )
-                context.user_data['waiting_for_phone'] = True
-            elif next_data_type == "email":
-                await update.message.reply_text(
-                    "📧 **Digite seu email:**\n\nExemplo: usuario@exemplo.com",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Cancelar", callback_data="cancel_data_collection")
-                    ]])
-                )
-                context.user_data['waiting_for_email'] = True
-        else:
-            # Todos os dados foram coletados
-            await finish_data_collection(update, context)
+    if text == "🔙 Voltar":
+        await handle_signup_menu_text(update, context, conversation)
         return
     
-    elif 'waiting_for_phone' in context.user_data and context.user_data['waiting_for_phone']:
-        # Processar telefone
-        context.user_data['collected_phone'] = text
-        context.user_data.pop('waiting_for_phone', None)
-        context.user_data['current_data_index'] += 1
-        
-        # Verificar se há mais dados para coletar
-        missing_data = context.user_data.get('missing_data', [])
-        current_index = context.user_data['current_data_index']
-        
-        if current_index < len(missing_data):
-            # Próximo dado
-            next_data_type = missing_data[current_index]
-            if next_data_type == "email":
-                await update.message.reply_text(
-                    "📧 **Digite seu email:**\n\nExemplo: usuario@exemplo.com",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Cancelar", callback_data="cancel_data_collection")
-                    ]])
-                )
-                context.user_data['waiting_for_email'] = True
-        else:
-            # Todos os dados foram coletados
-            await finish_data_collection(update, context)
-        return
+    field, label = SIGNUP_FIELDS[conversation.state]
+    setattr(conversation, field, text)
+    conversation.to(State.SIGNUP_MENU)
     
-    elif 'waiting_for_email' in context.user_data and context.user_data['waiting_for_email']:
-        # Processar email
-        context.user_data['collected_email'] = text
-        context.user_data.pop('waiting_for_email', None)
-        context.user_data['current_data_index'] += 1
-        
-        # Verificar se há mais dados para coletar
-        missing_data = context.user_data.get('missing_data', [])
-        current_index = context.user_data['current_data_index']
+    # Remover teclado personalizado
+    await update.message.reply_text(
+        f"✅ {label} salvo!",
+        reply_markup=ReplyKeyboardRemove()
+    )
+    
+    # Voltar para a tela de coleta de dados para mostrar botões atualizados
+    await continue_data_collection(update, context, conversation)
+
+async def handle_email_or_contact_text(update: Update, context: ContextTypes.DEFAULT_TYPE, conversation):
+    """Escolha entre digitar o email e compartilhar o telefone"""
+    text = update.message.text
+    
+    if text == "📧 Digitar Email":
+        # Usuário escolheu digitar email
+        await update.message.reply_text(
+            "📧 **Digite seu email:**\n\nExemplo: usuario@exemplo.com",
+            reply_markup=ReplyKeyboardRemove()
+        )
+        conversation.to(State.SIGNUP_EMAIL)
+    elif text == "📱 Compartilhar Telefone":
+        # Usuário escolheu compartilhar telefone; o contato chega por handle_contact_shared
+        keyboard = [[KeyboardButton("📱 Compartilhar Telefone", request_contact=True)]]
+        reply_markup = ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
         
-        if current_index >= len(missing_data):
-            # Todos os dados foram coletados
-            await finish_data_collection(update, context)
-        return
+        await update.message.reply_text(
+            "📱 **Toque no botão abaixo para compartilhar seu telefone:**",
+            reply_markup=reply_markup
+        )
+        conversation.to(State.SIGNUP_PHONE)
+    elif text == "🔙 Voltar":
+        await handle_signup_menu_text(update, context, conversation)
+    else:
+        # Usuário digitou um email diretamente
+        await handle_signup_field_text(update, context, conversation.to(State.SIGNUP_EMAIL))
+
+async def handle_welcome_text_input(update: Update, context: ContextTypes.DEFAULT_TYPE, conversation):
+    """Texto da mensagem de boas-vindas"""
+    text = update.message.text
     
-    # Verificar se está configurando URL do webhook
-    elif 'setting_webhook_url' in context.user_data and context.user_data['setting_webhook_url']:
-        # Validar URL
-        if text.startswith(('http://', 'https://')):
-            if set_config_value('webhook_url', text):
-                context.user_data.pop('setting_webhook_url', None)
-                await update.message.reply_text(
-                    f"✅ **URL do Webhook Definida!**\n\n🔗 {text}\n\nO webhook será enviado para esta URL.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="config_webhook")
-                    ]])
-                )
+    if await run_db(set_config_value, 'welcome_text', text):
+        conversation.to(State.IDLE)
+        await update.message.reply_text(
+            "✅ **Texto da Mensagem de Boas-vindas Salvo!**\n\n"
+            f"Texto configurado:\n{text}",
+            reply_markup=await run_db(create_config_welcome_keyboard)
+        )
+    else:
+        await update.message.reply_text(
+            "❌ **Erro ao salvar texto da mensagem de boas-vindas.**\n\nTente novamente.",
+            reply_markup=await run_db(create_config_welcome_keyboard)
+        )
+
+async def handle_webhook_url_input(update: Update, context: ContextTypes.DEFAULT_TYPE, conversation):
+    """URL do webhook (definição ou alteração)"""
+    text = update.message.text
+    changing = conversation.state == State.WEBHOOK_URL_CHANGE
+    
+    # Validar URL
+    if text.startswith(('http://', 'https://')):
+        if await run_db(set_config_value, 'webhook_url', text):
+            conversation.to(State.IDLE)
+            if changing:
+                message = f"✅ **URL do Webhook Alterada!**\n\n🔗 {text}\n\nO webhook será enviado para esta nova URL."
             else:
-                await update.message.reply_text(
-                    "❌ Erro ao salvar URL do webhook.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="config_webhook")
-                    ]])
-                )
-        else:
+                message = f"✅ **URL do Webhook Definida!**\n\n🔗 {text}\n\nO webhook será enviado para esta URL."
             await update.message.reply_text(
-                "❌ **URL Inválida!**\n\nA URL deve começar com http:// ou https://\n\nTente novamente:",
+                message,
                 reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Cancelar", callback_data="config_webhook")
+                    InlineKeyboardButton("🔙 Voltar", callback_data="config_webhook")
                 ]])
             )
-        return
-    
-    elif 'changing_webhook_url' in context.user_data and context.user_data['changing_webhook_url']:
-        # Validar URL
-        if text.startswith(('http://', 'https://')):
-            if set_config_value('webhook_url', text):
-                context.user_data.pop('changing_webhook_url', None)
-                await update.message.reply_text(
-                    f"✅ **URL do Webhook Alterada!**\n\n🔗 {text}\n\nO webhook será enviado para esta nova URL.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="config_webhook")
-                    ]])
-                )
-            else:
-                await update.message.reply_text(
-                    "❌ Erro ao alterar URL do webhook.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="config_webhook")
-                    ]])
-                )
         else:
             await update.message.reply_text(
-                "❌ **URL Inválida!**\n\nA URL deve começar com http:// ou https://\n\nTente novamente:",
+                "❌ Erro ao alterar URL do webhook." if changing else "❌ Erro ao salvar URL do webhook.",
                 reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Cancelar", callback_data="config_webhook")
+                    InlineKeyboardButton("🔙 Voltar", callback_data="config_webhook")
                 ]])
             )
-        return
+    else:
+        await update.message.reply_text(
+            "❌ **URL Inválida!**\n\nA URL deve começar com http:// ou https://\n\nTente novamente:",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Cancelar", callback_data="config_webhook")
+            ]])
+        )
+
+async def handle_edit_step_text_input(update: Update, context: ContextTypes.DEFAULT_TYPE, conversation):
+    """Novo texto para uma etapa existente"""
+    step_id = conversation.step_id
     
-    # Verificar se está editando texto de etapa
-    elif 'editing_step_text' in context.user_data and context.user_data['editing_step_text']:
-        step_id = context.user_data['editing_step_id']
+    if await run_db(update_step_content, step_id, update.message.text):
+        conversation.to(State.IDLE, step_id=None)
         
-        if update_step_content(step_id, text):
-            context.user_data.pop('editing_step_text', None)
-            context.user_data.pop('editing_step_id', None)
+        await update.message.reply_text(
+            "✅ **Texto da Etapa Atualizado!**\n\nO conteúdo foi modificado com sucesso.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
+            ]])
+        )
+    else:
+        await update.message.reply_text(
+            "❌ Erro ao atualizar texto da etapa.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
+            ]])
+        )
+
+async def handle_edit_step_media_url_input(update: Update, context: ContextTypes.DEFAULT_TYPE, conversation):
+    """Nova URL de mídia para uma etapa existente"""
+    text = update.message.text
+    step_id = conversation.step_id
+    
+    # Validar URL
+    if text.startswith(('http://', 'https://')):
+        if await run_db(update_step_media_url, step_id, text):
+            conversation.to(State.IDLE, step_id=None)
             
             await update.message.reply_text(
-                "✅ **Texto da Etapa Atualizado!**\n\nO conteúdo foi modificado com sucesso.",
+                "✅ **Mídia da Etapa Atualizada!**\n\nA URL da mídia foi modificada com sucesso.",
                 reply_markup=InlineKeyboardMarkup([[
                     InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
                 ]])
             )
         else:
             await update.message.reply_text(
-                "❌ Erro ao atualizar texto da etapa.",
+                "❌ Erro ao atualizar mídia da etapa.",
                 reply_markup=InlineKeyboardMarkup([[
                     InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
                 ]])
             )
-        return
+    else:
+        await update.message.reply_text(
+            "❌ **URL Inválida!**\n\nA URL deve começar com http:// ou https://\n\nTente novamente:",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Cancelar", callback_data=f"edit_step_{step_id}")
+            ]])
+        )
+
+async def handle_flow_name_input(update: Update, context: ContextTypes.DEFAULT_TYPE, conversation):
+    """Nome do novo fluxo"""
+    text = update.message.text
     
-    # Verificar se está editando mídia de etapa
-    elif 'editing_step_media' in context.user_data and context.user_data['editing_step_media']:
-        step_id = context.user_data['editing_step_id']
+    flow_id = await AsyncFlowManager().create_flow(text)
+    if flow_id:
+        conversation.to(State.IDLE, flow_id=flow_id, step_number=1)
         
-        # Validar URL
-        if text.startswith(('http://', 'https://')):
-            if update_step_media_url(step_id, text):
-                context.user_data.pop('editing_step_media', None)
-                context.user_data.pop('editing_step_id', None)
-                
-                await update.message.reply_text(
-                    "✅ **Mídia da Etapa Atualizada!**\n\nA URL da mídia foi modificada com sucesso.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
-                    ]])
-                )
-            else:
-                await update.message.reply_text(
-                    "❌ Erro ao atualizar mídia da etapa.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
-                    ]])
-                )
-        else:
-            await update.message.reply_text(
-                "❌ **URL Inválida!**\n\nA URL deve começar com http:// ou https://\n\nTente novamente:",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Cancelar", callback_data=f"edit_step_{step_id}")
-                ]])
-            )
-        return
-    
-    # Verificar se está configurando texto de imagem/vídeo (PRIORIDADE ALTA)
-    print(f"DEBUG: VERIFICANDO SEÇÃO waiting_for_image_text - Condição: {'waiting_for_image_text' in context.user_data} AND {context.user_data.get('waiting_for_image_text', False)}")
-    if 'waiting_for_image_text' in context.user_data and context.user_data['waiting_for_image_text']:
-        print(f"DEBUG: ENTRANDO NA SEÇÃO waiting_for_image_text - Processando texto da imagem: {text}")
-        context.user_data['current_step_data']['content'] = text
-        context.user_data.pop('waiting_for_image_text', None)
-        
-        # Verificar se precisa adicionar botão
-        if 'waiting_for_button' in context.user_data and context.user_data['waiting_for_button']:
-            print("DEBUG: Precisa adicionar botão, solicitando texto do botão")
-            print("DEBUG: ENVIANDO MENSAGEM: 🔘 **Digite o texto do botão:**")
-            await update.message.reply_text(
-                "🔘 **Digite o texto do botão:**",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
-                ]])
-            )
-            context.user_data['waiting_for_button_text'] = True
-            print("DEBUG: waiting_for_button_text definido como True (linha 522)")
-            return
-        else:
-            print("DEBUG: NÃO precisa adicionar botão, salvando etapa diretamente")
-            print(f"DEBUG: waiting_for_button existe: {'waiting_for_button' in context.user_data}")
-            print(f"DEBUG: waiting_for_button valor: {context.user_data.get('waiting_for_button', 'NÃO EXISTE')}")
-        
-        print("DEBUG: Não precisa botão, salvando etapa")
-        # Salvar etapa automaticamente
-        await save_current_step_and_continue(update, context, flow_manager)
-        return
-    else:
-        print(f"DEBUG: NÃO ENTROU NA SEÇÃO waiting_for_image_text. waiting_for_image_text existe: {'waiting_for_image_text' in context.user_data}, valor: {context.user_data.get('waiting_for_image_text', 'NÃO EXISTE')}")
-        print(f"DEBUG: Condição completa: {'waiting_for_image_text' in context.user_data} AND {context.user_data.get('waiting_for_image_text', False)}")
-    
-    # Verificar se está configurando texto do botão (PRIORIDADE ALTA)
-    print(f"DEBUG: VERIFICANDO SEÇÃO waiting_for_button_text - Condição: {'waiting_for_button_text' in context.user_data} AND {context.user_data.get('waiting_for_button_text', False)}")
-    if 'waiting_for_button_text' in context.user_data and context.user_data['waiting_for_button_text']:
-        print(f"DEBUG: ENTRANDO NA SEÇÃO CORRETA - Processando texto do botão: {text}")
-        
-        # Se ainda não tem o texto do botão, salvar o texto e pedir o link
-        if 'button_text' not in context.user_data:
-            context.user_data['button_text'] = text
-            print("DEBUG: Texto do botão salvo, pedindo link")
-            await update.message.reply_text(
-                "🔗 **Digite o link/URL do botão:**\n\nExemplo: https://exemplo.com",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
-                ]])
-            )
-            context.user_data['waiting_for_button_url'] = True
-            return
-        else:
-            # Se já tem o texto, agora é o link
-            button_url = text
-            
-            # Adicionar botão à etapa
-            if 'buttons' not in context.user_data['current_step_data']:
-                context.user_data['current_step_data']['buttons'] = []
-            
-            button_data = {
-                'text': context.user_data['button_text'],
-                'type': 'url',
-                'data': button_url
-            }
-            context.user_data['current_step_data']['buttons'].append(button_data)
-            
-            print(f"DEBUG: Botão adicionado. Total de botões: {len(context.user_data['current_step_data']['buttons'])}")
-            print(f"DEBUG: Botão criado - Texto: {context.user_data['button_text']}, URL: {button_url}")
-            
-            # Limpar todos os estados de espera
-            context.user_data.pop('waiting_for_button_text', None)
-            context.user_data.pop('waiting_for_button', None)
-            context.user_data.pop('waiting_for_image_text', None)
-            context.user_data.pop('waiting_for_video_text', None)
-            context.user_data.pop('button_text', None)
-            context.user_data.pop('waiting_for_button_url', None)
-            
-            print("DEBUG: Estados limpos, salvando etapa...")
-            
-            # Salvar etapa automaticamente
-            await save_current_step_and_continue(update, context, flow_manager)
-            return
+        await update.message.reply_text(
+            f"✅ **Fluxo '{text}' criado!**\n\n📋 **Mensagem 1**\n\nEscolha o tipo de mensagem:",
+            reply_markup=create_message_step_keyboard(1)
+        )
     else:
-        print(f"DEBUG: NÃO ENTROU NA SEÇÃO waiting_for_button_text. waiting_for_button_text existe: {'waiting_for_button_text' in context.user_data}, valor: {context.user_data.get('waiting_for_button_text', 'NÃO EXISTE')}")
-        print(f"DEBUG: Condição completa: {'waiting_for_button_text' in context.user_data} AND {context.user_data.get('waiting_for_button_text', False)}")
+        await update.message.reply_text(
+            "❌ Erro ao criar fluxo. Tente novamente.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+            ]])
+        )
+
+async def handle_step_content_input(update: Update, context: ContextTypes.DEFAULT_TYPE, conversation):
+    """Conteúdo da etapa escolhida: texto da mensagem ou URL da mídia"""
+    text = update.message.text
+    step_type = conversation.step_type
     
-    # Verificar se está configurando URL do botão
-    if 'waiting_for_button_url' in context.user_data and context.user_data['waiting_for_button_url']:
-        print(f"DEBUG: ENTRANDO NA SEÇÃO waiting_for_button_url - Processando URL do botão: {text}")
-        
-        # Se já tem o texto, agora é o link
-        button_url = text
-        
-        # Adicionar botão à etapa
-        if 'buttons' not in context.user_data['current_step_data']:
-            context.user_data['current_step_data']['buttons'] = []
-        
-        button_data = {
-            'text': context.user_data['button_text'],
-            'type': 'url',
-            'data': button_url
-        }
-        context.user_data['current_step_data']['buttons'].append(button_data)
-        
-        print(f"DEBUG: Botão adicionado. Total de botões: {len(context.user_data['current_step_data']['buttons'])}")
-        print(f"DEBUG: Botão criado - Texto: {context.user_data['button_text']}, URL: {button_url}")
-        
-        # Limpar todos os estados de espera
-        context.user_data.pop('waiting_for_button_text', None)
-        context.user_data.pop('waiting_for_button', None)
-        context.user_data.pop('waiting_for_image_text', None)
-        context.user_data.pop('waiting_for_video_text', None)
-        context.user_data.pop('button_text', None)
-        context.user_data.pop('waiting_for_button_url', None)
-        
-        print("DEBUG: Estados limpos, salvando etapa...")
+    if step_type == 'message_text':
+        # Configurar mensagem de texto simples
+        conversation.step['content'] = text
+        conversation.step['type'] = 'text'
         
         # Salvar etapa automaticamente
-        await save_current_step_and_continue(update, context, flow_manager)
-        return
+        await save_current_step_and_continue(update, context, AsyncFlowManager())
     
-    # Verificar se está configurando texto de vídeo
-    if 'waiting_for_video_text' in context.user_data and context.user_data['waiting_for_video_text']:
-        context.user_data['current_step_data']['content'] = text
-        context.user_data.pop('waiting_for_video_text', None)
+    elif step_type == 'message_text_button':
+        # Para texto + botão, o texto é o conteúdo da mensagem
+        conversation.step['content'] = text
+        conversation.step['type'] = 'text'
         
-        # Salvar etapa automaticamente
-        await save_current_step_and_continue(update, context, flow_manager)
-        return
+        await update.message.reply_text(
+            "🔘 **Digite o texto do botão:**",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+            ]])
+        )
+        conversation.to(State.BUTTON_TEXT)
     
-    # Verificar se está configurando texto de vídeo redondo
-    if 'waiting_for_video_note_text' in context.user_data and context.user_data['waiting_for_video_note_text']:
-        context.user_data['current_step_data']['content'] = text
-        context.user_data.pop('waiting_for_video_note_text', None)
+    elif step_type in STEP_MEDIA_PROMPTS:
+        media_type, article, media_name = STEP_MEDIA_PROMPTS[step_type]
         
-        # Salvar etapa automaticamente
-        await save_current_step_and_continue(update, context, flow_manager)
-        return
-    
-    # Verificar se está criando um fluxo
-    print(f"DEBUG: Verificando se está criando fluxo - creating_flow: {context.user_data.get('creating_flow', False)}")
-    if 'creating_flow' in context.user_data and context.user_data['creating_flow']:
-        print("DEBUG: ENTRANDO NA SEÇÃO creating_flow")
-        # Criar novo fluxo
-        flow_id = flow_manager.create_flow(text)
-        if flow_id:
-            context.user_data['current_flow_id'] = flow_id
-            context.user_data['creating_flow'] = False
-            context.user_data['flow_data']['name'] = text
+        # Verificar se é uma URL válida
+        if text.startswith(('http://', 'https://')):
+            conversation.step['media_url'] = text
+            conversation.step['type'] = media_type
             
             await update.message.reply_text(
-                f"✅ **Fluxo '{text}' criado!**\n\n📋 **Mensagem 1**\n\nEscolha o tipo de mensagem:",
-                reply_markup=create_message_step_keyboard(1)
-            )
-        else:
-            await update.message.reply_text(
-                "❌ Erro ao criar fluxo. Tente novamente.",
+                f"📝 **Digite o texto d{article} {media_name}:**",
                 reply_markup=InlineKeyboardMarkup([[
                     InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
                 ]])
             )
-        return
-    
-    # Verificar se está configurando etapa
-    print(f"DEBUG: Verificando se está configurando etapa - current_step_type: {context.user_data.get('current_step_type', 'NÃO EXISTE')}")
-    if 'current_step_type' in context.user_data:
-        print("DEBUG: ENTRANDO NA SEÇÃO current_step_type")
-        step_type = context.user_data['current_step_type']
-        
-        if 'current_step_data' not in context.user_data:
-            context.user_data['current_step_data'] = {}
-        
-        if step_type == 'message_text':
-            # Configurar mensagem de texto simples
-            context.user_data['current_step_data']['content'] = text
-            context.user_data['current_step_data']['type'] = 'text'
-            
-            # Salvar etapa automaticamente
-            await save_current_step_and_continue(update, context, flow_manager)
-            
-        elif step_type == 'message_image':
-            # Verificar se é uma URL válida
-            if text.startswith(('http://', 'https://')):
-                context.user_data['current_step_data']['media_url'] = text
-                context.user_data['current_step_data']['type'] = 'image'
-                
-                await update.message.reply_text(
-                    "📝 **Digite o texto da imagem:**",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
-                    ]])
-                )
-                context.user_data['waiting_for_image_text'] = True
-                return
-            else:
-                # Se não é URL, não processar aqui - deixar para a seção waiting_for_image_text
-                await update.message.reply_text(
-                    "❌ **URL inválida!**\n\nDigite uma URL válida (começando com http:// ou https://) ou envie a imagem diretamente.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
-                    ]])
-                )
-                return
-            
-        elif step_type == 'message_video':
-            # Verificar se é uma URL válida
-            if text.startswith(('http://', 'https://')):
-                context.user_data['current_step_data']['media_url'] = text
-                context.user_data['current_step_data']['type'] = 'video'
-                
-                await update.message.reply_text(
-                    "📝 **Digite o texto do vídeo:**",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
-                    ]])
-                )
-                context.user_data['waiting_for_video_text'] = True
-                return
-            else:
-                # Se não é URL, tratar como texto do vídeo (quando já tem media_url)
-                if 'current_step_data' in context.user_data and 'media_url' in context.user_data['current_step_data']:
-                    context.user_data['current_step_data']['content'] = text
-                    context.user_data.pop('waiting_for_video_text', None)
-                    
-                    # Salvar etapa automaticamente
-                    await save_current_step_and_continue(update, context, flow_manager)
-                    return
-                else:
-                    await update.message.reply_text(
-                        "❌ **URL inválida!**\n\nDigite uma URL válida (começando com http:// ou https://) ou envie o vídeo diretamente.",
-                        reply_markup=InlineKeyboardMarkup([[
-                            InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
-                        ]])
-                    )
-                    return
-        
-        elif step_type == 'message_video_note':
-            # Verificar se é uma URL válida
-            if text.startswith(('http://', 'https://')):
-                context.user_data['current_step_data']['media_url'] = text
-                context.user_data['current_step_data']['type'] = 'video_note'
-                
-                await update.message.reply_text(
-                    "📝 **Digite o texto do vídeo redondo:**",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
-                    ]])
-                )
-                context.user_data['waiting_for_video_note_text'] = True
-                return
-            else:
-                # Se não é URL, tratar como texto do vídeo redondo (quando já tem media_url)
-                if 'current_step_data' in context.user_data and 'media_url' in context.user_data['current_step_data']:
-                    context.user_data['current_step_data']['content'] = text
-                    context.user_data.pop('waiting_for_video_note_text', None)
-                    
-                    # Salvar etapa automaticamente
-                    await save_current_step_and_continue(update, context, flow_manager)
-                    return
-                else:
-                    await update.message.reply_text(
-                        "❌ **URL inválida!**\n\nDigite uma URL válida (começando com http:// ou https://) ou envie o vídeo redondo diretamente.",
-                        reply_markup=InlineKeyboardMarkup([[
-                            InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
-                        ]])
-                    )
-                    return
-            
-        elif step_type == 'message_image_button':
-            # Verificar se é uma URL válida
-            if text.startswith(('http://', 'https://')):
-                context.user_data['current_step_data']['media_url'] = text
-                context.user_data['current_step_data']['type'] = 'image'
-                
-                await update.message.reply_text(
-                    "📝 **Digite o texto da imagem:**",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
-                    ]])
-                )
-                context.user_data['waiting_for_image_text'] = True
-                context.user_data['waiting_for_button'] = True
-                return
-            else:
-                # Se não é URL, não processar aqui - deixar para a seção waiting_for_image_text
-                await update.message.reply_text(
-                    "❌ **URL inválida!**\n\nDigite uma URL válida (começando com http:// ou https://) ou envie a imagem diretamente.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
-                    ]])
-                )
-                return
-        
-        elif step_type == 'message_video_button':
-            # Verificar se é uma URL válida
-            if text.startswith(('http://', 'https://')):
-                context.user_data['current_step_data']['media_url'] = text
-                context.user_data['current_step_data']['type'] = 'video'
-                
-                await update.message.reply_text(
-                    "📝 **Digite o texto do vídeo:**",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
-                    ]])
-                )
-                context.user_data['waiting_for_video_text'] = True
-                context.user_data['waiting_for_button'] = True
-                return
-            else:
-                # Se não é URL, não processar aqui - deixar para a seção waiting_for_video_text
-                await update.message.reply_text(
-                    "❌ **URL inválida!**\n\nDigite uma URL válida (começando com http:// ou https://) ou envie o vídeo diretamente.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
-                    ]])
-                )
-                return
-        
-        elif step_type == 'message_video_note_button':
-            # Verificar se é uma URL válida
-            if text.startswith(('http://', 'https://')):
-                context.user_data['current_step_data']['media_url'] = text
-                context.user_data['current_step_data']['type'] = 'video_note'
-                
-                await update.message.reply_text(
-                    "📝 **Digite o texto do vídeo redondo:**",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
-                    ]])
-                )
-                context.user_data['waiting_for_video_note_text'] = True
-                context.user_data['waiting_for_button'] = True
-                return
-            else:
-                # Se não é URL, não processar aqui - deixar para a seção waiting_for_video_note_text
-                await update.message.reply_text(
-                    "❌ **URL inválida!**\n\nDigite uma URL válida (começando com http:// ou https://) ou envie o vídeo redondo diretamente.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
-                    ]])
-                )
-                return
-        
-        elif step_type == 'message_text_button':
-            # Para texto + botão, o texto é o conteúdo da mensagem
-            context.user_data['current_step_data']['content'] = text
-            context.user_data['current_step_data']['type'] = 'text'
-            
+            conversation.await_caption()
+        else:
             await update.message.reply_text(
-                "🔘 **Digite o texto do botão:**",
+                f"❌ **URL inválida!**\n\nDigite uma URL válida (começando com http:// ou https://) ou envie {article} {media_name} diretamente.",
                 reply_markup=InlineKeyboardMarkup([[
                     InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
                 ]])
             )
-            context.user_data['waiting_for_button_text'] = True
-            return
-        
-        # Salvar etapa automaticamente
-        if 'current_flow_id' in context.user_data:
-            flow_id = context.user_data['current_flow_id']
-            step_id = flow_manager.save_flow_step(flow_id, context.user_data['current_step_data'])
-            
-            if step_id:
-                # Limpar dados da etapa
-                context.user_data.pop('current_step_data', None)
-                context.user_data.pop('current_step_type', None)
-                context.user_data.pop('waiting_for_image_text', None)
-                context.user_data.pop('waiting_for_video_text', None)
-                
-                await update.message.reply_text(
-                    "✅ **Etapa salva automaticamente!**\n\nEscolha uma opção:",
-                    reply_markup=create_simple_flow_control_keyboard()
-                )
-            else:
-                await update.message.reply_text(
-                    "❌ Erro ao salvar etapa.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
-                    ]])
-                )
+
+async def handle_step_caption_input(update: Update, context: ContextTypes.DEFAULT_TYPE, conversation):
+    """Texto da imagem/vídeo já recebido"""
+    conversation.step['content'] = update.message.text
+    
+    # Verificar se precisa adicionar botão
+    if conversation.with_button:
+        await update.message.reply_text(
+            "🔘 **Digite o texto do botão:**",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+            ]])
+        )
+        conversation.to(State.BUTTON_TEXT)
         return
     
-    # Se não estiver em nenhum modo de criação, usar echo normal
-    print("DEBUG: NÃO ENTROU EM NENHUMA SEÇÃO ESPECÍFICA, USANDO ECHO")
-    await echo(update, context)
+    # Salvar etapa automaticamente
+    await save_current_step_and_continue(update, context, AsyncFlowManager())
+
+async def handle_button_text_input(update: Update, context: ContextTypes.DEFAULT_TYPE, conversation):
+    """Texto do botão da etapa"""
+    await update.message.reply_text(
+        "🔗 **Digite o link/URL do botão:**\n\nExemplo: https://exemplo.com",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+        ]])
+    )
+    conversation.to(State.BUTTON_URL, button_text=update.message.text)
+
+async def handle_button_url_input(update: Update, context: ContextTypes.DEFAULT_TYPE, conversation):
+    """Link do botão: completa a etapa e salva"""
+    button_url = update.message.text
+    
+    # Adicionar botão à etapa
+    conversation.step.setdefault('buttons', []).append({
+        'text': conversation.button_text,
+        'type': 'url',
+        'data': button_url
+    })
+    
+    print(f"DEBUG: Botão criado - Texto: {conversation.button_text}, URL: {button_url}")
+    
+    # Salvar etapa automaticamente
+    await save_current_step_and_continue(update, context, AsyncFlowManager())
 
 async def save_current_step_and_continue(update, context, flow_manager):
     """Salva a etapa atual e mostra opções para continuar"""
-    print(f"🔍 DEBUG: save_current_step_and_continue - current_flow_id existe: {'current_flow_id' in context.user_data}")
-    print(f"🔍 DEBUG: save_current_step_and_continue - current_step_data existe: {'current_step_data' in context.user_data}")
-    print(f"🔍 DEBUG: save_current_step_and_continue - current_flow_id: {context.user_data.get('current_flow_id', 'NÃO EXISTE')}")
-    print(f"🔍 DEBUG: save_current_step_and_continue - current_step_data: {context.user_data.get('current_step_data', 'NÃO EXISTE')}")
-    print(f"🔍 DEBUG: save_current_step_and_continue - editing_flow_id: {context.user_data.get('editing_flow_id', 'NÃO EXISTE')}")
-    
-    # Verificar se temos current_flow_id ou editing_flow_id
-    flow_id = context.user_data.get('current_flow_id') or context.user_data.get('editing_flow_id')
+    conversation = get_conversation(context)
+    flow_id = conversation.flow_id
     
-    if flow_id and 'current_step_data' in context.user_data:
-        step_data = context.user_data['current_step_data']
+    if flow_id and conversation.step is not None:
+        step_data = conversation.step
         
         print(f"🔍 DEBUG: Salvando etapa - flow_id: {flow_id}, step_data: {step_data}")
         
         # Salvar etapa
-        step_id = flow_manager.save_flow_step(flow_id, step_data)
+        step_id = await flow_manager.save_flow_step(flow_id, step_data)
         
         if step_id:
-            # Limpar dados da etapa atual
-            context.user_data.pop('current_step_data', None)
-            context.user_data.pop('current_step_type', None)
-            context.user_data.pop('waiting_for_image_text', None)
-            context.user_data.pop('waiting_for_video_text', None)
-            context.user_data.pop('waiting_for_video_note_text', None)
-            context.user_data.pop('waiting_for_button', None)
-            context.user_data.pop('waiting_for_button_text', None)
-            
-            # Incrementar número da etapa
-            current_step = context.user_data.get('current_step_number', 1)
-            next_step = current_step + 1
-            context.user_data['current_step_number'] = next_step
+            # Limpar dados da etapa atual e incrementar número da etapa
+            current_step = conversation.step_number
+            conversation.clear_step()
+            conversation.to(State.IDLE, step_number=current_step + 1)
             
             await update.message.reply_text(
                 f"✅ **Mensagem {current_step} salva!**\n\nEscolha uma opção:",
@@ -2188,13 +1576,61 @@ async def save_current_step_and_continue(update, context, flow_manager):
             ]])
         )
 
+# Botões do teclado de cadastro, válidos mesmo fora de um estado de cadastro
+SIGNUP_MENU_BUTTONS = ("📧 Enviar Email", "❌ Cancelar", "🔙 Voltar")
+
+# Campo da conversa e rótulo de confirmação de cada estado de cadastro
+SIGNUP_FIELDS = {
+    State.SIGNUP_NAME: ('name', 'Nome'),
+    State.SIGNUP_PHONE: ('phone', 'Telefone'),
+    State.SIGNUP_EMAIL: ('email', 'Email')
+}
+
+# Tipo de mídia, artigo e nome usados nas mensagens para cada etapa com mídia
+STEP_MEDIA_PROMPTS = {
+    'message_image': ('image', 'a', 'imagem'),
+    'message_image_button': ('image', 'a', 'imagem'),
+    'message_video': ('video', 'o', 'vídeo'),
+    'message_video_button': ('video', 'o', 'vídeo'),
+    'message_video_note': ('video_note', 'o', 'vídeo redondo'),
+    'message_video_note_button': ('video_note', 'o', 'vídeo redondo')
+}
+
+# Handler de texto para cada estado da conversa
+TEXT_HANDLERS = {
+    State.IDLE: handle_idle_text,
+    State.SIGNUP_MENU: handle_signup_menu_text,
+    State.SIGNUP_NAME: handle_signup_field_text,
+    State.SIGNUP_PHONE: handle_signup_field_text,
+    State.SIGNUP_EMAIL: handle_signup_field_text,
+    State.SIGNUP_EMAIL_OR_CONTACT: handle_email_or_contact_text,
+    State.WELCOME_TEXT: handle_welcome_text_input,
+    State.WEBHOOK_URL: handle_webhook_url_input,
+    State.WEBHOOK_URL_CHANGE: handle_webhook_url_input,
+    State.EDIT_STEP_TEXT: handle_edit_step_text_input,
+    State.EDIT_STEP_MEDIA: handle_edit_step_media_url_input,
+    State.FLOW_NAME: handle_flow_name_input,
+    State.STEP_CONTENT: handle_step_content_input,
+    State.STEP_CAPTION: handle_step_caption_input,
+    State.BUTTON_TEXT: handle_button_text_input,
+    State.BUTTON_URL: handle_button_url_input
+}
+
+# Handler de mídia para cada estado da conversa (demais estados ignoram mídias)
+MEDIA_HANDLERS = {
+    State.WELCOME_MEDIA: handle_welcome_media_input,
+    State.EDIT_STEP_MEDIA: handle_edit_step_media_input,
+    State.STEP_CONTENT: handle_step_media_input,
+    State.STEP_CAPTION: handle_step_media_input
+}
+
 # Handlers para sistema de fluxo e admin
 async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Comando /admin - Menu de administração"""
     user = update.effective_user
-    flow_manager = FlowManager()
+    flow_manager = AsyncFlowManager()
     
-    if not flow_manager.is_admin(user.id):
+    if not await flow_manager.is_admin(user.id):
         await update.message.reply_text("❌ Você não tem permissão de administrador.")
         return
     
@@ -2213,1557 +1649,1862 @@ async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TY
     print(f"🔍 DEBUG: Message ID: {query.message.message_id if query.message else 'N/A'}")
     
     await query.answer()
+    await callback_router.dispatch(update, context)
+
+@callback_router.route("admin_menu", admin=True)
+async def handle_admin_menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Painel de administração"""
+    query = update.callback_query
     
-    # DEBUG: Verificar se o callback começa com edit_step_text_
-    if query.data.startswith("edit_step_text_"):
-        print(f"🔍 DEBUG: Callback edit_step_text_ detectado: {query.data}")
-    elif query.data.startswith("edit_step_media_"):
-        print(f"🔍 DEBUG: Callback edit_step_media_ detectado: {query.data}")
-    else:
-        print(f"🔍 DEBUG: Callback não é de edição: {query.data}")
-    
-    # Função auxiliar para editar mensagem com tratamento de erro
-    async def safe_edit_message(text, reply_markup=None):
-        print(f"🔍 DEBUG: safe_edit_message chamada - Texto: {text[:50]}...")
-        print(f"🔍 DEBUG: Reply markup: {reply_markup}")
-        try:
-            await query.edit_message_text(text, reply_markup=reply_markup)
-            print("🔍 DEBUG: Mensagem editada com sucesso")
-        except Exception as e:
-            print(f"🔍 DEBUG: Erro ao editar mensagem: {e}")
-            if "Message is not modified" in str(e):
-                # Ignorar erro de mensagem não modificada
-                print("🔍 DEBUG: Ignorando erro 'Message is not modified'")
-                pass
-            else:
-                # Re-raise outros erros
-                print(f"🔍 DEBUG: Re-raise do erro: {e}")
-                raise e
-    
-    user = update.effective_user
-    flow_manager = FlowManager()
+    await safe_edit_message(
+        query,
+        "🔧 **Painel de Administração**\n\nEscolha uma opção:",
+        reply_markup=create_admin_keyboard()
+    )
+
+@callback_router.route("admin_flows", admin=True)
+async def handle_admin_flows_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Menu de gerenciamento de fluxos"""
+    query = update.callback_query
     
-    if query.data == "admin_menu":
-        if flow_manager.is_admin(user.id):
+    await safe_edit_message(
+        query,
+        "📝 **Gerenciamento de Fluxos**\n\nEscolha uma opção:",
+        reply_markup=create_flow_management_keyboard()
+    )
+
+@callback_router.route("create_flow", admin=True)
+async def handle_create_flow_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Inicia a criação de um fluxo"""
+    query = update.callback_query
+    conversation = get_conversation(context)
+    
+    conversation.clear_step()
+    conversation.to(State.FLOW_NAME, flow_id=None, step_number=1)
+    await safe_edit_message(
+        query,
+        "📝 **Criar Novo Fluxo**\n\nDigite o nome do fluxo:",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+        ]])
+    )
+
+@callback_router.route("add_message_text", admin=True)
+async def handle_add_message_text_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Nova etapa: mensagem de texto"""
+    query = update.callback_query
+    conversation = get_conversation(context)
+    
+    conversation.start_step('message_text')
+    await safe_edit_message(
+        query,
+        "📝 **Mensagem + Texto**\n\nDigite o texto da mensagem:",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+        ]])
+    )
+
+@callback_router.route("add_message_image", admin=True)
+async def handle_add_message_image_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Nova etapa: mensagem com imagem"""
+    query = update.callback_query
+    conversation = get_conversation(context)
+    
+    conversation.start_step('message_image')
+    await safe_edit_message(
+        query,
+        "🖼️ **Mensagem + Imagem**\n\n📤 **Envie a imagem diretamente** ou digite a URL:",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+        ]])
+    )
+
+@callback_router.route("add_message_video", admin=True)
+async def handle_add_message_video_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Nova etapa: mensagem com vídeo"""
+    query = update.callback_query
+    conversation = get_conversation(context)
+    
+    conversation.start_step('message_video')
+    await safe_edit_message(
+        query,
+        "🎥 **Mensagem + Vídeo**\n\n📤 **Envie o vídeo diretamente** ou digite a URL:",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+        ]])
+    )
+
+@callback_router.route("add_message_image_button", admin=True)
+async def handle_add_message_image_button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Nova etapa: imagem com botão"""
+    query = update.callback_query
+    conversation = get_conversation(context)
+    
+    conversation.start_step('message_image_button')
+    await safe_edit_message(
+        query,
+        "🖼️ **Mensagem + Imagem + Botão**\n\n📤 **Envie a imagem diretamente** ou digite a URL:",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+        ]])
+    )
+
+@callback_router.route("add_message_text_button", admin=True)
+async def handle_add_message_text_button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Nova etapa: texto com botão"""
+    query = update.callback_query
+    conversation = get_conversation(context)
+    
+    conversation.start_step('message_text_button')
+    await safe_edit_message(
+        query,
+        "🔘 **Mensagem + Texto + Botão**\n\n📝 **Digite o texto da mensagem:**",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+        ]])
+    )
+
+@callback_router.route("add_message_video_button", admin=True)
+async def handle_add_message_video_button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Nova etapa: vídeo com botão"""
+    query = update.callback_query
+    conversation = get_conversation(context)
+    
+    conversation.start_step('message_video_button')
+    await safe_edit_message(
+        query,
+        "🎥 **Mensagem + Vídeo + Botão**\n\n📤 **Envie o vídeo diretamente** ou digite a URL:",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+        ]])
+    )
+
+@callback_router.route("add_message_video_note", admin=True)
+async def handle_add_message_video_note_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Nova etapa: vídeo redondo"""
+    query = update.callback_query
+    conversation = get_conversation(context)
+    
+    conversation.start_step('message_video_note')
+    await safe_edit_message(
+        query,
+        "🎬 **Mensagem + Vídeo Redondo**\n\n📤 **Envie o vídeo redondo diretamente** ou digite a URL:",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+        ]])
+    )
+
+@callback_router.route("add_message_video_note_button", admin=True)
+async def handle_add_message_video_note_button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Nova etapa: vídeo redondo com texto"""
+    query = update.callback_query
+    conversation = get_conversation(context)
+    
+    conversation.start_step('message_video_note_button')
+    await safe_edit_message(
+        query,
+        "🎬 **Mensagem + Vídeo Redondo + Texto**\n\n📤 **Envie o vídeo redondo diretamente** ou digite a URL:",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+        ]])
+    )
+
+@callback_router.route("convert_video_note", admin=True)
+async def handle_convert_video_note_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Converte o vídeo enviado para vídeo redondo da etapa"""
+    query = update.callback_query
+    conversation = get_conversation(context)
+    
+    if conversation.pending_video is not None and conversation.step is not None:
+        video_to_convert = conversation.pending_video
+        
+        # Converter vídeo pela fila (uma única vez, já com os metadados registrados)
+        result = await convert_video_note_in_queue(
+            query,
+            video_to_convert['local_path'], f"{video_to_convert['file_id']}_video_note.mp4",
+            "🔄 **Convertendo vídeo...**\n\n"
+            "Aguarde enquanto convertemos o vídeo para o formato correto.",
+            retry_callback="convert_video_note", cancel_callback="admin_flows"
+        )
+        if result is None:
+            return
+        success, converted_path, message = result
+        
+        if success:
+            conversation.step['media_url'] = converted_path
+            conversation.step['type'] = 'video_note'
+            conversation.step['converted'] = True
+            
+            # Limpar dados de conversão
+            conversation.pending_video = None
+            
             await safe_edit_message(
-                "🔧 **Painel de Administração**\n\nEscolha uma opção:",
-                reply_markup=create_admin_keyboard()
+                query,
+                f"✅ **Conversão Concluída!**\n\n{message}\n\n"
+                "📝 **Digite o texto do vídeo redondo:**",
+                reply_markup=InlineKeyboardMarkup([[
+                    InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+                ]])
             )
+            conversation.await_caption()
         else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
-    
-    elif query.data == "admin_flows":
-        if flow_manager.is_admin(user.id):
             await safe_edit_message(
-                "📝 **Gerenciamento de Fluxos**\n\nEscolha uma opção:",
-                reply_markup=create_flow_management_keyboard()
-            )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
-    
-    elif query.data == "create_flow":
-        if flow_manager.is_admin(user.id):
-            context.user_data['creating_flow'] = True
-            context.user_data['flow_data'] = {}
-            context.user_data['current_step_number'] = 1
-            await safe_edit_message(
-                "📝 **Criar Novo Fluxo**\n\nDigite o nome do fluxo:",
+                query,
+                f"❌ **Erro na Conversão**\n\n{message}\n\n"
+                "Tente enviar um vídeo diferente ou verifique os requisitos.",
                 reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+                    InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
                 ]])
             )
+    else:
+        await safe_edit_message(
+            query,
+            "❌ **Erro**\n\nDados do vídeo não encontrados. Tente novamente.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
+            ]])
+        )
+
+@callback_router.route("convert_welcome_video_note", admin=True)
+async def handle_convert_welcome_video_note_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Converte o vídeo enviado para vídeo redondo de boas-vindas"""
+    query = update.callback_query
+    conversation = get_conversation(context)
+    
+    if conversation.pending_video is not None:
+        video_data = conversation.pending_video
+        
+        # Converter vídeo pela fila (uma única vez, já com os metadados registrados)
+        result = await convert_video_note_in_queue(
+            query,
+            video_data['local_path'], f"welcome_video_note_{video_data['file_id']}.mp4",
+            "🔄 **Convertendo vídeo para boas-vindas...**\n\n"
+            "Aguarde enquanto convertemos o vídeo para o formato redondo.",
+            retry_callback="convert_welcome_video_note", cancel_callback="config_welcome"
+        )
+        if result is None:
+            return
+        success, temp_path, message = result
+        
+        if success:
+            # Salvar configurações
+            if await run_db(set_welcome_media, temp_path, 'video_note'):
+                conversation.to(State.IDLE, media_type=None, pending_video=None)
+                
+                await safe_edit_message(
+                    query,
+                    f"✅ **Vídeo Redondo da Mensagem de Boas-vindas Configurado!**\n\n"
+                    f"O vídeo foi convertido com sucesso para formato redondo.\n"
+                    f"Arquivo: {temp_path}",
+                    reply_markup=await run_db(create_config_welcome_keyboard)
+                )
+            else:
+                await safe_edit_message(
+                    query,
+                    "❌ **Erro ao salvar vídeo redondo.**\n\nTente novamente.",
+                    reply_markup=await run_db(create_config_welcome_keyboard)
+                )
         else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
-    
-    elif query.data == "add_message_text":
-        if flow_manager.is_admin(user.id):
-            context.user_data['current_step_type'] = 'message_text'
             await safe_edit_message(
-                "📝 **Mensagem + Texto**\n\nDigite o texto da mensagem:",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
-                ]])
+                query,
+                f"❌ **Erro na Conversão**\n\n{message}\n\n"
+                "Tente enviar um vídeo diferente ou verifique os requisitos.",
+                reply_markup=await run_db(create_config_welcome_keyboard)
             )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    else:
+        await safe_edit_message(
+            query,
+            "❌ **Erro**\n\nDados do vídeo não encontrados. Tente novamente.",
+            reply_markup=await run_db(create_config_welcome_keyboard)
+        )
+
+@callback_router.route("finish_step", admin=True)
+async def handle_finish_step_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Salva a etapa em criação"""
+    query = update.callback_query
+    flow_manager = AsyncFlowManager()
+    conversation = get_conversation(context)
     
-    elif query.data == "add_message_image":
-        if flow_manager.is_admin(user.id):
-            context.user_data['current_step_type'] = 'message_image'
+    # Salvar etapa atual no banco de dados
+    if conversation.flow_id is not None and conversation.step is not None:
+        flow_id = conversation.flow_id
+        step_data = conversation.step
+        
+        # Salvar etapa usando a nova função
+        step_id = await flow_manager.save_flow_step(flow_id, step_data)
+        
+        if step_id:
+            # Limpar dados da etapa atual
+            conversation.clear_step()
+            conversation.to(State.IDLE)
+            
             await safe_edit_message(
-                "🖼️ **Mensagem + Imagem**\n\n📤 **Envie a imagem diretamente** ou digite a URL:",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
-                ]])
+                query,
+                "✅ **Etapa Salva!**\n\nEtapa adicionada com sucesso ao fluxo.",
+                reply_markup=create_flow_control_keyboard()
             )
         else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
-    
-    elif query.data == "add_message_video":
-        if flow_manager.is_admin(user.id):
-            context.user_data['current_step_type'] = 'message_video'
             await safe_edit_message(
-                "🎥 **Mensagem + Vídeo**\n\n📤 **Envie o vídeo diretamente** ou digite a URL:",
+                query,
+                "❌ Erro ao salvar etapa. Tente novamente.",
                 reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+                    InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
                 ]])
             )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    else:
+        await safe_edit_message(
+            query,
+            "❌ Dados da etapa não encontrados.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
+            ]])
+        )
+
+@callback_router.route("edit_flow", admin=True)
+async def handle_edit_flow_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Lista os fluxos para edição"""
+    query = update.callback_query
+    flow_manager = AsyncFlowManager()
     
-    elif query.data == "add_message_image_button":
-        if flow_manager.is_admin(user.id):
-            context.user_data['current_step_type'] = 'message_image_button'
-            await safe_edit_message(
-                "🖼️ **Mensagem + Imagem + Botão**\n\n📤 **Envie a imagem diretamente** ou digite a URL:",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
-                ]])
-            )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    flows = await flow_manager.get_active_flows()
+    if flows:
+        await safe_edit_message(
+            query,
+            "✏️ **Editar Fluxo**\n\nEscolha o fluxo que deseja editar:",
+            reply_markup=create_edit_flow_keyboard(flows)
+        )
+    else:
+        await safe_edit_message(
+            query,
+            "📝 Nenhum fluxo encontrado para editar.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
+            ]])
+        )
+
+@callback_router.prefix("edit_flow_", admin=True)
+async def handle_edit_flow_select_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Mostra as etapas do fluxo escolhido para edição"""
+    query = update.callback_query
+    flow_manager = AsyncFlowManager()
+    conversation = get_conversation(context)
+    
+    flow_id = int(payload)
+    
+    # Obter informações do fluxo
+    flows = await flow_manager.get_active_flows()
+    flow_name = "Fluxo Desconhecido"
+    for flow in flows:
+        if flow['id'] == flow_id:
+            flow_name = flow['name']
+            break
+    
+    # Salvar flow_id no contexto para edição
+    conversation.flow_id = flow_id
+    
+    await safe_edit_message(
+        query,
+        f"✏️ **Editar Fluxo: {flow_name}**\n\nEscolha a etapa que deseja editar:",
+        reply_markup=await run_db(create_edit_step_keyboard, flow_id)
+    )
+
+@callback_router.prefix("edit_step_", admin=True)
+async def handle_edit_step_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Mostra os detalhes da etapa escolhida para edição"""
+    query = update.callback_query
+    conversation = get_conversation(context)
     
-    elif query.data == "add_message_text_button":
-        if flow_manager.is_admin(user.id):
-            context.user_data['current_step_type'] = 'message_text_button'
-            await safe_edit_message(
-                "🔘 **Mensagem + Texto + Botão**\n\n📝 **Digite o texto da mensagem:**",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
-                ]])
-            )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    step_id = int(payload)
     
-    elif query.data == "add_message_video_button":
-        if flow_manager.is_admin(user.id):
-            context.user_data['current_step_type'] = 'message_video_button'
-            await safe_edit_message(
-                "🎥 **Mensagem + Vídeo + Botão**\n\n📤 **Envie o vídeo diretamente** ou digite a URL:",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
-                ]])
-            )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    # Obter detalhes da etapa
+    step = await run_db(get_step_details, step_id)
+    if step:
+        # Salvar a etapa no contexto
+        conversation.step_id = step_id
+        
+        # Criar mensagem de detalhes da etapa
+        message = f"📝 **Editar Etapa**\n\n"
+        message += f"**Fluxo:** {step['flow_name']}\n"
+        message += f"**Tipo:** {step['step_type'].replace('_', ' ').title()}\n"
+        message += f"**Conteúdo:** {step['content'][:100]}{'...' if len(step['content']) > 100 else ''}\n"
+        
+        if step.get('media_url'):
+            message += f"**Mídia:** {step['media_url'][:50]}...\n"
+        
+        if step.get('buttons'):
+            message += f"**Botões:** {len(step['buttons'])} botão(ões)\n"
+        
+        message += "\nEscolha o que deseja editar:"
+        
+        # Criar teclado de opções de edição
+        keyboard = [
+            [InlineKeyboardButton("📝 Editar Texto", callback_data=f"edit_step_text_{step_id}")],
+            [InlineKeyboardButton("🖼️ Editar Mídia", callback_data=f"edit_step_media_{step_id}")],
+            [InlineKeyboardButton("🗑️ Deletar Etapa", callback_data=f"delete_step_{step_id}")],
+            [InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_flow_{step['flow_id']}")]
+        ]
+        
+        await safe_edit_message(
+            query,
+            message,
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+    else:
+        await safe_edit_message(
+            query,
+            "❌ Etapa não encontrada.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="edit_flow_list")
+            ]])
+        )
+
+@callback_router.prefix("edit_step_text_", admin=True)
+async def handle_edit_step_text_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Inicia a edição do texto de uma etapa"""
+    query = update.callback_query
+    conversation = get_conversation(context)
+    
+    step_id = int(payload)
+    print(f"🔍 DEBUG: Step ID extraído: {step_id}")
+    
+    conversation.to(State.EDIT_STEP_TEXT, step_id=step_id)
+    
+    print("🔍 DEBUG: Tentando editar mensagem para edição de texto...")
+    await safe_edit_message(
+        query,
+        "📝 **Editar Texto da Etapa**\n\nDigite o novo texto:",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🔙 Cancelar", callback_data=f"edit_step_{step_id}")
+        ]])
+    )
+    print("🔍 DEBUG: Mensagem editada com sucesso para edição de texto")
+
+@callback_router.prefix("edit_step_media_", admin=True)
+async def handle_edit_step_media_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Inicia a troca da mídia de uma etapa"""
+    query = update.callback_query
+    conversation = get_conversation(context)
+    
+    step_id = int(payload)
+    print(f"🔍 DEBUG: Step ID extraído: {step_id}")
+    
+    conversation.to(State.EDIT_STEP_MEDIA, step_id=step_id)
     
-    elif query.data == "add_message_video_note":
-        if flow_manager.is_admin(user.id):
-            context.user_data['current_step_type'] = 'message_video_note'
+    print("🔍 DEBUG: Tentando editar mensagem para edição de mídia...")
+    await safe_edit_message(
+        query,
+        "🖼️ **Editar Mídia da Etapa**\n\nEnvie a nova imagem/vídeo ou digite a URL:",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🔙 Cancelar", callback_data=f"edit_step_{step_id}")
+        ]])
+    )
+    print("🔍 DEBUG: Mensagem editada com sucesso para edição de mídia")
+
+@callback_router.prefix("delete_step_", admin=True)
+async def handle_delete_step_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Exclui uma etapa"""
+    query = update.callback_query
+    
+    step_id = int(payload)
+    
+    # Obter detalhes da etapa antes de deletar
+    step = await run_db(get_step_details, step_id)
+    if step:
+        if await run_db(delete_step_completely, step_id):
             await safe_edit_message(
-                "🎬 **Mensagem + Vídeo Redondo**\n\n📤 **Envie o vídeo redondo diretamente** ou digite a URL:",
+                query,
+                f"🗑️ **Etapa Deletada!**\n\nA etapa '{step['step_type'].replace('_', ' ').title()}' foi removida com sucesso.",
                 reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+                    InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_flow_{step['flow_id']}")
                 ]])
             )
         else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
-    
-    elif query.data == "add_message_video_note_button":
-        if flow_manager.is_admin(user.id):
-            context.user_data['current_step_type'] = 'message_video_note_button'
             await safe_edit_message(
-                "🎬 **Mensagem + Vídeo Redondo + Texto**\n\n📤 **Envie o vídeo redondo diretamente** ou digite a URL:",
+                query,
+                "❌ Erro ao deletar etapa.",
                 reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
+                    InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
                 ]])
             )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    else:
+        await safe_edit_message(
+            query,
+            "❌ Etapa não encontrada.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="edit_flow_list")
+            ]])
+        )
+
+@callback_router.prefix("add_step_", admin=True)
+async def handle_add_step_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Adiciona uma etapa a um fluxo existente"""
+    query = update.callback_query
+    conversation = get_conversation(context)
     
-    elif query.data == "convert_video_note":
-        if flow_manager.is_admin(user.id):
-            if 'video_to_convert' in context.user_data:
-                video_data = context.user_data['video_to_convert']['file_data']
-                step_type = context.user_data['video_to_convert']['step_type']
-                
-                await safe_edit_message(
-                    "🔄 **Convertendo vídeo...**\n\n"
-                    "Aguarde enquanto convertemos o vídeo para o formato correto.\n"
-                    "Isso pode levar alguns segundos...",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("⏳ Processando...", callback_data="processing")
-                    ]])
-                )
-                
-                # Converter vídeo
-                success, converted_data, message = await convert_video_to_video_note(video_data)
-                
-                if success:
-                    # Salvar vídeo convertido
-                    if 'current_step_data' not in context.user_data:
-                        context.user_data['current_step_data'] = {}
-                    
-                    # Salvar como arquivo temporário
-                    temp_filename = f"converted_{int(asyncio.get_event_loop().time())}.mp4"
-                    temp_path = UPLOADS_DIR / "video_note" / temp_filename
-                    temp_path.parent.mkdir(exist_ok=True)
-                    
-                    with open(temp_path, 'wb') as f:
-                        f.write(converted_data)
-                    
-                    context.user_data['current_step_data']['media_url'] = str(temp_path)
-                    context.user_data['current_step_data']['type'] = 'video_note'
-                    context.user_data['current_step_data']['converted'] = True
-                    
-                    # Limpar dados de conversão
-                    context.user_data.pop('video_to_convert', None)
-                    
-                    await safe_edit_message(
-                        f"✅ **Conversão Concluída!**\n\n{message}\n\n"
-                        "📝 **Digite o texto do vídeo redondo:**",
-                        reply_markup=InlineKeyboardMarkup([[
-                            InlineKeyboardButton("🔙 Cancelar", callback_data="admin_flows")
-                        ]])
-                    )
-                    
-                    context.user_data['waiting_for_video_note_text'] = True
-                    if step_type == 'message_video_note_button':
-                        context.user_data['waiting_for_button'] = True
-                else:
-                    await safe_edit_message(
-                        f"❌ **Erro na Conversão**\n\n{message}\n\n"
-                        "Tente enviar um vídeo diferente ou verifique os requisitos.",
-                        reply_markup=InlineKeyboardMarkup([[
-                            InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
-                        ]])
-                    )
-            else:
-                await safe_edit_message(
-                    "❌ **Erro**\n\nDados do vídeo não encontrados. Tente novamente.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
-                    ]])
-                )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    flow_id = int(payload)
+    print(f"🔍 DEBUG: Flow ID extraído: {flow_id}")
     
-    elif query.data == "convert_welcome_video_note":
-        if flow_manager.is_admin(user.id):
-            if 'temp_welcome_video_data' in context.user_data:
-                video_data = context.user_data['temp_welcome_video_data']['file_data']
-                
-                await safe_edit_message(
-                    "🔄 **Convertendo vídeo para boas-vindas...**\n\n"
-                    "Aguarde enquanto convertemos o vídeo para o formato redondo.\n"
-                    "Isso pode levar alguns segundos...",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("⏳ Processando...", callback_data="processing")
-                    ]])
-                )
-                
-                # Converter vídeo
-                success, converted_data, message = await convert_video_to_video_note(video_data)
-                
-                if success:
-                    # Salvar vídeo convertido
-                    import os
-                    from pathlib import Path
-                    UPLOADS_DIR = Path("uploads")
-                    video_note_dir = UPLOADS_DIR / "video_note"
-                    video_note_dir.mkdir(parents=True, exist_ok=True)
-                    
-                    temp_filename = f"welcome_video_note_{int(asyncio.get_event_loop().time())}.mp4"
-                    temp_path = video_note_dir / temp_filename
-                    
-                    with open(temp_path, 'wb') as f:
-                        f.write(converted_data)
-                    
-                    # Salvar configurações
-                    if set_config_value('welcome_media_url', str(temp_path)) and set_config_value('welcome_media_type', 'video_note'):
-                        context.user_data.pop('configuring_welcome_media', None)
-                        context.user_data.pop('welcome_media_type', None)
-                        context.user_data.pop('temp_welcome_video_data', None)
-                        
-                        await safe_edit_message(
-                            f"✅ **Vídeo Redondo da Mensagem de Boas-vindas Configurado!**\n\n"
-                            f"O vídeo foi convertido com sucesso para formato redondo.\n"
-                            f"Arquivo: {temp_path}",
-                            reply_markup=create_config_welcome_keyboard()
-                        )
-                    else:
-                        await safe_edit_message(
-                            "❌ **Erro ao salvar vídeo redondo.**\n\nTente novamente.",
-                            reply_markup=create_config_welcome_keyboard()
-                        )
-                else:
-                    await safe_edit_message(
-                        f"❌ **Erro na Conversão**\n\n{message}\n\n"
-                        "Tente enviar um vídeo diferente ou verifique os requisitos.",
-                        reply_markup=create_config_welcome_keyboard()
-                    )
-            else:
-                await safe_edit_message(
-                    "❌ **Erro**\n\nDados do vídeo não encontrados. Tente novamente.",
-                    reply_markup=create_config_welcome_keyboard()
-                )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
-    
-    elif query.data == "finish_step":
-        if flow_manager.is_admin(user.id):
-            # Salvar etapa atual no banco de dados
-            if 'current_flow_id' in context.user_data and 'current_step_data' in context.user_data:
-                flow_id = context.user_data['current_flow_id']
-                step_data = context.user_data['current_step_data']
-                
-                # Salvar etapa usando a nova função
-                step_id = flow_manager.save_flow_step(flow_id, step_data)
-                
-                if step_id:
-                    # Limpar dados da etapa atual
-                    context.user_data.pop('current_step_data', None)
-                    context.user_data.pop('current_step_type', None)
-                    context.user_data.pop('media_option', None)
-                    context.user_data.pop('current_button_type', None)
-                    
-                    await safe_edit_message(
-                        "✅ **Etapa Salva!**\n\nEtapa adicionada com sucesso ao fluxo.",
-                        reply_markup=create_flow_control_keyboard()
-                    )
-                else:
-                    await safe_edit_message(
-                        "❌ Erro ao salvar etapa. Tente novamente.",
-                        reply_markup=InlineKeyboardMarkup([[
-                            InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
-                        ]])
-                    )
-            else:
-                await safe_edit_message(
-                    "❌ Dados da etapa não encontrados.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
-                    ]])
-                )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    # Salvar flow_id no contexto para adição de etapa
+    conversation.clear_step()
+    conversation.to(State.IDLE, flow_id=flow_id, step_number=1)
     
-    elif query.data == "edit_flow":
-        if flow_manager.is_admin(user.id):
-            flows = flow_manager.get_active_flows()
-            if flows:
-                await safe_edit_message(
-                    "✏️ **Editar Fluxo**\n\nEscolha o fluxo que deseja editar:",
-                    reply_markup=create_edit_flow_keyboard(flows)
-                )
-            else:
-                await safe_edit_message(
-                    "📝 Nenhum fluxo encontrado para editar.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
-                    ]])
-                )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    print(f"🔍 DEBUG: flow_id definido como: {flow_id}")
     
-    elif query.data.startswith("edit_flow_") and query.data != "edit_flow_list":
-        if flow_manager.is_admin(user.id):
-            flow_id = int(query.data.split("_")[2])
-            
-            # Obter informações do fluxo
-            flows = flow_manager.get_active_flows()
-            flow_name = "Fluxo Desconhecido"
-            for flow in flows:
-                if flow['id'] == flow_id:
-                    flow_name = flow['name']
-                    break
-            
-            # Salvar flow_id no contexto para edição
-            context.user_data['editing_flow_id'] = flow_id
-            
-            await safe_edit_message(
-                f"✏️ **Editar Fluxo: {flow_name}**\n\nEscolha a etapa que deseja editar:",
-                reply_markup=create_edit_step_keyboard(flow_id)
-            )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    await safe_edit_message(
+        query,
+        "📝 **Adicionar Etapa**\n\nEscolha o tipo de etapa:",
+        reply_markup=create_message_step_keyboard(1)
+    )
+
+@callback_router.route("edit_flow_list", admin=True)
+async def handle_edit_flow_list_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Volta para a lista de fluxos em edição"""
+    query = update.callback_query
+    flow_manager = AsyncFlowManager()
     
-    elif query.data.startswith("edit_step_") and not query.data.startswith("edit_step_text_") and not query.data.startswith("edit_step_media_"):
-        print(f"🔍 DEBUG: Entrando no handler edit_step_ genérico - Callback: {query.data}")
-        if flow_manager.is_admin(user.id):
-            step_id = int(query.data.split("_")[-1])
-            
-            # Obter detalhes da etapa
-            step = get_step_details(step_id)
-            if step:
-                # Salvar informações da etapa no contexto
-                context.user_data['editing_step_id'] = step_id
-                context.user_data['editing_step_type'] = step['step_type']
-                context.user_data['editing_step_content'] = step['content']
-                context.user_data['editing_step_media_url'] = step.get('media_url', '')
-                
-                # Criar mensagem de detalhes da etapa
-                message = f"📝 **Editar Etapa**\n\n"
-                message += f"**Fluxo:** {step['flow_name']}\n"
-                message += f"**Tipo:** {step['step_type'].replace('_', ' ').title()}\n"
-                message += f"**Conteúdo:** {step['content'][:100]}{'...' if len(step['content']) > 100 else ''}\n"
-                
-                if step.get('media_url'):
-                    message += f"**Mídia:** {step['media_url'][:50]}...\n"
-                
-                if step.get('buttons'):
-                    message += f"**Botões:** {len(step['buttons'])} botão(ões)\n"
-                
-                message += "\nEscolha o que deseja editar:"
-                
-                # Criar teclado de opções de edição
-                keyboard = [
-                    [InlineKeyboardButton("📝 Editar Texto", callback_data=f"edit_step_text_{step_id}")],
-                    [InlineKeyboardButton("🖼️ Editar Mídia", callback_data=f"edit_step_media_{step_id}")],
-                    [InlineKeyboardButton("🗑️ Deletar Etapa", callback_data=f"delete_step_{step_id}")],
-                    [InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_flow_{step['flow_id']}")]
-                ]
-                
-                await safe_edit_message(
-                    message,
-                    reply_markup=InlineKeyboardMarkup(keyboard)
-                )
-            else:
-                await safe_edit_message(
-                    "❌ Etapa não encontrada.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="edit_flow_list")
-                    ]])
-                )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    flows = await flow_manager.get_active_flows()
+    if flows:
+        await safe_edit_message(
+            query,
+            "✏️ **Editar Fluxo**\n\nEscolha o fluxo que deseja editar:",
+            reply_markup=create_edit_flow_keyboard(flows)
+        )
+    else:
+        await safe_edit_message(
+            query,
+            "📝 Nenhum fluxo encontrado para editar.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
+            ]])
+        )
+
+@callback_router.route("continue_flow", admin=True)
+async def handle_continue_flow_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Continua adicionando etapas ao fluxo"""
+    query = update.callback_query
+    conversation = get_conversation(context)
+    
+    # Continuar adicionando etapas
+    current_step = conversation.step_number
+    await safe_edit_message(
+        query,
+        f"📋 **Mensagem {current_step}**\n\nEscolha o tipo de mensagem:",
+        reply_markup=create_message_step_keyboard(current_step)
+    )
+
+@callback_router.route("confirm_step", admin=True)
+async def handle_confirm_step_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Confirma e salva a etapa atual"""
+    query = update.callback_query
+    flow_manager = AsyncFlowManager()
+    conversation = get_conversation(context)
     
-    elif query.data.startswith("edit_step_text_"):
-        print(f"🔍 DEBUG: Entrando no handler edit_step_text_ - Callback: {query.data}")
-        if flow_manager.is_admin(user.id):
-            step_id = int(query.data.split("_")[-1])
-            print(f"🔍 DEBUG: Step ID extraído: {step_id}")
-            
-            context.user_data['editing_step_text'] = True
-            context.user_data['editing_step_id'] = step_id
+    # Confirmar etapa atual (salvar no banco)
+    if conversation.flow_id is not None and conversation.step is not None:
+        flow_id = conversation.flow_id
+        step_data = conversation.step
+        
+        # Salvar etapa
+        step_id = await flow_manager.save_flow_step(flow_id, step_data)
+        
+        if step_id:
+            # Limpar dados da etapa atual
+            conversation.clear_step()
+            conversation.to(State.IDLE)
             
-            print("🔍 DEBUG: Tentando editar mensagem para edição de texto...")
             await safe_edit_message(
-                "📝 **Editar Texto da Etapa**\n\nDigite o novo texto:",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Cancelar", callback_data=f"edit_step_{step_id}")
-                ]])
+                query,
+                "✅ **Etapa Confirmada!**\n\nEtapa salva com sucesso.",
+                reply_markup=create_flow_control_keyboard()
             )
-            print("🔍 DEBUG: Mensagem editada com sucesso para edição de texto")
         else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
-    
-    elif query.data.startswith("edit_step_media_"):
-        print(f"🔍 DEBUG: Entrando no handler edit_step_media_ - Callback: {query.data}")
-        if flow_manager.is_admin(user.id):
-            step_id = int(query.data.split("_")[-1])
-            print(f"🔍 DEBUG: Step ID extraído: {step_id}")
-            
-            context.user_data['editing_step_media'] = True
-            context.user_data['editing_step_id'] = step_id
-            
-            print("🔍 DEBUG: Tentando editar mensagem para edição de mídia...")
             await safe_edit_message(
-                "🖼️ **Editar Mídia da Etapa**\n\nEnvie a nova imagem/vídeo ou digite a URL:",
+                query,
+                "❌ Erro ao confirmar etapa.",
                 reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Cancelar", callback_data=f"edit_step_{step_id}")
+                    InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
                 ]])
             )
-            print("🔍 DEBUG: Mensagem editada com sucesso para edição de mídia")
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    else:
+        await safe_edit_message(
+            query,
+            "❌ Dados da etapa não encontrados.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
+            ]])
+        )
+
+@callback_router.route("preview_step", admin=True)
+async def handle_preview_step_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Mostra o preview da etapa atual"""
+    query = update.callback_query
+    conversation = get_conversation(context)
     
-    elif query.data.startswith("delete_step_"):
-        if flow_manager.is_admin(user.id):
-            step_id = int(query.data.split("_")[-1])
-            
-            # Obter detalhes da etapa antes de deletar
-            step = get_step_details(step_id)
-            if step:
-                if delete_step_completely(step_id):
-                    await safe_edit_message(
-                        f"🗑️ **Etapa Deletada!**\n\nA etapa '{step['step_type'].replace('_', ' ').title()}' foi removida com sucesso.",
-                        reply_markup=InlineKeyboardMarkup([[
-                            InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_flow_{step['flow_id']}")
-                        ]])
-                    )
-                else:
-                    await safe_edit_message(
-                        "❌ Erro ao deletar etapa.",
-                        reply_markup=InlineKeyboardMarkup([[
-                            InlineKeyboardButton("🔙 Voltar", callback_data=f"edit_step_{step_id}")
-                        ]])
-                    )
-            else:
-                await safe_edit_message(
-                    "❌ Etapa não encontrada.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="edit_flow_list")
-                    ]])
-                )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
-    
-    elif query.data.startswith("add_step_"):
-        print(f"🔍 DEBUG: Entrando no handler add_step_ - Callback: {query.data}")
-        if flow_manager.is_admin(user.id):
-            flow_id = int(query.data.split("_")[-1])
-            print(f"🔍 DEBUG: Flow ID extraído: {flow_id}")
-            
-            # Salvar flow_id no contexto para adição de etapa
-            context.user_data['current_flow_id'] = flow_id  # Corrigido: usar current_flow_id
-            context.user_data['editing_flow_id'] = flow_id
-            context.user_data['current_step_number'] = 1
-            
-            print(f"🔍 DEBUG: current_flow_id definido como: {flow_id}")
-            
-            await safe_edit_message(
-                "📝 **Adicionar Etapa**\n\nEscolha o tipo de etapa:",
-                reply_markup=create_message_step_keyboard(1)
-            )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    # Mostrar preview da etapa atual
+    if conversation.step is not None:
+        step_data = conversation.step
+        
+        preview_text = f"�� **Preview da Etapa**\n\n"
+        preview_text += f"**Tipo:** {step_data.get('type', 'text').upper()}\n"
+        preview_text += f"**Conteúdo:** {step_data.get('content', '')[:100]}...\n"
+        
+        if step_data.get('media_url'):
+            preview_text += f"**Mídia:** {step_data.get('media_url')}\n"
+        
+        buttons = step_data.get('buttons', [])
+        if buttons:
+            preview_text += f"**Botões:** {len(buttons)} botão(ões)\n"
+            for i, button in enumerate(buttons, 1):
+                preview_text += f"  {i}. {button.get('text', '')}\n"
+        
+        await safe_edit_message(
+            query,
+            preview_text,
+            reply_markup=create_step_preview_keyboard()
+        )
+    else:
+        await safe_edit_message(
+            query,
+            "❌ Nenhuma etapa para preview.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="step_type_selection")
+            ]])
+        )
+
+@callback_router.route("finish_flow", admin=True)
+async def handle_finish_flow_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Finaliza a criação do fluxo"""
+    query = update.callback_query
+    flow_manager = AsyncFlowManager()
+    conversation = get_conversation(context)
     
-    elif query.data == "edit_flow_list":
-        if flow_manager.is_admin(user.id):
-            flows = flow_manager.get_active_flows()
-            if flows:
-                await safe_edit_message(
-                    "✏️ **Editar Fluxo**\n\nEscolha o fluxo que deseja editar:",
-                    reply_markup=create_edit_flow_keyboard(flows)
-                )
+    # Finalizar fluxo
+    if conversation.flow_id is not None:
+        flow_id = conversation.flow_id
+        
+        try:
+            # Reordenar etapas
+            if await flow_manager.reorder_steps(flow_id):
+                print(f"Etapas reordenadas com sucesso para o fluxo {flow_id}")
             else:
-                await safe_edit_message(
-                    "📝 Nenhum fluxo encontrado para editar.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
-                    ]])
-                )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
-    
-    elif query.data == "continue_flow":
-        if flow_manager.is_admin(user.id):
-            # Continuar adicionando etapas
-            current_step = context.user_data.get('current_step_number', 1)
+                print(f"Aviso: Não foi possível reordenar etapas do fluxo {flow_id}")
+            
+            # Obter resumo do fluxo
+            summary = await flow_manager.get_flow_summary(flow_id)
+        except Exception as e:
+            print(f"Erro ao finalizar fluxo: {e}")
             await safe_edit_message(
-                f"📋 **Mensagem {current_step}**\n\nEscolha o tipo de mensagem:",
-                reply_markup=create_message_step_keyboard(current_step)
+                query,
+                "❌ Erro ao finalizar fluxo. Tente novamente.",
+                reply_markup=InlineKeyboardMarkup([[
+                    InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
+                ]])
             )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
-    
-    elif query.data == "confirm_step":
-        if flow_manager.is_admin(user.id):
-            # Confirmar etapa atual (salvar no banco)
-            if 'current_flow_id' in context.user_data and 'current_step_data' in context.user_data:
-                flow_id = context.user_data['current_flow_id']
-                step_data = context.user_data['current_step_data']
-                
-                # Salvar etapa
-                step_id = flow_manager.save_flow_step(flow_id, step_data)
-                
-                if step_id:
-                    # Limpar dados da etapa atual
-                    context.user_data.pop('current_step_data', None)
-                    context.user_data.pop('current_step_type', None)
-                    context.user_data.pop('media_option', None)
-                    context.user_data.pop('current_button_type', None)
-                    
-                    await safe_edit_message(
-                        "✅ **Etapa Confirmada!**\n\nEtapa salva com sucesso.",
-                        reply_markup=create_flow_control_keyboard()
-                    )
-                else:
-                    await safe_edit_message(
-                        "❌ Erro ao confirmar etapa.",
-                        reply_markup=InlineKeyboardMarkup([[
-                            InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
-                        ]])
-                    )
-            else:
-                await safe_edit_message(
-                    "❌ Dados da etapa não encontrados.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
-                    ]])
-                )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
-    
-    elif query.data == "preview_step":
-        if flow_manager.is_admin(user.id):
-            # Mostrar preview da etapa atual
-            if 'current_step_data' in context.user_data:
-                step_data = context.user_data['current_step_data']
-                
-                preview_text = f"�� **Preview da Etapa**\n\n"
-                preview_text += f"**Tipo:** {step_data.get('type', 'text').upper()}\n"
-                preview_text += f"**Conteúdo:** {step_data.get('content', '')[:100]}...\n"
-                
-                if step_data.get('media_url'):
-                    preview_text += f"**Mídia:** {step_data.get('media_url')}\n"
-                
-                buttons = step_data.get('buttons', [])
-                if buttons:
-                    preview_text += f"**Botões:** {len(buttons)} botão(ões)\n"
-                    for i, button in enumerate(buttons, 1):
-                        preview_text += f"  {i}. {button.get('text', '')}\n"
-                
-                await safe_edit_message(
-                    preview_text,
-                    reply_markup=create_step_preview_keyboard()
-                )
-            else:
-                await safe_edit_message(
-                    "❌ Nenhuma etapa para preview.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="step_type_selection")
-                    ]])
-                )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
-    
-    elif query.data == "finish_flow":
-        if flow_manager.is_admin(user.id):
-            # Finalizar fluxo
-            if 'current_flow_id' in context.user_data:
-                flow_id = context.user_data['current_flow_id']
-                
-                try:
-                    # Reordenar etapas
-                    if flow_manager.reorder_steps(flow_id):
-                        print(f"Etapas reordenadas com sucesso para o fluxo {flow_id}")
-                    else:
-                        print(f"Aviso: Não foi possível reordenar etapas do fluxo {flow_id}")
-                    
-                    # Obter resumo do fluxo
-                    summary = flow_manager.get_flow_summary(flow_id)
-                except Exception as e:
-                    print(f"Erro ao finalizar fluxo: {e}")
-                    await safe_edit_message(
-                        "❌ Erro ao finalizar fluxo. Tente novamente.",
-                        reply_markup=InlineKeyboardMarkup([[
-                            InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
-                        ]])
-                    )
-                    return
-                
-                if summary:
-                    flow = summary['flow']
-                    steps = summary['steps']
-                    
-                    finish_text = f"🎉 **Fluxo Finalizado com Sucesso!**\n\n"
-                    finish_text += f"**Nome:** {flow['name']}\n"
-                    finish_text += f"**Descrição:** {flow['description']}\n"
-                    finish_text += f"**Total de Etapas:** {summary['total_steps']}\n\n"
-                    
-                    if steps:
-                        finish_text += "**Ordem de Envio:**\n"
-                        for i, step in enumerate(steps, 1):
-                            finish_text += f"{i}. {step['step_type'].upper()}"
-                            if step['button_count'] > 0:
-                                finish_text += f" ({step['button_count']} botões)"
-                            finish_text += "\n"
-                    
-                    finish_text += "\n✅ O fluxo foi salvo e está pronto para uso!"
-                else:
-                    finish_text = "🎉 **Fluxo Finalizado!**\n\nO fluxo foi salvo com sucesso."
-                
-                # Limpar dados temporários
-                context.user_data.clear()
-                
-                await safe_edit_message(
-                    finish_text,
-                    reply_markup=InlineKeyboardMarkup([
-                        [InlineKeyboardButton("📋 Ver Fluxos", callback_data="list_flows")],
-                        [InlineKeyboardButton("➕ Criar Novo Fluxo", callback_data="create_flow")],
-                        [InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")]
-                    ])
-                )
-            else:
-                await safe_edit_message(
-                    "❌ Dados do fluxo não encontrados.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
-                    ]])
-                )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
-    
-    elif query.data == "list_flows":
-        if flow_manager.is_admin(user.id):
-            flows = flow_manager.get_active_flows()
-            if flows:
-                flow_list = "📋 **Fluxos Ativos:**\n\n"
-                for flow in flows:
-                    flow_list += f"• **{flow['name']}** (ID: {flow['id']})\n"
-                    if flow['description']:
-                        flow_list += f"  _{flow['description']}_\n"
-                    flow_list += "\n"
-                
-                await safe_edit_message(
-                    flow_list,
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
-                    ]])
-                )
-            else:
-                await safe_edit_message(
-                    "📝 Nenhum fluxo encontrado.\n\nCrie um novo fluxo para começar!",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
-                    ]])
-                )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
-    
-    elif query.data == "delete_flow":
-        if flow_manager.is_admin(user.id):
-            flows = flow_manager.get_active_flows()
-            if flows:
-                await safe_edit_message(
-                    "🗑️ **Deletar Fluxo**\n\nEscolha o fluxo que deseja deletar:",
-                    reply_markup=create_delete_flow_keyboard(flows)
-                )
-            else:
-                await safe_edit_message(
-                    "📝 Nenhum fluxo encontrado para deletar.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
-                    ]])
-                )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
-    
-    elif query.data.startswith("delete_flow_"):
-        if flow_manager.is_admin(user.id):
-            flow_id = int(query.data.split("_")[2])
+            return
+        
+        if summary:
+            flow = summary['flow']
+            steps = summary['steps']
             
-            # Obter informações do fluxo antes de deletar
-            flows = flow_manager.get_active_flows()
-            flow_name = "Fluxo Desconhecido"
-            for flow in flows:
-                if flow['id'] == flow_id:
-                    flow_name = flow['name']
-                    break
+            finish_text = f"🎉 **Fluxo Finalizado com Sucesso!**\n\n"
+            finish_text += f"**Nome:** {flow['name']}\n"
+            finish_text += f"**Descrição:** {flow['description']}\n"
+            finish_text += f"**Total de Etapas:** {summary['total_steps']}\n\n"
             
-            # Deletar o fluxo
-            if flow_manager.delete_flow(flow_id):
-                await safe_edit_message(
-                    f"✅ **Fluxo Deletado!**\n\n🗑️ **{flow_name}** foi deletado com sucesso.\n\nTodas as etapas e botões associados também foram removidos.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
-                    ]])
-                )
-            else:
-                await safe_edit_message(
-                    f"❌ **Erro ao Deletar Fluxo**\n\nNão foi possível deletar o fluxo **{flow_name}**.\n\nVerifique se o fluxo existe e tente novamente.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
-                    ]])
-                )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
-    
-    elif query.data == "set_default_flow":
-        if flow_manager.is_admin(user.id):
-            flows = flow_manager.get_flows_for_default_selection()
-            if flows:
-                default_flow = flow_manager.get_default_flow()
-                current_default = f"⭐ **Fluxo Padrão Atual:** {default_flow['name']}" if default_flow else "❌ **Nenhum fluxo padrão definido**"
-                
-                message = f"⭐ **Definir Fluxo Padrão**\n\n{current_default}\n\nEscolha um fluxo para definir como padrão:"
-                
-                await safe_edit_message(
-                    message,
-                    reply_markup=create_default_flow_keyboard(flows)
-                )
-            else:
-                await safe_edit_message(
-                    "📝 Nenhum fluxo encontrado.\n\nCrie um novo fluxo primeiro!",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_menu")
-                    ]])
-                )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
-    
-    elif query.data.startswith("set_default_"):
-        if flow_manager.is_admin(user.id):
-            flow_id = int(query.data.split("_")[2])
+            if steps:
+                finish_text += "**Ordem de Envio:**\n"
+                for i, step in enumerate(steps, 1):
+                    finish_text += f"{i}. {step['step_type'].upper()}"
+                    if step['button_count'] > 0:
+                        finish_text += f" ({step['button_count']} botões)"
+                    finish_text += "\n"
             
-            if flow_manager.set_default_flow(flow_id):
-                # Obter nome do fluxo
-                flows = flow_manager.get_active_flows()
-                flow_name = "Fluxo Desconhecido"
-                for flow in flows:
-                    if flow['id'] == flow_id:
-                        flow_name = flow['name']
-                        break
-                
-                await safe_edit_message(
-                    f"✅ **Fluxo Padrão Definido!**\n\n⭐ **{flow_name}** agora é o fluxo padrão.\n\nEste fluxo será executado quando usuários enviarem /start.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_menu")
-                    ]])
-                )
-            else:
-                await safe_edit_message(
-                    "❌ Erro ao definir fluxo padrão. Tente novamente.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_menu")
-                    ]])
-                )
+            finish_text += "\n✅ O fluxo foi salvo e está pronto para uso!"
         else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
-    
-
-    
-    elif query.data == "back_to_main":
+            finish_text = "🎉 **Fluxo Finalizado!**\n\nO fluxo foi salvo com sucesso."
+        
+        # Limpar dados temporários
+        conversation.reset()
+        
         await safe_edit_message(
-            "👋 **Bot Influenciador**\n\nEscolha uma opção:",
+            query,
+            finish_text,
             reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("🚀 Iniciar", callback_data="start_flow")],
-                [InlineKeyboardButton("📋 Menu", callback_data="main_menu")],
-                [InlineKeyboardButton("❓ Ajuda", callback_data="help_menu")]
+                [InlineKeyboardButton("📋 Ver Fluxos", callback_data="list_flows")],
+                [InlineKeyboardButton("➕ Criar Novo Fluxo", callback_data="create_flow")],
+                [InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")]
             ])
         )
+    else:
+        await safe_edit_message(
+            query,
+            "❌ Dados do fluxo não encontrados.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
+            ]])
+        )
+
+@callback_router.route("list_flows", admin=True)
+async def handle_list_flows_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Lista os fluxos cadastrados"""
+    query = update.callback_query
+    flow_manager = AsyncFlowManager()
     
-    elif query.data == "admin_config":
-        if flow_manager.is_admin(user.id):
-            await safe_edit_message(
-                "⚙️ **Configurações do Bot**\n\nEscolha uma configuração para gerenciar:",
-                reply_markup=create_config_keyboard()
-            )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
-    
-    elif query.data == "admin_stats":
-        if flow_manager.is_admin(user.id):
-            await safe_edit_message(
-                "📊 **Estatísticas e Relatórios**\n\nEscolha o tipo de relatório:",
-                reply_markup=create_stats_keyboard()
-            )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
-    
-    elif query.data == "reset_welcome_video":
-        if flow_manager.is_admin(user.id):
-            # Resetar controle de vídeo de boas-vindas para todos os usuários
-            from flow_manager import reset_welcome_video_sent
-            
-            connection = create_connection()
-            if connection is None:
-                await safe_edit_message("❌ Erro ao conectar ao banco de dados.")
-                return
-            
-            try:
-                cursor = connection.cursor()
-                
-                # Resetar para todos os usuários
-                cursor.execute("UPDATE users SET welcome_video_sent = FALSE")
-                connection.commit()
-                
-                affected_rows = cursor.rowcount
-                await safe_edit_message(
-                    f"✅ **Controle de Vídeo Redondo Resetado!**\n\n"
-                    f"Resetado para {affected_rows} usuários.\n\n"
-                    f"Agora todos os usuários receberão o vídeo redondo novamente na próxima vez que precisarem de cadastro.",
-                    reply_markup=create_admin_keyboard()
-                )
-                
-            except Error as e:
-                await safe_edit_message(f"❌ Erro ao resetar: {e}")
-            finally:
-                if connection.is_connected():
-                    cursor.close()
-                    connection.close()
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
-    
-    elif query.data == "stats_general":
-        if flow_manager.is_admin(user.id):
-            stats = get_general_stats()
-            if stats:
-                message = "📈 **Estatísticas Gerais**\n\n"
-                message += f"👥 **Usuários:** {stats['total_users']}\n"
-                message += f"✅ **Com dados completos:** {stats['users_with_data']}\n"
-                message += f"📝 **Fluxos:** {stats['total_flows']}\n"
-                message += f"📋 **Etapas:** {stats['total_steps']}\n"
-                message += f"🔘 **Botões:** {stats['total_buttons']}\n\n"
-                
-                if stats['users_by_month']:
-                    message += "📅 **Usuários por mês (últimos 6 meses):**\n"
-                    for month, count in stats['users_by_month']:
-                        message += f"  • {month}: {count} usuários\n"
-                
-                await safe_edit_message(
-                    message,
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_stats")
-                    ]])
-                )
-            else:
-                await safe_edit_message(
-                    "❌ Erro ao obter estatísticas.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_stats")
-                    ]])
-                )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    flows = await flow_manager.get_active_flows()
+    if flows:
+        flow_list = "📋 **Fluxos Ativos:**\n\n"
+        for flow in flows:
+            flow_list += f"• **{flow['name']}** (ID: {flow['id']})\n"
+            if flow['description']:
+                flow_list += f"  _{flow['description']}_\n"
+            flow_list += "\n"
+        
+        await safe_edit_message(
+            query,
+            flow_list,
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
+            ]])
+        )
+    else:
+        await safe_edit_message(
+            query,
+            "📝 Nenhum fluxo encontrado.\n\nCrie um novo fluxo para começar!",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
+            ]])
+        )
+
+@callback_router.route("delete_flow", admin=True)
+async def handle_delete_flow_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Lista os fluxos para exclusão"""
+    query = update.callback_query
+    flow_manager = AsyncFlowManager()
     
-    elif query.data == "stats_full_report":
-        if flow_manager.is_admin(user.id):
-            await safe_edit_message(
-                "📊 **Gerando Relatório Completo...**\n\nAguarde um momento...",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("⏳ Processando...", callback_data="processing")
-                ]])
-            )
-            
-            filename = generate_excel_report("full")
-            if filename:
-                with open(filename, 'rb') as file:
-                    await safe_edit_message(
-                        "📊 **Relatório Completo Gerado!**\n\nO arquivo Excel foi criado com sucesso.",
-                        reply_markup=InlineKeyboardMarkup([[
-                            InlineKeyboardButton("🔙 Voltar", callback_data="admin_stats")
-                        ]])
-                    )
-                    await context.bot.send_document(
-                        chat_id=query.from_user.id,
-                        document=file,
-                        filename=filename,
-                        caption="📊 **Relatório Completo do Sistema**\n\nArquivo Excel com todas as estatísticas e dados."
-                    )
-                    # Remover arquivo após envio
-                    import os
-                    os.remove(filename)
-            else:
-                await safe_edit_message(
-                    "❌ Erro ao gerar relatório completo.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_stats")
-                    ]])
-                )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    flows = await flow_manager.get_active_flows()
+    if flows:
+        await safe_edit_message(
+            query,
+            "🗑️ **Deletar Fluxo**\n\nEscolha o fluxo que deseja deletar:",
+            reply_markup=create_delete_flow_keyboard(flows)
+        )
+    else:
+        await safe_edit_message(
+            query,
+            "📝 Nenhum fluxo encontrado para deletar.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
+            ]])
+        )
+
+@callback_router.prefix("delete_flow_", admin=True)
+async def handle_delete_flow_select_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Exclui o fluxo escolhido"""
+    query = update.callback_query
+    flow_manager = AsyncFlowManager()
     
-    elif query.data == "stats_users_report":
-        if flow_manager.is_admin(user.id):
-            await safe_edit_message(
-                "👥 **Gerando Relatório de Usuários...**\n\nAguarde um momento...",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("⏳ Processando...", callback_data="processing")
-                ]])
-            )
-            
-            filename = generate_excel_report("users")
-            if filename:
-                with open(filename, 'rb') as file:
-                    await safe_edit_message(
-                        "👥 **Relatório de Usuários Gerado!**\n\nO arquivo Excel foi criado com sucesso.",
-                        reply_markup=InlineKeyboardMarkup([[
-                            InlineKeyboardButton("🔙 Voltar", callback_data="admin_stats")
-                        ]])
-                    )
-                    await context.bot.send_document(
-                        chat_id=query.from_user.id,
-                        document=file,
-                        filename=filename,
-                        caption="👥 **Relatório de Usuários**\n\nLista completa de todos os usuários registrados."
-                    )
-                    # Remover arquivo após envio
-                    import os
-                    os.remove(filename)
-            else:
-                await safe_edit_message(
-                    "❌ Erro ao gerar relatório de usuários.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_stats")
-                    ]])
-                )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    flow_id = int(payload)
     
-    elif query.data == "stats_flows_report":
-        if flow_manager.is_admin(user.id):
-            await safe_edit_message(
-                "📝 **Gerando Relatório de Fluxos...**\n\nAguarde um momento...",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("⏳ Processando...", callback_data="processing")
-                ]])
-            )
-            
-            filename = generate_excel_report("flows")
-            if filename:
-                with open(filename, 'rb') as file:
-                    await safe_edit_message(
-                        "📝 **Relatório de Fluxos Gerado!**\n\nO arquivo Excel foi criado com sucesso.",
-                        reply_markup=InlineKeyboardMarkup([[
-                            InlineKeyboardButton("🔙 Voltar", callback_data="admin_stats")
-                        ]])
-                    )
-                    await context.bot.send_document(
-                        chat_id=query.from_user.id,
-                        document=file,
-                        filename=filename,
-                        caption="📝 **Relatório de Fluxos**\n\nLista completa de todos os fluxos criados."
-                    )
-                    # Remover arquivo após envio
-                    import os
-                    os.remove(filename)
-            else:
-                await safe_edit_message(
-                    "❌ Erro ao gerar relatório de fluxos.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_stats")
-                    ]])
-                )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    # Obter informações do fluxo antes de deletar
+    flows = await flow_manager.get_active_flows()
+    flow_name = "Fluxo Desconhecido"
+    for flow in flows:
+        if flow['id'] == flow_id:
+            flow_name = flow['name']
+            break
     
-    elif query.data == "config_phone":
-        if flow_manager.is_admin(user.id):
-            status = "✅ Ativada" if is_phone_collection_enabled() else "❌ Desativada"
-            await safe_edit_message(
-                f"📱 **Coleta de Número**\n\nStatus atual: {status}\n\nEscolha uma opção:",
-                reply_markup=create_config_phone_keyboard()
-            )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    # Deletar o fluxo
+    if await flow_manager.delete_flow(flow_id):
+        await safe_edit_message(
+            query,
+            f"✅ **Fluxo Deletado!**\n\n🗑️ **{flow_name}** foi deletado com sucesso.\n\nTodas as etapas e botões associados também foram removidos.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
+            ]])
+        )
+    else:
+        await safe_edit_message(
+            query,
+            f"❌ **Erro ao Deletar Fluxo**\n\nNão foi possível deletar o fluxo **{flow_name}**.\n\nVerifique se o fluxo existe e tente novamente.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_flows")
+            ]])
+        )
+
+@callback_router.route("set_default_flow", admin=True)
+async def handle_set_default_flow_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Lista os fluxos para escolher o padrão"""
+    query = update.callback_query
+    flow_manager = AsyncFlowManager()
     
-    elif query.data == "config_phone_enable":
-        if flow_manager.is_admin(user.id):
-            if set_config_value('collect_phone', 'true'):
-                await safe_edit_message(
-                    "✅ **Coleta de Número Ativada!**\n\nAgora o bot irá solicitar o número de telefone dos usuários antes de exibir o fluxo.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_config")
-                    ]])
-                )
-            else:
-                await safe_edit_message(
-                    "❌ Erro ao ativar coleta de número.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_config")
-                    ]])
-                )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    flows = await flow_manager.get_flows_for_default_selection()
+    if flows:
+        default_flow = await flow_manager.get_default_flow()
+        current_default = f"⭐ **Fluxo Padrão Atual:** {default_flow['name']}" if default_flow else "❌ **Nenhum fluxo padrão definido**"
+        
+        message = f"⭐ **Definir Fluxo Padrão**\n\n{current_default}\n\nEscolha um fluxo para definir como padrão:"
+        
+        await safe_edit_message(
+            query,
+            message,
+            reply_markup=create_default_flow_keyboard(flows)
+        )
+    else:
+        await safe_edit_message(
+            query,
+            "📝 Nenhum fluxo encontrado.\n\nCrie um novo fluxo primeiro!",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_menu")
+            ]])
+        )
+
+@callback_router.prefix("set_default_", admin=True)
+async def handle_set_default_select_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Define o fluxo escolhido como padrão"""
+    query = update.callback_query
+    flow_manager = AsyncFlowManager()
     
-    elif query.data == "config_phone_disable":
-        if flow_manager.is_admin(user.id):
-            if set_config_value('collect_phone', 'false'):
-                await safe_edit_message(
-                    "❌ **Coleta de Número Desativada!**\n\nO bot não irá mais solicitar o número de telefone dos usuários.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_config")
-                    ]])
-                )
-            else:
-                await safe_edit_message(
-                    "❌ Erro ao desativar coleta de número.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_config")
-                    ]])
-                )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    flow_id = int(payload)
     
-    elif query.data == "config_email":
-        if flow_manager.is_admin(user.id):
-            status = "✅ Ativada" if is_email_collection_enabled() else "❌ Desativada"
-            await safe_edit_message(
-                f"📧 **Coleta de Email**\n\nStatus atual: {status}\n\nEscolha uma opção:",
-                reply_markup=create_config_email_keyboard()
-            )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    if await flow_manager.set_default_flow(flow_id):
+        # Obter nome do fluxo
+        flows = await flow_manager.get_active_flows()
+        flow_name = "Fluxo Desconhecido"
+        for flow in flows:
+            if flow['id'] == flow_id:
+                flow_name = flow['name']
+                break
+        
+        await safe_edit_message(
+            query,
+            f"✅ **Fluxo Padrão Definido!**\n\n⭐ **{flow_name}** agora é o fluxo padrão.\n\nEste fluxo será executado quando usuários enviarem /start.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_menu")
+            ]])
+        )
+    else:
+        await safe_edit_message(
+            query,
+            "❌ Erro ao definir fluxo padrão. Tente novamente.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_menu")
+            ]])
+        )
+
+@callback_router.route("back_to_main")
+async def handle_back_to_main_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Volta para o menu principal"""
+    query = update.callback_query
     
-    elif query.data == "config_email_enable":
-        if flow_manager.is_admin(user.id):
-            if set_config_value('collect_email', 'true'):
-                await safe_edit_message(
-                    "✅ **Coleta de Email Ativada!**\n\nAgora o bot irá solicitar o email dos usuários antes de exibir o fluxo.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_config")
-                    ]])
-                )
-            else:
-                await safe_edit_message(
-                    "❌ Erro ao ativar coleta de email.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_config")
-                    ]])
-                )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    await safe_edit_message(
+        query,
+        "👋 **Bot Influenciador**\n\nEscolha uma opção:",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("🚀 Iniciar", callback_data="start_flow")],
+            [InlineKeyboardButton("📋 Menu", callback_data="main_menu")],
+            [InlineKeyboardButton("❓ Ajuda", callback_data="help_menu")]
+        ])
+    )
+
+@callback_router.route("admin_config", admin=True)
+async def handle_admin_config_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Menu de configurações"""
+    query = update.callback_query
     
-    elif query.data == "config_email_disable":
-        if flow_manager.is_admin(user.id):
-            if set_config_value('collect_email', 'false'):
-                await safe_edit_message(
-                    "❌ **Coleta de Email Desativada!**\n\nO bot não irá mais solicitar o email dos usuários.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_config")
-                    ]])
-                )
-            else:
-                await safe_edit_message(
-                    "❌ Erro ao desativar coleta de email.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_config")
-                    ]])
-                )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    await safe_edit_message(
+        query,
+        "⚙️ **Configurações do Bot**\n\nEscolha uma configuração para gerenciar:",
+        reply_markup=create_config_keyboard()
+    )
+
+@callback_router.route("admin_broadcast", admin=True)
+async def handle_admin_broadcast_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Menu de transmissões"""
+    query = update.callback_query
     
-    elif query.data == "config_require_signup":
-        if flow_manager.is_admin(user.id):
-            status = "✅ Ativado" if is_signup_required() else "❌ Desativado"
-            await safe_edit_message(
-                f"👤 **Exigir Cadastro**\n\nStatus atual: {status}\n\nEscolha uma opção:",
-                reply_markup=create_config_signup_keyboard()
-            )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    jobs = await run_db(get_recent_broadcast_jobs)
+    await safe_edit_message(
+        query,
+        "📣 **Transmissões**\n\nEnvie um fluxo para todos os usuários ou para um público específico.\n\nÚltimas transmissões:",
+        reply_markup=create_broadcast_menu_keyboard(jobs)
+    )
+
+@callback_router.route("broadcast_new", admin=True)
+async def handle_broadcast_new_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Nova transmissão: escolha do fluxo"""
+    query = update.callback_query
+    flow_manager = AsyncFlowManager()
     
-    elif query.data == "config_webhook":
-        if flow_manager.is_admin(user.id):
-            webhook_enabled = is_webhook_enabled()
-            webhook_url = get_webhook_url()
-            
-            status = "✅ Ativado" if webhook_enabled else "❌ Desativado"
-            url_status = f"🔗 {webhook_url}" if webhook_url else "❌ Não definida"
-            
-            message = f"🔗 **Webhook CRM**\n\n"
-            message += f"Status: {status}\n"
-            message += f"URL: {url_status}\n\n"
-            message += "**Eventos ativos:**\n"
-            message += "• Acesso ao bot\n"
-            message += "• Cadastro concluído\n\n"
-            message += "Escolha uma opção:"
-            
-            await safe_edit_message(
-                message,
-                reply_markup=create_webhook_keyboard()
-            )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    flows = await flow_manager.get_active_flows()
+    if flows:
+        await safe_edit_message(
+            query,
+            "📣 **Nova Transmissão**\n\nEscolha o fluxo que será enviado:",
+            reply_markup=create_broadcast_flow_keyboard(flows)
+        )
+    else:
+        await safe_edit_message(
+            query,
+            "❌ Nenhum fluxo ativo para transmitir.",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Voltar", callback_data="admin_broadcast")]])
+        )
+
+@callback_router.prefix("broadcast_flow_", admin=True)
+async def handle_broadcast_flow_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Nova transmissão: escolha do público"""
+    query = update.callback_query
     
-    elif query.data == "webhook_enable":
-        if flow_manager.is_admin(user.id):
-            if set_config_value('webhook_enabled', 'true'):
-                await safe_edit_message(
-                    "✅ **Webhook CRM Ativado!**\n\nAgora você precisa definir a URL do webhook.",
-                    reply_markup=InlineKeyboardMarkup([
-                        [InlineKeyboardButton("🔗 Definir URL", callback_data="webhook_set_url")],
-                        [InlineKeyboardButton("🔙 Voltar", callback_data="config_webhook")]
-                    ])
-                )
-            else:
-                await safe_edit_message(
-                    "❌ Erro ao ativar webhook.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="config_webhook")
-                    ]])
-                )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    flow_id = int(payload)
+    await safe_edit_message(
+        query,
+        "📣 **Nova Transmissão**\n\nEscolha para quem o fluxo será enviado:",
+        reply_markup=create_broadcast_segment_keyboard(flow_id)
+    )
+
+@callback_router.prefix("broadcast_segment_", admin=True)
+async def handle_broadcast_segment_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Nova transmissão: confirmação"""
+    query = update.callback_query
     
-    elif query.data == "webhook_disable":
-        if flow_manager.is_admin(user.id):
-            if set_config_value('webhook_enabled', 'false'):
-                await safe_edit_message(
-                    "❌ **Webhook CRM Desativado!**\n\nO webhook não será mais enviado.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="config_webhook")
-                    ]])
-                )
-            else:
-                await safe_edit_message(
-                    "❌ Erro ao desativar webhook.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="config_webhook")
-                    ]])
-                )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    flow_id, segment = payload.split("_", 1)
+    if segment not in SEGMENTS:
+        await safe_edit_message(query, "❌ Público inválido.")
+        return
+    plan = await run_db(get_flow_plan, int(flow_id))
+    if not plan or not plan.steps:
+        await safe_edit_message(query, "❌ Fluxo não encontrado ou sem etapas.")
+        return
+    total = await run_db(count_broadcast_users, segment)
+    keyboard = [
+        [InlineKeyboardButton("🚀 Iniciar Transmissão", callback_data=f"broadcast_start_{flow_id}_{segment}")],
+        [InlineKeyboardButton("🔙 Voltar", callback_data=f"broadcast_flow_{flow_id}")]
+    ]
+    await safe_edit_message(
+        query,
+        f"📣 **Confirmar Transmissão**\n\n"
+        f"📋 Fluxo: {plan.name}\n"
+        f"👥 Público: {SEGMENTS[segment][0]}\n"
+        f"📊 Usuários: {total}\n\n"
+        f"⚠️ Todos esses usuários receberão o fluxo completo.",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+@callback_router.prefix("broadcast_start_", admin=True)
+async def handle_broadcast_start_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Cria e inicia a transmissão"""
+    query = update.callback_query
+    user = update.effective_user
     
-    elif query.data == "webhook_set_url":
-        if flow_manager.is_admin(user.id):
-            context.user_data['setting_webhook_url'] = True
-            await safe_edit_message(
-                "🔗 **Definir URL do Webhook**\n\nDigite a URL do seu CRM:\n\nExemplo: https://seu-crm.com/webhook",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Cancelar", callback_data="config_webhook")
-                ]])
-            )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    flow_id, segment = payload.split("_", 1)
+    if segment not in SEGMENTS:
+        await safe_edit_message(query, "❌ Público inválido.")
+        return
+    job_id = await run_db(create_broadcast_job, int(flow_id), segment, user.id)
+    if not job_id:
+        await safe_edit_message(query, "❌ Erro ao criar transmissão.")
+        return
     
-    elif query.data == "webhook_change_url":
-        if flow_manager.is_admin(user.id):
-            context.user_data['changing_webhook_url'] = True
-            current_url = get_webhook_url()
-            await safe_edit_message(
-                f"✏️ **Alterar URL do Webhook**\n\nURL atual: {current_url}\n\nDigite a nova URL:",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Cancelar", callback_data="config_webhook")
-                ]])
-            )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    # A mensagem atual passa a mostrar o progresso da transmissão
+    await run_db(
+        update_broadcast_job, job_id,
+        report_chat_id=query.message.chat_id, report_message_id=query.message.message_id
+    )
+    job = await run_db(get_broadcast_job, job_id)
+    await safe_edit_message(
+        query,
+        format_broadcast_progress(job),
+        reply_markup=create_broadcast_control_keyboard(job_id, job['status'])
+    )
+    broadcast_engine.start(context.bot, job_id)
+
+@callback_router.prefix("broadcast_status_", "broadcast_pause_", "broadcast_resume_", "broadcast_cancel_", admin=True)
+async def handle_broadcast_control_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Progresso, pausa, retomada e cancelamento de uma transmissão"""
+    query = update.callback_query
     
-    elif query.data == "config_signup_enable":
-        if flow_manager.is_admin(user.id):
-            if set_config_value('require_signup', 'true'):
-                await safe_edit_message(
-                    "✅ **Exigir Cadastro Ativado!**\n\nAgora o bot irá solicitar o cadastro completo dos usuários antes de exibir o fluxo.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_config")
-                    ]])
-                )
-            else:
-                await safe_edit_message(
-                    "❌ Erro ao ativar exigir cadastro.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_config")
-                    ]])
-                )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    action = query.data.split("_")[1]
+    job_id = int(payload)
+    job = await run_db(get_broadcast_job, job_id)
+    if not job:
+        await safe_edit_message(query, "❌ Transmissão não encontrada.")
+        return
     
-    elif query.data == "config_signup_disable":
-        if flow_manager.is_admin(user.id):
-            if set_config_value('require_signup', 'false'):
-                await safe_edit_message(
-                    "❌ **Exigir Cadastro Desativado!**\n\nO bot não irá mais exigir cadastro dos usuários.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_config")
-                    ]])
-                )
-            else:
-                await safe_edit_message(
-                    "❌ Erro ao desativar exigir cadastro.",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("🔙 Voltar", callback_data="admin_config")
-                    ]])
-                )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    # Pausa e cancelamento valem ao fim da página de usuários em andamento
+    status = None
+    if action == "pause" and broadcast_engine.pause(job_id):
+        status = 'paused'
+    elif action == "cancel" and job['status'] not in ('done', 'cancelled'):
+        if not broadcast_engine.cancel(job_id):
+            await run_db(update_broadcast_job, job_id, status='cancelled')
+        status = 'cancelled'
+    elif action == "resume" and job['status'] in ('paused', 'failed'):
+        await run_db(
+            update_broadcast_job, job_id,
+            report_chat_id=query.message.chat_id, report_message_id=query.message.message_id
+        )
+        if broadcast_engine.start(context.bot, job_id):
+            status = 'running'
+    
+    job = await run_db(get_broadcast_job, job_id)
+    if status:
+        job['status'] = status
+    await safe_edit_message(
+        query,
+        format_broadcast_progress(job, broadcast_engine.get_progress(job_id)),
+        reply_markup=create_broadcast_control_keyboard(job_id, job['status'])
+    )
+
+@callback_router.route("admin_stats", admin=True)
+async def handle_admin_stats_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Menu de estatísticas"""
+    query = update.callback_query
     
-    elif query.data == "config_welcome":
-        if flow_manager.is_admin(user.id):
-            welcome_enabled = is_welcome_enabled()
-            welcome_data = get_welcome_message()
-            
-            status_text = "✅ **Ativada**" if welcome_enabled else "❌ **Desativada**"
-            media_text = f"🖼️ **Mídia:** {welcome_data['media_type']}" if welcome_data['media_url'] else "🖼️ **Mídia:** Nenhuma"
-            text_preview = welcome_data['text'][:50] + "..." if len(welcome_data['text']) > 50 else welcome_data['text']
-            text_display = f"📝 **Texto:** {text_preview}" if welcome_data['text'] else "📝 **Texto:** Nenhum"
-            
-            await safe_edit_message(
-                f"🎬 **Configuração de Mensagem de Boas-vindas**\n\n"
-                f"**Status:** {status_text}\n"
-                f"{text_display}\n"
-                f"{media_text}\n\n"
-                f"Configure uma mensagem que será enviada antes do cadastro do usuário.",
-                reply_markup=create_config_welcome_keyboard()
-            )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    await safe_edit_message(
+        query,
+        "📊 **Estatísticas e Relatórios**\n\nEscolha o tipo de relatório:",
+        reply_markup=create_stats_keyboard()
+    )
+
+@callback_router.route("reset_welcome_video", admin=True)
+async def handle_reset_welcome_video_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Reseta o envio do vídeo de boas-vindas para todos os usuários"""
+    query = update.callback_query
     
-    elif query.data == "config_welcome_enable":
-        if flow_manager.is_admin(user.id):
-            if set_config_value('welcome_enabled', 'true'):
-                await safe_edit_message(
-                    "✅ **Mensagem de Boas-vindas Ativada!**\n\nA mensagem será enviada antes do cadastro do usuário.",
-                    reply_markup=create_config_welcome_keyboard()
-                )
-            else:
-                await safe_edit_message(
-                    "❌ Erro ao ativar mensagem de boas-vindas.",
-                    reply_markup=create_config_welcome_keyboard()
-                )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    # Resetar controle de vídeo de boas-vindas para todos os usuários
+    affected_rows = await run_db(reset_all_welcome_video_sent)
+    if affected_rows is None:
+        await safe_edit_message(query, "❌ Erro ao resetar controle de vídeo redondo.")
+        return
     
-    elif query.data == "config_welcome_disable":
-        if flow_manager.is_admin(user.id):
-            if set_config_value('welcome_enabled', 'false'):
-                await safe_edit_message(
-                    "❌ **Mensagem de Boas-vindas Desativada!**\n\nA mensagem não será mais enviada.",
-                    reply_markup=create_config_welcome_keyboard()
-                )
-            else:
-                await safe_edit_message(
-                    "❌ Erro ao desativar mensagem de boas-vindas.",
-                    reply_markup=create_config_welcome_keyboard()
-                )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    await safe_edit_message(
+        query,
+        f"✅ **Controle de Vídeo Redondo Resetado!**\n\n"
+        f"Resetado para {affected_rows} usuários.\n\n"
+        f"Agora todos os usuários receberão o vídeo redondo novamente na próxima vez que precisarem de cadastro.",
+        reply_markup=create_admin_keyboard()
+    )
+
+@callback_router.route("stats_general", admin=True)
+async def handle_stats_general_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Estatísticas gerais"""
+    query = update.callback_query
+    
+    stats = await run_db(get_general_stats)
+    if stats:
+        message = "📈 **Estatísticas Gerais**\n\n"
+        message += f"👥 **Usuários:** {stats['total_users']}\n"
+        message += f"✅ **Com dados completos:** {stats['users_with_data']}\n"
+        message += f"📝 **Fluxos:** {stats['total_flows']}\n"
+        message += f"📋 **Etapas:** {stats['total_steps']}\n"
+        message += f"🔘 **Botões:** {stats['total_buttons']}\n\n"
+        
+        if stats['users_by_month']:
+            message += "📅 **Usuários por mês (últimos 6 meses):**\n"
+            for month, count in stats['users_by_month']:
+                message += f"  • {month}: {count} usuários\n"
+        
+        await safe_edit_message(
+            query,
+            message,
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_stats")
+            ]])
+        )
+    else:
+        await safe_edit_message(
+            query,
+            "❌ Erro ao obter estatísticas.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_stats")
+            ]])
+        )
+
+@callback_router.route("stats_full_report", admin=True)
+async def handle_stats_full_report_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Relatório completo"""
+    query = update.callback_query
+    
+    await safe_edit_message(
+        query,
+        "📊 **Gerando Relatório Completo...**\n\nAguarde um momento...",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("⏳ Processando...", callback_data="processing")
+        ]])
+    )
     
-    elif query.data == "config_welcome_text":
-        if flow_manager.is_admin(user.id):
-            context.user_data['configuring_welcome_text'] = True
-            current_text = get_config_value('welcome_text', '')
+    filename = await run_db(generate_excel_report, "full")
+    if filename:
+        with open(filename, 'rb') as file:
             await safe_edit_message(
-                f"📝 **Editar Texto da Mensagem de Boas-vindas**\n\n"
-                f"Texto atual:\n{current_text}\n\n"
-                f"Digite o novo texto da mensagem de boas-vindas:",
+                query,
+                "📊 **Relatório Completo Gerado!**\n\nO arquivo Excel foi criado com sucesso.",
                 reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Cancelar", callback_data="config_welcome")
+                    InlineKeyboardButton("🔙 Voltar", callback_data="admin_stats")
                 ]])
             )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
-    
-    elif query.data == "config_welcome_photo":
-        if flow_manager.is_admin(user.id):
-            context.user_data['configuring_welcome_media'] = True
-            context.user_data['welcome_media_type'] = 'photo'
-            current_media = get_config_value('welcome_media_url', '')
-            current_type = get_config_value('welcome_media_type', '')
-            
-            media_info = f"Tipo: {current_type}\nArquivo: {current_media}" if current_media else "Nenhuma foto configurada"
-            
-            await safe_edit_message(
-                f"🖼️ **Definir Foto da Mensagem de Boas-vindas**\n\n"
-                f"Configuração atual:\n{media_info}\n\n"
-                f"Envie uma foto para usar na mensagem de boas-vindas:",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Cancelar", callback_data="config_welcome")
-                ]])
+            await context.bot.send_document(
+                chat_id=query.from_user.id,
+                document=file,
+                filename=filename,
+                caption="📊 **Relatório Completo do Sistema**\n\nArquivo Excel com todas as estatísticas e dados."
             )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
-    
-    elif query.data == "config_welcome_video":
-        if flow_manager.is_admin(user.id):
-            context.user_data['configuring_welcome_media'] = True
-            context.user_data['welcome_media_type'] = 'video'
-            current_media = get_config_value('welcome_media_url', '')
-            current_type = get_config_value('welcome_media_type', '')
-            
-            media_info = f"Tipo: {current_type}\nArquivo: {current_media}" if current_media else "Nenhum vídeo configurado"
-            
+            # Remover arquivo após envio
+            import os
+            os.remove(filename)
+    else:
+        await safe_edit_message(
+            query,
+            "❌ Erro ao gerar relatório completo.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_stats")
+            ]])
+        )
+
+@callback_router.route("stats_users_report", admin=True)
+async def handle_stats_users_report_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Relatório de usuários"""
+    query = update.callback_query
+    
+    await safe_edit_message(
+        query,
+        "👥 **Gerando Relatório de Usuários...**\n\nAguarde um momento...",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("⏳ Processando...", callback_data="processing")
+        ]])
+    )
+    
+    filename = await run_db(generate_excel_report, "users")
+    if filename:
+        with open(filename, 'rb') as file:
             await safe_edit_message(
-                f"🎬 **Definir Vídeo da Mensagem de Boas-vindas**\n\n"
-                f"Configuração atual:\n{media_info}\n\n"
-                f"Envie um vídeo para usar na mensagem de boas-vindas:",
+                query,
+                "👥 **Relatório de Usuários Gerado!**\n\nO arquivo Excel foi criado com sucesso.",
                 reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Cancelar", callback_data="config_welcome")
+                    InlineKeyboardButton("🔙 Voltar", callback_data="admin_stats")
                 ]])
             )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
-    
-    elif query.data == "config_welcome_video_note":
-        if flow_manager.is_admin(user.id):
-            context.user_data['configuring_welcome_media'] = True
-            context.user_data['welcome_media_type'] = 'video_note'
-            current_media = get_config_value('welcome_media_url', '')
-            current_type = get_config_value('welcome_media_type', '')
-            
-            media_info = f"Tipo: {current_type}\nArquivo: {current_media}" if current_media else "Nenhum vídeo redondo configurado"
-            
+            await context.bot.send_document(
+                chat_id=query.from_user.id,
+                document=file,
+                filename=filename,
+                caption="👥 **Relatório de Usuários**\n\nLista completa de todos os usuários registrados."
+            )
+            # Remover arquivo após envio
+            import os
+            os.remove(filename)
+    else:
+        await safe_edit_message(
+            query,
+            "❌ Erro ao gerar relatório de usuários.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_stats")
+            ]])
+        )
+
+@callback_router.route("stats_flows_report", admin=True)
+async def handle_stats_flows_report_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Relatório de fluxos"""
+    query = update.callback_query
+    
+    await safe_edit_message(
+        query,
+        "📝 **Gerando Relatório de Fluxos...**\n\nAguarde um momento...",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("⏳ Processando...", callback_data="processing")
+        ]])
+    )
+    
+    filename = await run_db(generate_excel_report, "flows")
+    if filename:
+        with open(filename, 'rb') as file:
             await safe_edit_message(
-                f"⭕ **Definir Vídeo Redondo da Mensagem de Boas-vindas**\n\n"
-                f"Configuração atual:\n{media_info}\n\n"
-                f"Envie um vídeo redondo (video note) para usar na mensagem de boas-vindas.\n\n"
-                f"💡 **Dica**: Você pode enviar um vídeo normal e ele será convertido automaticamente para formato redondo.",
+                query,
+                "📝 **Relatório de Fluxos Gerado!**\n\nO arquivo Excel foi criado com sucesso.",
                 reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Cancelar", callback_data="config_welcome")
+                    InlineKeyboardButton("🔙 Voltar", callback_data="admin_stats")
                 ]])
             )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+            await context.bot.send_document(
+                chat_id=query.from_user.id,
+                document=file,
+                filename=filename,
+                caption="📝 **Relatório de Fluxos**\n\nLista completa de todos os fluxos criados."
+            )
+            # Remover arquivo após envio
+            import os
+            os.remove(filename)
+    else:
+        await safe_edit_message(
+            query,
+            "❌ Erro ao gerar relatório de fluxos.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_stats")
+            ]])
+        )
+
+@callback_router.route("config_phone", admin=True)
+async def handle_config_phone_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Configuração da coleta de telefone"""
+    query = update.callback_query
     
-    elif query.data == "config_welcome_remove_media":
-        if flow_manager.is_admin(user.id):
-            if set_config_value('welcome_media_url', '') and set_config_value('welcome_media_type', ''):
-                await safe_edit_message(
-                    "🗑️ **Mídia Removida!**\n\nA mensagem de boas-vindas agora será apenas texto.",
-                    reply_markup=create_config_welcome_keyboard()
-                )
-            else:
-                await safe_edit_message(
-                    "❌ Erro ao remover mídia.",
-                    reply_markup=create_config_welcome_keyboard()
-                )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    status = "✅ Ativada" if await run_db(is_phone_collection_enabled) else "❌ Desativada"
+    await safe_edit_message(
+        query,
+        f"📱 **Coleta de Número**\n\nStatus atual: {status}\n\nEscolha uma opção:",
+        reply_markup=create_config_phone_keyboard()
+    )
+
+@callback_router.route("config_phone_enable", admin=True)
+async def handle_config_phone_enable_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Ativa a coleta de telefone"""
+    query = update.callback_query
+    
+    if await run_db(set_config_value, 'collect_phone', 'true'):
+        await safe_edit_message(
+            query,
+            "✅ **Coleta de Número Ativada!**\n\nAgora o bot irá solicitar o número de telefone dos usuários antes de exibir o fluxo.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_config")
+            ]])
+        )
+    else:
+        await safe_edit_message(
+            query,
+            "❌ Erro ao ativar coleta de número.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_config")
+            ]])
+        )
+
+@callback_router.route("config_phone_disable", admin=True)
+async def handle_config_phone_disable_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Desativa a coleta de telefone"""
+    query = update.callback_query
+    
+    if await run_db(set_config_value, 'collect_phone', 'false'):
+        await safe_edit_message(
+            query,
+            "❌ **Coleta de Número Desativada!**\n\nO bot não irá mais solicitar o número de telefone dos usuários.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_config")
+            ]])
+        )
+    else:
+        await safe_edit_message(
+            query,
+            "❌ Erro ao desativar coleta de número.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_config")
+            ]])
+        )
+
+@callback_router.route("config_email", admin=True)
+async def handle_config_email_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Configuração da coleta de email"""
+    query = update.callback_query
+    
+    status = "✅ Ativada" if await run_db(is_email_collection_enabled) else "❌ Desativada"
+    await safe_edit_message(
+        query,
+        f"📧 **Coleta de Email**\n\nStatus atual: {status}\n\nEscolha uma opção:",
+        reply_markup=create_config_email_keyboard()
+    )
+
+@callback_router.route("config_email_enable", admin=True)
+async def handle_config_email_enable_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Ativa a coleta de email"""
+    query = update.callback_query
+    
+    if await run_db(set_config_value, 'collect_email', 'true'):
+        await safe_edit_message(
+            query,
+            "✅ **Coleta de Email Ativada!**\n\nAgora o bot irá solicitar o email dos usuários antes de exibir o fluxo.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_config")
+            ]])
+        )
+    else:
+        await safe_edit_message(
+            query,
+            "❌ Erro ao ativar coleta de email.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_config")
+            ]])
+        )
+
+@callback_router.route("config_email_disable", admin=True)
+async def handle_config_email_disable_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Desativa a coleta de email"""
+    query = update.callback_query
+    
+    if await run_db(set_config_value, 'collect_email', 'false'):
+        await safe_edit_message(
+            query,
+            "❌ **Coleta de Email Desativada!**\n\nO bot não irá mais solicitar o email dos usuários.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_config")
+            ]])
+        )
+    else:
+        await safe_edit_message(
+            query,
+            "❌ Erro ao desativar coleta de email.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_config")
+            ]])
+        )
+
+@callback_router.route("config_require_signup", admin=True)
+async def handle_config_require_signup_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Configuração do cadastro obrigatório"""
+    query = update.callback_query
+    
+    status = "✅ Ativado" if await run_db(is_signup_required) else "❌ Desativado"
+    await safe_edit_message(
+        query,
+        f"👤 **Exigir Cadastro**\n\nStatus atual: {status}\n\nEscolha uma opção:",
+        reply_markup=create_config_signup_keyboard()
+    )
+
+@callback_router.route("config_webhook", admin=True)
+async def handle_config_webhook_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Configuração do webhook do CRM"""
+    query = update.callback_query
+    
+    webhook_enabled = await run_db(is_webhook_enabled)
+    webhook_url = await run_db(get_webhook_url)
+    
+    status = "✅ Ativado" if webhook_enabled else "❌ Desativado"
+    url_status = f"🔗 {webhook_url}" if webhook_url else "❌ Não definida"
+    
+    message = f"🔗 **Webhook CRM**\n\n"
+    message += f"Status: {status}\n"
+    message += f"URL: {url_status}\n\n"
+    message += "**Eventos ativos:**\n"
+    message += "• Acesso ao bot\n"
+    message += "• Cadastro concluído\n\n"
+    outbox_stats = await run_db(get_outbox_stats)
+    message += f"📬 Fila: {outbox_stats['pending']} pendentes, {outbox_stats['dead']} com falha\n\n"
+    message += "Escolha uma opção:"
+    
+    await safe_edit_message(
+        query,
+        message,
+        reply_markup=await run_db(create_webhook_keyboard)
+    )
+
+@callback_router.route("webhook_enable", admin=True)
+async def handle_webhook_enable_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Ativa o webhook"""
+    query = update.callback_query
+    
+    if await run_db(set_config_value, 'webhook_enabled', 'true'):
+        await safe_edit_message(
+            query,
+            "✅ **Webhook CRM Ativado!**\n\nAgora você precisa definir a URL do webhook.",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("🔗 Definir URL", callback_data="webhook_set_url")],
+                [InlineKeyboardButton("🔙 Voltar", callback_data="config_webhook")]
+            ])
+        )
+    else:
+        await safe_edit_message(
+            query,
+            "❌ Erro ao ativar webhook.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="config_webhook")
+            ]])
+        )
+
+@callback_router.route("webhook_disable", admin=True)
+async def handle_webhook_disable_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Desativa o webhook"""
+    query = update.callback_query
+    
+    if await run_db(set_config_value, 'webhook_enabled', 'false'):
+        await safe_edit_message(
+            query,
+            "❌ **Webhook CRM Desativado!**\n\nO webhook não será mais enviado.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="config_webhook")
+            ]])
+        )
+    else:
+        await safe_edit_message(
+            query,
+            "❌ Erro ao desativar webhook.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="config_webhook")
+            ]])
+        )
+
+@callback_router.route("webhook_retry_dead", admin=True)
+async def handle_webhook_retry_dead_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Reenfileira os webhooks com falha"""
+    query = update.callback_query
+    
+    requeued = await run_db(retry_dead_webhooks)
+    if requeued is not None:
+        webhook_dispatcher.notify()
+        await safe_edit_message(
+            query,
+            f"🔁 **Webhooks Reenfileirados!**\n\n{requeued} evento(s) voltaram para a fila de envio.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="config_webhook")
+            ]])
+        )
+    else:
+        await safe_edit_message(
+            query,
+            "❌ Erro ao reenfileirar webhooks.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="config_webhook")
+            ]])
+        )
+
+@callback_router.route("webhook_set_url", admin=True)
+async def handle_webhook_set_url_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Solicita a URL do webhook"""
+    query = update.callback_query
+    conversation = get_conversation(context)
+    
+    conversation.to(State.WEBHOOK_URL)
+    await safe_edit_message(
+        query,
+        "🔗 **Definir URL do Webhook**\n\nDigite a URL do seu CRM:\n\nExemplo: https://seu-crm.com/webhook",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🔙 Cancelar", callback_data="config_webhook")
+        ]])
+    )
+
+@callback_router.route("webhook_change_url", admin=True)
+async def handle_webhook_change_url_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Solicita a nova URL do webhook"""
+    query = update.callback_query
+    conversation = get_conversation(context)
+    
+    conversation.to(State.WEBHOOK_URL_CHANGE)
+    current_url = await run_db(get_webhook_url)
+    await safe_edit_message(
+        query,
+        f"✏️ **Alterar URL do Webhook**\n\nURL atual: {current_url}\n\nDigite a nova URL:",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🔙 Cancelar", callback_data="config_webhook")
+        ]])
+    )
+
+@callback_router.route("config_signup_enable", admin=True)
+async def handle_config_signup_enable_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Ativa o cadastro obrigatório"""
+    query = update.callback_query
+    
+    if await run_db(set_config_value, 'require_signup', 'true'):
+        await safe_edit_message(
+            query,
+            "✅ **Exigir Cadastro Ativado!**\n\nAgora o bot irá solicitar o cadastro completo dos usuários antes de exibir o fluxo.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_config")
+            ]])
+        )
+    else:
+        await safe_edit_message(
+            query,
+            "❌ Erro ao ativar exigir cadastro.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_config")
+            ]])
+        )
+
+@callback_router.route("config_signup_disable", admin=True)
+async def handle_config_signup_disable_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Desativa o cadastro obrigatório"""
+    query = update.callback_query
+    
+    if await run_db(set_config_value, 'require_signup', 'false'):
+        await safe_edit_message(
+            query,
+            "❌ **Exigir Cadastro Desativado!**\n\nO bot não irá mais exigir cadastro dos usuários.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_config")
+            ]])
+        )
+    else:
+        await safe_edit_message(
+            query,
+            "❌ Erro ao desativar exigir cadastro.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔙 Voltar", callback_data="admin_config")
+            ]])
+        )
+
+@callback_router.route("config_welcome", admin=True)
+async def handle_config_welcome_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Configuração da mensagem de boas-vindas"""
+    query = update.callback_query
+    
+    welcome_enabled = await run_db(is_welcome_enabled)
+    welcome_data = await run_db(get_welcome_message)
+    
+    status_text = "✅ **Ativada**" if welcome_enabled else "❌ **Desativada**"
+    media_text = f"🖼️ **Mídia:** {welcome_data['media_type']}" if welcome_data['media_url'] else "🖼️ **Mídia:** Nenhuma"
+    text_preview = welcome_data['text'][:50] + "..." if len(welcome_data['text']) > 50 else welcome_data['text']
+    text_display = f"📝 **Texto:** {text_preview}" if welcome_data['text'] else "📝 **Texto:** Nenhum"
+    
+    await safe_edit_message(
+        query,
+        f"🎬 **Configuração de Mensagem de Boas-vindas**\n\n"
+        f"**Status:** {status_text}\n"
+        f"{text_display}\n"
+        f"{media_text}\n\n"
+        f"Configure uma mensagem que será enviada antes do cadastro do usuário.",
+        reply_markup=await run_db(create_config_welcome_keyboard)
+    )
+
+@callback_router.route("config_welcome_enable", admin=True)
+async def handle_config_welcome_enable_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Ativa a mensagem de boas-vindas"""
+    query = update.callback_query
+    
+    if await run_db(set_config_value, 'welcome_enabled', 'true'):
+        await safe_edit_message(
+            query,
+            "✅ **Mensagem de Boas-vindas Ativada!**\n\nA mensagem será enviada antes do cadastro do usuário.",
+            reply_markup=await run_db(create_config_welcome_keyboard)
+        )
+    else:
+        await safe_edit_message(
+            query,
+            "❌ Erro ao ativar mensagem de boas-vindas.",
+            reply_markup=await run_db(create_config_welcome_keyboard)
+        )
+
+@callback_router.route("config_welcome_disable", admin=True)
+async def handle_config_welcome_disable_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Desativa a mensagem de boas-vindas"""
+    query = update.callback_query
     
-    elif query.data == "config_welcome_preview":
-        if flow_manager.is_admin(user.id):
-            welcome_data = get_welcome_message()
-            
-            if not welcome_data['text'] and not welcome_data['media_url']:
-                await safe_edit_message(
-                    "⚠️ **Nenhuma Mensagem Configurada**\n\nConfigure um texto ou mídia primeiro.",
-                    reply_markup=create_config_welcome_keyboard()
-                )
-                return
-            
-            try:
-                # Simular envio da mensagem de boas-vindas
-                await send_welcome_message(update, context)
-                
-                await safe_edit_message(
-                    "👁️ **Visualização Enviada!**\n\nA mensagem de boas-vindas foi enviada acima para visualização.",
-                    reply_markup=create_config_welcome_keyboard()
-                )
-            except Exception as e:
-                await safe_edit_message(
-                    f"❌ **Erro na Visualização**\n\nErro: {str(e)}",
-                    reply_markup=create_config_welcome_keyboard()
-                )
-        else:
-            await safe_edit_message("❌ Você não tem permissão de administrador.")
+    if await run_db(set_config_value, 'welcome_enabled', 'false'):
+        await safe_edit_message(
+            query,
+            "❌ **Mensagem de Boas-vindas Desativada!**\n\nA mensagem não será mais enviada.",
+            reply_markup=await run_db(create_config_welcome_keyboard)
+        )
+    else:
+        await safe_edit_message(
+            query,
+            "❌ Erro ao desativar mensagem de boas-vindas.",
+            reply_markup=await run_db(create_config_welcome_keyboard)
+        )
+
+@callback_router.route("config_welcome_text", admin=True)
+async def handle_config_welcome_text_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Solicita o texto de boas-vindas"""
+    query = update.callback_query
+    conversation = get_conversation(context)
+    
+    conversation.to(State.WELCOME_TEXT)
+    current_text = await run_db(get_config_value, 'welcome_text', '')
+    await safe_edit_message(
+        query,
+        f"📝 **Editar Texto da Mensagem de Boas-vindas**\n\n"
+        f"Texto atual:\n{current_text}\n\n"
+        f"Digite o novo texto da mensagem de boas-vindas:",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🔙 Cancelar", callback_data="config_welcome")
+        ]])
+    )
+
+@callback_router.route("config_welcome_photo", admin=True)
+async def handle_config_welcome_photo_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Solicita a foto de boas-vindas"""
+    query = update.callback_query
+    conversation = get_conversation(context)
+    
+    conversation.to(State.WELCOME_MEDIA, media_type='photo', pending_video=None)
+    current_media = await run_db(get_config_value, 'welcome_media_url', '')
+    current_type = await run_db(get_config_value, 'welcome_media_type', '')
+    
+    media_info = f"Tipo: {current_type}\nArquivo: {current_media}" if current_media else "Nenhuma foto configurada"
+    
+    await safe_edit_message(
+        query,
+        f"🖼️ **Definir Foto da Mensagem de Boas-vindas**\n\n"
+        f"Configuração atual:\n{media_info}\n\n"
+        f"Envie uma foto para usar na mensagem de boas-vindas:",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🔙 Cancelar", callback_data="config_welcome")
+        ]])
+    )
+
+@callback_router.route("config_welcome_video", admin=True)
+async def handle_config_welcome_video_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Solicita o vídeo de boas-vindas"""
+    query = update.callback_query
+    conversation = get_conversation(context)
+    
+    conversation.to(State.WELCOME_MEDIA, media_type='video', pending_video=None)
+    current_media = await run_db(get_config_value, 'welcome_media_url', '')
+    current_type = await run_db(get_config_value, 'welcome_media_type', '')
+    
+    media_info = f"Tipo: {current_type}\nArquivo: {current_media}" if current_media else "Nenhum vídeo configurado"
+    
+    await safe_edit_message(
+        query,
+        f"🎬 **Definir Vídeo da Mensagem de Boas-vindas**\n\n"
+        f"Configuração atual:\n{media_info}\n\n"
+        f"Envie um vídeo para usar na mensagem de boas-vindas:",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🔙 Cancelar", callback_data="config_welcome")
+        ]])
+    )
+
+@callback_router.route("config_welcome_video_note", admin=True)
+async def handle_config_welcome_video_note_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Solicita o vídeo redondo de boas-vindas"""
+    query = update.callback_query
+    conversation = get_conversation(context)
+    
+    conversation.to(State.WELCOME_MEDIA, media_type='video_note', pending_video=None)
+    current_media = await run_db(get_config_value, 'welcome_media_url', '')
+    current_type = await run_db(get_config_value, 'welcome_media_type', '')
+    
+    media_info = f"Tipo: {current_type}\nArquivo: {current_media}" if current_media else "Nenhum vídeo redondo configurado"
+    
+    await safe_edit_message(
+        query,
+        f"⭕ **Definir Vídeo Redondo da Mensagem de Boas-vindas**\n\n"
+        f"Configuração atual:\n{media_info}\n\n"
+        f"Envie um vídeo redondo (video note) para usar na mensagem de boas-vindas.\n\n"
+        f"💡 **Dica**: Você pode enviar um vídeo normal e ele será convertido automaticamente para formato redondo.",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🔙 Cancelar", callback_data="config_welcome")
+        ]])
+    )
+
+@callback_router.route("config_welcome_remove_media", admin=True)
+async def handle_config_welcome_remove_media_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Remove a mídia de boas-vindas"""
+    query = update.callback_query
     
-    elif query.data == "share_phone":
-        # Solicitar compartilhamento de telefone via teclado personalizado
-        keyboard = [
-            [KeyboardButton("📱 Compartilhar Telefone", request_contact=True)],
-            [KeyboardButton("🔙 Voltar")]
-        ]
-        reply_markup = ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
-        
-        await query.message.reply_text(
-            "📱 **Compartilhe seu número de telefone:**\n\nToque no botão abaixo para compartilhar automaticamente.",
-            reply_markup=reply_markup
+    if await run_db(set_welcome_media, '', ''):
+        await safe_edit_message(
+            query,
+            "🗑️ **Mídia Removida!**\n\nA mensagem de boas-vindas agora será apenas texto.",
+            reply_markup=await run_db(create_config_welcome_keyboard)
         )
-        context.user_data['waiting_for_contact'] = True
+    else:
+        await safe_edit_message(
+            query,
+            "❌ Erro ao remover mídia.",
+            reply_markup=await run_db(create_config_welcome_keyboard)
+        )
+
+@callback_router.route("config_welcome_preview", admin=True)
+async def handle_config_welcome_preview_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Preview da mensagem de boas-vindas"""
+    query = update.callback_query
     
-    elif query.data == "share_email":
-        # Solicitar email via teclado personalizado
-        keyboard = [
-            [KeyboardButton("📧 Digitar Email")],
-            [KeyboardButton("📱 Compartilhar Telefone", request_contact=True)],
-            [KeyboardButton("🔙 Voltar")]
-        ]
-        reply_markup = ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
-        
-        await query.message.reply_text(
-            "📧 **Digite seu email ou compartilhe seu telefone:**\n\nVocê pode digitar o email ou compartilhar o telefone para continuar.",
-            reply_markup=reply_markup
+    welcome_data = await run_db(get_welcome_message)
+    
+    if not welcome_data['text'] and not welcome_data['media_url']:
+        await safe_edit_message(
+            query,
+            "⚠️ **Nenhuma Mensagem Configurada**\n\nConfigure um texto ou mídia primeiro.",
+            reply_markup=await run_db(create_config_welcome_keyboard)
         )
-        context.user_data['waiting_for_email_or_contact'] = True
+        return
     
-    elif query.data == "type_name":
-        # Solicitar digitação do nome via teclado personalizado
-        keyboard = [
-            [KeyboardButton("🔙 Voltar")]
-        ]
-        reply_markup = ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
+    try:
+        # Simular envio da mensagem de boas-vindas
+        await send_welcome_message(update, context)
         
-        await query.message.reply_text(
-            "👤 **Digite seu nome completo:**",
-            reply_markup=reply_markup
+        await safe_edit_message(
+            query,
+            "👁️ **Visualização Enviada!**\n\nA mensagem de boas-vindas foi enviada acima para visualização.",
+            reply_markup=await run_db(create_config_welcome_keyboard)
+        )
+    except Exception as e:
+        await safe_edit_message(
+            query,
+            f"❌ **Erro na Visualização**\n\nErro: {str(e)}",
+            reply_markup=await run_db(create_config_welcome_keyboard)
         )
-        context.user_data['waiting_for_name'] = True
+
+@callback_router.route("share_phone")
+async def handle_share_phone_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Solicita o compartilhamento do telefone"""
+    query = update.callback_query
+    conversation = get_conversation(context)
+    
+    # Solicitar compartilhamento de telefone via teclado personalizado
+    keyboard = [
+        [KeyboardButton("📱 Compartilhar Telefone", request_contact=True)],
+        [KeyboardButton("🔙 Voltar")]
+    ]
+    reply_markup = ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
+    
+    await query.message.reply_text(
+        "📱 **Compartilhe seu número de telefone:**\n\nToque no botão abaixo para compartilhar automaticamente.",
+        reply_markup=reply_markup
+    )
+    conversation.to(State.SIGNUP_PHONE)
+
+@callback_router.route("share_email")
+async def handle_share_email_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Solicita a digitação do email"""
+    query = update.callback_query
+    conversation = get_conversation(context)
+    
+    # Solicitar email via teclado personalizado
+    keyboard = [
+        [KeyboardButton("📧 Digitar Email")],
+        [KeyboardButton("📱 Compartilhar Telefone", request_contact=True)],
+        [KeyboardButton("🔙 Voltar")]
+    ]
+    reply_markup = ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
+    
+    await query.message.reply_text(
+        "📧 **Digite seu email ou compartilhe seu telefone:**\n\nVocê pode digitar o email ou compartilhar o telefone para continuar.",
+        reply_markup=reply_markup
+    )
+    conversation.to(State.SIGNUP_EMAIL_OR_CONTACT)
+
+@callback_router.route("type_name")
+async def handle_type_name_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Solicita a digitação do nome"""
+    query = update.callback_query
+    conversation = get_conversation(context)
     
-    elif query.data == "back_to_data_collection":
-        # Voltar para a tela inicial de coleta de dados
-        if 'missing_data' in context.user_data:
-            missing_data = context.user_data['missing_data']
-            await request_missing_data(update, context, missing_data)
-        else:
-            await update.effective_message.reply_text("❌ Erro na coleta de dados.")
+    # Solicitar digitação do nome via teclado personalizado
+    keyboard = [
+        [KeyboardButton("🔙 Voltar")]
+    ]
+    reply_markup = ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
     
+    await query.message.reply_text(
+        "👤 **Digite seu nome completo:**",
+        reply_markup=reply_markup
+    )
+    conversation.to(State.SIGNUP_NAME)
 
+@callback_router.route("back_to_data_collection")
+async def handle_back_to_data_collection_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Volta para a tela inicial da coleta de dados"""
+    conversation = get_conversation(context)
+    # Voltar para a tela inicial de coleta de dados
+    if conversation.missing_data is not None:
+        missing_data = conversation.missing_data
+        await request_missing_data(update, context, missing_data)
+    else:
+        await update.effective_message.reply_text("❌ Erro na coleta de dados.")
+
+@callback_router.route("start_data_collection")
+async def handle_start_data_collection_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Inicia a coleta de dados"""
+    query = update.callback_query
+    conversation = get_conversation(context)
     
-    elif query.data == "start_data_collection":
-        # Iniciar coleta de dados (mantido para compatibilidade)
-        if 'missing_data' in context.user_data and 'current_data_index' in context.user_data:
-            missing_data = context.user_data['missing_data']
-            current_index = context.user_data['current_data_index']
+    # Iniciar coleta de dados (mantido para compatibilidade)
+    if conversation.missing_data is not None:
+        pending = [data_type for data_type in conversation.missing_data if not conversation.collected(data_type)]
+        
+        if pending:
+            data_type = pending[0]
             
-            if current_index < len(missing_data):
-                data_type = missing_data[current_index]
-                
-                if data_type == "nome":
-                    await safe_edit_message(
-                        "👤 **Digite seu nome completo:**",
-                        reply_markup=InlineKeyboardMarkup([[
-                            InlineKeyboardButton("🔙 Cancelar", callback_data="cancel_data_collection")
-                        ]])
-                    )
-                    context.user_data['waiting_for_name'] = True
-                elif data_type == "telefone":
-                    await safe_edit_message(
-                        "📱 **Digite seu número de telefone:**\n\nFormato: (11) 99999-9999",
-                        reply_markup=InlineKeyboardMarkup([[
-                            InlineKeyboardButton("🔙 Cancelar", callback_data="cancel_data_collection")
-                        ]])
-                    )
-                    context.user_data['waiting_for_phone'] = True
-                elif data_type == "email":
-                    await safe_edit_message(
-                        "📧 **Digite seu email:**\n\nExemplo: usuario@exemplo.com",
-                        reply_markup=InlineKeyboardMarkup([[
-                            InlineKeyboardButton("🔙 Cancelar", callback_data="cancel_data_collection")
-                        ]])
-                    )
-                    context.user_data['waiting_for_email'] = True
-            else:
-                # Todos os dados foram coletados
-                await finish_data_collection(query, context)
+            if data_type == "nome":
+                await safe_edit_message(
+                    query,
+                    "👤 **Digite seu nome completo:**",
+                    reply_markup=InlineKeyboardMarkup([[
+                        InlineKeyboardButton("🔙 Cancelar", callback_data="cancel_data_collection")
+                    ]])
+                )
+                conversation.to(State.SIGNUP_NAME)
+            elif data_type == "telefone":
+                await safe_edit_message(
+                    query,
+                    "📱 **Digite seu número de telefone:**\n\nFormato: (11) 99999-9999",
+                    reply_markup=InlineKeyboardMarkup([[
+                        InlineKeyboardButton("🔙 Cancelar", callback_data="cancel_data_collection")
+                    ]])
+                )
+                conversation.to(State.SIGNUP_PHONE)
+            elif data_type == "email":
+                await safe_edit_message(
+                    query,
+                    "📧 **Digite seu email:**\n\nExemplo: usuario@exemplo.com",
+                    reply_markup=InlineKeyboardMarkup([[
+                        InlineKeyboardButton("🔙 Cancelar", callback_data="cancel_data_collection")
+                    ]])
+                )
+                conversation.to(State.SIGNUP_EMAIL)
         else:
-            await query.message.reply_text("❌ Erro na coleta de dados.")
+            # Todos os dados foram coletados
+            await finish_data_collection(query, context)
+    else:
+        await query.message.reply_text("❌ Erro na coleta de dados.")
+
+@callback_router.route("cancel_data_collection")
+async def handle_cancel_data_collection_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Cancela a coleta de dados"""
+    query = update.callback_query
+    conversation = get_conversation(context)
+    
+    # Cancelar coleta de dados
+    conversation.reset()
+    await query.message.reply_text(
+        "❌ **Coleta de Dados Cancelada**\n\nVocê pode tentar novamente enviando /start",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🔄 Tentar Novamente", callback_data="restart_data_collection")
+        ]])
+    )
+
+@callback_router.route("restart_data_collection")
+async def handle_restart_data_collection_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Reinicia a coleta de dados"""
+    query = update.callback_query
     
-    elif query.data == "cancel_data_collection":
-        # Cancelar coleta de dados
-        context.user_data.clear()
-        await query.message.reply_text(
-            "❌ **Coleta de Dados Cancelada**\n\nVocê pode tentar novamente enviando /start",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("🔄 Tentar Novamente", callback_data="restart_data_collection")
-            ]])
-        )
+    # Reiniciar coleta de dados
+    user = update.effective_user
     
-    elif query.data == "restart_data_collection":
-        # Reiniciar coleta de dados
-        user = update.effective_user
-        
-        # Verificar configurações novamente
-        require_signup = is_signup_required()
-        collect_phone = is_phone_collection_enabled()
-        collect_email = is_email_collection_enabled()
-        
-        user_data = get_user_data(user.id)
-        
-        missing_data = []
-        if require_signup and not user_data.get('name'):
-            missing_data.append("nome")
-        if collect_phone and not user_data.get('phone'):
-            missing_data.append("telefone")
-        if collect_email and not user_data.get('email'):
-            missing_data.append("email")
-        
-        if missing_data:
-            context.user_data['collecting_data'] = True
-            context.user_data['missing_data'] = missing_data
-            context.user_data['current_data_index'] = 0
-            
-            await request_missing_data(update, context, missing_data)
-        else:
-            await query.message.reply_text("✅ Todos os dados já foram fornecidos!")
+    # Verificar configurações novamente
+    require_signup = await run_db(is_signup_required)
+    collect_phone = await run_db(is_phone_collection_enabled)
+    collect_email = await run_db(is_email_collection_enabled)
     
+    user_data = await run_db(get_user_data, user.id)
+    
+    missing_data = []
+    if require_signup and not user_data.get('name'):
+        missing_data.append("nome")
+    if collect_phone and not user_data.get('phone'):
+        missing_data.append("telefone")
+    if collect_email and not user_data.get('email'):
+        missing_data.append("email")
+    
+    if missing_data:
+        await request_missing_data(update, context, missing_data)
+    else:
+        await query.message.reply_text("✅ Todos os dados já foram fornecidos!")
 
+@callback_router.route("start_flow")
+async def handle_start_flow_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, payload):
+    """Executa o fluxo padrão"""
+    query = update.callback_query
+    flow_manager = AsyncFlowManager()
     
-    elif query.data == "start_flow":
-        # Executar fluxo padrão
-        flows = flow_manager.get_active_flows()
-        if flows:
-            default_flow = flows[0]  # Primeiro fluxo ativo
-            await execute_flow(query, default_flow['id'])
-        else:
-            await query.message.reply_text("❌ Nenhum fluxo configurado.")
+    # Executar fluxo padrão
+    flows = await flow_manager.get_active_flows()
+    if flows:
+        default_flow = flows[0]  # Primeiro fluxo ativo
+        await execute_flow(query, default_flow['id'])
+    else:
+        await query.message.reply_text("❌ Nenhum fluxo configurado.")
 
 async def execute_flow(query, flow_id):
     """Executa um fluxo específico"""
-    flow_manager = FlowManager()
-    steps = flow_manager.get_flow_steps(flow_id)
+    plan = await run_db(get_flow_plan, flow_id)
+    steps = plan.steps if plan else ()
     
     if not steps:
         await query.message.reply_text("❌ Fluxo vazio ou não encontrado.")
@@ -3780,16 +3521,8 @@ async def execute_complete_flow(update, steps):
         try:
             print(f"🔍 DEBUG: Step {i+1}/{len(steps)} - Tipo: {step.get('step_type')} - ID: {step.get('id')}")
             
-            # Pré-processamento comum para todos os steps com botões
-            buttons = []
-            if step.get('buttons'):
-                for button in step['buttons']:
-                    if button['button_type'] == 'url':
-                        buttons.append([InlineKeyboardButton(button['button_text'], url=button['button_data'])])
-                    else:
-                        buttons.append([InlineKeyboardButton(button['button_text'], callback_data=button['button_data'])])
-            
-            keyboard = InlineKeyboardMarkup(buttons) if buttons else None
+            # Teclado já vem pré-montado no FlowPlan
+            keyboard = step['keyboard'] if 'keyboard' in step else build_step_keyboard(step.get('buttons'))
 
             if step['step_type'] == 'text':
                 await update.message.reply_text(step['content'], reply_markup=keyboard)
@@ -3815,398 +3548,7 @@ async def execute_complete_flow(update, steps):
                 )
 
             elif step['step_type'] == 'video_note':
-                print(f"🔍 DEBUG: Tentando enviar video_note")
-                
-                if step.get('file_id'):
-                    try:
-                        print(f"🔍 DEBUG: Enviando video_note via file_id")
-                        # Para vídeos redondos, usar reply_video_note
-                        print(f"🔍 DEBUG: Enviando como reply_video_note")
-                        await update.message.reply_video_note(
-                            video_note=step['file_id']
-                        )
-                        
-                        # Enviar texto separadamente (video notes não suportam caption)
-                        if step.get('content'):
-                            await update.message.reply_text(
-                                step.get('content', ''),
-                                reply_markup=keyboard
-                            )
-                    except Exception as e:
-                        print(f"🔍 DEBUG: Erro no video_note (file_id): {e}")
-                        await handle_video_note_fallback(update, step, keyboard)
-                
-                elif step.get('media_url'):
-                    try:
-                        print(f"🔍 DEBUG: Enviando video_note via media_url")
-                        
-                        if step['media_url'].startswith('uploads/') or step['media_url'].startswith('uploads\\'):
-                            print(f"🔍 DEBUG: Usando arquivo local: {step['media_url']}")
-                            with open(step['media_url'], 'rb') as f:
-                                file_data = f.read()
-                            print(f"🔍 DEBUG: Arquivo lido, tamanho: {len(file_data)} bytes")
-                            
-                            # Validar requisitos antes de enviar
-                            print(f"🔍 DEBUG: Validando requisitos do video note antes do envio...")
-                            is_valid, validation_message = await validate_video_note_requirements(file_data)
-                            
-                            if not is_valid:
-                                print(f"🔍 DEBUG: Video note inválido: {validation_message}")
-                                
-                                # Tentar conversão automática
-                                print(f"🔧 DEBUG: Tentando conversão automática...")
-                                conversion_success, converted_data, conversion_message = await convert_video_to_video_note(file_data)
-                                
-                                if conversion_success:
-                                    print(f"🔧 DEBUG: Conversão bem-sucedida: {conversion_message}")
-                                    
-                                    # Substituir o arquivo original pelo convertido
-                                    try:
-                                        print(f"🔧 DEBUG: Substituindo arquivo original pelo convertido...")
-                                        
-                                        # Salvar vídeo convertido no lugar do original
-                                        if step['media_url'].startswith('uploads/') or step['media_url'].startswith('uploads\\'):
-                                            # Para arquivos locais, substituir diretamente
-                                            with open(step['media_url'], 'wb') as f:
-                                                f.write(converted_data)
-                                            
-                                            print(f"🔧 DEBUG: ✅ Arquivo original substituído: {step['media_url']}")
-                                            
-                                            # Atualizar o banco de dados para marcar como convertido
-                                            from flow_manager import update_step_media_url
-                                            update_step_media_url(step['id'], step['media_url'])
-                                            
-                                        else:
-                                            # Para URLs remotas, salvar localmente
-                                            temp_filename = f"converted_{int(asyncio.get_event_loop().time())}.mp4"
-                                            temp_path = UPLOADS_DIR / "video_note" / temp_filename
-                                            temp_path.parent.mkdir(exist_ok=True)
-                                            
-                                            with open(temp_path, 'wb') as f:
-                                                f.write(converted_data)
-                                            
-                                            # Atualizar o banco de dados com o novo caminho
-                                            from flow_manager import update_step_media_url
-                                            update_step_media_url(step['id'], str(temp_path))
-                                            
-                                            print(f"🔧 DEBUG: ✅ Arquivo convertido salvo: {temp_path}")
-                                        
-                                    except Exception as e:
-                                        print(f"🔧 DEBUG: ⚠️ Erro ao substituir arquivo: {e}")
-                                    
-                                    # Enviar vídeo convertido com retry
-                                    max_retries = 3
-                                    for attempt in range(max_retries):
-                                        try:
-                                            print(f"🔧 DEBUG: Tentativa {attempt + 1}/{max_retries} de envio")
-                                            
-                                            # Enviar vídeo convertido como video_note com timeout
-                                            await asyncio.wait_for(
-                                                update.message.reply_video_note(
-                                                    video_note=converted_data
-                                                ),
-                                                timeout=30.0  # 30 segundos de timeout
-                                            )
-                                            
-                                            # Enviar texto separadamente (video notes não suportam caption)
-                                            if step.get('content'):
-                                                await update.message.reply_text(
-                                                    step.get('content', ''),
-                                                    reply_markup=keyboard
-                                                )
-                                            
-                                            print(f"🔧 DEBUG: ✅ Envio bem-sucedido na tentativa {attempt + 1}")
-                                            break
-                                            
-                                        except asyncio.TimeoutError:
-                                            print(f"🔧 DEBUG: ⏰ Timeout na tentativa {attempt + 1}")
-                                            if attempt == max_retries - 1:
-                                                await update.message.reply_text(
-                                                    f"⚠️ **Timeout no Envio**\n\n"
-                                                    "O vídeo foi convertido com sucesso, mas houve timeout no envio.\n"
-                                                    "Tente novamente em alguns segundos.",
-                                                    reply_markup=keyboard
-                                                )
-                                            else:
-                                                await asyncio.sleep(2)  # Aguardar 2 segundos antes da próxima tentativa
-                                                
-                                        except Exception as e:
-                                            print(f"🔧 DEBUG: ❌ Erro na tentativa {attempt + 1}: {e}")
-                                            if attempt == max_retries - 1:
-                                                await update.message.reply_text(
-                                                    f"❌ **Erro no Envio**\n\n"
-                                                    "O vídeo foi convertido, mas houve erro no envio.\n"
-                                                    "Tente novamente.",
-                                                    reply_markup=keyboard
-                                                )
-                                            else:
-                                                await asyncio.sleep(2)
-                                else:
-                                    print(f"🔧 DEBUG: Conversão falhou: {conversion_message}")
-                                    await update.message.reply_text(
-                                        f"❌ **Erro ao enviar video note**\n\n{validation_message}\n\n"
-                                        "Tentativa de conversão automática falhou.\n"
-                                        "O vídeo não atende aos requisitos do Telegram.",
-                                        reply_markup=keyboard
-                                    )
-                                return
-                            
-                            print(f"🔍 DEBUG: {validation_message}")
-                            
-                            # Para vídeos redondos, usar reply_video_note
-                            print(f"🔍 DEBUG: Enviando como reply_video_note")
-                            await update.message.reply_video_note(
-                                video_note=file_data
-                            )
-                            
-                            # Enviar texto separadamente (video notes não suportam caption)
-                            if step.get('content'):
-                                await update.message.reply_text(
-                                    step.get('content', ''),
-                                    reply_markup=keyboard
-                                )
-                        else:
-                            # Verificar se é um arquivo local (mesmo que não comece com 'uploads/')
-                            if not step['media_url'].startswith(('http://', 'https://', 'ftp://')):
-                                print(f"🔍 DEBUG: Usando arquivo local: {step['media_url']}")
-                                try:
-                                    # Tentar abrir como arquivo local
-                                    with open(step['media_url'], 'rb') as f:
-                                        file_data = f.read()
-                                    print(f"🔍 DEBUG: Arquivo local lido, tamanho: {len(file_data)} bytes")
-                                    
-                                    # Validar requisitos antes de enviar
-                                    print(f"🔍 DEBUG: Validando requisitos do video note antes do envio...")
-                                    is_valid, validation_message = await validate_video_note_requirements(file_data)
-                                    
-                                    if not is_valid:
-                                        print(f"🔍 DEBUG: Video note inválido: {validation_message}")
-                                        
-                                        # Tentar conversão automática
-                                        print(f"🔧 DEBUG: Tentando conversão automática...")
-                                        conversion_success, converted_data, conversion_message = await convert_video_to_video_note(file_data)
-                                        
-                                        if conversion_success:
-                                            print(f"🔧 DEBUG: Conversão bem-sucedida: {conversion_message}")
-                                            
-                                            # Substituir o arquivo original pelo convertido
-                                            try:
-                                                print(f"🔧 DEBUG: Substituindo arquivo original pelo convertido...")
-                                                
-                                                # Salvar vídeo convertido no lugar do original
-                                                with open(step['media_url'], 'wb') as f:
-                                                    f.write(converted_data)
-                                                
-                                                print(f"🔧 DEBUG: ✅ Arquivo original substituído: {step['media_url']}")
-                                                
-                                                # Atualizar o banco de dados para marcar como convertido
-                                                from flow_manager import update_step_media_url
-                                                update_step_media_url(step['id'], step['media_url'])
-                                                
-                                            except Exception as e:
-                                                print(f"🔧 DEBUG: ⚠️ Erro ao substituir arquivo: {e}")
-                                            
-                                            # Enviar vídeo convertido com retry
-                                            max_retries = 3
-                                            for attempt in range(max_retries):
-                                                try:
-                                                    print(f"🔧 DEBUG: Tentativa {attempt + 1}/{max_retries} de envio")
-                                                    
-                                                    # Enviar vídeo convertido como video_note com timeout
-                                                    await asyncio.wait_for(
-                                                        update.message.reply_video_note(
-                                                            video_note=converted_data
-                                                        ),
-                                                        timeout=30.0  # 30 segundos de timeout
-                                                    )
-                                                    
-                                                    # Enviar texto separadamente (video notes não suportam caption)
-                                                    if step.get('content'):
-                                                        await update.message.reply_text(
-                                                            step.get('content', ''),
-                                                            reply_markup=keyboard
-                                                        )
-                                                    
-                                                    
-                                                    print(f"🔧 DEBUG: ✅ Envio bem-sucedido na tentativa {attempt + 1}")
-                                                    break
-                                                    
-                                                except asyncio.TimeoutError:
-                                                    print(f"🔧 DEBUG: ⏰ Timeout na tentativa {attempt + 1}")
-                                                    if attempt == max_retries - 1:
-                                                        await update.message.reply_text(
-                                                            f"⚠️ **Timeout no Envio**\n\n"
-                                                            "O vídeo foi convertido com sucesso, mas houve timeout no envio.\n"
-                                                            "Tente novamente em alguns segundos.",
-                                                            reply_markup=keyboard
-                                                        )
-                                                    else:
-                                                        await asyncio.sleep(2)  # Aguardar 2 segundos antes da próxima tentativa
-                                                        
-                                                except Exception as e:
-                                                    print(f"🔧 DEBUG: ❌ Erro na tentativa {attempt + 1}: {e}")
-                                                    if attempt == max_retries - 1:
-                                                        await update.message.reply_text(
-                                                            f"❌ **Erro no Envio**\n\n"
-                                                            "O vídeo foi convertido, mas houve erro no envio.\n"
-                                                            "Tente novamente.",
-                                                            reply_markup=keyboard
-                                                        )
-                                                    else:
-                                                        await asyncio.sleep(2)
-                                        else:
-                                            print(f"🔧 DEBUG: Conversão falhou: {conversion_message}")
-                                            await update.message.reply_text(
-                                                f"❌ **Erro ao enviar video note**\n\n{validation_message}\n\n"
-                                                "Tentativa de conversão automática falhou.\n"
-                                                "O vídeo não atende aos requisitos do Telegram.",
-                                                reply_markup=keyboard
-                                            )
-                                        return
-                                    
-                                    print(f"🔍 DEBUG: {validation_message}")
-                                    
-                                    # Para vídeos redondos, usar reply_video_note
-                                    print(f"🔍 DEBUG: Enviando como reply_video_note")
-                                    await update.message.reply_video_note(
-                                        video_note=file_data
-                                    )
-                                    
-                                    # Enviar texto separadamente (video notes não suportam caption)
-                                    if step.get('content'):
-                                        await update.message.reply_text(
-                                            step.get('content', ''),
-                                            reply_markup=keyboard
-                                        )
-                                        
-                                except FileNotFoundError:
-                                    print(f"🔍 DEBUG: Arquivo local não encontrado: {step['media_url']}")
-                                    await handle_video_note_fallback(update, step, keyboard)
-                                except Exception as e:
-                                    print(f"🔍 DEBUG: Erro ao ler arquivo local: {e}")
-                                    await handle_video_note_fallback(update, step, keyboard)
-                            else:
-                                print(f"🔍 DEBUG: Usando URL remota: {step['media_url']}")
-                                async with aiohttp.ClientSession() as session:
-                                    async with session.get(step['media_url']) as response:
-                                        if response.status == 200:
-                                                                                    file_data = await response.read()
-                                        print(f"🔍 DEBUG: Arquivo baixado, tamanho: {len(file_data)} bytes")
-                                        
-                                        # Validar requisitos antes de enviar
-                                        print(f"🔍 DEBUG: Validando requisitos do video note antes do envio...")
-                                        is_valid, validation_message = await validate_video_note_requirements(file_data)
-                                        
-                                        if not is_valid:
-                                            print(f"🔍 DEBUG: Video note inválido: {validation_message}")
-                                            
-                                            # Tentar conversão automática
-                                            print(f"🔧 DEBUG: Tentando conversão automática (URL)...")
-                                            conversion_success, converted_data, conversion_message = await convert_video_to_video_note(file_data)
-                                            
-                                            if conversion_success:
-                                                print(f"🔧 DEBUG: Conversão bem-sucedida (URL): {conversion_message}")
-                                                
-                                                # Substituir o arquivo original pelo convertido
-                                                try:
-                                                    print(f"🔧 DEBUG: Substituindo arquivo original pelo convertido (URL)...")
-                                                    
-                                                    # Para URLs remotas, salvar localmente
-                                                    temp_filename = f"converted_{int(asyncio.get_event_loop().time())}.mp4"
-                                                    temp_path = UPLOADS_DIR / "video_note" / temp_filename
-                                                    temp_path.parent.mkdir(exist_ok=True)
-                                                    
-                                                    with open(temp_path, 'wb') as f:
-                                                        f.write(converted_data)
-                                                    
-                                                    # Atualizar o banco de dados com o novo caminho
-                                                    from flow_manager import update_step_media_url
-                                                    update_step_media_url(step['id'], str(temp_path))
-                                                    
-                                                    print(f"🔧 DEBUG: ✅ Arquivo convertido salvo: {temp_path}")
-                                                    
-                                                except Exception as e:
-                                                    print(f"🔧 DEBUG: ⚠️ Erro ao substituir arquivo (URL): {e}")
-                                                
-                                                # Enviar vídeo convertido com retry
-                                                max_retries = 3
-                                                for attempt in range(max_retries):
-                                                    try:
-                                                        print(f"🔧 DEBUG: Tentativa {attempt + 1}/{max_retries} de envio (URL)")
-                                                        
-                                                        # Enviar vídeo convertido como video_note com timeout
-                                                        await asyncio.wait_for(
-                                                            update.message.reply_video_note(
-                                                                video_note=converted_data
-                                                            ),
-                                                            timeout=30.0  # 30 segundos de timeout
-                                                        )
-                                                        
-                                                        # Enviar texto separadamente (video notes não suportam caption)
-                                                        if step.get('content'):
-                                                            await update.message.reply_text(
-                                                                step.get('content', ''),
-                                                                reply_markup=keyboard
-                                                            )
-                                                        
-                                                        
-                                                        print(f"🔧 DEBUG: ✅ Envio bem-sucedido na tentativa {attempt + 1} (URL)")
-                                                        break
-                                                        
-                                                    except asyncio.TimeoutError:
-                                                        print(f"🔧 DEBUG: ⏰ Timeout na tentativa {attempt + 1} (URL)")
-                                                        if attempt == max_retries - 1:
-                                                            await update.message.reply_text(
-                                                                f"⚠️ **Timeout no Envio**\n\n"
-                                                                "O vídeo foi convertido com sucesso, mas houve timeout no envio.\n"
-                                                                "Tente novamente em alguns segundos.",
-                                                                reply_markup=keyboard
-                                                            )
-                                                        else:
-                                                            await asyncio.sleep(2)  # Aguardar 2 segundos antes da próxima tentativa
-                                                            
-                                                    except Exception as e:
-                                                        print(f"🔧 DEBUG: ❌ Erro na tentativa {attempt + 1} (URL): {e}")
-                                                        if attempt == max_retries - 1:
-                                                            await update.message.reply_text(
-                                                                f"❌ **Erro no Envio**\n\n"
-                                                                "O vídeo foi convertido, mas houve erro no envio.\n"
-                                                                "Tente novamente.",
-                                                                reply_markup=keyboard
-                                                            )
-                                                        else:
-                                                            await asyncio.sleep(2)
-                                            else:
-                                                print(f"🔧 DEBUG: Conversão falhou (URL): {conversion_message}")
-                                                await update.message.reply_text(
-                                                    f"❌ **Erro ao enviar video note**\n\n{validation_message}\n\n"
-                                                    "Tentativa de conversão automática falhou.\n"
-                                                    "O vídeo não atende aos requisitos do Telegram.",
-                                                    reply_markup=keyboard
-                                                )
-                                            return
-                                        
-                                        print(f"🔍 DEBUG: {validation_message}")
-                                        
-                                        # Para vídeos redondos, usar reply_video_note
-                                        print(f"🔍 DEBUG: Enviando como reply_video_note")
-                                        await update.message.reply_video_note(
-                                            video_note=file_data
-                                        )
-                                        
-                                        # Enviar texto separadamente (video notes não suportam caption)
-                                        if step.get('content'):
-                                            await update.message.reply_text(
-                                                step.get('content', ''),
-                                                reply_markup=keyboard
-                                            )
-#                                     else:
-                                        raise Exception(f"HTTP {response.status}")
-                    except Exception as e:
-                        print(f"🔍 DEBUG: Erro no video_note (media_url): {e}")
-                        await handle_video_note_fallback(update, step, keyboard)
-                else:
-                    await handle_fallback(update, step, keyboard)
+                await handle_video_note_send(update, step, keyboard)
 
             elif step['step_type'] == 'button':
                 await update.message.reply_text(
@@ -4214,13 +3556,18 @@ async def execute_complete_flow(update, steps):
                     reply_markup=keyboard
                 )
 
-            # Pequena pausa entre as mensagens
-            await asyncio.sleep(0.5)
-            
         except Exception as e:
             print(f"Erro ao executar etapa {i+1}: {e}")
             continue
 
+async def remember_step_file_id(step, message):
+    """Guarda o file_id retornado pelo Telegram no primeiro envio da mídia da etapa"""
+    if step.get('file_id') or not step.get('id'):
+        return
+    file_id = extract_file_id(message)
+    if file_id:
+        await run_db(update_step_file_id, step['id'], file_id)
+
 async def handle_media_send(update, step, keyboard, media_type, method):
     """Manipula o envio de mídia genérica"""
     print(f"🔍 DEBUG: handle_media_send - Tipo: {media_type}")
@@ -4244,15 +3591,17 @@ async def handle_media_send(update, step, keyboard, media_type, method):
             if step['media_url'].startswith('uploads/') or step['media_url'].startswith('uploads\\'):
                 print(f"🔍 DEBUG: Usando arquivo local: {step['media_url']}")
                 try:
-                    with open(step['media_url'], 'rb') as f:
-                        file_data = f.read()
-                    print(f"🔍 DEBUG: Arquivo lido, tamanho: {len(file_data)} bytes")
-                    
-                    await method(
-                        **{media_type: file_data},
-                        caption=step.get('content', ''),
-                        reply_markup=keyboard
+                    # Um único upload por arquivo; os demais envios usam o file_id
+                    message = await local_media_sender.send(
+                        step['media_url'],
+                        media_type,
+                        lambda media: method(
+                            **{media_type: media},
+                            caption=step.get('content', ''),
+                            reply_markup=keyboard
+                        )
                     )
+                    await remember_step_file_id(step, message)
                     print(f"🔍 DEBUG: ✅ Envio de arquivo local bem-sucedido")
                 except FileNotFoundError:
                     print(f"🔍 DEBUG: ❌ Arquivo não encontrado: {step['media_url']}")
@@ -4268,11 +3617,12 @@ async def handle_media_send(update, step, keyboard, media_type, method):
                             file_data = await response.read()
                             print(f"🔍 DEBUG: Arquivo baixado, tamanho: {len(file_data)} bytes")
                             
-                            await method(
+                            message = await method(
                                 **{media_type: file_data},
                                 caption=step.get('content', ''),
                                 reply_markup=keyboard
                             )
+                            await remember_step_file_id(step, message)
                             print(f"🔍 DEBUG: ✅ Envio de URL remota bem-sucedido")
                         else:
                             print(f"🔍 DEBUG: ❌ HTTP {response.status} para URL: {step['media_url']}")
@@ -4284,6 +3634,51 @@ async def handle_media_send(update, step, keyboard, media_type, method):
         print(f"🔍 DEBUG: ❌ Erro ao enviar {media_type}: {e}")
         await handle_fallback(update, step, keyboard)
 
+async def handle_video_note_send(update, step, keyboard):
+    """
+    Envia o video note de uma etapa. A mídia já foi validada e convertida no
+    upload (normalize_video_note_upload), então aqui só há consulta: file_id
+    do Telegram, ou o arquivo salvo com a duração registrada em media_metadata.
+    """
+    media_url = step.get('media_url')
+    if not step.get('file_id') and not media_url:
+        await handle_fallback(update, step, keyboard)
+        return
+    
+    extra = {'length': VIDEO_NOTE_SIZE}
+    if step.get('media_duration'):
+        extra['duration'] = int(step['media_duration'])
+    
+    try:
+        if step.get('file_id'):
+            print(f"🔍 DEBUG: Enviando video_note via file_id")
+            message = await update.message.reply_video_note(video_note=step['file_id'])
+        elif media_url.startswith(('http://', 'https://')):
+            # O Telegram não aceita video note por URL: baixar e enviar os bytes
+            print(f"🔍 DEBUG: Usando URL remota: {media_url}")
+            async with aiohttp.ClientSession() as session:
+                async with session.get(media_url) as response:
+                    if response.status != 200:
+                        raise Exception(f"HTTP {response.status}")
+                    file_data = await response.read()
+            message = await update.message.reply_video_note(video_note=file_data, **extra)
+        else:
+            if not step.get('media_ready'):
+                print(f"🔍 DEBUG: video_note sem metadados (upload antigo), enviando como está: {media_url}")
+            message = await local_media_sender.send(
+                media_url, 'video_note',
+                lambda media: update.message.reply_video_note(video_note=media, **extra)
+            )
+        await remember_step_file_id(step, message)
+    except Exception as e:
+        print(f"🔍 DEBUG: Erro no video_note: {e}")
+        await handle_video_note_fallback(update, step, keyboard)
+        return
+    
+    # Enviar texto separadamente (video notes não suportam caption)
+    if step.get('content'):
+        await update.message.reply_text(step['content'], reply_markup=keyboard)
+
 async def handle_fallback(update, step, keyboard):
     """Fallback genérico quando o envio de mídia falha"""
     await update.message.reply_text(
@@ -4296,14 +3691,16 @@ async def handle_video_note_fallback(update, step, keyboard):
     try:
         if step.get('media_url'):
             if step['media_url'].startswith('uploads/') or step['media_url'].startswith('uploads\\'):
-                with open(step['media_url'], 'rb') as f:
-                    await update.message.reply_video(
-                        video=f,
+                await local_media_sender.send(
+                    step['media_url'], 'video',
+                    lambda media: update.message.reply_video(
+                        video=media,
                         caption=step.get('content', ''),
                         reply_markup=keyboard,
                         width=512,
                         height=512
                     )
+                )
             else:
                 async with aiohttp.ClientSession() as session:
                     async with session.get(step['media_url']) as response:
@@ -4328,26 +3725,19 @@ async def execute_step(query, step):
     """Executa uma etapa específica"""
     if step['step_type'] == 'text':
         # Verificar se há botões para este step de texto
-        buttons = []
-        if step.get('buttons'):
-            for button in step['buttons']:
-                if button['button_type'] == 'url':
-                    buttons.append([InlineKeyboardButton(button['button_text'], url=button['button_data'])])
-                else:
-                    buttons.append([InlineKeyboardButton(button['button_text'], callback_data=button['button_data'])])
-        
-        keyboard = InlineKeyboardMarkup(buttons) if buttons else None
-        await safe_edit_message(step['content'], reply_markup=keyboard)
+        keyboard = step['keyboard'] if 'keyboard' in step else build_step_keyboard(step.get('buttons'))
+        await safe_edit_message(query, step['content'], reply_markup=keyboard)
     elif step['step_type'] == 'image':
         if step['media_url']:
             try:
                 # Verificar se é um arquivo local
                 if step['media_url'].startswith('uploads/') or step['media_url'].startswith('uploads\\'):
                     # Arquivo local
-                    with open(step['media_url'], 'rb') as f:
-                        file_data = f.read()
-                    await query.edit_message_media(
-                        media=InputMediaPhoto(file_data, caption=step['content'] or "")
+                    await local_media_sender.send(
+                        step['media_url'], 'photo',
+                        lambda media: query.edit_message_media(
+                            media=InputMediaPhoto(media, caption=step['content'] or "")
+                        )
                     )
                 else:
                     # URL remota
@@ -4362,10 +3752,11 @@ async def execute_step(query, step):
                 # Verificar se é um arquivo local
                 if step['media_url'].startswith('uploads/') or step['media_url'].startswith('uploads\\'):
                     # Arquivo local
-                    with open(step['media_url'], 'rb') as f:
-                        file_data = f.read()
-                    await query.edit_message_media(
-                        media=InputMediaVideo(file_data, caption=step['content'] or "")
+                    await local_media_sender.send(
+                        step['media_url'], 'video',
+                        lambda media: query.edit_message_media(
+                            media=InputMediaVideo(media, caption=step['content'] or "")
+                        )
                     )
                 else:
                     # URL remota
@@ -4375,107 +3766,12 @@ async def execute_step(query, step):
             except Exception as e:
                 print(f"Erro ao editar vídeo: {e}")
     elif step['step_type'] == 'video_note':
-        # Para vídeos redondos, sempre usar reply_video com dimensões 512x512
-        # O Telegram só aceita vídeos redondos reais no sendVideoNote
-        is_converted_video = True
-        
-        if step['media_url']:
-            try:
-                # Verificar se é um arquivo local
-                if step['media_url'].startswith('uploads/') or step['media_url'].startswith('uploads\\'):
-                    # Arquivo local
-                    with open(step['media_url'], 'rb') as f:
-                        file_data = f.read()
-                    
-                    # Validar requisitos antes de enviar
-                    print(f"🔍 DEBUG: Validando requisitos do video note em execute_step...")
-                    is_valid, validation_message = await validate_video_note_requirements(file_data)
-                    
-                    if not is_valid:
-                        print(f"🔍 DEBUG: Video note inválido em execute_step: {validation_message}")
-                        
-                        # Tentar conversão automática
-                        print(f"🔧 DEBUG: Tentando conversão automática em execute_step...")
-                        conversion_success, converted_data, conversion_message = await convert_video_to_video_note(file_data)
-                        
-                        if conversion_success:
-                            print(f"🔧 DEBUG: Conversão bem-sucedida em execute_step: {conversion_message}")
-                            
-                            # Substituir o arquivo original pelo convertido
-                            try:
-                                print(f"🔧 DEBUG: Substituindo arquivo original pelo convertido em execute_step...")
-                                
-                                # Salvar vídeo convertido no lugar do original
-                                with open(step['media_url'], 'wb') as f:
-                                    f.write(converted_data)
-                                
-                                print(f"🔧 DEBUG: ✅ Arquivo original substituído: {step['media_url']}")
-                                
-                                # Atualizar o banco de dados para marcar como convertido
-                                from flow_manager import update_step_media_url
-                                update_step_media_url(step['id'], step['media_url'])
-                                
-                            except Exception as e:
-                                print(f"🔧 DEBUG: ⚠️ Erro ao substituir arquivo em execute_step: {e}")
-                            
-                            # Enviar vídeo convertido
-                            await query.message.reply_video_note(video_note=converted_data)
-                            
-                            # Enviar texto separadamente (video notes não suportam caption)
-                            if step.get('content'):
-                                await query.message.reply_text(step['content'])
-                            
-                        else:
-                            print(f"🔧 DEBUG: Conversão falhou em execute_step: {conversion_message}")
-                            await query.message.reply_text(
-                                f"❌ **Erro ao enviar video note**\n\n{validation_message}\n\n"
-                                "Tentativa de conversão automática falhou.\n"
-                                "O vídeo não atende aos requisitos do Telegram."
-                            )
-                        return
-                    
-                    print(f"🔍 DEBUG: {validation_message}")
-                    
-                    # Para vídeos redondos, sempre usar reply_video_note
-                    await query.message.reply_video_note(video_note=file_data)
-                    
-                    # Enviar texto separadamente (video notes não suportam caption)
-                    if step.get('content'):
-                        await query.message.reply_text(step['content'])
-                else:
-                    # URL remota (fallback)
-                    async with aiohttp.ClientSession() as session:
-                        async with session.get(step['media_url']) as response:
-                            if response.status == 200:
-                                file_data = await response.read()
-                                
-                                # Validar requisitos antes de enviar
-                                print(f"🔍 DEBUG: Validando requisitos do video note em execute_step (URL)...")
-                                is_valid, validation_message = await validate_video_note_requirements(file_data)
-                                
-                                if not is_valid:
-                                    print(f"🔍 DEBUG: Video note inválido em execute_step (URL): {validation_message}")
-                                    await query.message.reply_text(
-                                        f"❌ **Erro ao enviar video note**\n\n{validation_message}\n\n"
-                                        "O vídeo não atende aos requisitos do Telegram.",
-                                    )
-                                    return
-                                
-                                print(f"🔍 DEBUG: {validation_message}")
-                                
-                                # Para vídeos redondos, sempre usar reply_video_note
-                                await query.message.reply_video_note(video_note=file_data)
-                                
-                                # Enviar texto separadamente (video notes não suportam caption)
-                                if step.get('content'):
-                                    await query.message.reply_text(step['content'])
-                            else:
-                                await safe_edit_message("Vídeo redondo não disponível")
-            except Exception as e:
-                print(f"Erro ao enviar vídeo redondo: {e}")
-                await safe_edit_message("Vídeo redondo não disponível")
+        if step['media_url'] or step.get('file_id'):
+            # CallbackQuery também expõe .message para responder
+            keyboard = step['keyboard'] if 'keyboard' in step else build_step_keyboard(step.get('buttons'))
+            await handle_video_note_send(query, step, keyboard)
         else:
-            await safe_edit_message(step['content'] or "")
+            await safe_edit_message(query, step['content'] or "")
     elif step['step_type'] == 'button':
         # Criar botões inline
         buttons = []
@@ -4484,6 +3780,7 @@ async def execute_step(query, step):
         
         keyboard = InlineKeyboardMarkup(buttons) if buttons else None
         await safe_edit_message(
+            query,
             step['content'] or "Escolha uma opção:",
             reply_markup=keyboard
         )
@@ -4503,12 +3800,15 @@ def get_user_data(telegram_id):
         WHERE telegram_id = %s
         """
         cursor.execute(query, (telegram_id,))
-        result = cursor.fetchone()
+        result = cursor.fetchone() or {}
         
-        if result:
-            return result
-        else:
-            return {}
+        # Alterações ainda não gravadas no banco
+        pending = user_write_buffer.get(telegram_id)
+        for field in ('name', 'phone', 'email', 'additional_data'):
+            if field in pending:
+                result[field] = pending[field]
+        
+        return result
             
     except Error as e:
         print(f"Erro ao obter dados do usuário: {e}")
@@ -4519,52 +3819,18 @@ def get_user_data(telegram_id):
             connection.close()
 
 def update_user_data(telegram_id, data):
-    """Atualiza dados adicionais do usuário"""
-    connection = create_connection()
-    if connection is None:
+    """Atualiza dados adicionais do usuário (gravado em lote pelo user_write_buffer)"""
+    fields = {field: data[field] for field in ('name', 'phone', 'email', 'additional_data') if field in data}
+    if not fields:
         return False
     
-    try:
-        cursor = connection.cursor()
-        
-        # Construir query dinamicamente baseada nos dados fornecidos
-        update_fields = []
-        values = []
-        
-        if 'name' in data:
-            update_fields.append("name = %s")
-            values.append(data['name'])
-        if 'phone' in data:
-            update_fields.append("phone = %s")
-            values.append(data['phone'])
-        if 'email' in data:
-            update_fields.append("email = %s")
-            values.append(data['email'])
-        if 'additional_data' in data:
-            update_fields.append("additional_data = %s")
-            values.append(data['additional_data'])
-        
-        if not update_fields:
-            return False
-        
-        values.append(telegram_id)
-        query = f"UPDATE users SET {', '.join(update_fields)} WHERE telegram_id = %s"
-        
-        cursor.execute(query, values)
-        connection.commit()
-        return True
-        
-    except Error as e:
-        print(f"Erro ao atualizar dados do usuário: {e}")
-        return False
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
+    user_write_buffer.update(telegram_id, **fields)
+    return True
 
 async def request_missing_data(update, context, missing_data):
     """Solicita dados faltantes do usuário"""
     user = update.effective_user
+    conversation = get_conversation(context)
     
     print(f"🔍 DEBUG: request_missing_data - Usuário {user.id} - Dados faltantes: {missing_data}")
 
@@ -4573,20 +3839,10 @@ async def request_missing_data(update, context, missing_data):
     print(f"🔍 DEBUG: Chamando send_welcome_video_note_for_signup para usuário {user.id}")
     video_sent = await send_welcome_video_note_for_signup(update, context)
     print(f"🔍 DEBUG: Resultado send_welcome_video_note_for_signup: {video_sent}")
-    
-    # Aguardar um pouco se o vídeo foi enviado
-    if video_sent:
-        print(f"🔍 DEBUG: Vídeo enviado, aguardando 1 segundo...")
-        await asyncio.sleep(1)
-
-    # Definir estado de coleta de dados
-    context.user_data['collecting_data'] = True
-    context.user_data['missing_data'] = missing_data
-    context.user_data['current_data_index'] = 0
 
     # Verificar dados já coletados para atualizar a lista
-    collected_phone = context.user_data.get('collected_phone', None)
-    collected_email = context.user_data.get('collected_email', None)
+    collected_phone = conversation.phone
+    collected_email = conversation.email
     
     # Filtrar dados que ainda faltam
     remaining_data = []
@@ -4598,8 +3854,8 @@ async def request_missing_data(update, context, missing_data):
         elif data_type not in ["telefone", "email"]:
             remaining_data.append(data_type)
     
-    # Atualizar missing_data com apenas os dados que faltam
-    context.user_data['missing_data'] = remaining_data
+    # Definir estado de coleta de dados, apenas com os dados que faltam
+    conversation.to(State.SIGNUP_MENU, missing_data=remaining_data)
     
     # Mensagem inicial
     message = "📋 *Cadastro Necessário*\n\n"
@@ -4614,19 +3870,12 @@ async def request_missing_data(update, context, missing_data):
     buttons = []
     
     # Verificar dados já coletados
-    collected_data = context.user_data.get('collected_phone', None)
-    has_phone = collected_data is not None
-    
-    collected_email = context.user_data.get('collected_email', None)
+    has_phone = collected_phone is not None
     has_email = collected_email is not None
-    
 
-
-    # Mostrar apenas botões para dados que ainda faltam
+    # Mostrar apenas botões para dados que ainda faltam (o contato chega por handle_contact_shared)
     if "telefone" in remaining_data and not has_phone:
         buttons.append([KeyboardButton("�� Compartilhar Telefone", request_contact=True)])
-        # Definir estado para esperar contato
-        context.user_data['waiting_for_contact'] = True
 
     if "email" in remaining_data and not has_email:
         buttons.append([KeyboardButton("📧 Enviar Email")])
@@ -4647,9 +3896,9 @@ async def request_missing_data(update, context, missing_data):
     # Verificação extra: se todos os dados necessários foram coletados
     required_data = ["telefone", "email"]
     collected_data = []
-    if context.user_data.get('collected_phone'):
+    if conversation.phone:
         collected_data.append("telefone")
-    if context.user_data.get('collected_email'):
+    if conversation.email:
         collected_data.append("email")
     
     if len(collected_data) == len(required_data):
@@ -4670,16 +3919,17 @@ async def finish_data_collection(update, context):
     user = update.effective_user
     
     # Salvar dados coletados
+    conversation = get_conversation(context)
     collected_data = {}
-    if 'collected_name' in context.user_data:
-        collected_data['name'] = context.user_data['collected_name']
-    if 'collected_phone' in context.user_data:
-        collected_data['phone'] = context.user_data['collected_phone']
-    if 'collected_email' in context.user_data:
-        collected_data['email'] = context.user_data['collected_email']
+    if conversation.name is not None:
+        collected_data['name'] = conversation.name
+    if conversation.phone is not None:
+        collected_data['phone'] = conversation.phone
+    if conversation.email is not None:
+        collected_data['email'] = conversation.email
     
     if collected_data:
-        update_user_data(user.id, collected_data)
+        await run_db(update_user_data, user.id, collected_data)
         
         # Enviar webhook de cadastro concluído
         user_data = {
@@ -4691,7 +3941,7 @@ async def finish_data_collection(update, context):
             'phone': collected_data.get('phone'),
             'email': collected_data.get('email')
         }
-        send_webhook('cadastro_concluido', user_data)
+        await send_webhook('cadastro_concluido', user_data)
 
         # Se não há fluxo padrão, mostrar mensagem
     await update.message.reply_text(
@@ -4701,53 +3951,59 @@ async def finish_data_collection(update, context):
     )
     
     # Limpar dados temporários
-    context.user_data.clear()
+    conversation.reset()
     
     # Executar fluxo automaticamente
-    flow_manager = FlowManager()
-    default_flow = flow_manager.get_default_flow()
-    
-    if default_flow:
-        steps = flow_manager.get_flow_steps(default_flow['id'])
-        if steps:
-            # Executar todas as etapas do fluxo
-            await execute_complete_flow(update, steps)
-            return
+    default_plan = await run_db(get_default_flow_plan)
+    
+    if default_plan and default_plan.steps:
+        # Executar todas as etapas do fluxo
+        await execute_complete_flow(update, default_plan.steps)
+        return
     
 
 
-def get_config_value(config_key, default=None):
-    """Obtém o valor de uma configuração do banco de dados"""
-    connection = create_connection()
-    if connection is None:
-        return default
-    
-    try:
-        cursor = connection.cursor()
-        
-        query = "SELECT config_value FROM bot_config WHERE config_key = %s"
-        cursor.execute(query, (config_key,))
-        result = cursor.fetchone()
-        
-        if result:
-            return result[0]
-        else:
-            return default
-            
-    except Error as e:
-        print(f"Erro ao obter configuração '{config_key}': {e}")
-        return default
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
+async def on_startup(application):
+    """Inicia as tarefas em segundo plano depois que o loop do bot está rodando"""
+    await run_db(load_admin_ids, True)
+    user_write_buffer.start()
+    webhook_dispatcher.start()
+    media_store.start()
+    transcode_queue.start()
+    await broadcast_engine.resume_interrupted(application.bot)
+
+async def on_stop(application):
+    """Interrompe o que ainda envia pelo bot, antes de a conexão com o Telegram ser fechada"""
+    await broadcast_engine.stop()
+    await transcode_queue.stop()
+
+async def on_shutdown(application):
+    """Encerra as tarefas em segundo plano"""
+    await webhook_dispatcher.stop()
+    await media_downloader.stop()
+    await media_store.stop()
+    await user_write_buffer.stop()
+
+def get_telegram_webhook_url():
+    """URL pública em que o Telegram entrega os updates (None se não configurada)"""
+    base_url = os.getenv('TELEGRAM_WEBHOOK_URL')
+    if not base_url and os.getenv('RAILWAY_PUBLIC_DOMAIN'):
+        base_url = f"https://{os.getenv('RAILWAY_PUBLIC_DOMAIN')}"
+    if not base_url:
+        return None
+    return f"{base_url.rstrip('/')}/{TELEGRAM_WEBHOOK_PATH}"
+
+def get_telegram_webhook_secret(bot_token):
+    """Secret token conferido em cada requisição do Telegram"""
+    # Derivado do token quando não definido, para ser o mesmo a cada deploy
+    return os.getenv('TELEGRAM_WEBHOOK_SECRET') or hashlib.sha256(bot_token.encode()).hexdigest()
 
 def main():
     """Função principal do bot"""
     
-    # Criar tabelas se não existirem
-    if not create_tables():
-        print("Erro ao criar tabelas. Verifique a conexão com o banco de dados.")
+    # Aplicar as migrações pendentes do banco (nenhum DDL se o esquema estiver atualizado)
+    if not run_migrations():
+        print("Erro ao migrar o banco de dados. Verifique a conexão com o banco de dados.")
         return
     
     # Obter token do bot do banco de dados ou variável de ambiente
@@ -4758,7 +4014,18 @@ def main():
         return
     
     # Criar aplicação
-    application = Application.builder().token(bot_token).build()
+    application = (
+        Application.builder()
+        .token(bot_token)
+        .base_url(TELEGRAM_BASE_URL)
+        .base_file_url(TELEGRAM_BASE_FILE_URL)
+        .concurrent_updates(update_processor)
+        .rate_limiter(send_scheduler)
+        .post_init(on_startup)
+        .post_stop(on_stop)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
     
     # Adicionar handlers
     application.add_handler(CommandHandler("start", start))
@@ -4782,8 +4049,27 @@ def main():
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text_input))
     
     # Iniciar o bot
-    print("Bot iniciado...")
-    application.run_polling()
+    if BOT_MODE == 'webhook':
+        webhook_url = get_telegram_webhook_url()
+        if not webhook_url:
+            print("Erro: defina TELEGRAM_WEBHOOK_URL (ou RAILWAY_PUBLIC_DOMAIN) para usar BOT_MODE=webhook.")
+            return
+        
+        # Ao receber SIGTERM o servidor para de aceitar updates e os que já
+        # chegaram terminam de ser processados antes do encerramento. O webhook
+        # continua registrado, então o Telegram guarda os updates até o próximo deploy.
+        print(f"Bot iniciado em modo webhook na porta {TELEGRAM_WEBHOOK_PORT}...")
+        application.run_webhook(
+            listen=TELEGRAM_WEBHOOK_LISTEN,
+            port=TELEGRAM_WEBHOOK_PORT,
+            url_path=TELEGRAM_WEBHOOK_PATH,
+            webhook_url=webhook_url,
+            secret_token=get_telegram_webhook_secret(bot_token),
+            max_connections=TELEGRAM_WEBHOOK_MAX_CONNECTIONS
+        )
+    else:
+        print("Bot iniciado...")
+        application.run_polling()
 
 if __name__ == '__main__':
     main() 
@@ -0,0 +1,564 @@
+import os
+import time
+import asyncio
+import aiohttp
+from dotenv import load_dotenv
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import Forbidden, TelegramError
+from database import create_connection, run_db, Error
+from media_engine import VIDEO_NOTE_SIZE
+from flow_manager import get_flow_plan, extract_file_id, update_step_file_id
+from media_sender import local_media_sender
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+# Configuração das transmissões
+BROADCAST_WORKERS = int(os.getenv('BROADCAST_WORKERS', 50))                   # usuários atendidos em paralelo
+BROADCAST_PAGE_SIZE = int(os.getenv('BROADCAST_PAGE_SIZE', 500))              # usuários lidos por consulta (e por checkpoint)
+BROADCAST_REPORT_INTERVAL = float(os.getenv('BROADCAST_REPORT_INTERVAL', 10))  # segundos entre atualizações do progresso
+
+# Envios em massa saem pela fila de menor prioridade do send_scheduler
+BULK = {'priority': 'bulk'}
+
+# Público de cada transmissão: (nome, condição SQL sobre a tabela users)
+SEGMENTS = {
+    'all': ("👥 Todos os usuários", "is_active = TRUE"),
+    'registered': ("✅ Cadastrados", "is_active = TRUE AND name IS NOT NULL"),
+    'unregistered': ("📝 Sem cadastro", "is_active = TRUE AND name IS NULL")
+}
+
+STATUS_TEXT = {
+    'pending': "⏳ Aguardando",
+    'running': "▶️ Em andamento",
+    'paused': "⏸️ Pausada",
+    'done': "✅ Concluída",
+    'cancelled': "⛔ Cancelada",
+    'failed': "❌ Falhou"
+}
+
+
+def count_broadcast_users(segment):
+    """Conta os usuários de um público"""
+    connection = create_connection()
+    if not connection:
+        return 0
+
+    try:
+        cursor = connection.cursor()
+
+        cursor.execute(f"SELECT COUNT(*) FROM users WHERE {SEGMENTS[segment][1]}")
+        return cursor.fetchone()[0]
+
+    except Error as e:
+        print(f"Erro ao contar usuários da transmissão: {e}")
+        return 0
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+def create_broadcast_job(flow_id, segment, created_by):
+    """Cria uma transmissão e retorna seu ID"""
+    connection = create_connection()
+    if not connection:
+        return None
+
+    try:
+        cursor = connection.cursor()
+
+        cursor.execute(f"SELECT COUNT(*) FROM users WHERE {SEGMENTS[segment][1]}")
+        total = cursor.fetchone()[0]
+
+        cursor.execute("""
+            INSERT INTO broadcast_jobs (flow_id, segment, status, total, created_by)
+            VALUES (%s, %s, 'pending', %s, %s)
+        """, (flow_id, segment, total, created_by))
+        connection.commit()
+
+        return cursor.lastrowid
+
+    except Error as e:
+        print(f"Erro ao criar transmissão: {e}")
+        return None
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+def get_broadcast_job(job_id):
+    """Obtém uma transmissão com o nome do fluxo"""
+    connection = create_connection()
+    if not connection:
+        return None
+
+    try:
+        cursor = connection.cursor(dictionary=True)
+
+        cursor.execute("""
+            SELECT bj.*, f.name AS flow_name
+            FROM broadcast_jobs bj
+            LEFT JOIN flows f ON f.id = bj.flow_id
+            WHERE bj.id = %s
+        """, (job_id,))
+        return cursor.fetchone()
+
+    except Error as e:
+        print(f"Erro ao obter transmissão: {e}")
+        return None
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+def get_recent_broadcast_jobs(limit=5):
+    """Obtém as últimas transmissões criadas"""
+    connection = create_connection()
+    if not connection:
+        return []
+
+    try:
+        cursor = connection.cursor(dictionary=True)
+
+        cursor.execute("""
+            SELECT bj.*, f.name AS flow_name
+            FROM broadcast_jobs bj
+            LEFT JOIN flows f ON f.id = bj.flow_id
+            ORDER BY bj.id DESC
+            LIMIT %s
+        """, (limit,))
+        return cursor.fetchall()
+
+    except Error as e:
+        print(f"Erro ao listar transmissões: {e}")
+        return []
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+def get_running_broadcast_ids():
+    """IDs das transmissões interrompidas em andamento (para retomar após reinício)"""
+    connection = create_connection()
+    if not connection:
+        return []
+
+    try:
+        cursor = connection.cursor()
+
+        cursor.execute("SELECT id FROM broadcast_jobs WHERE status = 'running' ORDER BY id")
+        return [row[0] for row in cursor.fetchall()]
+
+    except Error as e:
+        print(f"Erro ao listar transmissões em andamento: {e}")
+        return []
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+def fetch_broadcast_users(segment, after_id, limit):
+    """Próxima página de usuários por paginação de chave (id > último id processado)"""
+    connection = create_connection()
+    if not connection:
+        return None
+
+    try:
+        cursor = connection.cursor(dictionary=True)
+
+        cursor.execute(f"""
+            SELECT id, telegram_id FROM users
+            WHERE id > %s AND {SEGMENTS[segment][1]}
+            ORDER BY id
+            LIMIT %s
+        """, (after_id, limit))
+        return cursor.fetchall()
+
+    except Error as e:
+        print(f"Erro ao ler usuários da transmissão: {e}")
+        return None
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+def update_broadcast_job(job_id, **fields):
+    """Atualiza campos de uma transmissão (status, checkpoint, contadores...)"""
+    connection = create_connection()
+    if not connection:
+        return False
+
+    try:
+        cursor = connection.cursor()
+
+        assignments = ', '.join(f"{column} = %s" for column in fields)
+        cursor.execute(f"UPDATE broadcast_jobs SET {assignments} WHERE id = %s", (*fields.values(), job_id))
+        connection.commit()
+
+        return True
+
+    except Error as e:
+        print(f"Erro ao atualizar transmissão: {e}")
+        return False
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+def deactivate_users(telegram_ids):
+    """Marca como inativos os usuários que bloquearam o bot"""
+    if not telegram_ids:
+        return True
+
+    connection = create_connection()
+    if not connection:
+        return False
+
+    try:
+        cursor = connection.cursor()
+
+        placeholders = ', '.join(['%s'] * len(telegram_ids))
+        cursor.execute(f"UPDATE users SET is_active = FALSE WHERE telegram_id IN ({placeholders})", tuple(telegram_ids))
+        connection.commit()
+
+        return True
+
+    except Error as e:
+        print(f"Erro ao desativar usuários: {e}")
+        return False
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+class BroadcastRun:
+    """Estado em memória de uma transmissão em execução"""
+
+    def __init__(self, job):
+        self.job = job
+        self.sent = job['sent']
+        self.failed = job['failed']
+        self.blocked = job['blocked']
+        self.processed_at_start = self.sent + self.failed + self.blocked
+        self.started = time.monotonic()
+        self.stop_status = None
+        self.task = None
+        self.file_ids = {}
+        self.media_locks = {}
+
+    @property
+    def processed(self):
+        return self.sent + self.failed + self.blocked
+
+    def rate(self):
+        """Usuários atendidos por segundo desde o início desta execução"""
+        elapsed = time.monotonic() - self.started
+        return (self.processed - self.processed_at_start) / elapsed if elapsed > 0 else 0
+
+
+class BroadcastEngine:
+    """
+    Envia um fluxo compilado para todos os usuários de um público.
+
+    Os usuários são lidos em páginas por paginação de chave (users.id) e
+    cada página é atendida por até `workers` envios simultâneos, todos com
+    prioridade 'bulk' no send_scheduler, que mantém o ritmo dentro dos
+    limites do Telegram. Ao fim de cada página o último id e os contadores
+    são gravados em broadcast_jobs: após um reinício a transmissão continua
+    da última página concluída (os usuários da página interrompida podem
+    receber o fluxo de novo).
+
+    Mídias locais são enviadas uma única vez; as demais entregas usam o
+    file_id devolvido pelo Telegram.
+    """
+
+    def __init__(self, workers=BROADCAST_WORKERS, page_size=BROADCAST_PAGE_SIZE):
+        self.workers = workers
+        self.page_size = page_size
+        self._runs = {}
+
+    def start(self, bot, job_id):
+        """Inicia (ou retoma) uma transmissão em segundo plano"""
+        if job_id in self._runs:
+            return False
+        self._runs[job_id] = None
+        asyncio.create_task(self._start(bot, job_id))
+        return True
+
+    async def _start(self, bot, job_id):
+        job = await run_db(get_broadcast_job, job_id)
+        if not job or job['status'] in ('done', 'cancelled'):
+            self._runs.pop(job_id, None)
+            return
+
+        run = BroadcastRun(job)
+        run.task = asyncio.current_task()
+        self._runs[job_id] = run
+        reporter = asyncio.create_task(self._report_loop(bot, run))
+        try:
+            await self._run(bot, run)
+        except asyncio.CancelledError:
+            # Encerramento do bot: a transmissão continua 'running' e é retomada depois
+            pass
+        except Exception as e:
+            print(f"❌ Erro na transmissão {job_id}: {e}")
+            run.job['status'] = 'failed'
+            await run_db(update_broadcast_job, job_id, status='failed')
+        finally:
+            reporter.cancel()
+            self._runs.pop(job_id, None)
+            await self._report(bot, run)
+
+    async def _run(self, bot, run):
+        job = run.job
+        plan = await run_db(get_flow_plan, job['flow_id'])
+        if not plan or not plan.steps:
+            raise Exception("Fluxo não encontrado ou sem etapas")
+
+        job['status'] = 'running'
+        await run_db(update_broadcast_job, job['id'], status='running')
+        print(f"📣 Transmissão {job['id']} iniciada: fluxo '{plan.name}', {job['total']} usuários")
+
+        semaphore = asyncio.Semaphore(self.workers)
+        last_user_id = job['last_user_id']
+        while run.stop_status is None:
+            users = await run_db(fetch_broadcast_users, job['segment'], last_user_id, self.page_size)
+            if users is None:
+                raise Exception("Erro ao ler usuários")
+            if not users:
+                break
+
+            blocked = []
+            await asyncio.gather(*(
+                self._deliver(bot, run, plan.steps, user['telegram_id'], semaphore, blocked)
+                for user in users
+            ))
+
+            last_user_id = users[-1]['id']
+            await run_db(
+                update_broadcast_job, job['id'],
+                last_user_id=last_user_id, sent=run.sent, failed=run.failed, blocked=run.blocked
+            )
+            await run_db(deactivate_users, blocked)
+
+        job['status'] = run.stop_status or 'done'
+        await run_db(update_broadcast_job, job['id'], status=job['status'])
+        print(f"📣 Transmissão {job['id']} {STATUS_TEXT[job['status']]}: {run.sent} enviados, {run.failed} falhas, {run.blocked} bloqueados")
+
+    async def _deliver(self, bot, run, steps, chat_id, semaphore, blocked):
+        async with semaphore:
+            try:
+                for step in steps:
+                    await self._send_step(bot, run, chat_id, step)
+                run.sent += 1
+            except Forbidden:
+                # Usuário bloqueou o bot ou apagou a conta
+                run.blocked += 1
+                blocked.append(chat_id)
+            except Exception as e:
+                # Qualquer outro erro conta como falha deste usuário, não da transmissão
+                print(f"⚠️ Transmissão {run.job['id']}: erro ao enviar para {chat_id}: {e}")
+                run.failed += 1
+
+    async def _send_step(self, bot, run, chat_id, step):
+        keyboard = step['keyboard']
+        step_type = step['step_type']
+
+        if step_type in ('text', 'button'):
+            await bot.send_message(
+                chat_id, step['content'] or "Escolha uma opção:",
+                reply_markup=keyboard, rate_limit_args=BULK
+            )
+            return
+
+        if step_type == 'image':
+            send = lambda media: bot.send_photo(chat_id, photo=media, caption=step.get('content', ''), reply_markup=keyboard, rate_limit_args=BULK)
+        elif step_type == 'video':
+            send = lambda media: bot.send_video(chat_id, video=media, caption=step.get('content', ''), reply_markup=keyboard, rate_limit_args=BULK)
+        elif step_type == 'video_note':
+            extra = {'length': VIDEO_NOTE_SIZE}
+            if step.get('media_duration'):
+                extra['duration'] = int(step['media_duration'])
+            send = lambda media: bot.send_video_note(chat_id, video_note=media, rate_limit_args=BULK, **extra)
+        else:
+            return
+
+        await self._send_media(run, step, send)
+
+        # Video notes não suportam legenda: texto enviado separadamente
+        if step_type == 'video_note' and step.get('content'):
+            await bot.send_message(chat_id, step['content'], reply_markup=keyboard, rate_limit_args=BULK)
+
+    async def _send_media(self, run, step, send):
+        """Envia a mídia da etapa, fazendo upload no máximo uma vez por transmissão"""
+        file_id = run.file_ids.get(step['id']) or step.get('file_id')
+        if file_id:
+            return await send(file_id)
+
+        lock = run.media_locks.setdefault(step['id'], asyncio.Lock())
+        async with lock:
+            file_id = run.file_ids.get(step['id'])
+            if file_id:
+                return await send(file_id)
+
+            media_url = step.get('media_url')
+            if not media_url:
+                raise TelegramError("Etapa sem mídia")
+            if media_url.startswith(('http://', 'https://')):
+                if step['step_type'] == 'video_note':
+                    # O Telegram não aceita video note por URL
+                    async with aiohttp.ClientSession() as session:
+                        async with session.get(media_url) as response:
+                            message = await send(await response.read())
+                else:
+                    message = await send(media_url)
+            else:
+                message = await local_media_sender.send(media_url, step['step_type'], send)
+
+            file_id = extract_file_id(message)
+            if file_id:
+                run.file_ids[step['id']] = file_id
+                await run_db(update_step_file_id, step['id'], file_id)
+            return message
+
+    def pause(self, job_id):
+        """Pausa a transmissão ao fim da página em andamento"""
+        return self._stop(job_id, 'paused')
+
+    def cancel(self, job_id):
+        """Cancela a transmissão ao fim da página em andamento"""
+        return self._stop(job_id, 'cancelled')
+
+    def _stop(self, job_id, status):
+        run = self._runs.get(job_id)
+        if run is None:
+            return False
+        run.stop_status = status
+        return True
+
+    async def resume_interrupted(self, bot):
+        """Retoma as transmissões que estavam em andamento quando o bot parou"""
+        for job_id in await run_db(get_running_broadcast_ids):
+            print(f"📣 Retomando transmissão {job_id}")
+            self.start(bot, job_id)
+
+    async def stop(self):
+        """Interrompe as transmissões mantendo o status 'running' para retomar depois"""
+        tasks = [run.task for run in self._runs.values() if run is not None and run.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_progress(self, job_id):
+        """Dados ao vivo de uma transmissão em execução (None se não estiver rodando)"""
+        return self._runs.get(job_id)
+
+    async def _report_loop(self, bot, run):
+        while True:
+            await asyncio.sleep(BROADCAST_REPORT_INTERVAL)
+            await self._report(bot, run)
+
+    async def _report(self, bot, run):
+        """Atualiza a mensagem de progresso do administrador que iniciou a transmissão"""
+        job = run.job
+        if not job.get('report_chat_id') or not job.get('report_message_id'):
+            return
+        try:
+            await bot.edit_message_text(
+                format_broadcast_progress(job, run),
+                chat_id=job['report_chat_id'],
+                message_id=job['report_message_id'],
+                reply_markup=create_broadcast_control_keyboard(job['id'], job['status'])
+            )
+        except TelegramError as e:
+            if "Message is not modified" not in str(e):
+                print(f"⚠️ Erro ao atualizar progresso da transmissão {job['id']}: {e}")
+
+    def get_stats(self):
+        """Retorna quantas transmissões estão em execução"""
+        return {'running': len(self._runs)}
+
+
+def format_broadcast_progress(job, run=None):
+    """Texto com o progresso de uma transmissão"""
+    sent = run.sent if run else job['sent']
+    failed = run.failed if run else job['failed']
+    blocked = run.blocked if run else job['blocked']
+    processed = sent + failed + blocked
+    total = max(job['total'] or 0, processed)
+    percent = processed * 100 / total if total else 100
+
+    message = f"📣 **Transmissão #{job['id']}**\n\n"
+    message += f"📋 Fluxo: {job.get('flow_name') or job['flow_id']}\n"
+    message += f"👥 Público: {SEGMENTS.get(job['segment'], (job['segment'],))[0]}\n"
+    message += f"Status: {STATUS_TEXT.get(job['status'], job['status'])}\n\n"
+    message += f"📊 Progresso: {processed}/{total} ({percent:.1f}%)\n"
+    message += f"✅ Enviados: {sent}\n"
+    message += f"❌ Falhas: {failed}\n"
+    message += f"🚫 Bloquearam o bot: {blocked}\n"
+
+    if run and job['status'] == 'running':
+        rate = run.rate()
+        message += f"\n⚡ Velocidade: {rate:.1f} usuários/s\n"
+        if rate > 0:
+            remaining = (total - processed) / rate
+            message += f"⏱️ Tempo restante: {int(remaining // 60)}min {int(remaining % 60)}s\n"
+    return message
+
+
+def create_broadcast_menu_keyboard(jobs):
+    """Cria teclado do menu de transmissões"""
+    keyboard = [[InlineKeyboardButton("➕ Nova Transmissão", callback_data="broadcast_new")]]
+    for job in jobs:
+        button_text = f"{STATUS_TEXT.get(job['status'], job['status'])[:2]} #{job['id']} {job.get('flow_name') or ''}"
+        keyboard.append([InlineKeyboardButton(button_text, callback_data=f"broadcast_status_{job['id']}")])
+    keyboard.append([InlineKeyboardButton("🔙 Voltar", callback_data="admin_menu")])
+    return InlineKeyboardMarkup(keyboard)
+
+
+def create_broadcast_flow_keyboard(flows):
+    """Cria teclado para escolher o fluxo da transmissão"""
+    keyboard = []
+    for flow in flows:
+        keyboard.append([InlineKeyboardButton(f"📋 {flow['name']}", callback_data=f"broadcast_flow_{flow['id']}")])
+    keyboard.append([InlineKeyboardButton("🔙 Voltar", callback_data="admin_broadcast")])
+    return InlineKeyboardMarkup(keyboard)
+
+
+def create_broadcast_segment_keyboard(flow_id):
+    """Cria teclado para escolher o público da transmissão"""
+    keyboard = []
+    for segment, (label, _) in SEGMENTS.items():
+        keyboard.append([InlineKeyboardButton(label, callback_data=f"broadcast_segment_{flow_id}_{segment}")])
+    keyboard.append([InlineKeyboardButton("🔙 Voltar", callback_data="broadcast_new")])
+    return InlineKeyboardMarkup(keyboard)
+
+
+def create_broadcast_control_keyboard(job_id, status):
+    """Cria teclado de controle de uma transmissão"""
+    keyboard = []
+    if status in ('pending', 'running'):
+        keyboard.append([
+            InlineKeyboardButton("⏸️ Pausar", callback_data=f"broadcast_pause_{job_id}"),
+            InlineKeyboardButton("⛔ Cancelar", callback_data=f"broadcast_cancel_{job_id}")
+        ])
+    elif status in ('paused', 'failed'):
+        keyboard.append([
+            InlineKeyboardButton("▶️ Retomar", callback_data=f"broadcast_resume_{job_id}"),
+            InlineKeyboardButton("⛔ Cancelar", callback_data=f"broadcast_cancel_{job_id}")
+        ])
+    keyboard.append([InlineKeyboardButton("🔄 Atualizar", callback_data=f"broadcast_status_{job_id}")])
+    keyboard.append([InlineKeyboardButton("🔙 Voltar", callback_data="admin_broadcast")])
+    return InlineKeyboardMarkup(keyboard)
+
+
+# Motor compartilhado pelo bot
+broadcast_engine = BroadcastEngine()
@@ -0,0 +1,140 @@
+import time
+import logging
+from flow_manager import AsyncFlowManager
+
+logger = logging.getLogger(__name__)
+
+# Mensagem padrão para rotas restritas acessadas por quem não é administrador
+ADMIN_DENIED_MESSAGE = "❌ Você não tem permissão de administrador."
+
+
+async def safe_edit_message(query, text, reply_markup=None):
+    """Edita a mensagem do callback ignorando o erro de mensagem não modificada"""
+    try:
+        await query.edit_message_text(text, reply_markup=reply_markup)
+    except Exception as e:
+        if "Message is not modified" in str(e):
+            return
+        print(f"❌ Erro ao editar mensagem: {e}")
+        raise
+
+
+class CallbackRoute:
+    """Rota registrada: handler, restrição de administrador e métricas de latência"""
+
+    def __init__(self, name, handler, admin):
+        self.name = name
+        self.handler = handler
+        self.admin = admin
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def record(self, elapsed, failed):
+        self.calls += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        if failed:
+            self.errors += 1
+
+    def get_stats(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'avg_ms': self.total_time * 1000 / self.calls if self.calls else 0,
+            'max_ms': self.max_time * 1000
+        }
+
+
+class CallbackRouter:
+    """
+    Roteia o callback_data dos botões inline para o handler registrado.
+
+    Rotas exatas ficam num dicionário. Rotas por prefixo (ex.: "edit_step_")
+    são procuradas pelos prefixos do próprio callback_data, um por "_", do
+    mais longo para o mais curto. Assim o custo não cresce com o número de
+    rotas, e o prefixo mais específico vence ("edit_step_text_" antes de
+    "edit_step_"). O handler recebe o restante do callback_data já separado
+    (payload), ou None nas rotas exatas.
+
+    Rotas com admin=True só executam para administradores; a verificação é
+    feita pelo roteador, uma vez por callback.
+    """
+
+    def __init__(self):
+        self._exact = {}
+        self._prefixes = {}
+        self._unmatched = 0
+
+    def route(self, data, admin=False):
+        """Registra um handler para um callback_data exato"""
+        def decorator(handler):
+            self._exact[data] = CallbackRoute(data, handler, admin)
+            return handler
+        return decorator
+
+    def prefix(self, *prefixes, admin=False):
+        """Registra um handler para callback_data que começa com um dos prefixos"""
+        def decorator(handler):
+            for prefix in prefixes:
+                self._prefixes[prefix] = CallbackRoute(f"{prefix}*", handler, admin)
+            return handler
+        return decorator
+
+    def resolve(self, data):
+        """Retorna (rota, payload) para o callback_data, ou (None, None)"""
+        route = self._exact.get(data)
+        if route is not None:
+            return route, None
+
+        end = data.rfind('_')
+        while end != -1:
+            route = self._prefixes.get(data[:end + 1])
+            if route is not None:
+                return route, data[end + 1:]
+            end = data.rfind('_', 0, end)
+        return None, None
+
+    async def dispatch(self, update, context):
+        """Executa o handler do callback. Retorna False se não houver rota"""
+        query = update.callback_query
+        route, payload = self.resolve(query.data or '')
+        if route is None:
+            self._unmatched += 1
+            logger.debug("Callback sem rota: %s", query.data)
+            return False
+
+        if route.admin and not await AsyncFlowManager().is_admin(update.effective_user.id):
+            await safe_edit_message(query, ADMIN_DENIED_MESSAGE)
+            return True
+
+        started = time.perf_counter()
+        failed = True
+        try:
+            await route.handler(update, context, payload)
+            failed = False
+        finally:
+            route.record(time.perf_counter() - started, failed)
+        return True
+
+    def get_stats(self):
+        """Métricas por rota e totais (chamadas, erros, latência em ms e callbacks sem rota)"""
+        routes = {route.name: route.get_stats() for route in self.routes() if route.calls}
+        calls = sum(route['calls'] for route in routes.values())
+        total_ms = sum(route['avg_ms'] * route['calls'] for route in routes.values())
+        return {
+            'routes': len(self._exact) + len(self._prefixes),
+            'calls': calls,
+            'errors': sum(route['errors'] for route in routes.values()),
+            'avg_ms': total_ms / calls if calls else 0,
+            'unmatched': self._unmatched,
+            'by_route': routes
+        }
+
+    def routes(self):
+        return list(self._exact.values()) + list(self._prefixes.values())
+
+
+# Roteador compartilhado pelo bot
+callback_router = CallbackRouter()
@@ -1,5 +1,4 @@
-from database import create_connection
-from mysql.connector import Error
+from database import create_connection, Error
 
 def check_database_connection():
     """Verifica a conexão com o banco de dados e mostra informações básicas"""
@@ -0,0 +1,117 @@
+from enum import Enum
+
+
+class State(Enum):
+    """O que a próxima mensagem do usuário significa"""
+    IDLE = 'idle'
+
+    # Cadastro (qualquer usuário)
+    SIGNUP_MENU = 'signup_menu'                          # teclado de cadastro exibido
+    SIGNUP_NAME = 'signup_name'
+    SIGNUP_PHONE = 'signup_phone'
+    SIGNUP_EMAIL = 'signup_email'
+    SIGNUP_EMAIL_OR_CONTACT = 'signup_email_or_contact'
+
+    # Configurações (admin)
+    WELCOME_TEXT = 'welcome_text'
+    WELCOME_MEDIA = 'welcome_media'
+    WEBHOOK_URL = 'webhook_url'
+    WEBHOOK_URL_CHANGE = 'webhook_url_change'
+
+    # Edição de etapas (admin)
+    EDIT_STEP_TEXT = 'edit_step_text'
+    EDIT_STEP_MEDIA = 'edit_step_media'
+
+    # Criação de fluxos (admin)
+    FLOW_NAME = 'flow_name'
+    STEP_CONTENT = 'step_content'                        # texto, URL ou mídia da etapa escolhida
+    STEP_CAPTION = 'step_caption'                        # texto da imagem/vídeo já recebido
+    BUTTON_TEXT = 'button_text'
+    BUTTON_URL = 'button_url'
+
+
+SIGNUP_STATES = frozenset({
+    State.SIGNUP_MENU, State.SIGNUP_NAME, State.SIGNUP_PHONE,
+    State.SIGNUP_EMAIL, State.SIGNUP_EMAIL_OR_CONTACT
+})
+
+# Estados que só administradores podem ocupar
+ADMIN_STATES = frozenset(State) - SIGNUP_STATES - {State.IDLE}
+
+# Etapas que pedem um botão depois do texto da mídia
+BUTTON_STEP_TYPES = ('message_image_button', 'message_video_button', 'message_video_note_button')
+
+
+class Conversation:
+    """
+    Estado da conversa de um usuário, guardado em context.user_data.
+
+    Substitui as dezenas de flags soltas (waiting_for_*, editing_*,
+    configuring_*): o estado diz qual handler trata a próxima mensagem e
+    os campos guardam apenas o que a conversa em andamento precisa.
+    """
+
+    __slots__ = (
+        'state',
+        # Cadastro
+        'missing_data', 'name', 'phone', 'email',
+        # Criação e edição de fluxos
+        'flow_id', 'step_number', 'step_type', 'step', 'with_button', 'button_text', 'step_id',
+        # Mídias (boas-vindas e conversões pendentes)
+        'media_type', 'pending_video'
+    )
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Volta ao estado inicial, descartando tudo"""
+        self.state = State.IDLE
+        self.missing_data = None
+        self.name = None
+        self.phone = None
+        self.email = None
+        self.flow_id = None
+        self.step_number = 1
+        self.step_id = None
+        self.media_type = None
+        self.clear_step()
+
+    def clear_step(self):
+        """Descarta a etapa em criação"""
+        self.step_type = None
+        self.step = None
+        self.with_button = False
+        self.button_text = None
+        self.pending_video = None
+
+    def to(self, state, **fields):
+        """Muda de estado, atualizando os campos informados"""
+        self.state = state
+        for name, value in fields.items():
+            setattr(self, name, value)
+        return self
+
+    def start_step(self, step_type):
+        """Começa uma nova etapa do tipo escolhido"""
+        self.clear_step()
+        self.step_type = step_type
+        self.step = {}
+        return self.to(State.STEP_CONTENT)
+
+    def await_caption(self):
+        """Mídia recebida: aguardar o texto (e depois o botão, se a etapa tiver)"""
+        self.with_button = self.step_type in BUTTON_STEP_TYPES
+        return self.to(State.STEP_CAPTION)
+
+    def collected(self, data_type):
+        """Valor já informado para um item do cadastro ("nome", "telefone" ou "email")"""
+        return {'nome': self.name, 'telefone': self.phone, 'email': self.email}.get(data_type)
+
+
+def get_conversation(context):
+    """Obtém (ou cria) o estado da conversa do usuário"""
+    conversation = context.user_data.get('conversation')
+    if conversation is None:
+        conversation = context.user_data['conversation'] = Conversation()
+    return conversation
@@ -1,43 +1,221 @@
 import os
-import mysql.connector
-from mysql.connector import Error
+import time
+import asyncio
+import threading
+import sqlite3
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from mysql.connector import Error as MySQLError, pooling
+from mysql.connector.errors import PoolError
 from dotenv import load_dotenv
+from sqlite_backend import SQLitePool, SQLITE_PATH
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
+# Backend de armazenamento: 'mysql' (padrão) ou 'sqlite' (arquivo local, sem servidor)
+DB_BACKEND = os.getenv('DB_BACKEND', 'mysql').strip().lower()
+
+# Erros de banco dos dois backends (use em "except Error")
+Error = (MySQLError, sqlite3.Error)
+
+# Configuração do pool de conexões
+POOL_NAME = os.getenv('MYSQL_POOL_NAME', 'bot_pool')
+POOL_SIZE = min(int(os.getenv('MYSQL_POOL_SIZE', 10)), pooling.CNX_POOL_MAXSIZE)
+POOL_TIMEOUT = float(os.getenv('MYSQL_POOL_TIMEOUT', 5))  # segundos esperando uma conexão livre
+POOL_PING_INTERVAL = float(os.getenv('MYSQL_POOL_PING_INTERVAL', 30))  # segundos ociosa antes do health check
+
+# Executor dedicado às consultas: limita quantas rodam em paralelo ao tamanho do pool
+DB_EXECUTOR = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix='db')
+
+_pool = None
+_pool_lock = threading.Lock()
+_last_used = {}
+_stats = {
+    'checkouts': 0,
+    'in_use': 0,
+    'peak_in_use': 0,
+    'waits': 0,
+    'timeouts': 0,
+    'pings': 0,
+    'recycled': 0,
+    'errors': 0
+}
+
+def get_connection_config():
+    """Obtém as credenciais do MySQL de acordo com o ambiente"""
+    # Verifica se está em ambiente de produção (Railway)
+    if os.getenv('RAILWAY_ENVIRONMENT') == 'production':
+        return {
+            'host': os.getenv('MYSQL_HOST'),
+            'port': int(os.getenv('MYSQL_PORT', 3306)),
+            'database': os.getenv('MYSQL_DATABASE'),
+            'user': os.getenv('MYSQL_USER'),
+            'password': os.getenv('MYSQL_PASSWORD')
+        }
+
+    # Credenciais fixas para uso local
+    return {
+        'host': 'localhost',
+        'port': 3306,  # Porta padrão do MySQL
+        'database': 'kpftdhra_bot_influenciador',
+        'user': 'root',
+        'password': ''
+    }
+
+def _get_pool():
+    """Cria o pool de conexões na primeira utilização"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None and DB_BACKEND == 'sqlite':
+                _pool = SQLitePool(SQLITE_PATH, POOL_SIZE)
+                print(f"Banco SQLite em {SQLITE_PATH} (modo WAL).")
+            elif _pool is None:
+                _pool = pooling.MySQLConnectionPool(
+                    pool_name=POOL_NAME,
+                    pool_size=POOL_SIZE,
+                    pool_reset_session=True,
+                    **get_connection_config()
+                )
+                print(f"Pool de conexões MySQL criado ({POOL_SIZE} conexões).")
+    return _pool
+
+def _update_stats(key, delta=1):
+    with _pool_lock:
+        _stats[key] += delta
+        if key == 'in_use' and _stats['in_use'] > _stats['peak_in_use']:
+            _stats['peak_in_use'] = _stats['in_use']
+
+class PooledConnection:
+    """
+    Conexão emprestada do pool.
+
+    close() devolve a conexão ao pool em vez de encerrá-la. Se a conexão
+    cair (is_connected() retorna False), ela é devolvida imediatamente para
+    ser reconectada pelo pool, evitando que o slot fique preso.
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def is_connected(self):
+        if self._released:
+            return False
+        try:
+            connected = self._connection.is_connected()
+        except Error:
+            connected = False
+        if not connected:
+            _update_stats('recycled')
+            self.close()
+        return connected
+
+    def close(self):
+        if self._released:
+            return
+        self._released = True
+        _update_stats('in_use', -1)
+        raw = getattr(self._connection, '_cnx', None)
+        try:
+            self._connection.close()
+        except Error as e:
+            # Conexão quebrada: o pool a reconecta no próximo empréstimo
+            print(f"Erro ao devolver conexão ao pool: {e}")
+            _update_stats('errors')
+        if raw is not None:
+            _last_used[id(raw)] = time.monotonic()
+
+def _checkout(pool):
+    """Empresta uma conexão do pool, aguardando até POOL_TIMEOUT segundos"""
+    deadline = time.monotonic() + POOL_TIMEOUT
+    waited = False
+    while True:
+        try:
+            return pool.get_connection()
+        except PoolError:
+            if time.monotonic() >= deadline:
+                _update_stats('timeouts')
+                raise
+            if not waited:
+                _update_stats('waits')
+                waited = True
+            time.sleep(0.01)
+
 def create_connection():
+    connection = None
     try:
-        # Verifica se está em ambiente de produção (Railway)
-        if os.getenv('RAILWAY_ENVIRONMENT') == 'production':
-            connection = mysql.connector.connect(
-                host=os.getenv('MYSQL_HOST'),
-                port=int(os.getenv('MYSQL_PORT', 3306)),
-                database=os.getenv('MYSQL_DATABASE'),
-                user=os.getenv('MYSQL_USER'),
-                password=os.getenv('MYSQL_PASSWORD')
-            )
-        else:
-            # Credenciais fixas para uso local
-            connection = mysql.connector.connect(
-                host='localhost',
-                port=3306,  # Porta padrão do MySQL
-                database='kpftdhra_bot_influenciador',
-                user='root',
-                password=''
-            )
-
-        if connection.is_connected():
-            print("Conexão com o MySQL foi bem-sucedida.")
-            return connection
+        connection = _checkout(_get_pool())
+
+        # Health check apenas para conexões que ficaram muito tempo ociosas
+        raw = getattr(connection, '_cnx', None)
+        last_used = _last_used.get(id(raw)) if raw is not None else None
+        if last_used is not None and time.monotonic() - last_used > POOL_PING_INTERVAL:
+            _update_stats('pings')
+            connection.ping(reconnect=True, attempts=2, delay=0)
+
+        _update_stats('checkouts')
+        _update_stats('in_use')
+        return PooledConnection(connection)
 
     except Error as e:
-        print(f"Erro ao conectar ao MySQL: {e}")
+        _update_stats('errors')
+        print(f"Erro ao conectar ao banco de dados ({DB_BACKEND}): {e}")
+        if connection is not None:
+            # Ping falhou: devolver a conexão para não perder o slot do pool
+            try:
+                connection.close()
+            except Error:
+                pass
         return None
 
+async def run_db(func, *args, **kwargs):
+    """Executa uma função de banco de dados sem bloquear o loop de eventos"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(DB_EXECUTOR, functools.partial(func, *args, **kwargs))
+
+def table_columns(cursor, table):
+    """Colunas existentes de uma tabela (lista vazia se a tabela não existir)"""
+    if DB_BACKEND == 'sqlite':
+        cursor.execute(f"PRAGMA table_info({table})")
+        return [row[1] for row in cursor.fetchall()]
+
+    cursor.execute(
+        "SELECT COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (table,)
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+def table_indexes(cursor, table):
+    """Nomes dos índices de uma tabela"""
+    if DB_BACKEND == 'sqlite':
+        # No SQLite os nomes são globais; o backend os prefixa com a tabela
+        cursor.execute(f"PRAGMA index_list({table})")
+        prefix = f"{table}_"
+        return [row[1][len(prefix):] if row[1].startswith(prefix) else row[1] for row in cursor.fetchall()]
+
+    cursor.execute(
+        "SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (table,)
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+def get_pool_stats():
+    """Retorna estatísticas de uso do pool de conexões"""
+    with _pool_lock:
+        stats = dict(_stats)
+    stats['size'] = POOL_SIZE
+    stats['backend'] = DB_BACKEND
+    return stats
+
 # Exemplo de uso
 if __name__ == "__main__":
     conn = create_connection()
     # ... faça algo com a conexão ...
     if conn:
-        conn.close() 
\ No newline at end of file
+        conn.close()
+    print(get_pool_stats())
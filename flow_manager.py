@@ -1,9 +1,40 @@
 import os
-import asyncio
-from database import create_connection
-from mysql.connector import Error
+import time
+import threading
+from types import MappingProxyType
+from collections import namedtuple
+from database import create_connection, run_db, Error
+from webhook_outbox import enqueue_webhook, get_outbox_stats, webhook_dispatcher
+from user_writes import user_write_buffer
+from media_sender import local_media_sender
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 
+# Cache em memória da tabela bot_config
+CONFIG_REFRESH_INTERVAL = float(os.getenv('CONFIG_REFRESH_INTERVAL', 30))  # segundos entre verificações de versão
+
+_config_cache = None
+_config_version = None
+_config_checked_at = 0.0
+_config_lock = threading.Lock()
+
+# Cache de fluxos compilados (FlowPlan) por id de fluxo
+FLOW_CACHE_TTL = float(os.getenv('FLOW_CACHE_TTL', 300))  # segundos até recompilar por segurança
+
+FlowPlan = namedtuple('FlowPlan', ['flow_id', 'name', 'steps', 'compiled_at'])
+
+_flow_plans = {}
+_default_flow_entry = None  # (flow_id ou None, carregado_em)
+_flow_cache_generation = 0  # incrementada a cada invalidação
+_flow_cache_lock = threading.Lock()
+
+# Cache em memória dos administradores (admin_config)
+ADMIN_REFRESH_INTERVAL = float(os.getenv('ADMIN_REFRESH_INTERVAL', 60))  # segundos entre verificações de versão
+
+_admin_ids = None
+_admin_version = None
+_admin_checked_at = 0.0
+_admin_lock = threading.Lock()
+
 class FlowManager:
     def __init__(self):
         pass
@@ -91,6 +122,7 @@ class FlowManager:
             """
             cursor.execute(query, (flow_id, step_order, step_type, content, media_url))
             connection.commit()
+            invalidate_flow_cache(flow_id)
             return cursor.lastrowid
         except Error as e:
             print(f"Erro ao adicionar etapa: {e}")
@@ -114,6 +146,7 @@ class FlowManager:
             """
             cursor.execute(query, (step_id, button_text, button_type, button_data))
             connection.commit()
+            invalidate_flow_cache()
             return cursor.lastrowid
         except Error as e:
             print(f"Erro ao adicionar botão: {e}")
@@ -131,9 +164,10 @@ class FlowManager:
         
         try:
             cursor = connection.cursor()
-            query = "UPDATE flow_steps SET media_url = %s WHERE id = %s"
+            query = "UPDATE flow_steps SET media_url = %s, file_id = NULL WHERE id = %s"
             cursor.execute(query, (media_url, step_id))
             connection.commit()
+            invalidate_flow_cache()
             return True
         except Error as e:
             print(f"Erro ao atualizar mídia: {e}")
@@ -179,6 +213,7 @@ class FlowManager:
             # Deletar etapa
             cursor.execute("DELETE FROM flow_steps WHERE id = %s", (step_id,))
             connection.commit()
+            invalidate_flow_cache()
             return True
         except Error as e:
             print(f"Erro ao deletar etapa: {e}")
@@ -216,6 +251,7 @@ class FlowManager:
                 cursor.execute(update_query, (i, step[0]))
             
             connection.commit()
+            invalidate_flow_cache(flow_id)
             return True
         except Error as e:
             print(f"Erro ao reordenar etapas: {e}")
@@ -300,6 +336,7 @@ class FlowManager:
             cursor.execute("DELETE FROM flows WHERE id = %s", (flow_id,))
             
             connection.commit()
+            invalidate_flow_cache()
             return True
         except Error as e:
             print(f"Erro ao deletar fluxo: {e}")
@@ -364,6 +401,7 @@ class FlowManager:
                 ))
             
             connection.commit()
+            invalidate_flow_cache(flow_id)
             return step_id
         except Error as e:
             print(f"Erro ao salvar etapa: {e}")
@@ -416,23 +454,8 @@ class FlowManager:
                 connection.close()
     
     def is_admin(self, telegram_id):
-        """Verifica se o usuário é admin"""
-        connection = create_connection()
-        if not connection:
-            return False
-        
-        try:
-            cursor = connection.cursor()
-            query = "SELECT id FROM admin_config WHERE admin_telegram_id = %s"
-            cursor.execute(query, (telegram_id,))
-            return cursor.fetchone() is not None
-        except Error as e:
-            print(f"Erro ao verificar admin: {e}")
-            return False
-        finally:
-            if connection and connection.is_connected():
-                cursor.close()
-                connection.close()
+        """Verifica se o usuário é admin (servido do cache em memória)"""
+        return telegram_id in load_admin_ids()
     
     def add_admin(self, telegram_id):
         """Adiciona um admin"""
@@ -445,6 +468,7 @@ class FlowManager:
             query = "INSERT INTO admin_config (admin_telegram_id) VALUES (%s)"
             cursor.execute(query, (telegram_id,))
             connection.commit()
+            remember_admin(telegram_id)
             return True
         except Error as e:
             print(f"Erro ao adicionar admin: {e}")
@@ -489,6 +513,7 @@ class FlowManager:
             cursor.execute("UPDATE flows SET is_default = TRUE WHERE id = %s", (flow_id,))
             
             connection.commit()
+            invalidate_flow_cache()
             return True
         except Error as e:
             print(f"Erro ao definir fluxo padrão: {e}")
@@ -523,11 +548,212 @@ class FlowManager:
                 cursor.close()
                 connection.close()
 
+class AsyncFlowManager:
+    """Versão assíncrona do FlowManager: cada método roda no executor do banco"""
+    
+    def __init__(self, flow_manager=None):
+        self._flow_manager = flow_manager or FlowManager()
+    
+    def __getattr__(self, name):
+        method = getattr(self._flow_manager, name)
+        if not callable(method):
+            return method
+        
+        async def run(*args, **kwargs):
+            return await run_db(method, *args, **kwargs)
+        
+        return run
+    
+    async def is_admin(self, telegram_id):
+        """Verifica se o usuário é admin sem passar pelo executor do banco, exceto na verificação de versão"""
+        if admin_ids_expired():
+            await run_db(load_admin_ids)
+        return telegram_id in (_admin_ids or ())
+
+def admin_ids_expired():
+    """Indica se o cache de administradores precisa de uma verificação de versão"""
+    return _admin_ids is None or time.monotonic() - _admin_checked_at >= ADMIN_REFRESH_INTERVAL
+
+def load_admin_ids(force=False):
+    """Carrega os telegram_ids de admin_config em memória, recarregando só quando a versão muda"""
+    global _admin_ids, _admin_version, _admin_checked_at
+    
+    with _admin_lock:
+        if not force and not admin_ids_expired():
+            return _admin_ids
+        
+        connection = create_connection()
+        if connection is None:
+            return _admin_ids or frozenset()
+        
+        try:
+            cursor = connection.cursor()
+            
+            # Versão = quantidade e maior id: muda a cada admin inserido ou removido,
+            # inclusive pelo add_admin.py rodando em outro processo
+            cursor.execute("SELECT COUNT(*), MAX(id) FROM admin_config")
+            version = tuple(cursor.fetchone())
+            
+            if force or _admin_ids is None or version != _admin_version:
+                cursor.execute("SELECT admin_telegram_id FROM admin_config")
+                _admin_ids = frozenset(int(row[0]) for row in cursor.fetchall())
+                _admin_version = version
+            
+            _admin_checked_at = time.monotonic()
+            return _admin_ids
+            
+        except Error as e:
+            print(f"Erro ao carregar administradores: {e}")
+            return _admin_ids or frozenset()
+        finally:
+            if connection.is_connected():
+                cursor.close()
+                connection.close()
+
+def remember_admin(telegram_id):
+    """Inclui um admin recém-adicionado no cache e força a verificação de versão"""
+    global _admin_ids, _admin_version
+    
+    with _admin_lock:
+        if _admin_ids is not None:
+            _admin_ids = _admin_ids | {int(telegram_id)}
+        _admin_version = None
+
+def get_admin_cache_stats():
+    """Quantidade de administradores em cache e segundos desde a última verificação"""
+    return {
+        'admins': len(_admin_ids or ()),
+        'age': time.monotonic() - _admin_checked_at if _admin_ids is not None else None
+    }
+
+def build_step_keyboard(buttons):
+    """Monta o teclado inline de uma etapa a partir dos seus botões"""
+    keyboard = []
+    for button in buttons or []:
+        if button['button_type'] == 'url':
+            keyboard.append([InlineKeyboardButton(button['button_text'], url=button['button_data'])])
+        else:
+            keyboard.append([InlineKeyboardButton(button['button_text'], callback_data=button['button_data'])])
+    return InlineKeyboardMarkup(keyboard) if keyboard else None
+
+def compile_flow_plan(flow_id):
+    """Compila um fluxo em um FlowPlan imutável usando uma única consulta"""
+    connection = create_connection()
+    if not connection:
+        return None
+    
+    try:
+        cursor = connection.cursor(dictionary=True)
+        query = """
+        SELECT f.name AS flow_name, fs.*,
+               b.id AS btn_id, b.button_text AS btn_text, b.button_type AS btn_type,
+               b.button_data AS btn_data, b.button_order AS btn_order,
+               mm.duration AS media_duration, mm.is_video_note_ready AS media_ready
+        FROM flows f
+        LEFT JOIN flow_steps fs ON fs.flow_id = f.id AND fs.is_active = TRUE
+        LEFT JOIN buttons b ON b.step_id = fs.id AND b.is_active = TRUE
+        LEFT JOIN media_metadata mm ON mm.media_path = fs.media_url
+        WHERE f.id = %s
+        ORDER BY fs.step_order, fs.id, b.button_order, b.id
+        """
+        cursor.execute(query, (flow_id,))
+        rows = cursor.fetchall()
+        
+        if not rows:
+            return None
+        
+        steps = []
+        buttons_by_step = {}
+        for row in rows:
+            if row['id'] is None:
+                continue
+            
+            if row['id'] not in buttons_by_step:
+                step = {key: value for key, value in row.items() if key != 'flow_name' and not key.startswith('btn_')}
+                steps.append(step)
+                buttons_by_step[row['id']] = []
+            
+            if row['btn_id'] is not None:
+                buttons_by_step[row['id']].append(MappingProxyType({
+                    'id': row['btn_id'],
+                    'button_text': row['btn_text'],
+                    'button_type': row['btn_type'],
+                    'button_data': row['btn_data'],
+                    'button_order': row['btn_order']
+                }))
+        
+        compiled_steps = []
+        for step in steps:
+            buttons = tuple(buttons_by_step[step['id']])
+            step['buttons'] = buttons
+            step['keyboard'] = build_step_keyboard(buttons)
+            compiled_steps.append(MappingProxyType(step))
+        
+        return FlowPlan(flow_id, rows[0]['flow_name'], tuple(compiled_steps), time.monotonic())
+    except Error as e:
+        print(f"Erro ao compilar fluxo {flow_id}: {e}")
+        return None
+    finally:
+        if connection and connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def get_flow_plan(flow_id):
+    """Obtém o FlowPlan de um fluxo, compilando apenas quando não está em cache"""
+    with _flow_cache_lock:
+        plan = _flow_plans.get(flow_id)
+        generation = _flow_cache_generation
+    if plan and time.monotonic() - plan.compiled_at < FLOW_CACHE_TTL:
+        return plan
+    
+    plan = compile_flow_plan(flow_id)
+    if plan:
+        with _flow_cache_lock:
+            # Uma invalidação durante a compilação torna este plano possivelmente antigo
+            if generation == _flow_cache_generation:
+                _flow_plans[flow_id] = plan
+    return plan
+
+def get_default_flow_plan():
+    """Obtém o FlowPlan do fluxo padrão (None se não houver)"""
+    global _default_flow_entry
+    
+    with _flow_cache_lock:
+        entry = _default_flow_entry
+        generation = _flow_cache_generation
+    if entry is None or time.monotonic() - entry[1] >= FLOW_CACHE_TTL:
+        default_flow = FlowManager().get_default_flow()
+        entry = (default_flow['id'] if default_flow else None, time.monotonic())
+        with _flow_cache_lock:
+            if generation == _flow_cache_generation:
+                _default_flow_entry = entry
+    
+    if entry[0] is None:
+        return None
+    return get_flow_plan(entry[0])
+
+def invalidate_flow_cache(flow_id=None):
+    """
+    Descarta fluxos compilados (todos, se flow_id não for informado). Compilações
+    já em andamento não gravam o resultado no cache, pois podem ter lido o fluxo
+    antes da alteração.
+    """
+    global _default_flow_entry, _flow_cache_generation
+    
+    with _flow_cache_lock:
+        _flow_cache_generation += 1
+        if flow_id is None:
+            _flow_plans.clear()
+            _default_flow_entry = None
+        else:
+            _flow_plans.pop(flow_id, None)
+
 def create_admin_keyboard():
     """Cria teclado para menu admin"""
     keyboard = [
         [InlineKeyboardButton("📝 Gerenciar Fluxos", callback_data="admin_flows")],
         [InlineKeyboardButton("⭐ Definir Fluxo Padrão", callback_data="set_default_flow")],
+        [InlineKeyboardButton("📣 Transmissões", callback_data="admin_broadcast")],
         [InlineKeyboardButton("📊 Estatísticas", callback_data="admin_stats")],
         [InlineKeyboardButton("⚙️ Configurações", callback_data="admin_config")],
         [InlineKeyboardButton("🔄 Resetar Vídeo Boas-vindas", callback_data="reset_welcome_video")],
@@ -749,69 +975,75 @@ def get_welcome_message():
     return {
         'text': get_config_value('welcome_text', ''),
         'media_url': get_config_value('welcome_media_url', ''),
-        'media_type': get_config_value('welcome_media_type', '')
+        'media_type': get_config_value('welcome_media_type', ''),
+        'file_id': get_config_value('welcome_media_file_id', '')
     }
 
+def set_welcome_media(media_url, media_type):
+    """Define a mídia de boas-vindas, descartando o file_id da mídia anterior"""
+    return (
+        set_config_value('welcome_media_url', media_url)
+        and set_config_value('welcome_media_type', media_type)
+        and set_config_value('welcome_media_file_id', '')
+    )
+
+def extract_file_id(message):
+    """Obtém o file_id da mídia de uma mensagem enviada pelo bot"""
+    if message is None:
+        return None
+    if message.photo:
+        return message.photo[-1].file_id
+    for media in (message.video_note, message.video, message.animation, message.document, message.audio):
+        if media:
+            return media.file_id
+    return None
+
+async def remember_welcome_file_id(welcome_data, message):
+    """Guarda o file_id da mídia de boas-vindas após o primeiro upload"""
+    if welcome_data.get('file_id'):
+        return
+    file_id = extract_file_id(message)
+    if file_id:
+        await run_db(set_config_value, 'welcome_media_file_id', file_id)
+
 async def send_welcome_message(update, context):
     """Envia a mensagem de boas-vindas configurada"""
-    if not is_welcome_enabled():
+    if not await run_db(is_welcome_enabled):
         return False
     
-    welcome_data = get_welcome_message()
+    welcome_data = await run_db(get_welcome_message)
     
     if not welcome_data['text'] and not welcome_data['media_url']:
         return False
     
+    caption = welcome_data['text'] if welcome_data['text'] else None
+    
     try:
         if welcome_data['media_url']:
-            # Enviar mídia com texto
-            if welcome_data['media_type'] == 'photo':
-                await update.message.reply_photo(
-                    photo=welcome_data['media_url'],
-                    caption=welcome_data['text'] if welcome_data['text'] else None
-                )
-            elif welcome_data['media_type'] == 'video':
-                await update.message.reply_video(
-                    video=welcome_data['media_url'],
-                    caption=welcome_data['text'] if welcome_data['text'] else None
-                )
-            elif welcome_data['media_type'] == 'video_note':
-                # Para vídeo redondo, enviar primeiro o vídeo e depois o texto separadamente
-                await update.message.reply_video_note(
-                    video_note=welcome_data['media_url']
-                )
-                # Enviar texto separadamente após o vídeo redondo
-                if welcome_data['text']:
-                    await update.message.reply_text(welcome_data['text'])
+            async def send(media):
+                # Enviar mídia com texto
+                if welcome_data['media_type'] == 'photo':
+                    return await update.message.reply_photo(photo=media, caption=caption)
+                elif welcome_data['media_type'] == 'video':
+                    return await update.message.reply_video(video=media, caption=caption)
+                elif welcome_data['media_type'] == 'video_note':
+                    # Para vídeo redondo, enviar primeiro o vídeo e depois o texto separadamente
+                    return await update.message.reply_video_note(video_note=media)
+                # Outros tipos são enviados como documento
+                return await update.message.reply_document(document=media, caption=caption)
+            
+            # Depois do primeiro upload a mídia é referenciada pelo file_id do Telegram
+            media = welcome_data['file_id'] or welcome_data['media_url']
+            if media.startswith('uploads/') or media.startswith('uploads\\'):
+                message = await local_media_sender.send(media, welcome_data['media_type'], send)
             else:
-                # Fallback para arquivo local
-                if welcome_data['media_url'].startswith('uploads/') or welcome_data['media_url'].startswith('uploads\\'):
-                    with open(welcome_data['media_url'], 'rb') as f:
-                        file_data = f.read()
-                    
-                    if welcome_data['media_type'] == 'photo':
-                        await update.message.reply_photo(
-                            photo=file_data,
-                            caption=welcome_data['text'] if welcome_data['text'] else None
-                        )
-                    elif welcome_data['media_type'] == 'video':
-                        await update.message.reply_video(
-                            video=file_data,
-                            caption=welcome_data['text'] if welcome_data['text'] else None
-                        )
-                    elif welcome_data['media_type'] == 'video_note':
-                        # Para vídeo redondo local, enviar primeiro o vídeo e depois o texto
-                        await update.message.reply_video_note(
-                            video_note=file_data
-                        )
-                        if welcome_data['text']:
-                            await update.message.reply_text(welcome_data['text'])
-                    else:
-                        # Enviar como documento
-                        await update.message.reply_document(
-                            document=file_data,
-                            caption=welcome_data['text'] if welcome_data['text'] else None
-                        )
+                message = await send(media)
+            
+            # Enviar texto separadamente após o vídeo redondo
+            if welcome_data['media_type'] == 'video_note' and welcome_data['text']:
+                await update.message.reply_text(welcome_data['text'])
+            
+            await remember_welcome_file_id(welcome_data, message)
         else:
             # Enviar apenas texto
             await update.message.reply_text(welcome_data['text'])
@@ -827,11 +1059,11 @@ async def send_welcome_video_note_for_signup(update, context):
     user = update.effective_user
     print(f"🔍 DEBUG: send_welcome_video_note_for_signup - Iniciando para usuário {user.id}")
     
-    if not is_welcome_enabled():
+    if not await run_db(is_welcome_enabled):
         print(f"🔍 DEBUG: Mensagem de boas-vindas não está habilitada")
         return False
     
-    welcome_data = get_welcome_message()
+    welcome_data = await run_db(get_welcome_message)
     print(f"🔍 DEBUG: Dados da mensagem de boas-vindas: {welcome_data}")
     
     # Só enviar se for vídeo (normal ou redondo)
@@ -842,149 +1074,103 @@ async def send_welcome_video_note_for_signup(update, context):
     # Verificar se o usuário já recebeu o vídeo
     user = update.effective_user
     print(f"🔍 DEBUG: Verificando se usuário {user.id} já recebeu o vídeo")
-    has_received = has_user_received_welcome_video(user.id)
+    has_received = await run_db(has_user_received_welcome_video, user.id)
     print(f"🔍 DEBUG: Usuário {user.id} já recebeu vídeo: {has_received}")
     if has_received:
         print(f"🔍 DEBUG: Usuário {user.id} já recebeu o vídeo redondo de boas-vindas")
         return False
     
-    # Configurações de retry
-    max_retries = 3
-    timeout_seconds = 30.0
+    # RetryAfter e falhas de rede são refeitos pelo send_scheduler
+    is_local_file = not welcome_data['file_id'] and (
+        welcome_data['media_url'].startswith('uploads/') or welcome_data['media_url'].startswith('uploads\\')
+    )
+    if is_local_file and not os.path.exists(welcome_data['media_url']):
+        print(f"❌ Arquivo não encontrado: {welcome_data['media_url']}")
+        return False
+    
+    try:
+        if is_local_file:
+            message = await local_media_sender.send(
+                welcome_data['media_url'], welcome_data['media_type'],
+                lambda media: reply_welcome_video(update, welcome_data, media)
+            )
+        else:
+            # Mídia já enviada antes (file_id) ou URL remota
+            message = await reply_welcome_video(update, welcome_data, welcome_data['file_id'] or welcome_data['media_url'])
+        
+        # Enviar texto separadamente se for video_note e tiver texto
+        if welcome_data['media_type'] == 'video_note' and welcome_data['text']:
+            await update.message.reply_text(welcome_data['text'])
+        
+        # Guardar o file_id para os próximos envios e marcar que o usuário já recebeu o vídeo
+        await remember_welcome_file_id(welcome_data, message)
+        await run_db(mark_welcome_video_sent, user.id)
+        print(f"🔍 DEBUG: ✅ Vídeo de boas-vindas enviado com sucesso para usuário {user.id}")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Erro ao enviar vídeo redondo de boas-vindas para cadastro: {e}")
+        return False
+
+async def reply_welcome_video(update, welcome_data, media):
+    """Envia o vídeo de boas-vindas como vídeo redondo ou vídeo normal"""
+    if welcome_data['media_type'] == 'video_note':
+        return await update.message.reply_video_note(video_note=media)
+    return await update.message.reply_video(
+        video=media,
+        caption=welcome_data['text'] if welcome_data['text'] else None
+    )
+
+def load_config_snapshot(force=False):
+    """Carrega a tabela bot_config em memória, recarregando só quando a versão muda"""
+    global _config_cache, _config_version, _config_checked_at
     
-    # Verificar tamanho do arquivo se for local
-    if welcome_data['media_url'].startswith('uploads/') or welcome_data['media_url'].startswith('uploads\\'):
-        if os.path.exists(welcome_data['media_url']):
-            file_size = os.path.getsize(welcome_data['media_url'])
-            file_size_mb = file_size / (1024 * 1024)
-            print(f"🔍 DEBUG: Tamanho do arquivo: {file_size_mb:.2f} MB")
-            
-            # Se o arquivo for muito grande (> 50MB), tentar comprimir
-            if file_size_mb > 50:
-                print(f"🔍 DEBUG: Arquivo muito grande ({file_size_mb:.2f} MB), tentando comprimir...")
-                try:
-                    from bot import convert_video_to_video_note
-                    with open(welcome_data['media_url'], 'rb') as f:
-                        video_data = f.read()
-                    
-                    conversion_success, converted_data, conversion_message = await convert_video_to_video_note(video_data)
-                    if conversion_success:
-                        # Salvar versão comprimida
-                        compressed_path = welcome_data['media_url'].replace('.mp4', '_compressed.mp4')
-                        with open(compressed_path, 'wb') as f:
-                            f.write(converted_data)
-                        welcome_data['media_url'] = compressed_path
-                        print(f"🔍 DEBUG: Arquivo comprimido salvo em: {compressed_path}")
-                    else:
-                        print(f"🔍 DEBUG: Falha na compressão: {conversion_message}")
-                except Exception as e:
-                    print(f"🔍 DEBUG: Erro ao tentar comprimir: {e}")
-    
-    for attempt in range(max_retries):
+    with _config_lock:
+        now = time.monotonic()
+        if not force and _config_cache is not None and now - _config_checked_at < CONFIG_REFRESH_INTERVAL:
+            return _config_cache
+        
+        connection = create_connection()
+        if connection is None:
+            return _config_cache or {}
+        
         try:
-            print(f"🔍 DEBUG: Tentativa {attempt + 1}/{max_retries} de envio do vídeo de boas-vindas")
+            cursor = connection.cursor()
             
-            # Enviar vídeo (normal ou redondo) com timeout
-            if welcome_data['media_url'].startswith('uploads/') or welcome_data['media_url'].startswith('uploads\\'):
-                # Arquivo local
-                # Verificar se o arquivo existe
-                if not os.path.exists(welcome_data['media_url']):
-                    print(f"❌ Arquivo não encontrado: {welcome_data['media_url']}")
-                    return False
-                
-                # Enviar baseado no tipo de vídeo com timeout
-                if welcome_data['media_type'] == 'video_note':
-                    # Enviar como video_note com timeout
-                    await asyncio.wait_for(
-                        update.message.reply_video_note(
-                            video_note=open(welcome_data['media_url'], 'rb')
-                        ),
-                        timeout=timeout_seconds
-                    )
-                else:
-                    # Enviar como vídeo normal com timeout
-                    await asyncio.wait_for(
-                        update.message.reply_video(
-                            video=open(welcome_data['media_url'], 'rb'),
-                            caption=welcome_data['text'] if welcome_data['text'] else None
-                        ),
-                        timeout=timeout_seconds
-                    )
-            else:
-                # URL remota com timeout
-                if welcome_data['media_type'] == 'video_note':
-                    await asyncio.wait_for(
-                        update.message.reply_video_note(video_note=welcome_data['media_url']),
-                        timeout=timeout_seconds
-                    )
-                else:
-                    await asyncio.wait_for(
-                        update.message.reply_video(
-                            video=welcome_data['media_url'],
-                            caption=welcome_data['text'] if welcome_data['text'] else None
-                        ),
-                        timeout=timeout_seconds
-                    )
+            # Verificação barata de versão antes de recarregar tudo. updated_at tem
+            # resolução de 1 segundo, então a versão inclui a soma de revision,
+            # incrementada a cada set_config_value (inclusive de outro processo)
+            cursor.execute("SELECT COUNT(*), MAX(id), SUM(revision), MAX(updated_at) FROM bot_config")
+            version = tuple(cursor.fetchone())
             
-            # Enviar texto separadamente se for video_note e tiver texto
-            if welcome_data['media_type'] == 'video_note' and welcome_data['text']:
-                await asyncio.wait_for(
-                    update.message.reply_text(welcome_data['text']),
-                    timeout=10.0  # Timeout menor para texto
-                )
+            if force or _config_cache is None or version != _config_version:
+                cursor.execute("SELECT config_key, config_value FROM bot_config")
+                _config_cache = {key: value for key, value in cursor.fetchall()}
+                _config_version = version
             
-            # Marcar que o usuário já recebeu o vídeo
-            mark_welcome_video_sent(user.id)
-            print(f"🔍 DEBUG: ✅ Vídeo de boas-vindas enviado com sucesso para usuário {user.id}")
+            _config_checked_at = now
+            return _config_cache
             
-            return True
-            
-        except asyncio.TimeoutError:
-            print(f"🔍 DEBUG: ⏰ Timeout na tentativa {attempt + 1} de envio do vídeo de boas-vindas")
-            if attempt == max_retries - 1:
-                print(f"❌ Timeout após {max_retries} tentativas de envio do vídeo de boas-vindas")
-                return False
-            else:
-                await asyncio.sleep(2)  # Aguardar 2 segundos antes da próxima tentativa
-                
-        except Exception as e:
-            print(f"🔍 DEBUG: ❌ Erro na tentativa {attempt + 1}: {e}")
-            if attempt == max_retries - 1:
-                print(f"❌ Erro ao enviar vídeo redondo de boas-vindas para cadastro após {max_retries} tentativas: {e}")
-                return False
-            else:
-                await asyncio.sleep(2)
-    
-    return False
+        except Error as e:
+            print(f"Erro ao carregar configurações: {e}")
+            return _config_cache or {}
+        finally:
+            if connection.is_connected():
+                cursor.close()
+                connection.close()
 
 def get_config_value(config_key, default=None):
-    """Obtém o valor de uma configuração do banco de dados"""
-    connection = create_connection()
-    if connection is None:
-        return default
-    
-    try:
-        cursor = connection.cursor()
-        
-        query = "SELECT config_value FROM bot_config WHERE config_key = %s"
-        cursor.execute(query, (config_key,))
-        result = cursor.fetchone()
-        
-        if result:
-            return result[0]
-        else:
-            return default
-            
-    except Error as e:
-        print(f"Erro ao obter configuração '{config_key}': {e}")
-        return default
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
+    """Obtém o valor de uma configuração (servido do cache em memória)"""
+    config = load_config_snapshot()
+    if config_key in config:
+        return config[config_key]
+    return default
 
 def set_config_value(config_key, config_value):
     """Define o valor de uma configuração no banco de dados"""
+    global _config_version, _config_checked_at
+    
     connection = create_connection()
     if connection is None:
         return False
@@ -999,7 +1185,7 @@ def set_config_value(config_key, config_value):
         
         if exists:
             # Atualizar configuração existente
-            update_query = "UPDATE bot_config SET config_value = %s WHERE config_key = %s"
+            update_query = "UPDATE bot_config SET config_value = %s, revision = revision + 1 WHERE config_key = %s"
             cursor.execute(update_query, (config_value, config_key))
         else:
             # Inserir nova configuração
@@ -1007,6 +1193,14 @@ def set_config_value(config_key, config_value):
             cursor.execute(insert_query, (config_key, config_value))
         
         connection.commit()
+        
+        # Atualizar o cache e forçar recarga completa já na próxima leitura
+        with _config_lock:
+            if _config_cache is not None:
+                _config_cache[config_key] = config_value
+            _config_version = None
+            _config_checked_at = 0.0
+        
         return True
         
     except Error as e:
@@ -1045,6 +1239,9 @@ def create_webhook_keyboard():
     else:
         keyboard.append([InlineKeyboardButton("✅ Ativar Webhook", callback_data="webhook_enable")])
     
+    if get_outbox_stats()['dead']:
+        keyboard.append([InlineKeyboardButton("🔁 Reenviar Falhas", callback_data="webhook_retry_dead")])
+    
     keyboard.append([InlineKeyboardButton("🔙 Voltar", callback_data="admin_config")])
     return InlineKeyboardMarkup(keyboard)
 
@@ -1061,22 +1258,30 @@ def get_webhook_events():
     events = get_config_value('webhook_events', 'bot_access,cadastro_concluido')
     return events.split(',')
 
+# Coluna de users que registra o envio de cada webhook único
+WEBHOOK_SENT_COLUMNS = {
+    'bot_access': 'webhook_bot_access_sent',
+    'cadastro_concluido': 'webhook_cadastro_sent'
+}
+
 def is_webhook_already_sent(telegram_id, event_type):
     """Verifica se o webhook já foi enviado para o usuário"""
+    column = WEBHOOK_SENT_COLUMNS.get(event_type)
+    if column is None:
+        return False
+    
+    # Marcação ainda não gravada no banco
+    pending = user_write_buffer.get(telegram_id)
+    if column in pending:
+        return bool(pending[column])
+    
     connection = create_connection()
     if not connection:
         return False
     
     try:
         cursor = connection.cursor()
-        
-        if event_type == 'bot_access':
-            cursor.execute("SELECT webhook_bot_access_sent FROM users WHERE telegram_id = %s", (telegram_id,))
-        elif event_type == 'cadastro_concluido':
-            cursor.execute("SELECT webhook_cadastro_sent FROM users WHERE telegram_id = %s", (telegram_id,))
-        else:
-            return False
-        
+        cursor.execute(f"SELECT {column} FROM users WHERE telegram_id = %s", (telegram_id,))
         result = cursor.fetchone()
         return result[0] if result else False
         
@@ -1089,116 +1294,60 @@ def is_webhook_already_sent(telegram_id, event_type):
             connection.close()
 
 def mark_webhook_as_sent(telegram_id, event_type):
-    """Marca o webhook como enviado para o usuário"""
-    connection = create_connection()
-    if not connection:
+    """Marca o webhook como enviado para o usuário (gravado em lote pelo user_write_buffer)"""
+    column = WEBHOOK_SENT_COLUMNS.get(event_type)
+    if column is None:
         return False
     
-    try:
-        cursor = connection.cursor()
-        
-        if event_type == 'bot_access':
-            cursor.execute("""
-                UPDATE users 
-                SET webhook_bot_access_sent = TRUE, webhook_sent_at = NOW() 
-                WHERE telegram_id = %s
-            """, (telegram_id,))
-        elif event_type == 'cadastro_concluido':
-            cursor.execute("""
-                UPDATE users 
-                SET webhook_cadastro_sent = TRUE, webhook_sent_at = NOW() 
-                WHERE telegram_id = %s
-            """, (telegram_id,))
-        else:
-            return False
-        
-        connection.commit()
-        print(f"✅ Webhook {event_type} marcado como enviado para usuário {telegram_id}")
-        return True
-        
-    except Error as e:
-        print(f"❌ Erro ao marcar webhook como enviado: {e}")
-        return False
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
+    from datetime import datetime
+    
+    user_write_buffer.update(telegram_id, **{column: True, 'webhook_sent_at': datetime.now()})
+    print(f"✅ Webhook {event_type} marcado como enviado para usuário {telegram_id}")
+    return True
 
-def send_webhook(event_type, user_data=None, flow_data=None):
-    """Envia webhook para CRM"""
+def prepare_webhook(event_type, user_data=None, flow_data=None):
+    """Verifica as configurações e monta o payload do webhook (None se não deve ser enviado)"""
     if not is_webhook_enabled():
-        return False
+        return None
     
     webhook_url = get_webhook_url()
     if not webhook_url:
-        return False
+        return None
     
     # Verificar se o evento está ativo
     active_events = get_webhook_events()
     if event_type not in active_events:
-        return False
+        return None
     
-    # Para webhook de bot_access, verificar se já foi enviado
-    if event_type == 'bot_access' and user_data and 'telegram_id' in user_data:
-        if is_webhook_already_sent(user_data['telegram_id'], 'bot_access'):
-            print(f"🔗 Webhook bot_access já enviado para usuário {user_data['telegram_id']}")
-            return True
+    # Para webhooks de bot_access e cadastro_concluido, verificar se já foi enviado
+    if event_type in ['bot_access', 'cadastro_concluido'] and user_data and 'telegram_id' in user_data:
+        if is_webhook_already_sent(user_data['telegram_id'], event_type):
+            print(f"🔗 Webhook {event_type} já enviado para usuário {user_data['telegram_id']}")
+            return None
     
-    # Para webhook de cadastro_concluido, verificar se já foi enviado
-    if event_type == 'cadastro_concluido' and user_data and 'telegram_id' in user_data:
-        if is_webhook_already_sent(user_data['telegram_id'], 'cadastro_concluido'):
-            print(f"🔗 Webhook cadastro_concluido já enviado para usuário {user_data['telegram_id']}")
-            return True
+    from datetime import datetime
     
+    # Preparar dados do webhook
+    webhook_data = {
+        'event_type': event_type,
+        'timestamp': datetime.now().isoformat(),
+        'bot_token': get_config_value('bot_token', ''),
+        'user_data': user_data or {},
+        'flow_data': flow_data or {}
+    }
+    return webhook_url, webhook_data
+
+async def send_webhook(event_type, user_data=None, flow_data=None):
+    """Enfileira o webhook para o CRM; o envio fica a cargo do webhook_dispatcher"""
     try:
-        import aiohttp
-        import asyncio
-        import json
-        from datetime import datetime
-        
-        # Preparar dados do webhook
-        webhook_data = {
-            'event_type': event_type,
-            'timestamp': datetime.now().isoformat(),
-            'bot_token': get_config_value('bot_token', ''),
-            'user_data': user_data or {},
-            'flow_data': flow_data or {}
-        }
-        
-        # Enviar webhook de forma assíncrona
-        async def send_webhook_async():
-            try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(
-                        webhook_url,
-                        json=webhook_data,
-                        headers={'Content-Type': 'application/json'},
-                        timeout=aiohttp.ClientTimeout(total=10)
-                    ) as response:
-                        if response.status == 200:
-                            print(f"✅ Webhook enviado com sucesso: {event_type}")
-                            
-                            # Marcar como enviado se for bot_access ou cadastro_concluido
-                            if event_type in ['bot_access', 'cadastro_concluido'] and user_data and 'telegram_id' in user_data:
-                                mark_webhook_as_sent(user_data['telegram_id'], event_type)
-                            
-                            return True
-                        else:
-                            print(f"❌ Erro no webhook: {response.status}")
-                            return False
-            except Exception as e:
-                print(f"❌ Erro ao enviar webhook: {e}")
-                return False
-        
-        # Executar de forma assíncrona
-        loop = asyncio.get_event_loop()
-        if loop.is_running():
-            # Se já estamos em um loop assíncrono, criar task
-            asyncio.create_task(send_webhook_async())
-        else:
-            # Se não, executar diretamente
-            loop.run_until_complete(send_webhook_async())
+        prepared = await run_db(prepare_webhook, event_type, user_data, flow_data)
+        if not prepared:
+            return False
         
+        # O evento fica salvo na outbox até ser entregue, mesmo se o CRM estiver fora
+        if not await run_db(enqueue_webhook, *prepared):
+            return False
+        webhook_dispatcher.notify()
         return True
         
     except Exception as e:
@@ -1416,6 +1565,7 @@ def update_step_content(step_id, content):
         query = "UPDATE flow_steps SET content = %s WHERE id = %s"
         cursor.execute(query, (content, step_id))
         connection.commit()
+        invalidate_flow_cache()
         
         return True
         
@@ -1436,9 +1586,11 @@ def update_step_media_url(step_id, media_url):
     try:
         cursor = connection.cursor()
         
-        query = "UPDATE flow_steps SET media_url = %s WHERE id = %s"
+        # Nova mídia: o file_id anterior deixa de valer
+        query = "UPDATE flow_steps SET media_url = %s, file_id = NULL WHERE id = %s"
         cursor.execute(query, (media_url, step_id))
         connection.commit()
+        invalidate_flow_cache()
         
         return True
         
@@ -1450,6 +1602,91 @@ def update_step_media_url(step_id, media_url):
             cursor.close()
             connection.close()
 
+def update_step_file_id(step_id, file_id):
+    """Guarda o file_id do Telegram da mídia de uma etapa"""
+    connection = create_connection()
+    if not connection:
+        return False
+    
+    try:
+        cursor = connection.cursor()
+        
+        query = "UPDATE flow_steps SET file_id = %s WHERE id = %s"
+        cursor.execute(query, (file_id, step_id))
+        connection.commit()
+        invalidate_flow_cache()
+        
+        return True
+        
+    except Error as e:
+        print(f"Erro ao salvar file_id da etapa: {e}")
+        return False
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def save_media_metadata(media_path, info, is_video_note_ready=False):
+    """Registra os dados do ffprobe e o sha256 de uma mídia recebida"""
+    connection = create_connection()
+    if not connection:
+        return False
+    
+    try:
+        cursor = connection.cursor()
+        
+        query = """
+        INSERT INTO media_metadata
+            (media_path, duration, width, height, codec, size_bytes, sha256, is_video_note_ready)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            duration = VALUES(duration), width = VALUES(width), height = VALUES(height),
+            codec = VALUES(codec), size_bytes = VALUES(size_bytes), sha256 = VALUES(sha256),
+            is_video_note_ready = VALUES(is_video_note_ready)
+        """
+        cursor.execute(query, (
+            media_path,
+            info.get('duration'),
+            info.get('width'),
+            info.get('height'),
+            info.get('codec'),
+            info.get('size_bytes'),
+            info.get('sha256'),
+            is_video_note_ready
+        ))
+        connection.commit()
+        invalidate_flow_cache()
+        
+        return True
+        
+    except Error as e:
+        print(f"Erro ao salvar metadados da mídia: {e}")
+        return False
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def get_media_metadata(media_path):
+    """Obtém os metadados registrados no upload de uma mídia"""
+    connection = create_connection()
+    if not connection:
+        return None
+    
+    try:
+        cursor = connection.cursor(dictionary=True)
+        
+        cursor.execute("SELECT * FROM media_metadata WHERE media_path = %s", (media_path,))
+        return cursor.fetchone()
+        
+    except Error as e:
+        print(f"Erro ao obter metadados da mídia: {e}")
+        return None
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
 def delete_step_completely(step_id):
     """Deleta uma etapa completamente (incluindo botões)"""
     connection = create_connection()
@@ -1466,6 +1703,7 @@ def delete_step_completely(step_id):
         cursor.execute("DELETE FROM flow_steps WHERE id = %s", (step_id,))
         
         connection.commit()
+        invalidate_flow_cache()
         return True
         
     except Error as e:
@@ -1558,6 +1796,11 @@ def generate_excel_report(report_type):
 
 def has_user_received_welcome_video(telegram_id):
     """Verifica se o usuário já recebeu o vídeo redondo de boas-vindas"""
+    # Marcação ainda não gravada no banco
+    pending = user_write_buffer.get(telegram_id)
+    if 'welcome_video_sent' in pending:
+        return bool(pending['welcome_video_sent'])
+    
     connection = create_connection()
     if connection is None:
         return False
@@ -1583,34 +1826,28 @@ def has_user_received_welcome_video(telegram_id):
             connection.close()
 
 def mark_welcome_video_sent(telegram_id):
-    """Marca que o usuário já recebeu o vídeo redondo de boas-vindas"""
+    """Marca que o usuário já recebeu o vídeo redondo de boas-vindas (cria o usuário se não existir)"""
+    user_write_buffer.update(telegram_id, welcome_video_sent=True)
+    return True
+
+def reset_all_welcome_video_sent():
+    """Reseta o controle de vídeo de boas-vindas para todos os usuários"""
+    # Gravar antes as marcações pendentes, para que não sejam aplicadas depois do reset
+    user_write_buffer.flush()
+    
     connection = create_connection()
-    if connection is None:
-        return False
+    if not connection:
+        return None
     
     try:
         cursor = connection.cursor()
-        
-        # Verificar se o usuário existe
-        check_query = "SELECT id FROM users WHERE telegram_id = %s"
-        cursor.execute(check_query, (telegram_id,))
-        user_exists = cursor.fetchone()
-        
-        if user_exists:
-            # Atualizar campo welcome_video_sent
-            update_query = "UPDATE users SET welcome_video_sent = TRUE WHERE telegram_id = %s"
-            cursor.execute(update_query, (telegram_id,))
-        else:
-            # Inserir usuário com welcome_video_sent = TRUE
-            insert_query = "INSERT INTO users (telegram_id, welcome_video_sent) VALUES (%s, TRUE)"
-            cursor.execute(insert_query, (telegram_id,))
-        
+        cursor.execute("UPDATE users SET welcome_video_sent = FALSE")
         connection.commit()
-        return True
+        return cursor.rowcount
         
     except Error as e:
-        print(f"Erro ao marcar vídeo de boas-vindas como enviado: {e}")
-        return False
+        print(f"❌ Erro ao resetar controle de vídeo de boas-vindas: {e}")
+        return None
     finally:
         if connection.is_connected():
             cursor.close()
@@ -1618,22 +1855,5 @@ def mark_welcome_video_sent(telegram_id):
 
 def reset_welcome_video_sent(telegram_id):
     """Reseta o controle de vídeo de boas-vindas para o usuário (para testes)"""
-    connection = create_connection()
-    if connection is None:
-        return False
-    
-    try:
-        cursor = connection.cursor()
-        
-        update_query = "UPDATE users SET welcome_video_sent = FALSE WHERE telegram_id = %s"
-        cursor.execute(update_query, (telegram_id,))
-        connection.commit()
-        return True
-        
-    except Error as e:
-        print(f"Erro ao resetar vídeo de boas-vindas: {e}")
-        return False
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close() 
\ No newline at end of file
+    user_write_buffer.update(telegram_id, welcome_video_sent=False)
+    return True 
\ No newline at end of file
@@ -0,0 +1,144 @@
+import os
+import asyncio
+import aiohttp
+import aiofiles
+from dotenv import load_dotenv
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+# Configuração dos downloads de mídia
+DOWNLOAD_CONCURRENCY = int(os.getenv('DOWNLOAD_CONCURRENCY', 4))          # downloads simultâneos
+DOWNLOAD_CHUNK_SIZE = int(os.getenv('DOWNLOAD_CHUNK_SIZE', 256 * 1024))   # bytes lidos/gravados por vez
+DOWNLOAD_ATTEMPTS = int(os.getenv('DOWNLOAD_ATTEMPTS', 3))                # tentativas (retomando do ponto parado)
+DOWNLOAD_TIMEOUT = float(os.getenv('DOWNLOAD_TIMEOUT', 30))               # segundos sem receber dados antes de desistir
+
+# Sufixo do arquivo parcial, renomeado para o destino ao terminar
+PARTIAL_SUFFIX = '.part'
+
+
+class DownloadError(Exception):
+    """Resposta HTTP que não permite continuar o download"""
+
+
+class MediaDownloader:
+    """
+    Baixa arquivos direto para o disco, em blocos de chunk_size bytes.
+
+    O conteúdo é gravado em <destino>.part e renomeado atomicamente para o
+    destino no fim, então um arquivo em uploads/ nunca fica pela metade. Se
+    a conexão cair, a próxima tentativa (ou o próximo download do mesmo
+    arquivo) continua do tamanho já gravado com um cabeçalho Range.
+
+    Todos os downloads usam uma única sessão HTTP, no máximo concurrency
+    rodam ao mesmo tempo e pedidos repetidos do mesmo destino aguardam o
+    download que já está em andamento.
+    """
+
+    def __init__(self, concurrency=DOWNLOAD_CONCURRENCY, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self._session = None
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._in_flight = {}
+        self._waiting = 0
+        self._stats = {'downloads': 0, 'resumed': 0, 'failed': 0, 'bytes': 0}
+
+    def _get_session(self):
+        """Cria a sessão compartilhada no loop em execução na primeira utilização"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=None, sock_read=DOWNLOAD_TIMEOUT),
+                connector=aiohttp.TCPConnector(limit=self.concurrency)
+            )
+        return self._session
+
+    async def stop(self):
+        """Fecha a sessão HTTP; arquivos .part ficam para serem retomados"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def download(self, url, destination):
+        """Baixa url para destination. Retorna True se o arquivo completo foi salvo"""
+        destination = str(destination)
+        task = self._in_flight.get(destination)
+        if task is None:
+            task = asyncio.ensure_future(self._download(url, destination))
+            self._in_flight[destination] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(destination, None))
+        return await asyncio.shield(task)
+
+    async def _download(self, url, destination):
+        session = self._get_session()
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+
+        try:
+            for attempt in range(1, DOWNLOAD_ATTEMPTS + 1):
+                try:
+                    await self._fetch(session, url, destination)
+                    self._stats['downloads'] += 1
+                    return True
+                except DownloadError as e:
+                    print(f"Erro ao baixar arquivo: {e}")
+                    break
+                except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                    print(f"Erro ao baixar arquivo (tentativa {attempt}/{DOWNLOAD_ATTEMPTS}): {e}")
+                    if attempt < DOWNLOAD_ATTEMPTS:
+                        await asyncio.sleep(attempt)
+
+            self._stats['failed'] += 1
+            return False
+        finally:
+            self._semaphore.release()
+
+    async def _fetch(self, session, url, destination):
+        """Uma tentativa: continua o .part existente e renomeia ao terminar"""
+        partial_path = destination + PARTIAL_SUFFIX
+        offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+
+        async with session.get(url, headers=headers) as response:
+            if response.status == 416:
+                # O .part não corresponde a este arquivo: recomeçar do zero
+                os.unlink(partial_path)
+                raise aiohttp.ClientPayloadError("Range inválido para o arquivo parcial")
+            if response.status == 206:
+                mode = 'ab'
+                self._stats['resumed'] += 1
+                print(f"Retomando download a partir de {offset} bytes: {destination}")
+            elif response.status == 200:
+                # Servidor ignorou o Range (ou não havia .part): gravar do início
+                mode = 'wb'
+            else:
+                raise DownloadError(f"HTTP {response.status}")
+
+            expected = response.content_length
+            received = 0
+            async with aiofiles.open(partial_path, mode) as f:
+                async for chunk in response.content.iter_chunked(self.chunk_size):
+                    await f.write(chunk)
+                    received += len(chunk)
+                    self._stats['bytes'] += len(chunk)
+
+            if expected is not None and received != expected:
+                raise aiohttp.ClientPayloadError(f"Recebidos {received} de {expected} bytes")
+
+        os.replace(partial_path, destination)
+
+    def get_stats(self):
+        """Downloads em andamento, na fila, concluídos, retomados e bytes recebidos"""
+        return dict(
+            self._stats,
+            running=len(self._in_flight) - self._waiting,
+            waiting=self._waiting,
+            concurrency=self.concurrency
+        )
+
+
+# Baixador compartilhado pelo bot
+media_downloader = MediaDownloader()
@@ -0,0 +1,191 @@
+import os
+import json
+import asyncio
+import hashlib
+from dotenv import load_dotenv
+from media_worker import media_pool, MediaJobError
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+FFMPEG_BIN = os.getenv('FFMPEG_BIN', 'ffmpeg')
+FFPROBE_BIN = os.getenv('FFPROBE_BIN', 'ffprobe')
+
+# Requisitos do Telegram para video note
+VIDEO_NOTE_SIZE = 512
+VIDEO_NOTE_MAX_DURATION = 60
+VIDEO_NOTE_MAX_MB = 100
+VIDEO_NOTE_MIN_SIDE = 256
+VIDEO_NOTE_CODECS = ('h264', 'mpeg4')
+
+# Tamanho alvo do arquivo convertido (define o bitrate de uma única passada)
+VIDEO_NOTE_TARGET_MB = float(os.getenv('VIDEO_NOTE_TARGET_MB', 12))
+AUDIO_BITRATE_KBPS = 64
+MIN_VIDEO_BITRATE_KBPS = 150
+MAX_VIDEO_BITRATE_KBPS = 1500
+
+# Identifica os parâmetros de transcode_video_note no cache de conversões.
+# Mude a versão ao alterar o comando do ffmpeg para não reaproveitar saídas antigas.
+VIDEO_NOTE_PRESET = f"video_note-v1-{VIDEO_NOTE_SIZE}px-{VIDEO_NOTE_TARGET_MB:g}mb"
+
+
+async def probe_video(file_path):
+    """Lê duração, dimensões e codec do vídeo apenas pelos cabeçalhos (ffprobe)"""
+    returncode, stdout, stderr = await media_pool.run(
+        FFPROBE_BIN, '-v', 'error',
+        '-print_format', 'json',
+        '-show_entries', 'format=duration,size:stream=codec_type,codec_name,width,height',
+        file_path,
+        timeout=30,
+        heavy=False
+    )
+    if returncode != 0:
+        raise MediaJobError(stderr.decode(errors='ignore').strip() or "ffprobe falhou")
+
+    data = json.loads(stdout or b'{}')
+    streams = data.get('streams', [])
+    video = next((s for s in streams if s.get('codec_type') == 'video'), None)
+    if video is None:
+        raise MediaJobError("Arquivo não contém faixa de vídeo")
+
+    file_format = data.get('format', {})
+    return {
+        'duration': float(file_format.get('duration') or 0),
+        'size_bytes': int(file_format.get('size') or os.path.getsize(file_path)),
+        'width': int(video.get('width') or 0),
+        'height': int(video.get('height') or 0),
+        'codec': video.get('codec_name', ''),
+        'has_audio': any(s.get('codec_type') == 'audio' for s in streams)
+    }
+
+
+def file_sha256(file_path, chunk_size=1024 * 1024):
+    """Calcula o sha256 do arquivo lendo em blocos"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def inspect_media(file_path):
+    """Retorna os dados do ffprobe junto com o sha256 do arquivo"""
+    info = await probe_video(file_path)
+    info['sha256'] = await asyncio.to_thread(file_sha256, file_path)
+    return info
+
+
+def check_video_note_info(info):
+    """Confere os dados do ffprobe contra os requisitos de video note"""
+    size_mb = info['size_bytes'] / (1024 * 1024)
+    if size_mb > VIDEO_NOTE_MAX_MB:
+        return False, f"❌ Tamanho do arquivo ({size_mb:.2f} MB) excede o limite de {VIDEO_NOTE_MAX_MB}MB para bots"
+
+    if info['duration'] > VIDEO_NOTE_MAX_DURATION:
+        return False, f"❌ Duração do vídeo ({info['duration']:.2f}s) excede o limite de {VIDEO_NOTE_MAX_DURATION} segundos"
+
+    width, height = info['width'], info['height']
+    aspect_ratio = width / height if height else 0
+    if not (0.95 <= aspect_ratio <= 1.05):  # Permitir pequena tolerância
+        return False, f"❌ Vídeo não é quadrado (aspect ratio: {aspect_ratio:.2f}). Deve ser 1:1"
+
+    if width < VIDEO_NOTE_MIN_SIDE or height < VIDEO_NOTE_MIN_SIDE:
+        return False, f"❌ Resolução muito baixa ({width}x{height}). Recomendado: {VIDEO_NOTE_SIZE}x{VIDEO_NOTE_SIZE}"
+
+    if info['codec'].lower() not in VIDEO_NOTE_CODECS:
+        return False, f"❌ Codec não suportado: {info['codec']}. Use H.264/MPEG-4"
+
+    return True, "✅ Video note válido"
+
+
+async def validate_video_note(file_path):
+    """Valida um arquivo de vídeo como video note. Retorna (válido, mensagem)"""
+    try:
+        info = await probe_video(file_path)
+    except (MediaJobError, ValueError) as e:
+        return False, f"❌ Erro na validação: {str(e)}"
+
+    return check_video_note_info(info)
+
+
+def target_video_bitrate(duration):
+    """Calcula o bitrate de vídeo (kbps) para atingir VIDEO_NOTE_TARGET_MB"""
+    duration = min(duration or VIDEO_NOTE_MAX_DURATION, VIDEO_NOTE_MAX_DURATION)
+    total_kbps = VIDEO_NOTE_TARGET_MB * 8 * 1024 / max(duration, 1)
+    video_kbps = int(total_kbps - AUDIO_BITRATE_KBPS)
+    return max(MIN_VIDEO_BITRATE_KBPS, min(video_kbps, MAX_VIDEO_BITRATE_KBPS))
+
+
+def parse_progress_line(line, duration):
+    """
+    Fração concluída (0 a 1) a partir de uma linha do -progress do ffmpeg,
+    ou None se a linha não informar o tempo processado.
+    """
+    key, _, value = line.partition('=')
+    if key == 'progress' and value == 'end':
+        return 1.0
+    # out_time_ms também é dado em microssegundos
+    if key not in ('out_time_us', 'out_time_ms') or not value.isdigit() or not duration:
+        return None
+    return min(int(value) / 1_000_000 / duration, 1.0)
+
+
+async def transcode_video_note(input_path, output_path, on_progress=None):
+    """
+    Converte um vídeo para video note em uma única passada do ffmpeg:
+    recorta o centro em quadrado, redimensiona para 512x512, limita a 60
+    segundos e usa um bitrate calculado para o tamanho alvo.
+
+    on_progress(fração), se informado, recebe o andamento lido do
+    -progress do ffmpeg.
+
+    Returns:
+        tuple: (sucesso, mensagem)
+    """
+    try:
+        info = await probe_video(input_path)
+    except (MediaJobError, ValueError) as e:
+        return False, f"❌ Erro na conversão: {str(e)}"
+
+    video_kbps = target_video_bitrate(info['duration'])
+
+    args = [
+        FFMPEG_BIN, '-y', '-v', 'error',
+        '-i', input_path,
+        '-t', str(VIDEO_NOTE_MAX_DURATION),
+        '-vf', f"crop='min(iw,ih)':'min(iw,ih)',scale={VIDEO_NOTE_SIZE}:{VIDEO_NOTE_SIZE},setsar=1",
+        '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p',
+        '-b:v', f'{video_kbps}k', '-maxrate', f'{video_kbps}k', '-bufsize', f'{video_kbps * 2}k'
+    ]
+    if info['has_audio']:
+        args += ['-c:a', 'aac', '-b:a', f'{AUDIO_BITRATE_KBPS}k']
+    else:
+        args += ['-an']
+    args += ['-movflags', '+faststart', output_path]
+
+    on_output = None
+    if on_progress is not None:
+        args[1:1] = ['-progress', 'pipe:1', '-nostats']
+        duration = min(info['duration'], VIDEO_NOTE_MAX_DURATION)
+
+        def report_progress(line):
+            fraction = parse_progress_line(line, duration)
+            if fraction is not None:
+                on_progress(fraction)
+
+        on_output = report_progress
+
+    try:
+        returncode, _, stderr = await media_pool.run(*args, on_output=on_output)
+    except MediaJobError as e:
+        return False, f"❌ Erro na conversão: {str(e)}"
+
+    if returncode != 0 or not os.path.exists(output_path):
+        error = stderr.decode(errors='ignore').strip().splitlines()
+        return False, f"❌ Erro na conversão: {error[-1] if error else 'ffmpeg falhou'}"
+
+    final_size_mb = os.path.getsize(output_path) / (1024 * 1024)
+    if final_size_mb > VIDEO_NOTE_MAX_MB:
+        return False, f"❌ Vídeo convertido ainda excede {VIDEO_NOTE_MAX_MB}MB ({final_size_mb:.2f} MB)"
+
+    return True, f"✅ Vídeo convertido com sucesso ({final_size_mb:.2f} MB)"
@@ -0,0 +1,94 @@
+import os
+import asyncio
+import aiofiles
+
+
+class LocalMediaSender:
+    """
+    Envia arquivos de uploads/ fazendo no máximo um upload por arquivo.
+
+    O python-telegram-bot lê o arquivo inteiro para a memória a cada envio
+    (InputFile chama read(), mesmo recebendo um arquivo aberto), então N
+    envios simultâneos do mesmo vídeo custariam N cópias dele. Aqui o
+    primeiro envio de cada (arquivo, tipo) faz o upload e guarda o file_id
+    devolvido pelo Telegram; os envios simultâneos esperam por ele e todos
+    os seguintes usam só o file_id. Se o arquivo mudar (mtime ou tamanho),
+    o file_id guardado deixa de valer.
+    """
+
+    def __init__(self):
+        self._file_ids = {}
+        self._locks = {}
+        self._stats = {'uploads': 0, 'reused': 0, 'waits': 0, 'bytes': 0}
+
+    async def send(self, path, kind, send):
+        """
+        Envia o arquivo path como kind (photo, video, video_note, document...).
+
+        send(media) faz o envio propriamente dito e retorna a Message; media
+        é o file_id já conhecido ou o conteúdo do arquivo (no primeiro envio).
+        """
+        key = (os.path.normpath(path), kind)
+        file_id = self._cached_file_id(key)
+        if file_id:
+            self._stats['reused'] += 1
+            return await send(file_id)
+
+        # [lock, envios usando o lock]: o lock é descartado quando o último termina
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        elif entry[0].locked():
+            self._stats['waits'] += 1
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                # Outro envio pode ter feito o upload enquanto este esperava
+                file_id = self._cached_file_id(key)
+                if file_id:
+                    self._stats['reused'] += 1
+                    return await send(file_id)
+
+                return await self._upload(key, path, send)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._locks.pop(key, None)
+
+    async def _upload(self, key, path, send):
+        """Envia o conteúdo do arquivo e guarda o file_id devolvido"""
+        stat = os.stat(path)
+        async with aiofiles.open(path, 'rb') as f:
+            data = await f.read()
+        message = await send(data)
+        self._stats['uploads'] += 1
+        self._stats['bytes'] += len(data)
+
+        # edit_message_media de mensagens inline retorna True, sem file_id
+        from flow_manager import extract_file_id
+        file_id = extract_file_id(message) if not isinstance(message, bool) else None
+        if file_id:
+            self._file_ids[key] = ((stat.st_mtime_ns, stat.st_size), file_id)
+        return message
+
+    def _cached_file_id(self, key):
+        cached = self._file_ids.get(key)
+        if cached is None:
+            return None
+        stamp, file_id = cached
+        try:
+            stat = os.stat(key[0])
+        except OSError:
+            stat = None
+        if stat is None or (stat.st_mtime_ns, stat.st_size) != stamp:
+            del self._file_ids[key]
+            return None
+        return file_id
+
+    def get_stats(self):
+        """Uploads feitos, envios que reaproveitaram o file_id e esperas pelo primeiro upload"""
+        return dict(self._stats, cached=len(self._file_ids))
+
+
+# Envio compartilhado pelo bot e pelas transmissões
+local_media_sender = LocalMediaSender()
@@ -0,0 +1,409 @@
+import os
+import re
+import time
+import shutil
+import asyncio
+from pathlib import Path
+from dotenv import load_dotenv
+from database import create_connection, Error
+from media_engine import file_sha256
+from flow_manager import get_config_value, set_config_value, invalidate_flow_cache
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+# Configuração da coleta de arquivos sem referência
+MEDIA_GC_INTERVAL = float(os.getenv('MEDIA_GC_INTERVAL', 6 * 3600))  # segundos entre coletas
+MEDIA_GC_GRACE = float(os.getenv('MEDIA_GC_GRACE', 24 * 3600))       # idade mínima de um arquivo sem referência para ser apagado
+TRANSCODE_CACHE_DAYS = int(os.getenv('TRANSCODE_CACHE_DAYS', 30))     # dias que uma conversão em cache é mantida sem etapa usando
+
+# Arquivos ficam em uploads/store/<2 primeiros hex>/<sha256><extensão>
+UPLOADS_DIR = Path("uploads")
+STORE_DIR = UPLOADS_DIR / "store"
+
+# Pastas do formato antigo (uploads/<tipo>/<file_id><extensão>) que a coleta percorre
+LEGACY_DIRS = ('image', 'video', 'video_note')
+
+# Só são coletados arquivos com os nomes que o próprio bot grava: o sha256
+# no armazenamento e o file_id do Telegram (com os sufixos das conversões)
+# nas pastas antigas. Qualquer outro arquivo em uploads/ é ignorado.
+MEDIA_EXTENSIONS = r'\.(?:jpg|mp4|pdf)'
+STORED_NAME = re.compile(rf'[0-9a-f]{{64}}{MEDIA_EXTENSIONS}')
+LEGACY_NAME = re.compile(rf'[A-Za-z0-9_-]{{20,}}{MEDIA_EXTENSIONS}')
+
+
+def normalize_media_path(path):
+    """Caminho com barras normais, no formato gravado em flow_steps e bot_config"""
+    return str(path).replace('\\', '/')
+
+
+def store_path(digest, extension):
+    """Caminho no armazenamento do conteúdo com esse sha256"""
+    return normalize_media_path(STORE_DIR / digest[:2] / f"{digest}{extension.lower()}")
+
+
+def is_stored(path):
+    """Indica se o caminho já está dentro do armazenamento por conteúdo"""
+    return normalize_media_path(path).startswith(normalize_media_path(STORE_DIR) + '/')
+
+
+def link_into_store(source_path, digest=None):
+    """
+    Garante uma cópia de source_path no armazenamento (hard link quando
+    possível) sem apagar a origem. Retorna (caminho no armazenamento, se o
+    conteúdo já estava lá).
+    """
+    digest = digest or file_sha256(source_path)
+    target = store_path(digest, Path(source_path).suffix)
+    if os.path.exists(target):
+        # Renovar o prazo da coleta: o conteúdo acabou de ser enviado de novo
+        os.utime(target, None)
+        return target, True
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    temp_path = f"{target}.{os.getpid()}.tmp"
+    try:
+        os.link(source_path, temp_path)
+    except OSError:
+        shutil.copy2(source_path, temp_path)
+    os.replace(temp_path, target)
+    return target, False
+
+
+def add_to_store(source_path, digest=None):
+    """
+    Move um arquivo recém-gravado para o armazenamento por conteúdo. Se o
+    mesmo conteúdo já estiver lá, a origem é apenas apagada. Retorna o
+    caminho no armazenamento.
+    """
+    if is_stored(source_path):
+        return normalize_media_path(source_path)
+
+    target, _ = link_into_store(source_path, digest)
+    os.unlink(source_path)
+    return target
+
+
+async def store_media(source_path, digest=None):
+    """add_to_store fora do loop (o sha256 lê o arquivo inteiro)"""
+    return await asyncio.to_thread(add_to_store, source_path, digest)
+
+
+def get_media_references():
+    """
+    Referências de cada arquivo local: etapas de fluxo (ativas ou não), a
+    mídia de boas-vindas e as conversões em cache feitas há menos de
+    TRANSCODE_CACHE_DAYS dias. Retorna {caminho normalizado: [valores gravados]}
+    ou None se o banco não responder (nesse caso nada deve ser apagado).
+    """
+    connection = create_connection()
+    if not connection:
+        return None
+
+    try:
+        cursor = connection.cursor()
+
+        cursor.execute("SELECT DISTINCT media_url FROM flow_steps WHERE media_url LIKE 'uploads%'")
+        stored_paths = [row[0] for row in cursor.fetchall()]
+
+        cursor.execute(
+            "SELECT output_path FROM transcode_cache "
+            f"WHERE created_at >= DATE_SUB(NOW(), INTERVAL {TRANSCODE_CACHE_DAYS} DAY)"
+        )
+        stored_paths += [row[0] for row in cursor.fetchall()]
+
+    except Error as e:
+        print(f"Erro ao consultar referências de mídia: {e}")
+        return None
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+    welcome_path = get_config_value('welcome_media_url')
+    if welcome_path and welcome_path.startswith('uploads'):
+        stored_paths.append(welcome_path)
+
+    references = {}
+    for path in stored_paths:
+        references.setdefault(normalize_media_path(path), []).append(path)
+    return references
+
+
+def relocate_media_references(old_path, new_path):
+    """Aponta flow_steps, transcode_cache, a mídia de boas-vindas e media_metadata de old_path para new_path"""
+    connection = create_connection()
+    if not connection:
+        return False
+
+    try:
+        cursor = connection.cursor()
+
+        cursor.execute(
+            "UPDATE flow_steps SET media_url = %s WHERE media_url = %s",
+            (new_path, old_path)
+        )
+        cursor.execute(
+            "UPDATE transcode_cache SET output_path = %s WHERE output_path = %s",
+            (new_path, old_path)
+        )
+
+        # Conteúdo repetido: o novo caminho pode já ter metadados
+        cursor.execute("SELECT COUNT(*) FROM media_metadata WHERE media_path = %s", (new_path,))
+        if cursor.fetchone()[0]:
+            cursor.execute("DELETE FROM media_metadata WHERE media_path = %s", (old_path,))
+        else:
+            cursor.execute(
+                "UPDATE media_metadata SET media_path = %s WHERE media_path = %s",
+                (new_path, old_path)
+            )
+
+        connection.commit()
+
+    except Error as e:
+        print(f"Erro ao atualizar referências de mídia: {e}")
+        connection.rollback()
+        return False
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+    invalidate_flow_cache()
+    if get_config_value('welcome_media_url') == old_path:
+        return set_config_value('welcome_media_url', new_path)
+    return True
+
+
+def delete_media_metadata(media_path):
+    """Remove os metadados e as conversões em cache de um arquivo apagado"""
+    connection = create_connection()
+    if not connection:
+        return False
+
+    try:
+        cursor = connection.cursor()
+
+        cursor.execute("DELETE FROM media_metadata WHERE media_path = %s", (media_path,))
+        cursor.execute("DELETE FROM transcode_cache WHERE output_path = %s", (media_path,))
+        connection.commit()
+        return True
+
+    except Error as e:
+        print(f"Erro ao remover metadados da mídia: {e}")
+        return False
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+def get_cached_transcode(source_sha256, preset):
+    """
+    Caminho da conversão já feita desse conteúdo com esse preset, ou None.
+    Entradas cujo arquivo não existe mais são descartadas.
+    """
+    connection = create_connection()
+    if not connection:
+        return None
+
+    try:
+        cursor = connection.cursor()
+
+        cursor.execute(
+            "SELECT output_path FROM transcode_cache WHERE source_sha256 = %s AND preset = %s",
+            (source_sha256, preset)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        if os.path.exists(row[0]):
+            return row[0]
+
+        cursor.execute(
+            "DELETE FROM transcode_cache WHERE source_sha256 = %s AND preset = %s",
+            (source_sha256, preset)
+        )
+        connection.commit()
+        return None
+
+    except Error as e:
+        print(f"Erro ao consultar cache de conversões: {e}")
+        return None
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+def save_cached_transcode(source_sha256, preset, output_path):
+    """Registra o resultado de uma conversão para os próximos envios do mesmo conteúdo"""
+    connection = create_connection()
+    if not connection:
+        return False
+
+    try:
+        cursor = connection.cursor()
+
+        query = """
+        INSERT INTO transcode_cache (source_sha256, preset, output_path)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE output_path = VALUES(output_path)
+        """
+        cursor.execute(query, (source_sha256, preset, output_path))
+        connection.commit()
+        return True
+
+    except Error as e:
+        print(f"Erro ao salvar conversão no cache: {e}")
+        return False
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+def collectable_files():
+    """Mídias gravadas pelo bot: o armazenamento e as pastas do formato antigo"""
+    if STORE_DIR.is_dir():
+        for prefix_dir in sorted(STORE_DIR.iterdir()):
+            if not prefix_dir.is_dir():
+                continue
+            for path in sorted(prefix_dir.iterdir()):
+                if STORED_NAME.fullmatch(path.name) and path.name.startswith(prefix_dir.name):
+                    yield normalize_media_path(path)
+
+    for type_name in LEGACY_DIRS:
+        type_dir = UPLOADS_DIR / type_name
+        if not type_dir.is_dir():
+            continue
+        for path in sorted(type_dir.iterdir()):
+            if path.is_file() and LEGACY_NAME.fullmatch(path.name):
+                yield normalize_media_path(path)
+
+
+def collect_garbage(grace=MEDIA_GC_GRACE):
+    """
+    Uma coleta das mídias de uploads/ (ver collectable_files):
+
+    1. arquivos antigos (uploads/<tipo>/<file_id>) ainda referenciados são
+       levados para o armazenamento e as referências passam a apontar para lá;
+    2. arquivos sem nenhuma referência há mais de grace segundos são apagados
+       junto com seus metadados e entradas do cache de conversões. O prazo
+       protege mídias de etapas que o admin ainda está criando.
+
+    Retorna o resumo da coleta ou None se as referências não puderem ser lidas.
+    """
+    references = get_media_references()
+    if references is None:
+        return None
+
+    result = {'moved': 0, 'deduplicated': 0, 'removed': 0, 'freed_bytes': 0}
+    now = time.time()
+
+    for path in list(collectable_files()):
+        try:
+            stat = os.stat(path)
+
+            if path in references:
+                if is_stored(path):
+                    continue
+                target, existed = link_into_store(path)
+                # Só apagar a origem depois que todas as referências apontarem para o armazenamento
+                if all([relocate_media_references(old_path, target) for old_path in references[path]]):
+                    os.unlink(path)
+                    result['moved'] += 1
+                    if existed:
+                        result['deduplicated'] += 1
+                        result['freed_bytes'] += stat.st_size
+                continue
+
+            if now - stat.st_mtime < grace:
+                continue
+
+            os.unlink(path)
+            delete_media_metadata(path)
+            result['removed'] += 1
+            result['freed_bytes'] += stat.st_size
+
+        except OSError as e:
+            print(f"❌ Erro ao coletar {path}: {e}")
+
+    return result
+
+
+class MediaStore:
+    """
+    Coleta periódica do armazenamento de mídias por conteúdo.
+
+    Cada arquivo de uploads/store/ é identificado pelo sha256, então o mesmo
+    vídeo enviado várias vezes (com file_ids diferentes) ocupa o disco uma
+    única vez. As referências não ficam em um contador: são lidas de
+    flow_steps.media_url, de welcome_media_url e de transcode_cache a cada
+    coleta, assim nunca ficam dessincronizadas das etapas e configurações.
+    Arquivos que ninguém referencia (sobras de conversões, mídias trocadas
+    ou de etapas apagadas) são removidos pela coleta. Uma conversão em cache
+    que nenhuma etapa usa é mantida por TRANSCODE_CACHE_DAYS dias e depois
+    apagada junto com a entrada do cache.
+    """
+
+    def __init__(self, interval=MEDIA_GC_INTERVAL, grace=MEDIA_GC_GRACE):
+        self.interval = interval
+        self.grace = grace
+        self._task = None
+        self._last_run = None
+        self._stats = {'runs': 0, 'moved': 0, 'deduplicated': 0, 'removed': 0, 'freed_bytes': 0}
+
+    def start(self):
+        """Inicia a coleta periódica no loop em execução"""
+        if self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+        print(f"🗂️ Coleta de mídias iniciada (a cada {self.interval / 3600:.1f}h)")
+
+    async def stop(self):
+        """Interrompe a coleta periódica"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def collect(self):
+        """Executa uma coleta fora do loop e acumula o resultado nas estatísticas"""
+        result = await asyncio.to_thread(collect_garbage, self.grace)
+        if result is None:
+            return None
+
+        self._last_run = time.time()
+        self._stats['runs'] += 1
+        for key, value in result.items():
+            self._stats[key] += value
+
+        if result['moved'] or result['removed']:
+            print(
+                f"🗂️ Coleta de mídias: {result['moved']} movidas para o armazenamento, "
+                f"{result['removed']} removidas ({result['freed_bytes'] / (1024 * 1024):.1f} MB liberados)"
+            )
+        return result
+
+    async def _run(self):
+        while True:
+            try:
+                await self.collect()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Erro na coleta de mídias: {e}")
+
+            await asyncio.sleep(self.interval)
+
+    def get_stats(self):
+        """Coletas feitas, arquivos movidos, deduplicados e removidos e bytes liberados"""
+        return dict(self._stats, running=self._task is not None, last_run=self._last_run)
+
+
+# Armazenamento compartilhado pelo bot
+media_store = MediaStore()
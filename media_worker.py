@@ -0,0 +1,117 @@
+import os
+import asyncio
+from dotenv import load_dotenv
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+# Configuração do pool de processos de mídia
+MEDIA_WORKERS = int(os.getenv('MEDIA_WORKERS', max(1, (os.cpu_count() or 2) - 1)))
+MEDIA_JOB_TIMEOUT = float(os.getenv('MEDIA_JOB_TIMEOUT', 600))  # segundos por tarefa
+
+
+class MediaJobError(Exception):
+    """Erro ao executar uma tarefa de mídia (falha, timeout ou processo encerrado)"""
+
+
+class MediaWorkerPool:
+    """
+    Executa tarefas de mídia (ffmpeg/ffprobe) como processos externos.
+
+    Tarefas pesadas são limitadas a max_workers simultâneas; tarefas leves
+    (como sondagens de cabeçalho) não entram na fila. Em caso de timeout ou
+    cancelamento o processo é encerrado de fato, sem travar o loop do bot.
+    """
+
+    def __init__(self, max_workers=MEDIA_WORKERS, timeout=MEDIA_JOB_TIMEOUT):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._semaphore = None
+        self._processes = set()
+        self._waiting = 0
+
+    def _get_semaphore(self):
+        # Criado sob demanda para ficar associado ao loop em execução
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        return self._semaphore
+
+    async def run(self, *args, timeout=None, heavy=True, on_output=None):
+        """
+        Executa um comando e retorna (código de saída, stdout, stderr).
+
+        Com on_output, cada linha do stdout é entregue a on_output(linha)
+        assim que é escrita (ex.: -progress do ffmpeg) e o stdout retornado
+        fica vazio.
+        """
+        if not heavy:
+            return await self._execute(args, timeout or self.timeout, on_output)
+
+        self._waiting += 1
+        try:
+            await self._get_semaphore().acquire()
+        finally:
+            self._waiting -= 1
+
+        try:
+            return await self._execute(args, timeout or self.timeout, on_output)
+        finally:
+            self._get_semaphore().release()
+
+    async def _execute(self, args, timeout, on_output=None):
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *args,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+        except FileNotFoundError:
+            raise MediaJobError(f"Programa não encontrado: {args[0]}")
+
+        self._processes.add(process)
+        try:
+            if on_output is None:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
+            else:
+                stdout, stderr = await asyncio.wait_for(self._stream(process, on_output), timeout=timeout)
+        except asyncio.TimeoutError:
+            raise MediaJobError(f"Tarefa de mídia excedeu o limite de {timeout:.0f}s")
+        finally:
+            # Encerrar o processo em caso de timeout ou cancelamento
+            self._processes.discard(process)
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+
+        return process.returncode, stdout, stderr
+
+    async def _stream(self, process, on_output):
+        """Lê o stdout linha a linha enquanto o stderr é acumulado"""
+        stderr_task = asyncio.ensure_future(process.stderr.read())
+        try:
+            async for line in process.stdout:
+                on_output(line.decode(errors='ignore').strip())
+            await process.wait()
+            return b'', await stderr_task
+        finally:
+            stderr_task.cancel()
+
+    def get_stats(self):
+        """Retorna quantas tarefas estão rodando e aguardando"""
+        return {
+            'workers': self.max_workers,
+            'running': len(self._processes),
+            'waiting': self._waiting
+        }
+
+    def shutdown(self):
+        """Encerra as tarefas em andamento"""
+        for process in list(self._processes):
+            if process.returncode is None:
+                process.kill()
+        self._processes.clear()
+
+
+# Pool compartilhado pelo bot
+media_pool = MediaWorkerPool()
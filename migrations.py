@@ -0,0 +1,277 @@
+from database import create_connection, table_columns, table_indexes, Error
+
+# Controle das migrações já aplicadas
+CREATE_SCHEMA_VERSION_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INT PRIMARY KEY,
+    description VARCHAR(200) NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+# Tabelas de BANCO_DE_DADOS.sql (mesmas colunas, chaves e índices do dump)
+BASE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS admin_config (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        admin_telegram_id BIGINT NOT NULL UNIQUE,
+        can_manage_flows BOOLEAN DEFAULT TRUE,
+        can_manage_users BOOLEAN DEFAULT TRUE,
+        can_view_stats BOOLEAN DEFAULT TRUE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS bot_config (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        config_key VARCHAR(100) NOT NULL UNIQUE,
+        config_value TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        telegram_id BIGINT NOT NULL UNIQUE,
+        username VARCHAR(100),
+        first_name VARCHAR(100),
+        last_name VARCHAR(100),
+        is_active BOOLEAN DEFAULT TRUE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        name VARCHAR(200),
+        phone VARCHAR(20),
+        email VARCHAR(200),
+        additional_data TEXT,
+        webhook_bot_access_sent BOOLEAN DEFAULT FALSE,
+        webhook_cadastro_sent BOOLEAN DEFAULT FALSE,
+        webhook_sent_at TIMESTAMP NULL DEFAULT NULL,
+        welcome_video_sent BOOLEAN DEFAULT FALSE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS flows (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        description TEXT,
+        is_active BOOLEAN DEFAULT TRUE,
+        is_default BOOLEAN DEFAULT FALSE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS flow_steps (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        flow_id INT NOT NULL,
+        step_order INT NOT NULL,
+        step_type ENUM('text', 'image', 'video', 'video_note', 'document', 'audio', 'button') NOT NULL,
+        content TEXT,
+        media_url VARCHAR(500),
+        file_id VARCHAR(255),
+        button_text VARCHAR(100),
+        button_url VARCHAR(500),
+        button_callback VARCHAR(100),
+        is_active BOOLEAN DEFAULT TRUE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        INDEX idx_flow_order (flow_id, step_order),
+        CONSTRAINT flow_steps_ibfk_1 FOREIGN KEY (flow_id) REFERENCES flows (id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS buttons (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        step_id INT NOT NULL,
+        button_text VARCHAR(100) NOT NULL,
+        button_type ENUM('url', 'callback', 'contact', 'location') DEFAULT 'callback',
+        button_data VARCHAR(500),
+        button_order INT DEFAULT 0,
+        is_active BOOLEAN DEFAULT TRUE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        INDEX idx_step_order (step_id, button_order),
+        CONSTRAINT buttons_ibfk_1 FOREIGN KEY (step_id) REFERENCES flow_steps (id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS media_metadata (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        media_path VARCHAR(500) NOT NULL UNIQUE,
+        duration FLOAT,
+        width INT,
+        height INT,
+        codec VARCHAR(50),
+        size_bytes BIGINT,
+        sha256 CHAR(64),
+        is_video_note_ready BOOLEAN DEFAULT FALSE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS webhook_outbox (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        event_type VARCHAR(50) NOT NULL,
+        telegram_id BIGINT,
+        webhook_url VARCHAR(500) NOT NULL,
+        payload TEXT NOT NULL,
+        status ENUM('pending', 'sent', 'dead') DEFAULT 'pending',
+        attempts INT DEFAULT 0,
+        next_attempt_at DATETIME NOT NULL,
+        last_error VARCHAR(500),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        sent_at DATETIME NULL,
+        INDEX idx_status_next (status, next_attempt_at),
+        INDEX idx_user_event (telegram_id, event_type)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS broadcast_jobs (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        flow_id INT NOT NULL,
+        segment VARCHAR(20) NOT NULL DEFAULT 'all',
+        status ENUM('pending', 'running', 'paused', 'done', 'cancelled', 'failed') DEFAULT 'pending',
+        last_user_id INT DEFAULT 0,
+        total INT DEFAULT 0,
+        sent INT DEFAULT 0,
+        failed INT DEFAULT 0,
+        blocked INT DEFAULT 0,
+        created_by BIGINT,
+        report_chat_id BIGINT,
+        report_message_id INT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        INDEX idx_status (status)
+    )
+    """
+]
+
+
+def add_column_if_missing(cursor, table, column, definition):
+    """Adiciona uma coluna em bancos criados antes dela existir"""
+    columns = table_columns(cursor, table)
+    if not columns or column in columns:
+        return False
+
+    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    print(f"Coluna {table}.{column} adicionada.")
+    return True
+
+
+def add_index_if_missing(cursor, table, name, columns):
+    """Cria um índice se a tabela ainda não tiver um com esse nome"""
+    if name in table_indexes(cursor, table):
+        return False
+
+    cursor.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+    print(f"Índice {table}.{name} criado.")
+    return True
+
+
+def create_base_schema(cursor):
+    """Cria as tabelas que faltarem e completa as de bancos antigos"""
+    for create_table in BASE_TABLES:
+        cursor.execute(create_table)
+
+    # Colunas que o create_tables() antigo não criava
+    add_column_if_missing(cursor, 'users', 'name', 'VARCHAR(200) NULL AFTER updated_at')
+    add_column_if_missing(cursor, 'users', 'phone', 'VARCHAR(20) NULL AFTER name')
+    add_column_if_missing(cursor, 'users', 'email', 'VARCHAR(200) NULL AFTER phone')
+    add_column_if_missing(cursor, 'users', 'additional_data', 'TEXT NULL AFTER email')
+    add_column_if_missing(cursor, 'users', 'webhook_bot_access_sent', 'BOOLEAN DEFAULT FALSE AFTER additional_data')
+    add_column_if_missing(cursor, 'users', 'webhook_cadastro_sent', 'BOOLEAN DEFAULT FALSE AFTER webhook_bot_access_sent')
+    add_column_if_missing(cursor, 'users', 'webhook_sent_at', 'TIMESTAMP NULL DEFAULT NULL AFTER webhook_cadastro_sent')
+    add_column_if_missing(cursor, 'users', 'welcome_video_sent', 'BOOLEAN DEFAULT FALSE AFTER webhook_sent_at')
+
+    # Cache do file_id do Telegram para mídias das etapas
+    add_column_if_missing(cursor, 'flow_steps', 'file_id', 'VARCHAR(255) NULL AFTER media_url')
+
+
+def add_users_indexes(cursor):
+    """Índices das consultas de estatísticas, listagem e segmentos de usuários"""
+    # Usuários por mês (get_general_stats)
+    add_index_if_missing(cursor, 'users', 'idx_created_at', 'created_at')
+    # Contagem de ativos e listagem dos ativos por data de cadastro
+    add_index_if_missing(cursor, 'users', 'idx_active_created', 'is_active, created_at')
+
+
+def create_transcode_cache(cursor):
+    """Conversões já feitas, por conteúdo de origem e parâmetros de codificação"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS transcode_cache (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        source_sha256 CHAR(64) NOT NULL,
+        preset VARCHAR(100) NOT NULL,
+        output_path VARCHAR(500) NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE KEY idx_source_preset (source_sha256, preset)
+    )
+    """)
+
+
+def add_config_revision(cursor):
+    """Contador de alterações de bot_config (versão do cache de configurações)"""
+    add_column_if_missing(cursor, 'bot_config', 'revision', 'INT NOT NULL DEFAULT 0 AFTER config_value')
+
+
+# Migrações em ordem de versão. Nunca altere uma migração já publicada:
+# acrescente uma nova versão. Cada uma deve poder ser repetida sem erro
+# (o DDL do MySQL não é transacional; uma falha no meio é refeita no boot).
+MIGRATIONS = [
+    (1, "Esquema base de BANCO_DE_DADOS.sql", create_base_schema),
+    (2, "Índices de users (created_at, is_active)", add_users_indexes),
+    (3, "Cache de conversões (transcode_cache)", create_transcode_cache),
+    (4, "Revisão das configurações (bot_config.revision)", add_config_revision),
+]
+
+
+def run_migrations():
+    """
+    Aplica, em ordem, as migrações ainda não registradas em schema_version.
+
+    Com o esquema atualizado nenhum DDL é executado: o boot faz apenas a
+    leitura de schema_version. Retorna False se alguma migração falhar.
+    """
+    connection = create_connection()
+    if connection is None:
+        return False
+
+    try:
+        cursor = connection.cursor()
+
+        if not table_columns(cursor, 'schema_version'):
+            cursor.execute(CREATE_SCHEMA_VERSION_TABLE)
+
+        cursor.execute("SELECT version FROM schema_version")
+        applied = {row[0] for row in cursor.fetchall()}
+        pending = [migration for migration in MIGRATIONS if migration[0] not in applied]
+
+        if not pending:
+            print(f"Esquema do banco atualizado (versão {max(applied)}).")
+            return True
+
+        for version, description, migrate in pending:
+            print(f"Aplicando migração {version}: {description}")
+            migrate(cursor)
+            cursor.execute(
+                "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                (version, description)
+            )
+            connection.commit()
+
+        print(f"Esquema do banco migrado para a versão {pending[-1][0]}.")
+        return True
+
+    except Error as e:
+        print(f"Erro ao aplicar migrações do banco: {e}")
+        return False
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+if __name__ == "__main__":
+    run_migrations()
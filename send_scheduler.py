@@ -0,0 +1,184 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+from dotenv import load_dotenv
+from telegram.error import RetryAfter, NetworkError, TimedOut, BadRequest
+from telegram.ext import BaseRateLimiter
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+# Limites de envio do Telegram
+SEND_GLOBAL_RATE = float(os.getenv('SEND_GLOBAL_RATE', 30))        # mensagens por segundo somando todos os chats
+SEND_CHAT_RATE = float(os.getenv('SEND_CHAT_RATE', 1))             # mensagens por segundo em cada chat privado
+SEND_GROUP_RATE = float(os.getenv('SEND_GROUP_RATE', 20 / 60))     # mensagens por segundo em cada grupo
+SEND_CHAT_BURST = int(os.getenv('SEND_CHAT_BURST', 3))             # mensagens seguidas antes de aplicar o limite do chat
+SEND_MAX_RETRIES = int(os.getenv('SEND_MAX_RETRIES', 3))           # novas tentativas após RetryAfter ou falha de rede
+CHAT_BUCKETS_MAX = 5000                                            # chats acompanhados antes de descartar os ociosos
+
+# Filas de prioridade: menor valor sai primeiro
+PRIORITIES = {'high': 0, 'normal': 1, 'bulk': 2}
+
+# Métodos que contam como mensagem enviada para um chat
+LIMITED_PREFIXES = ('send', 'copy', 'forward', 'edit')
+UNLIMITED_ENDPOINTS = ('sendChatAction',)
+
+
+class TokenBucket:
+    """Balde de tokens: recebe `rate` tokens por segundo, acumulando até `capacity`"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """Consome um token se houver; senão retorna quantos segundos faltam para o próximo"""
+        self._refill(time.monotonic())
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def is_idle(self):
+        """Balde cheio: o chat não enviou nada recentemente"""
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+
+class SendScheduler(BaseRateLimiter):
+    """
+    Agenda todas as chamadas à Bot API feitas pelo bot.
+
+    Mensagens para um chat passam por dois baldes de tokens: o do chat
+    (SEND_CHAT_RATE ou SEND_GROUP_RATE) e o global (SEND_GLOBAL_RATE). No
+    balde global os pedidos esperam numa fila de prioridade, escolhida com
+    rate_limit_args={'priority': 'high' | 'normal' | 'bulk'}. Edições e
+    respostas a botões usam 'high' por padrão, porque são a interface dos
+    administradores. Os demais pedidos usam 'normal', e envios em massa
+    devem usar 'bulk'.
+
+    Um RetryAfter pausa todos os envios pelo tempo pedido pelo Telegram, e
+    o pedido é refeito. Falhas de conexão também são refeitas com backoff.
+    TimedOut não é refeito, porque a mensagem pode ter sido entregue.
+    """
+
+    def __init__(self, global_rate=SEND_GLOBAL_RATE, max_retries=SEND_MAX_RETRIES):
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats = {}
+        self._queue = []
+        self._counter = itertools.count()
+        self._drainer = None
+        self._paused_until = 0
+        self._stats = {'sent': 0, 'retry_after': 0, 'retries': 0}
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        if self._drainer is not None:
+            self._drainer.cancel()
+            self._drainer = None
+
+    @staticmethod
+    def _priority(endpoint, rate_limit_args):
+        if isinstance(rate_limit_args, dict) and rate_limit_args.get('priority') in PRIORITIES:
+            return PRIORITIES[rate_limit_args['priority']]
+        if endpoint.startswith('edit') or endpoint == 'answerCallbackQuery':
+            return PRIORITIES['high']
+        return PRIORITIES['normal']
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= CHAT_BUCKETS_MAX:
+                self._chats = {key: value for key, value in self._chats.items() if not value.is_idle()}
+            # IDs negativos são grupos e canais
+            is_group = isinstance(chat_id, int) and chat_id < 0
+            bucket = self._chats[chat_id] = TokenBucket(SEND_GROUP_RATE if is_group else SEND_CHAT_RATE, SEND_CHAT_BURST)
+        return bucket
+
+    async def _wait_pause(self):
+        while (delay := self._paused_until - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+
+    async def _acquire_chat(self, chat_id):
+        bucket = self._chat_bucket(chat_id)
+        while (delay := bucket.reserve()) > 0:
+            await asyncio.sleep(delay)
+
+    async def _acquire_global(self, priority):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._counter), future))
+        if self._drainer is None or self._drainer.done():
+            self._drainer = asyncio.create_task(self._drain())
+        await future
+
+    async def _drain(self):
+        """Libera os pedidos da fila global, por prioridade, no ritmo do balde"""
+        while self._queue:
+            if self._queue[0][2].done():
+                # Pedido cancelado enquanto esperava
+                heapq.heappop(self._queue)
+                continue
+
+            delay = max(self._paused_until - time.monotonic(), self._global.reserve())
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            _, _, future = heapq.heappop(self._queue)
+            if not future.done():
+                future.set_result(None)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get('chat_id') if data else None
+        limited = chat_id is not None and endpoint.startswith(LIMITED_PREFIXES) and endpoint not in UNLIMITED_ENDPOINTS
+        priority = self._priority(endpoint, rate_limit_args)
+
+        for attempt in range(self.max_retries + 1):
+            if limited:
+                await self._acquire_chat(chat_id)
+                await self._acquire_global(priority)
+            else:
+                await self._wait_pause()
+
+            try:
+                result = await callback(*args, **kwargs)
+                self._stats['sent'] += 1
+                return result
+            except RetryAfter as e:
+                self._stats['retry_after'] += 1
+                if attempt >= self.max_retries:
+                    raise
+                print(f"⏳ Flood control em {endpoint}: pausando envios por {e.retry_after}s")
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after + 0.1)
+            except (TimedOut, BadRequest):
+                raise
+            except NetworkError as e:
+                if attempt >= self.max_retries:
+                    raise
+                print(f"⚠️ Falha de rede em {endpoint} (tentativa {attempt + 1}): {e}")
+                await asyncio.sleep(2 ** attempt)
+            self._stats['retries'] += 1
+
+    def get_stats(self):
+        """Retorna a fila de envio, os chats acompanhados e os flood controls recebidos"""
+        return dict(
+            self._stats,
+            queued=len(self._queue),
+            chats=len(self._chats),
+            paused=max(self._paused_until - time.monotonic(), 0)
+        )
+
+
+# Agendador compartilhado pelo bot
+send_scheduler = SendScheduler()
@@ -43,9 +43,10 @@ def run_script(script_name, description):
     
     try:
         # Importar e executar o script
-        if script_name == "create_tables":
-            from bot import create_tables
-            create_tables()
+        if script_name == "migrations":
+            from migrations import run_migrations
+            if not run_migrations():
+                return False
         elif script_name == "check_database":
             from check_database import check_database_connection
             check_database_connection()
@@ -71,7 +72,7 @@ def main():
     
     # Lista de scripts para executar
     scripts = [
-        ("create_tables", "Criando tabelas do banco de dados"),
+        ("migrations", "Aplicando migrações do banco de dados"),
         ("check_database", "Verificando conexão com banco de dados")
     ]
     
@@ -0,0 +1,369 @@
+import os
+import re
+import sqlite3
+import threading
+import functools
+from datetime import datetime, date
+from dotenv import load_dotenv
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+# Configuração do backend SQLite (DB_BACKEND=sqlite)
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'bot_influenciador.db')         # arquivo do banco
+SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', 5))      # segundos esperando o lock de escrita
+
+# Dump de referência: o mesmo esquema importado no MySQL
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'BANCO_DE_DADOS.sql')
+
+# NOW() do MySQL no SQLite (hora local, como o servidor MySQL)
+SQLITE_NOW = "datetime('now', 'localtime')"
+
+# Unidades do INTERVAL do MySQL nos modificadores de data do SQLite
+INTERVAL_UNITS = {
+    'SECOND': 'seconds', 'MINUTE': 'minutes', 'HOUR': 'hours',
+    'DAY': 'days', 'MONTH': 'months', 'YEAR': 'years'
+}
+
+_STATEMENT_TOKEN = re.compile(r"'(?:[^'\\]|\\.|'')*'|--[^\n]*|/\*.*?\*/|;|[^';/-]+|.", re.S)
+_CREATE_TABLE = re.compile(r"^\s*CREATE\s+TABLE\s+(IF\s+NOT\s+EXISTS\s+)?`?(\w+)`?\s*\((.*)\)[^)]*$", re.I | re.S)
+_ALTER_TABLE = re.compile(r"^\s*ALTER\s+TABLE\s+`?(\w+)`?\s+(.*)$", re.I | re.S)
+_ADD_COLUMN = re.compile(r"^\s*ALTER\s+TABLE\s+`?(\w+)`?\s+ADD\s+COLUMN\s+`?(\w+)`?\s+(.*?)\s*$", re.I | re.S)
+_CREATE_INDEX = re.compile(r"^\s*CREATE\s+(UNIQUE\s+)?INDEX\s+`?(\w+)`?\s+ON\s+`?(\w+)`?\s*\((.*)\)\s*$", re.I | re.S)
+_KEY_ITEM = re.compile(r"^(?:(UNIQUE)(?:\s+(?:KEY|INDEX))?|KEY|INDEX)\s*`?(\w*)`?\s*\((.*)\)$", re.I | re.S)
+_ENUM = re.compile(r"\benum\s*\((?:'[^']*'|[^)'])*\)", re.I)
+_ON_UPDATE_NOW = re.compile(r"\s+ON\s+UPDATE\s+current_timestamp(?:\(\))?", re.I)
+_DEFAULT_NOW = re.compile(r"\bDEFAULT\s+current_timestamp(?:\(\))?", re.I)
+_MYSQL_ONLY = re.compile(r"\s+(?:COLLATE|CHARACTER\s+SET)\s+\w+|\s+UNSIGNED\b|\s+AFTER\s+`?\w+`?|\s+FIRST\b", re.I)
+
+_PLACEHOLDER = re.compile(r"'(?:[^'\\]|\\.|'')*'|%s")
+_DATE_ARITHMETIC = re.compile(r"\bDATE_(ADD|SUB)\(\s*NOW\(\)\s*,\s*INTERVAL\s+(\d+)\s+(\w+)\s*\)", re.I)
+_DATE_FORMAT = re.compile(r"\bDATE_FORMAT\(\s*([\w.]+)\s*,\s*'([^']*)'\s*\)", re.I)
+_NOW = re.compile(r"\bNOW\(\)|\bCURRENT_TIMESTAMP\b(?:\(\))?", re.I)
+_ON_DUPLICATE = re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.I)
+_VALUES_REF = re.compile(r"\bVALUES\(\s*`?(\w+)`?\s*\)", re.I)
+_INSERT_IGNORE = re.compile(r"\bINSERT\s+IGNORE\b", re.I)
+
+
+def _convert_datetime(value):
+    """Lê TIMESTAMP/DATETIME como datetime, como o mysql.connector"""
+    try:
+        return datetime.fromisoformat(value.decode())
+    except ValueError:
+        return value.decode()
+
+
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_converter('timestamp', _convert_datetime)
+sqlite3.register_converter('datetime', _convert_datetime)
+
+
+def _split_statements(text):
+    """Separa um script SQL em instruções, ignorando comentários e ';' dentro de textos"""
+    statement = []
+    for token in _STATEMENT_TOKEN.findall(text):
+        if token.startswith('--') or token.startswith('/*'):
+            continue
+        if token == ';':
+            if ''.join(statement).strip():
+                yield ''.join(statement).strip()
+            statement = []
+        else:
+            statement.append(token)
+    if ''.join(statement).strip():
+        yield ''.join(statement).strip()
+
+
+def _split_top_level(body):
+    """Separa por vírgulas fora de parênteses e de textos (colunas, chaves, ações de ALTER)"""
+    items, current, depth, quoted = [], [], 0, False
+    for char in body:
+        if char == "'":
+            quoted = not quoted
+        elif not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+        elif not quoted and depth == 0 and char == ',':
+            items.append(''.join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    if ''.join(current).strip():
+        items.append(''.join(current).strip())
+    return items
+
+
+def _split_column(item):
+    """Separa "`nome` definição" em (nome, definição)"""
+    name, _, definition = item.strip().partition(' ')
+    return name.strip('`"'), definition.strip()
+
+
+def _column_definition(definition):
+    """Converte a definição de uma coluna do MySQL. Retorna (definição, auto_increment, on_update)"""
+    if re.search(r"\bAUTO_INCREMENT\b", definition, re.I):
+        return 'INTEGER PRIMARY KEY AUTOINCREMENT', True, False
+
+    on_update = bool(_ON_UPDATE_NOW.search(definition))
+    definition = _ON_UPDATE_NOW.sub('', definition)
+    definition = _DEFAULT_NOW.sub(f"DEFAULT ({SQLITE_NOW})", definition)
+    definition = _ENUM.sub('TEXT', definition)
+    definition = _MYSQL_ONLY.sub('', definition)
+    return definition.strip(), False, on_update
+
+
+def _translate_create_table(query):
+    """CREATE TABLE do MySQL -> CREATE TABLE, índices e triggers de updated_at do SQLite"""
+    match = _CREATE_TABLE.match(query)
+    if_not_exists = 'IF NOT EXISTS ' if match.group(1) else ''
+    table = match.group(2)
+
+    columns, constraints, statements = [], [], []
+    auto_increment = None
+    for item in _split_top_level(match.group(3)):
+        key = _KEY_ITEM.match(item)
+        upper = item.upper()
+        if upper.startswith('PRIMARY KEY'):
+            constraints.append(item)
+        elif key:
+            unique, name, key_columns = key.groups()
+            name = name or re.sub(r"\W+", '_', key_columns).strip('_')
+            statements.append(
+                f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS "{table}_{name}" ON "{table}" ({key_columns})'
+            )
+        elif upper.startswith(('CONSTRAINT', 'FOREIGN KEY')):
+            constraints.append(item)
+        else:
+            name, definition = _split_column(item)
+            definition, is_auto, on_update = _column_definition(definition)
+            if is_auto:
+                auto_increment = name
+            if on_update:
+                statements.append(
+                    f'CREATE TRIGGER IF NOT EXISTS "{table}_{name}_on_update" AFTER UPDATE ON "{table}" '
+                    f'FOR EACH ROW WHEN NEW."{name}" IS OLD."{name}" '
+                    f'BEGIN UPDATE "{table}" SET "{name}" = {SQLITE_NOW} WHERE rowid = NEW.rowid; END'
+                )
+            columns.append(f'"{name}" {definition}')
+
+    # A chave primária já foi declarada na coluna INTEGER PRIMARY KEY
+    if auto_increment:
+        constraints = [
+            item for item in constraints
+            if not re.match(rf"PRIMARY\s+KEY\s*\(\s*`?{auto_increment}`?\s*\)$", item, re.I)
+        ]
+
+    definitions = ',\n    '.join(columns + constraints)
+    return (f'CREATE TABLE {if_not_exists}"{table}" (\n    {definitions}\n)',) + tuple(statements)
+
+
+def _date_arithmetic(match):
+    operation, amount, unit = match.groups()
+    sign = '+' if operation.upper() == 'ADD' else '-'
+    return f"datetime('now', 'localtime', '{sign}{amount} {INTERVAL_UNITS[unit.upper()]}')"
+
+
+def _date_format(match):
+    column, mysql_format = match.groups()
+    sqlite_format = re.sub(r"%[is]", lambda spec: {'%i': '%M', '%s': '%S'}[spec.group()], mysql_format)
+    return f"strftime('{sqlite_format}', {column})"
+
+
+@functools.lru_cache(maxsize=512)
+def translate(query):
+    """
+    Converte uma instrução escrita para o MySQL no dialeto do SQLite.
+
+    Retorna uma tupla de instruções (um CREATE TABLE vira também os seus
+    CREATE INDEX e triggers). Cobre o que o bot usa: placeholders %s,
+    NOW()/DATE_SUB/DATE_FORMAT, ON DUPLICATE KEY UPDATE, INSERT IGNORE,
+    AUTO_INCREMENT, ENUM, ON UPDATE CURRENT_TIMESTAMP e nomes de índices
+    (prefixados com a tabela, pois no SQLite eles são globais).
+    """
+    if _CREATE_TABLE.match(query):
+        return _translate_create_table(query)
+
+    create_index = _CREATE_INDEX.match(query)
+    if create_index:
+        unique, name, table, columns = create_index.groups()
+        return (f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS "{table}_{name}" ON "{table}" ({columns})',)
+
+    add_column = _ADD_COLUMN.match(query)
+    if add_column:
+        table, column, definition = add_column.groups()
+        return (f'ALTER TABLE "{table}" ADD COLUMN "{column}" {_column_definition(definition)[0]}',)
+
+    query = _INSERT_IGNORE.sub('INSERT OR IGNORE', query)
+    query = _DATE_ARITHMETIC.sub(_date_arithmetic, query)
+    query = _DATE_FORMAT.sub(_date_format, query)
+    query = _NOW.sub(SQLITE_NOW, query)
+
+    parts = _ON_DUPLICATE.split(query, 1)
+    if len(parts) == 2:
+        insert, updates = parts
+        query = insert + 'ON CONFLICT DO UPDATE SET' + _VALUES_REF.sub(r'excluded.\1', updates)
+
+    return (_PLACEHOLDER.sub(lambda match: '?' if match.group() == '%s' else match.group(), query),)
+
+
+def load_schema_dump(path=SCHEMA_FILE):
+    """
+    Lê o dump do phpMyAdmin e monta um CREATE TABLE completo por tabela.
+
+    O dump declara chaves, AUTO_INCREMENT e chaves estrangeiras em ALTER
+    TABLEs separados, que o SQLite não suporta; aqui eles são incorporados
+    ao CREATE TABLE de cada tabela. Os dados (INSERTs) não são copiados.
+    """
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+
+    tables = {}
+    for statement in _split_statements(text):
+        create = _CREATE_TABLE.match(statement)
+        if create:
+            tables[create.group(2)] = _split_top_level(create.group(3))
+            continue
+
+        alter = _ALTER_TABLE.match(statement)
+        if not alter or alter.group(1) not in tables:
+            continue
+
+        items = tables[alter.group(1)]
+        for action in _split_top_level(alter.group(2)):
+            verb, _, rest = action.partition(' ')
+            if verb.upper() == 'ADD':
+                items.append(rest.strip())
+            elif verb.upper() == 'MODIFY':
+                name = _split_column(rest)[0]
+                items[:] = [rest.strip() if _split_column(item)[0] == name else item for item in items]
+
+    return [f"CREATE TABLE `{table}` ({', '.join(items)})" for table, items in tables.items()]
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+class SQLiteCursor:
+    """Cursor com a interface do mysql.connector usada pelo bot"""
+
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        if dictionary:
+            cursor.row_factory = _dict_row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, query, params=None):
+        *setup, statement = translate(query)
+        for extra in setup:
+            self._cursor.execute(extra)
+        self._cursor.execute(statement, tuple(params or ()))
+        return self
+
+    def executemany(self, query, seq_params):
+        statement, = translate(query)
+        self._cursor.executemany(statement, [tuple(params) for params in seq_params])
+        return self
+
+
+class SQLiteConnection:
+    """
+    Conexão emprestada do SQLitePool.
+
+    Imita o necessário do mysql.connector (cursor(dictionary=True), commit,
+    rollback, is_connected, close) para que as funções de dados funcionem
+    sem alterações nos dois backends. close() devolve a conexão ao pool.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def cursor(self, dictionary=False, **kwargs):
+        return SQLiteCursor(self._raw.cursor(), dictionary)
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def is_connected(self):
+        return self._raw is not None
+
+    def close(self):
+        if self._raw is None:
+            return
+        raw, self._raw = self._raw, None
+        self._pool.release(raw)
+
+
+class SQLitePool:
+    """
+    Pool de conexões para um arquivo SQLite em modo WAL.
+
+    No WAL as leituras não bloqueiam a escrita nem umas às outras; as
+    escritas usam BEGIN IMMEDIATE e esperam o lock por até
+    SQLITE_BUSY_TIMEOUT segundos. Na primeira conexão, se o arquivo
+    estiver vazio, o esquema de BANCO_DE_DADOS.sql é criado.
+    """
+
+    def __init__(self, path=SQLITE_PATH, pool_size=10):
+        self.path = path
+        self.pool_size = pool_size
+        self._idle = []
+        self._lock = threading.Lock()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def get_connection(self):
+        with self._lock:
+            raw = self._idle.pop() if self._idle else None
+        if raw is None:
+            raw = self._connect()
+        return SQLiteConnection(self, raw)
+
+    def release(self, raw):
+        # Como o pool_reset_session do MySQL: nada pendente volta para o pool
+        if raw.in_transaction:
+            raw.rollback()
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(raw)
+                return
+        raw.close()
+
+    def _connect(self):
+        raw = sqlite3.connect(
+            self.path,
+            timeout=SQLITE_BUSY_TIMEOUT,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            isolation_level='IMMEDIATE',
+            check_same_thread=False
+        )
+        raw.execute("PRAGMA journal_mode = WAL")
+        raw.execute("PRAGMA synchronous = NORMAL")
+        raw.execute("PRAGMA foreign_keys = ON")
+        if not self._schema_ready:
+            self._ensure_schema(raw)
+        return raw
+
+    def _ensure_schema(self, raw):
+        """Cria as tabelas do dump de referência num banco novo"""
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            if raw.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table'").fetchone()[0] == 0:
+                for create_table in load_schema_dump():
+                    for statement in translate(create_table):
+                        raw.execute(statement)
+                raw.commit()
+                print(f"Esquema de {os.path.basename(SCHEMA_FILE)} criado em {self.path}.")
+            self._schema_ready = True
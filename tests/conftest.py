@@ -0,0 +1,37 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# Os módulos do bot ficam na raiz do repositório (sem pacote)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Banco SQLite descartável para os testes que usam o banco
+os.environ['DB_BACKEND'] = 'sqlite'
+os.environ['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(), 'bot_influenciador_test.db')
+
+DATA_TABLES = (
+    'broadcast_jobs', 'transcode_cache', 'media_metadata', 'buttons',
+    'flow_steps', 'flows', 'bot_config', 'users'
+)
+
+
+@pytest.fixture
+def db():
+    """Banco migrado e vazio (sem usuários, fluxos, mídias nem configurações)"""
+    import flow_manager
+    from database import create_connection
+    from migrations import run_migrations
+
+    assert run_migrations()
+    connection = create_connection()
+    cursor = connection.cursor()
+    for table in DATA_TABLES:
+        cursor.execute(f"DELETE FROM {table}")
+    connection.commit()
+    cursor.close()
+    connection.close()
+
+    flow_manager.load_config_snapshot(force=True)
+    flow_manager.invalidate_flow_cache()
+    yield
@@ -0,0 +1,148 @@
+import asyncio
+from telegram.error import BadRequest, Forbidden
+from database import create_connection
+from broadcast import (
+    BroadcastEngine, create_broadcast_job, deactivate_users, fetch_broadcast_users,
+    get_broadcast_job
+)
+
+BLOCKED = {1003, 1006}
+BROKEN = {1004}
+
+
+class FakeBot:
+    """Bot mínimo: registra os envios e simula bloqueios e falhas"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, reply_markup=None, rate_limit_args=None):
+        if chat_id in BLOCKED:
+            raise Forbidden("Forbidden: bot was blocked by the user")
+        if chat_id in BROKEN:
+            raise BadRequest("Chat not found")
+        self.sent.append((chat_id, text, rate_limit_args))
+
+
+def execute(query, params=()):
+    connection = create_connection()
+    cursor = connection.cursor()
+    cursor.execute(query, params)
+    connection.commit()
+    lastrowid = cursor.lastrowid
+    cursor.close()
+    connection.close()
+    return lastrowid
+
+
+def fetch(query, params=()):
+    connection = create_connection()
+    cursor = connection.cursor()
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    cursor.close()
+    connection.close()
+    return rows
+
+
+def add_users(telegram_ids, is_active=True):
+    for telegram_id in telegram_ids:
+        execute("INSERT INTO users (telegram_id, is_active) VALUES (%s, %s)", (telegram_id, is_active))
+
+
+def add_flow():
+    flow_id = execute("INSERT INTO flows (name) VALUES ('Novidades')")
+    execute(
+        "INSERT INTO flow_steps (flow_id, step_order, step_type, content) VALUES (%s, 1, 'text', 'Olá!')",
+        (flow_id,)
+    )
+    return flow_id
+
+
+def test_fetch_broadcast_users_pages_by_id(db):
+    add_users([1001, 1002])
+    add_users([1003], is_active=False)
+    add_users([1004, 1005])
+
+    first_page = fetch_broadcast_users('all', 0, 2)
+    assert [user['telegram_id'] for user in first_page] == [1001, 1002]
+
+    second_page = fetch_broadcast_users('all', first_page[-1]['id'], 2)
+    assert [user['telegram_id'] for user in second_page] == [1004, 1005]
+    assert fetch_broadcast_users('all', second_page[-1]['id'], 2) == []
+
+
+def test_broadcast_checkpoints_each_page_and_deactivates_blocked_users(db):
+    add_users(range(1001, 1008))
+    add_users([2001], is_active=False)
+    job_id = create_broadcast_job(add_flow(), 'all', created_by=1)
+    bot = FakeBot()
+
+    asyncio.run(BroadcastEngine(workers=2, page_size=3)._start(bot, job_id))
+
+    assert sorted(chat_id for chat_id, _, _ in bot.sent) == [1001, 1002, 1005, 1007]
+    assert {(text, tuple(args.items())) for _, text, args in bot.sent} == {("Olá!", (('priority', 'bulk'),))}
+
+    job = get_broadcast_job(job_id)
+    last_active_id = fetch("SELECT MAX(id) FROM users WHERE telegram_id = 1007")[0][0]
+    assert job['status'] == 'done'
+    assert job['total'] == 7
+    assert (job['sent'], job['failed'], job['blocked']) == (4, 1, 2)
+    assert job['last_user_id'] == last_active_id
+
+    inactive = fetch("SELECT telegram_id FROM users WHERE is_active = FALSE ORDER BY telegram_id")
+    assert [row[0] for row in inactive] == [1003, 1006, 2001]
+
+
+def test_broadcast_resumes_after_last_checkpoint(db):
+    add_users(range(1001, 1006))
+    job_id = create_broadcast_job(add_flow(), 'all', created_by=1)
+    checkpoint = fetch("SELECT id FROM users WHERE telegram_id = 1002")[0][0]
+    execute(
+        "UPDATE broadcast_jobs SET status = 'running', last_user_id = %s, sent = 2 WHERE id = %s",
+        (checkpoint, job_id)
+    )
+    bot = FakeBot()
+
+    asyncio.run(BroadcastEngine(workers=2, page_size=2)._start(bot, job_id))
+
+    assert sorted(chat_id for chat_id, _, _ in bot.sent) == [1005]
+    job = get_broadcast_job(job_id)
+    assert (job['status'], job['sent'], job['failed'], job['blocked']) == ('done', 3, 1, 1)
+
+
+class ClosedBot(FakeBot):
+    """Bot cuja conexão foi fechada no meio do envio de um usuário"""
+
+    async def send_message(self, chat_id, text, reply_markup=None, rate_limit_args=None):
+        if chat_id == 1002:
+            raise RuntimeError("This HTTPXRequest is not initialized!")
+        await super().send_message(chat_id, text, reply_markup, rate_limit_args)
+
+
+def test_unexpected_error_fails_the_recipient_not_the_broadcast(db):
+    add_users([1001, 1002, 1005])
+    job_id = create_broadcast_job(add_flow(), 'all', created_by=1)
+    bot = ClosedBot()
+
+    asyncio.run(BroadcastEngine(workers=2, page_size=2)._start(bot, job_id))
+
+    assert sorted(chat_id for chat_id, _, _ in bot.sent) == [1001, 1005]
+    job = get_broadcast_job(job_id)
+    assert (job['status'], job['sent'], job['failed'], job['blocked']) == ('done', 2, 1, 0)
+
+
+def test_start_reactivates_users_who_blocked_the_bot(db):
+    from bot import save_user
+    from user_writes import user_write_buffer
+
+    add_users([1001, 1002])
+    save_user(1001, username='ana')
+    assert user_write_buffer.flush()
+
+    deactivate_users([1001, 1002])
+    save_user(1001, username='ana')
+    save_user(1002, username='bia')
+    assert user_write_buffer.flush()
+
+    assert [user['telegram_id'] for user in fetch_broadcast_users('all', 0, 10)] == [1001, 1002]
@@ -0,0 +1,28 @@
+import asyncio
+from types import SimpleNamespace
+from callback_router import CallbackRouter
+
+
+def make_update(data):
+    return SimpleNamespace(callback_query=SimpleNamespace(data=data), effective_user=SimpleNamespace(id=1))
+
+
+def test_dispatch_prefers_the_longest_prefix_and_counts_misses():
+    router = CallbackRouter()
+    calls = []
+
+    @router.prefix("edit_step_")
+    async def edit_step(update, context, payload):
+        calls.append(('edit_step', payload))
+
+    @router.prefix("edit_step_text_")
+    async def edit_step_text(update, context, payload):
+        calls.append(('edit_step_text', payload))
+
+    assert asyncio.run(router.dispatch(make_update("edit_step_text_7"), None))
+    assert asyncio.run(router.dispatch(make_update("edit_step_8"), None))
+    assert not asyncio.run(router.dispatch(make_update("desconhecido"), None))
+
+    assert calls == [('edit_step_text', '7'), ('edit_step', '8')]
+    stats = router.get_stats()
+    assert (stats['calls'], stats['errors'], stats['unmatched']) == (2, 0, 1)
@@ -0,0 +1,44 @@
+import flow_manager
+from database import create_connection
+from flow_manager import get_config_value, set_config_value, load_config_snapshot
+
+
+def update_in_other_process(config_key, config_value):
+    """UPDATE igual ao de set_config_value, sem passar pelo cache deste processo"""
+    connection = create_connection()
+    cursor = connection.cursor()
+    cursor.execute(
+        "UPDATE bot_config SET config_value = %s, revision = revision + 1 WHERE config_key = %s",
+        (config_value, config_key)
+    )
+    connection.commit()
+    cursor.close()
+    connection.close()
+
+
+def expire_snapshot(monkeypatch):
+    monkeypatch.setattr(flow_manager, '_config_checked_at', 0.0)
+
+
+def test_set_config_value_is_visible_immediately(db):
+    assert set_config_value('welcome_text', 'Olá')
+    assert get_config_value('welcome_text') == 'Olá'
+    assert set_config_value('welcome_text', 'Oi')
+    assert get_config_value('welcome_text') == 'Oi'
+
+
+def test_snapshot_sees_edits_in_the_same_second(db, monkeypatch):
+    set_config_value('welcome_text', 'primeiro')
+    load_config_snapshot(force=True)
+
+    # Mesmo segundo, mesma quantidade de linhas: só revision muda a versão
+    update_in_other_process('welcome_text', 'segundo')
+    expire_snapshot(monkeypatch)
+    assert get_config_value('welcome_text') == 'segundo'
+
+
+def test_snapshot_is_reused_while_version_is_unchanged(db, monkeypatch):
+    set_config_value('welcome_text', 'igual')
+    snapshot = load_config_snapshot(force=True)
+    expire_snapshot(monkeypatch)
+    assert load_config_snapshot() is snapshot
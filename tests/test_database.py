@@ -0,0 +1,49 @@
+import time
+from mysql.connector import errors
+import database
+
+
+class FakeConnection:
+    def __init__(self, pool):
+        self._pool = pool
+        self._cnx = object()
+
+    def ping(self, reconnect=True, attempts=1, delay=0):
+        raise errors.InterfaceError("Lost connection")
+
+    def close(self):
+        self._pool.available += 1
+
+
+class FakePool:
+    def __init__(self, size):
+        self.available = size
+        self.connections = []
+
+    def get_connection(self):
+        if not self.available:
+            raise errors.PoolError("Failed getting connection; pool exhausted")
+        self.available -= 1
+        connection = FakeConnection(self)
+        self.connections.append(connection)
+        return connection
+
+
+def test_failed_ping_returns_connection_to_pool(monkeypatch):
+    pool = FakePool(1)
+    monkeypatch.setattr(database, '_get_pool', lambda: pool)
+    monkeypatch.setattr(database, 'POOL_TIMEOUT', 0)
+
+    # Conexão ociosa há mais que POOL_PING_INTERVAL: o ping é feito e falha
+    real_get_connection = pool.get_connection
+
+    def idle_connection():
+        connection = real_get_connection()
+        database._last_used[id(connection._cnx)] = time.monotonic() - database.POOL_PING_INTERVAL - 1
+        return connection
+
+    monkeypatch.setattr(pool, 'get_connection', idle_connection)
+
+    for _ in range(3):
+        assert database.create_connection() is None
+        assert pool.available == 1
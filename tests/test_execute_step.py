@@ -0,0 +1,43 @@
+import asyncio
+from bot import execute_step
+
+
+class FakeQuery:
+    """CallbackQuery mínimo: guarda as edições da mensagem"""
+
+    def __init__(self):
+        self.edits = []
+
+    async def edit_message_text(self, text, reply_markup=None):
+        self.edits.append((text, reply_markup))
+
+
+def make_step(step_type, **fields):
+    step = {'id': 7, 'step_type': step_type, 'content': None, 'media_url': None,
+            'button_text': None, 'buttons': []}
+    step.update(fields)
+    return step
+
+
+def test_button_step_edits_the_callback_message():
+    query = FakeQuery()
+    asyncio.run(execute_step(query, make_step('button', content="Escolha", button_text="Abrir")))
+
+    [(text, keyboard)] = query.edits
+    assert text == "Escolha"
+    [[button]] = keyboard.inline_keyboard
+    assert button.text == "Abrir" and button.callback_data == "step_7"
+
+
+def test_button_step_without_content_uses_default_text():
+    query = FakeQuery()
+    asyncio.run(execute_step(query, make_step('button')))
+
+    assert query.edits == [("Escolha uma opção:", None)]
+
+
+def test_text_step_edits_the_callback_message():
+    query = FakeQuery()
+    asyncio.run(execute_step(query, make_step('text', content="Olá")))
+
+    assert [text for text, _ in query.edits] == ["Olá"]
@@ -0,0 +1,37 @@
+import time
+import pytest
+from types import SimpleNamespace
+import flow_manager
+from flow_manager import FlowPlan, get_flow_plan, invalidate_flow_cache
+
+
+@pytest.fixture
+def compiler(monkeypatch):
+    """Substitui compile_flow_plan; on_compile roda no meio da compilação"""
+    compiler = SimpleNamespace(calls=[], on_compile=None)
+
+    def compile_flow_plan(flow_id):
+        compiler.calls.append(flow_id)
+        if compiler.on_compile:
+            compiler.on_compile()
+        return FlowPlan(flow_id, f"Fluxo {len(compiler.calls)}", (), time.monotonic())
+
+    invalidate_flow_cache()
+    monkeypatch.setattr(flow_manager, 'compile_flow_plan', compile_flow_plan)
+    yield compiler
+    invalidate_flow_cache()
+
+
+def test_compiled_plan_is_cached(compiler):
+    assert get_flow_plan(1) is get_flow_plan(1)
+    assert compiler.calls == [1]
+
+
+def test_plan_compiled_during_invalidation_is_not_cached(compiler):
+    compiler.on_compile = lambda: invalidate_flow_cache(1)
+    assert get_flow_plan(1).name == "Fluxo 1"
+
+    compiler.on_compile = None
+    assert get_flow_plan(1).name == "Fluxo 2"
+    assert get_flow_plan(1).name == "Fluxo 2"
+    assert compiler.calls == [1, 1]
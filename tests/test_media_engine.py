@@ -0,0 +1,55 @@
+import pytest
+from media_engine import (
+    parse_progress_line, target_video_bitrate, check_video_note_info,
+    MIN_VIDEO_BITRATE_KBPS, MAX_VIDEO_BITRATE_KBPS
+)
+
+
+def video_info(**fields):
+    info = {'size_bytes': 5 * 1024 * 1024, 'duration': 20.0, 'width': 512, 'height': 512, 'codec': 'h264'}
+    info.update(fields)
+    return info
+
+
+def test_target_video_bitrate_is_clamped():
+    assert target_video_bitrate(1) == MAX_VIDEO_BITRATE_KBPS
+    assert MIN_VIDEO_BITRATE_KBPS <= target_video_bitrate(60) <= MAX_VIDEO_BITRATE_KBPS
+
+
+def test_target_video_bitrate_limits_duration_to_a_video_note():
+    # Só os primeiros 60 segundos são convertidos
+    assert target_video_bitrate(600) == target_video_bitrate(60)
+    assert target_video_bitrate(0) == target_video_bitrate(60)
+
+
+@pytest.mark.parametrize('line, expected', [
+    ('out_time_us=5000000', 0.5),
+    ('out_time_ms=2500000', 0.25),
+    ('out_time_us=20000000', 1.0),
+    ('progress=end', 1.0),
+    ('progress=continue', None),
+    ('out_time_us=N/A', None),
+    ('frame=120', None),
+    ('', None),
+])
+def test_parse_progress_line(line, expected):
+    assert parse_progress_line(line, 10) == expected
+
+
+def test_parse_progress_line_without_duration():
+    assert parse_progress_line('out_time_us=5000000', 0) is None
+
+
+def test_check_video_note_info_accepts_square_h264():
+    assert check_video_note_info(video_info())[0]
+
+
+@pytest.mark.parametrize('fields', [
+    {'width': 640, 'height': 360},
+    {'duration': 61.0},
+    {'width': 200, 'height': 200},
+    {'codec': 'vp9'},
+    {'size_bytes': 101 * 1024 * 1024},
+])
+def test_check_video_note_info_rejects(fields):
+    assert not check_video_note_info(video_info(**fields))[0]
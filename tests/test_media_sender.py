@@ -0,0 +1,74 @@
+import asyncio
+import os
+from types import SimpleNamespace
+from media_sender import LocalMediaSender
+
+
+def sent_video(file_id):
+    return SimpleNamespace(
+        photo=None, video_note=None, video=SimpleNamespace(file_id=file_id),
+        animation=None, document=None, audio=None
+    )
+
+
+def test_concurrent_sends_upload_once_and_release_the_lock(tmp_path):
+    path = tmp_path / 'video.mp4'
+    path.write_bytes(b'conteudo')
+
+    async def scenario():
+        sender = LocalMediaSender()
+        sent = []
+
+        async def send(media):
+            sent.append(media)
+            await asyncio.sleep(0.01)
+            return sent_video('FILE_ID')
+
+        await asyncio.gather(*(sender.send(str(path), 'video', send) for _ in range(5)))
+        return sender, sent
+
+    sender, sent = asyncio.run(scenario())
+    assert sent == [b'conteudo'] + ['FILE_ID'] * 4
+    assert sender._locks == {}
+    stats = sender.get_stats()
+    assert stats['uploads'] == 1 and stats['reused'] == 4 and stats['waits'] == 4
+
+
+def test_changed_file_is_uploaded_again(tmp_path):
+    path = tmp_path / 'video.mp4'
+    path.write_bytes(b'primeiro')
+
+    async def scenario():
+        sender = LocalMediaSender()
+        sent = []
+
+        async def send(media):
+            sent.append(media)
+            return sent_video(f'FILE_ID_{len(sent)}')
+
+        await sender.send(str(path), 'video', send)
+        path.write_bytes(b'segundo conteudo')
+        os.utime(path, (1, 1))
+        await sender.send(str(path), 'video', send)
+        return sent
+
+    assert asyncio.run(scenario()) == [b'primeiro', b'segundo conteudo']
+
+
+def test_failed_upload_releases_the_lock(tmp_path):
+    path = tmp_path / 'video.mp4'
+    path.write_bytes(b'conteudo')
+
+    async def scenario():
+        sender = LocalMediaSender()
+
+        async def send(media):
+            raise RuntimeError("Telegram indisponível")
+
+        try:
+            await sender.send(str(path), 'video', send)
+        except RuntimeError:
+            pass
+        return sender
+
+    assert asyncio.run(scenario())._locks == {}
@@ -0,0 +1,151 @@
+import os
+import time
+import pytest
+from database import create_connection
+from flow_manager import set_config_value, get_config_value
+from media_engine import file_sha256
+import media_store
+from media_store import add_to_store, collect_garbage, collectable_files, store_path
+
+FILE_ID = 'BAACAgEAAxkBAAIBZ2Zt0a1b2c3d4e5f6g7h8i9j0'
+OLD = time.time() - 3 * 24 * 3600
+
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch, db):
+    """uploads/ vazio em um diretório temporário"""
+    monkeypatch.chdir(tmp_path)
+    for type_name in media_store.LEGACY_DIRS:
+        (tmp_path / 'uploads' / type_name).mkdir(parents=True)
+    return tmp_path / 'uploads'
+
+
+def write(path, content, mtime=None):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return media_store.normalize_media_path(os.path.relpath(path))
+
+
+def add_step(media_url):
+    connection = create_connection()
+    cursor = connection.cursor()
+    cursor.execute("INSERT INTO flows (name) VALUES ('Fluxo de teste')")
+    cursor.execute(
+        "INSERT INTO flow_steps (flow_id, step_order, step_type, media_url) VALUES (%s, 1, 'video', %s)",
+        (cursor.lastrowid, media_url)
+    )
+    connection.commit()
+    cursor.close()
+    connection.close()
+
+
+def step_media_urls():
+    connection = create_connection()
+    cursor = connection.cursor()
+    cursor.execute("SELECT media_url FROM flow_steps")
+    rows = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    connection.close()
+    return rows
+
+
+def test_add_to_store_deduplicates_content(uploads):
+    first = write(uploads / 'video' / f'{FILE_ID}.mp4', b'video')
+    second = write(uploads / 'video' / f'{FILE_ID}X.mp4', b'video')
+
+    stored = add_to_store(first)
+    assert stored == store_path(file_sha256(stored), '.mp4')
+    assert add_to_store(second) == stored
+    assert not os.path.exists(first) and not os.path.exists(second)
+
+
+def test_collectable_files_ignore_non_media(uploads):
+    write(uploads / 'image' / 'teste.py', b'print()', OLD)
+    write(uploads / 'video' / 'teste', b'', OLD)
+    write(uploads / 'notas.txt', b'', OLD)
+    write(uploads / 'outros' / f'{FILE_ID}.mp4', b'', OLD)
+    write(uploads / 'video' / f'{FILE_ID}.mp4.part', b'', OLD)
+    media = write(uploads / 'video' / f'{FILE_ID}.mp4', b'video', OLD)
+
+    assert list(collectable_files()) == [media]
+
+
+def test_collect_garbage_removes_only_old_orphans(uploads):
+    keep = [
+        write(uploads / 'image' / 'teste.py', b'print()', OLD),
+        write(uploads / 'video_note' / 'teste', b'', OLD),
+        write(uploads / 'image' / f'{FILE_ID}.jpg', b'recente')
+    ]
+    orphan = write(uploads / 'video' / f'{FILE_ID}.mp4', b'antigo', OLD)
+    stored_orphan = add_to_store(write(uploads / 'video' / f'{FILE_ID}2.mp4', b'armazenado'))
+    os.utime(stored_orphan, (OLD, OLD))
+
+    result = collect_garbage()
+
+    assert result['removed'] == 2
+    assert not os.path.exists(orphan) and not os.path.exists(stored_orphan)
+    assert all(os.path.exists(path) for path in keep)
+
+
+def test_collect_garbage_moves_referenced_legacy_files(uploads):
+    step_path = write(uploads / 'video' / f'{FILE_ID}.mp4', b'passo', OLD)
+    welcome_path = write(uploads / 'video_note' / f'welcome_video_note_{FILE_ID}.mp4', b'boas-vindas', OLD)
+    add_step(step_path)
+    set_config_value('welcome_media_url', welcome_path)
+
+    result = collect_garbage()
+
+    assert result['moved'] == 2 and result['removed'] == 0
+    [new_step_path] = step_media_urls()
+    assert new_step_path == store_path(file_sha256(new_step_path), '.mp4')
+    assert media_store.is_stored(get_config_value('welcome_media_url'))
+    assert not os.path.exists(step_path) and not os.path.exists(welcome_path)
+    assert collect_garbage() == {'moved': 0, 'deduplicated': 0, 'removed': 0, 'freed_bytes': 0}
+
+
+def test_cached_transcodes_survive_until_their_ttl(uploads):
+    from media_store import save_cached_transcode, get_cached_transcode
+
+    recent = add_to_store(write(uploads / 'video_note' / f'{FILE_ID}_video_note.mp4', b'recente'))
+    expired = add_to_store(write(uploads / 'video_note' / f'{FILE_ID}2_video_note.mp4', b'expirada'))
+    for path in (recent, expired):
+        os.utime(path, (OLD, OLD))
+    save_cached_transcode('a' * 64, 'preset', recent)
+    save_cached_transcode('b' * 64, 'preset', expired)
+
+    connection = create_connection()
+    cursor = connection.cursor()
+    cursor.execute("UPDATE transcode_cache SET created_at = '2020-01-01 00:00:00' WHERE output_path = %s", (expired,))
+    connection.commit()
+    cursor.close()
+    connection.close()
+
+    result = collect_garbage()
+
+    assert result['removed'] == 1
+    assert get_cached_transcode('a' * 64, 'preset') == recent
+    assert get_cached_transcode('b' * 64, 'preset') is None
+    assert not os.path.exists(expired)
+
+
+def test_reupload_of_old_orphan_renews_its_grace(uploads):
+    orphan = add_to_store(write(uploads / 'video' / f'{FILE_ID}.mp4', b'video'))
+    os.utime(orphan, (OLD, OLD))
+
+    assert add_to_store(write(uploads / 'video' / f'{FILE_ID}X.mp4', b'video')) == orphan
+    assert collect_garbage()['removed'] == 0
+    assert os.path.exists(orphan)
+
+
+def test_collect_garbage_relocates_cached_transcodes(uploads):
+    from media_store import save_cached_transcode, get_cached_transcode
+
+    legacy = write(uploads / 'video_note' / f'{FILE_ID}_video_note.mp4', b'convertido', OLD)
+    save_cached_transcode('a' * 64, 'preset', legacy)
+
+    assert collect_garbage()['moved'] == 1
+    cached = get_cached_transcode('a' * 64, 'preset')
+    assert cached == store_path(file_sha256(cached), '.mp4')
+    assert not os.path.exists(legacy)
@@ -0,0 +1,83 @@
+import json
+import time
+import asyncio
+from telegram.ext import ExtBot
+from telegram.request import BaseRequest
+from send_scheduler import SendScheduler
+
+RETRY_AFTER = 1
+
+
+class FakeBotAPI(BaseRequest):
+    """Bot API falsa: responde getMe e devolve um flood control no primeiro sendMessage"""
+
+    def __init__(self, flood_controls=1):
+        self.flood_controls = flood_controls
+        self.sends = []
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        endpoint = url.rsplit('/', 1)[-1]
+        if endpoint == 'getMe':
+            return 200, self._ok({'id': 1, 'is_bot': True, 'first_name': "Bot", 'username': "teste_bot"})
+
+        params = request_data.parameters
+        self.sends.append((time.monotonic(), params['chat_id'], params['text']))
+        if self.flood_controls:
+            self.flood_controls -= 1
+            return 429, json.dumps({
+                'ok': False, 'error_code': 429,
+                'description': f"Too Many Requests: retry after {RETRY_AFTER}",
+                'parameters': {'retry_after': RETRY_AFTER}
+            }).encode()
+
+        return 200, self._ok({
+            'message_id': len(self.sends), 'date': 0,
+            'chat': {'id': params['chat_id'], 'type': 'private'}, 'text': params['text']
+        })
+
+    @staticmethod
+    def _ok(result):
+        return json.dumps({'ok': True, 'result': result}).encode()
+
+
+async def send(api, scheduler, *messages):
+    """Envia (atraso, chat_id, texto) pelo ExtBot usando a Bot API falsa"""
+    async def send_later(bot, delay, chat_id, text):
+        await asyncio.sleep(delay)
+        return await bot.send_message(chat_id, text)
+
+    async with ExtBot("123:TESTE", request=api, get_updates_request=api, rate_limiter=scheduler) as bot:
+        return await asyncio.gather(*(send_later(bot, *message) for message in messages))
+
+
+def test_retry_after_pauses_and_resends():
+    api = FakeBotAPI()
+    scheduler = SendScheduler()
+
+    [message] = asyncio.run(send(api, scheduler, (0, 10, "Olá")))
+
+    assert message.text == "Olá"
+    [(first_at, chat_id, _), (resent_at, resent_chat_id, resent_text)] = api.sends
+    assert (chat_id, resent_chat_id, resent_text) == (10, 10, "Olá")
+    assert resent_at - first_at >= RETRY_AFTER
+    stats = scheduler.get_stats()
+    # getMe (feito ao inicializar o bot) também passa pelo agendador
+    assert (stats['sent'], stats['retry_after'], stats['retries']) == (2, 1, 1)
+
+
+def test_retry_after_pauses_every_chat():
+    api = FakeBotAPI()
+    scheduler = SendScheduler()
+
+    messages = asyncio.run(send(api, scheduler, (0, 10, "primeiro"), (0.2, 20, "segundo")))
+
+    assert [message.chat.id for message in messages] == [10, 20]
+    [(first_at, _, _), *others] = api.sends
+    assert sorted(chat_id for _, chat_id, _ in others) == [10, 20]
+    assert all(sent_at - first_at >= RETRY_AFTER for sent_at, _, _ in others)
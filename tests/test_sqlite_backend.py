@@ -0,0 +1,109 @@
+import sqlite3
+import pytest
+from sqlite_backend import SQLITE_NOW, load_schema_dump, translate
+
+
+def run(connection, query, params=()):
+    *setup, statement = translate(query)
+    for extra in setup:
+        connection.execute(extra)
+    return connection.execute(statement, params)
+
+
+@pytest.fixture
+def connection():
+    connection = sqlite3.connect(':memory:')
+    run(connection, """
+        CREATE TABLE IF NOT EXISTS bot_config (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            config_key VARCHAR(100) NOT NULL UNIQUE,
+            config_value TEXT,
+            status ENUM('on', 'off') DEFAULT 'on',
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            KEY idx_status (status)
+        )
+    """)
+    yield connection
+    connection.close()
+
+
+def test_placeholders_outside_literals_become_question_marks():
+    assert translate("SELECT * FROM users WHERE name = %s AND note = 'taxa de 10%s' AND id = %s") == (
+        "SELECT * FROM users WHERE name = ? AND note = 'taxa de 10%s' AND id = ?",
+    )
+
+
+def test_now_and_date_arithmetic():
+    [query] = translate("SELECT id FROM media_metadata WHERE created_at < DATE_SUB(NOW(), INTERVAL 7 DAY) OR updated_at > NOW()")
+    assert query == (
+        "SELECT id FROM media_metadata WHERE created_at < datetime('now', 'localtime', '-7 days') "
+        f"OR updated_at > {SQLITE_NOW}"
+    )
+    assert translate("SELECT DATE_ADD(NOW(), INTERVAL 2 HOUR)") == ("SELECT datetime('now', 'localtime', '+2 hours')",)
+
+
+def test_date_format_maps_minutes_and_seconds():
+    assert translate("SELECT DATE_FORMAT(u.created_at, '%d/%m/%Y %H:%i:%s') FROM users u") == (
+        "SELECT strftime('%d/%m/%Y %H:%M:%S', u.created_at) FROM users u",
+    )
+
+
+def test_on_duplicate_key_update_becomes_upsert(connection):
+    query = """
+        INSERT INTO bot_config (config_key, config_value) VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE config_value = VALUES(config_value)
+    """
+    assert 'ON CONFLICT DO UPDATE SET config_value = excluded.config_value' in translate(query)[0]
+
+    run(connection, query, ('welcome', 'Olá'))
+    run(connection, query, ('welcome', 'Oi'))
+    assert connection.execute("SELECT config_key, config_value FROM bot_config").fetchall() == [('welcome', 'Oi')]
+
+
+def test_insert_ignore_keeps_existing_row(connection):
+    run(connection, "INSERT IGNORE INTO bot_config (config_key, config_value) VALUES (%s, %s)", ('welcome', 'Olá'))
+    run(connection, "INSERT IGNORE INTO bot_config (config_key, config_value) VALUES (%s, %s)", ('welcome', 'Oi'))
+    assert connection.execute("SELECT config_value FROM bot_config").fetchall() == [('Olá',)]
+
+
+def test_create_table_moves_keys_and_on_update_to_indexes_and_triggers():
+    create, *extra = translate("""
+        CREATE TABLE IF NOT EXISTS bot_config (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            status ENUM('on', 'off') DEFAULT 'on',
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            KEY idx_status (status)
+        )
+    """)
+    assert '"id" INTEGER PRIMARY KEY AUTOINCREMENT' in create
+    assert '"status" TEXT DEFAULT \'on\'' in create
+    assert f'"updated_at" TIMESTAMP DEFAULT ({SQLITE_NOW})' in create
+    assert 'ON UPDATE' not in create and 'KEY idx_status' not in create
+
+    [trigger, index] = extra
+    assert index == 'CREATE INDEX IF NOT EXISTS "bot_config_idx_status" ON "bot_config" (status)'
+    assert trigger.startswith('CREATE TRIGGER IF NOT EXISTS "bot_config_updated_at_on_update" AFTER UPDATE ON "bot_config"')
+
+
+def test_on_update_trigger_refreshes_timestamp(connection):
+    connection.execute("INSERT INTO bot_config (config_key, updated_at) VALUES ('welcome', '2000-01-01 00:00:00')")
+    run(connection, "UPDATE bot_config SET config_value = %s WHERE config_key = %s", ('Olá', 'welcome'))
+    [(updated_at,)] = connection.execute("SELECT updated_at FROM bot_config").fetchall()
+    assert updated_at > '2000-01-01 00:00:00'
+
+
+def test_alter_table_add_column_drops_mysql_only_clauses(connection):
+    assert translate("ALTER TABLE bot_config ADD COLUMN revision INT NOT NULL DEFAULT 0 AFTER config_value") == (
+        'ALTER TABLE "bot_config" ADD COLUMN "revision" INT NOT NULL DEFAULT 0',
+    )
+    run(connection, "ALTER TABLE bot_config ADD COLUMN revision INT NOT NULL DEFAULT 0 AFTER config_value")
+    assert 'revision' in [row[1] for row in connection.execute("PRAGMA table_info(bot_config)")]
+
+
+def test_schema_dump_creates_every_table():
+    connection = sqlite3.connect(':memory:')
+    for statement in load_schema_dump():
+        run(connection, statement)
+    tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {'users', 'flows', 'flow_steps', 'bot_config', 'broadcast_jobs', 'transcode_cache'} <= tables
+    connection.close()
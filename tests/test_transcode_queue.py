@@ -0,0 +1,121 @@
+import asyncio
+import pytest
+from transcode_queue import TranscodeQueue, TranscodeQueueFull
+
+
+def run(scenario):
+    return asyncio.run(scenario())
+
+
+def test_submit_rejects_when_queue_is_full():
+    async def scenario():
+        queue = TranscodeQueue(max_queued=2, workers=1)
+        queue.start()
+        release = asyncio.Event()
+
+        async def job(on_progress):
+            await release.wait()
+            return 'ok'
+
+        first = queue.submit(job)
+        await asyncio.sleep(0)  # o consumidor pega a primeira conversão
+        waiting = [queue.submit(job), queue.submit(job)]
+        with pytest.raises(TranscodeQueueFull):
+            queue.submit(job)
+
+        stats = queue.get_stats()
+        positions = [job.position for job in waiting]
+        release.set()
+        results = await asyncio.gather(first.future, *(job.future for job in waiting))
+        final_stats = queue.get_stats()
+        await queue.stop()
+        return stats, positions, results, final_stats
+
+    stats, positions, results, final_stats = run(scenario)
+    assert stats['running'] == 1 and stats['queued'] == 2 and stats['rejected'] == 1
+    assert positions == [1, 2]
+    assert results == ['ok', 'ok', 'ok']
+    assert final_stats['done'] == 3 and final_stats['running'] == 0 and final_stats['queued'] == 0
+
+
+def test_positions_advance_as_jobs_start():
+    async def scenario():
+        queue = TranscodeQueue(max_queued=3, workers=1)
+        queue.start()
+        releases = [asyncio.Event() for _ in range(3)]
+
+        def make_job(release):
+            async def job(on_progress):
+                await release.wait()
+            return job
+
+        jobs = [queue.submit(make_job(release)) for release in releases]
+        await asyncio.sleep(0)
+        before = [job.status for job in jobs], jobs[2].position
+        releases[0].set()
+        await jobs[0].future
+        await asyncio.sleep(0)
+        after = [job.status for job in jobs], jobs[2].position
+        for release in releases:
+            release.set()
+        await asyncio.gather(*(job.future for job in jobs))
+        await queue.stop()
+        return before, after
+
+    before, after = run(scenario)
+    assert before == (['running', 'queued', 'queued'], 2)
+    assert after == (['done', 'running', 'queued'], 1)
+
+
+def test_wait_reports_progress_and_failures(monkeypatch):
+    monkeypatch.setattr('transcode_queue.TRANSCODE_PROGRESS_INTERVAL', 0.01)
+
+    async def scenario():
+        queue = TranscodeQueue(max_queued=2, workers=1)
+        queue.start()
+        updates = []
+
+        async def job(on_progress):
+            for fraction in (0.25, 0.5, 0.75):
+                on_progress(fraction)
+                await asyncio.sleep(0.03)
+            return 'pronto'
+
+        async def broken(on_progress):
+            raise RuntimeError("ffmpeg falhou")
+
+        async def on_update(job):
+            updates.append((job.status, job.progress))
+
+        result = await queue.wait(queue.submit(job), on_update)
+        failed = queue.submit(broken)
+        with pytest.raises(RuntimeError):
+            await queue.wait(failed, on_update)
+        stats = queue.get_stats()
+        await queue.stop()
+        return result, updates, failed, stats
+
+    result, updates, failed, stats = run(scenario)
+    assert result == 'pronto'
+    assert [progress for status, progress in updates if status == 'running'] == sorted(
+        progress for status, progress in updates if status == 'running'
+    )
+    assert any(progress >= 0.5 for _, progress in updates)
+    assert failed.status == 'failed' and 'falhou' in failed.describe()
+    assert stats['done'] == 1 and stats['failed'] == 1
+
+
+def test_stop_cancels_pending_jobs():
+    async def scenario():
+        queue = TranscodeQueue(max_queued=2, workers=1)
+        queue.start()
+
+        async def job(on_progress):
+            await asyncio.Event().wait()
+
+        jobs = [queue.submit(job), queue.submit(job)]
+        await asyncio.sleep(0)
+        await queue.stop()
+        return [job.future.cancelled() for job in jobs]
+
+    assert run(scenario) == [True, True]
@@ -0,0 +1,55 @@
+import asyncio
+from types import SimpleNamespace
+from update_processor import ChatOrderedUpdateProcessor
+
+
+def make_update(chat_id):
+    return SimpleNamespace(effective_chat=SimpleNamespace(id=chat_id), effective_user=None)
+
+
+def test_get_stats_on_fresh_processor():
+    processor = ChatOrderedUpdateProcessor(4)
+    assert processor.get_stats() == {'max': 4, 'running': 0, 'chats': 0}
+
+
+def test_get_stats_counts_updates_in_progress():
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor(4)
+        release = asyncio.Event()
+
+        async def handler():
+            await release.wait()
+
+        tasks = [
+            asyncio.create_task(processor.process_update(make_update(chat_id), handler()))
+            for chat_id in (1, 1, 2)
+        ]
+        await asyncio.sleep(0)
+        during = processor.get_stats()
+        release.set()
+        await asyncio.gather(*tasks)
+        return during, processor.get_stats()
+
+    during, after = asyncio.run(scenario())
+    assert during['running'] == 3
+    assert during['chats'] == 2
+    assert after['running'] == 0
+    assert after['chats'] == 0
+
+
+def test_updates_of_the_same_chat_run_in_order():
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor(4)
+        order = []
+
+        async def handler(name, delay):
+            await asyncio.sleep(delay)
+            order.append(name)
+
+        await asyncio.gather(
+            processor.process_update(make_update(1), handler('first', 0.02)),
+            processor.process_update(make_update(1), handler('second', 0))
+        )
+        return order
+
+    assert asyncio.run(scenario()) == ['first', 'second']
@@ -0,0 +1,62 @@
+import pytest
+import user_writes
+from user_writes import UserWriteBuffer
+
+BAD = 666
+
+
+@pytest.fixture
+def written(monkeypatch):
+    """Substitui write_user_rows: guarda as linhas gravadas e recusa as do usuário BAD"""
+    rows_written = {}
+
+    def write_user_rows(columns, rows):
+        if any(row[0] == BAD for row in rows):
+            return False
+        for telegram_id, *values in rows:
+            rows_written[telegram_id] = dict(zip(columns, values))
+        return True
+
+    monkeypatch.setattr(user_writes, 'write_user_rows', write_user_rows)
+    monkeypatch.setattr(user_writes, 'database_reachable', lambda: True)
+    return rows_written
+
+
+def test_rejected_row_does_not_block_the_rest_of_the_batch(written):
+    buffer = UserWriteBuffer(batch_size=10, max_attempts=3)
+    for telegram_id in (1, 2, BAD, 3):
+        buffer.update(telegram_id, phone=f"{telegram_id}" * 30)
+
+    assert not buffer.flush()
+    assert sorted(written) == [1, 2, 3]
+    assert buffer.get_stats()['pending'] == 1
+    assert buffer.get(BAD) == {'phone': f"{BAD}" * 30}
+
+
+def test_row_is_dropped_after_max_attempts(written):
+    buffer = UserWriteBuffer(batch_size=10, max_attempts=3)
+    buffer.update(BAD, phone='0' * 30)
+
+    assert not buffer.flush()
+    buffer.update(4, name='Ana')
+    assert not buffer.flush()
+    assert buffer.flush()
+
+    assert sorted(written) == [4]
+    stats = buffer.get_stats()
+    assert (stats['pending'], stats['dropped']) == (0, 1)
+    assert buffer.get(BAD) == {}
+
+
+def test_nothing_is_dropped_while_the_database_is_down(monkeypatch):
+    monkeypatch.setattr(user_writes, 'write_user_rows', lambda columns, rows: False)
+    monkeypatch.setattr(user_writes, 'database_reachable', lambda: False)
+    buffer = UserWriteBuffer(batch_size=10, max_attempts=2)
+    buffer.update(1, name='Ana')
+    buffer.update(2, name='Bia')
+
+    for _ in range(5):
+        assert not buffer.flush()
+
+    stats = buffer.get_stats()
+    assert (stats['pending'], stats['dropped']) == (2, 0)
@@ -0,0 +1,174 @@
+import os
+import time
+import asyncio
+import itertools
+from dotenv import load_dotenv
+from media_worker import media_pool
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+# Configuração da fila de conversões
+TRANSCODE_QUEUE_SIZE = int(os.getenv('TRANSCODE_QUEUE_SIZE', 5))                     # conversões aguardando além das em andamento
+TRANSCODE_PROGRESS_INTERVAL = float(os.getenv('TRANSCODE_PROGRESS_INTERVAL', 3))     # segundos entre edições da mensagem de progresso
+
+
+class TranscodeQueueFull(Exception):
+    """A fila de conversões atingiu o limite de tarefas aguardando"""
+
+
+class TranscodeJob:
+    """Uma conversão na fila: identificador, situação, andamento e resultado"""
+
+    def __init__(self, job_id, run, owner=None):
+        self.id = job_id
+        self.owner = owner
+        self.status = 'queued'
+        self.progress = 0.0
+        self.position = 0
+        self.created_at = time.time()
+        self.started_at = None
+        self._run = run
+        self.future = asyncio.get_running_loop().create_future()
+
+    def set_progress(self, fraction):
+        self.progress = max(self.progress, fraction)
+
+    def describe(self):
+        """Texto da situação da conversão para a mensagem do admin"""
+        if self.status == 'queued':
+            return f"🕐 Conversão #{self.id} na fila (posição {self.position})"
+        if self.status == 'running':
+            filled = int(self.progress * 10)
+            bar = '▓' * filled + '░' * (10 - filled)
+            elapsed = time.time() - self.started_at
+            return f"🔄 Conversão #{self.id}: {bar} {self.progress * 100:.0f}% ({elapsed:.0f}s)"
+        if self.status == 'done':
+            return f"✅ Conversão #{self.id} concluída"
+        return f"❌ Conversão #{self.id} falhou"
+
+
+class TranscodeQueue:
+    """
+    Fila limitada das conversões pedidas pelos admins.
+
+    No máximo workers conversões rodam ao mesmo tempo (o mesmo limite do
+    media_pool) e até max_queued ficam aguardando; além disso o pedido é
+    recusado com TranscodeQueueFull em vez de acumular processos do ffmpeg.
+    Cada tarefa tem um número, posição na fila e o andamento lido do
+    ffmpeg, usados por wait() para atualizar a mensagem de quem pediu.
+    """
+
+    def __init__(self, max_queued=TRANSCODE_QUEUE_SIZE, workers=None):
+        self.max_queued = max_queued
+        self.workers = workers or media_pool.max_workers
+        self._queue = None
+        self._tasks = []
+        self._ids = itertools.count(1)
+        self._jobs = {}
+        self._stats = {'done': 0, 'failed': 0, 'rejected': 0}
+
+    def start(self):
+        """Inicia os consumidores da fila no loop em execução"""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(self.max_queued)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        print(f"🎞️ Fila de conversões iniciada ({self.workers} em paralelo, até {self.max_queued} aguardando)")
+
+    async def stop(self):
+        """Interrompe os consumidores; conversões pendentes falham com CancelledError"""
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        for job in self._jobs.values():
+            if not job.future.done():
+                job.future.cancel()
+        self._jobs.clear()
+
+    def submit(self, run, owner=None):
+        """
+        Enfileira run(on_progress), uma corrotina que faz a conversão e
+        retorna o resultado. Levanta TranscodeQueueFull se não houver vaga.
+        """
+        job = TranscodeJob(next(self._ids), run, owner)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self._stats['rejected'] += 1
+            raise TranscodeQueueFull(f"{self._queue.qsize()} conversões aguardando")
+
+        self._jobs[job.id] = job
+        self._update_positions()
+        return job
+
+    async def wait(self, job, on_update):
+        """
+        Aguarda o resultado de job chamando on_update(job) no máximo a cada
+        TRANSCODE_PROGRESS_INTERVAL segundos e só quando o texto muda, para
+        não estourar o limite de edições do Telegram.
+        """
+        last_text = None
+        while True:
+            text = job.describe()
+            if text != last_text:
+                last_text = text
+                try:
+                    await on_update(job)
+                except Exception as e:
+                    print(f"❌ Erro ao atualizar progresso da conversão #{job.id}: {e}")
+            try:
+                return await asyncio.wait_for(asyncio.shield(job.future), TRANSCODE_PROGRESS_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            job.status = 'running'
+            job.started_at = time.time()
+            self._update_positions()
+            try:
+                result = await job._run(job.set_progress)
+                job.status = 'done'
+                job.progress = 1.0
+                self._stats['done'] += 1
+                if not job.future.done():
+                    job.future.set_result(result)
+            except asyncio.CancelledError:
+                job.future.cancel()
+                raise
+            except Exception as e:
+                job.status = 'failed'
+                self._stats['failed'] += 1
+                print(f"❌ Erro na conversão #{job.id}: {e}")
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                self._jobs.pop(job.id, None)
+                self._queue.task_done()
+
+    def _update_positions(self):
+        queued = [job for job in self._jobs.values() if job.status == 'queued']
+        for position, job in enumerate(sorted(queued, key=lambda job: job.id), 1):
+            job.position = position
+
+    def get_stats(self):
+        """Conversões em andamento, aguardando, concluídas, com falha e recusadas por fila cheia"""
+        running = sum(1 for job in self._jobs.values() if job.status == 'running')
+        return dict(
+            self._stats,
+            running=running,
+            queued=len(self._jobs) - running,
+            max_queued=self.max_queued,
+            workers=self.workers
+        )
+
+
+# Fila compartilhada pelos callbacks de conversão
+transcode_queue = TranscodeQueue()
@@ -0,0 +1,85 @@
+import os
+import asyncio
+from dotenv import load_dotenv
+from telegram.ext import BaseUpdateProcessor
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+# Quantos updates podem ser processados ao mesmo tempo (todos os chats somados)
+MAX_CONCURRENT_UPDATES = int(os.getenv('MAX_CONCURRENT_UPDATES', 32))
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Processa updates de chats diferentes em paralelo, mantendo a ordem
+    dentro de cada chat.
+
+    Cada chat tem uma fila serial (um asyncio.Lock, que atende em ordem de
+    chegada). O lock do chat é obtido antes do semáforo global, assim um
+    update esperando a vez no próprio chat não ocupa uma das vagas de
+    max_concurrent_updates.
+    """
+
+    def __init__(self, max_concurrent_updates=MAX_CONCURRENT_UPDATES):
+        super().__init__(max_concurrent_updates)
+        self._chat_locks = {}
+        self._in_flight = 0
+
+    @staticmethod
+    def _chat_key(update):
+        """Identifica a fila do update: o chat, ou o usuário quando não há chat"""
+        chat = getattr(update, 'effective_chat', None)
+        if chat is not None:
+            return chat.id
+        user = getattr(update, 'effective_user', None)
+        if user is not None:
+            return f"user:{user.id}"
+        return None
+
+    async def process_update(self, update, coroutine):
+        self._in_flight += 1
+        try:
+            await self._process_in_order(update, coroutine)
+        finally:
+            self._in_flight -= 1
+
+    async def _process_in_order(self, update, coroutine):
+        key = self._chat_key(update)
+        if key is None:
+            await super().process_update(update, coroutine)
+            return
+
+        entry = self._chat_locks.get(key)
+        if entry is None:
+            entry = self._chat_locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await super().process_update(update, coroutine)
+        finally:
+            # Remover a fila quando não há mais updates do chat
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._chat_locks.pop(key, None)
+
+    async def do_process_update(self, update, coroutine):
+        await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def get_stats(self):
+        """Retorna quantos updates estão em processamento (ou na fila do chat) e quantos chats têm fila"""
+        return {
+            'max': self.max_concurrent_updates,
+            'running': self._in_flight,
+            'chats': len(self._chat_locks)
+        }
+
+
+# Processador compartilhado pelo bot
+update_processor = ChatOrderedUpdateProcessor()
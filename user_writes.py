@@ -0,0 +1,229 @@
+import os
+import asyncio
+import threading
+from dotenv import load_dotenv
+from database import create_connection, run_db, Error
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+# Configuração da gravação em lote dos dados de usuários
+USER_WRITE_FLUSH_INTERVAL = float(os.getenv('USER_WRITE_FLUSH_INTERVAL', 1))   # segundos entre gravações
+USER_WRITE_BATCH_SIZE = int(os.getenv('USER_WRITE_BATCH_SIZE', 200))          # usuários pendentes que antecipam a gravação
+USER_WRITE_MAX_ATTEMPTS = int(os.getenv('USER_WRITE_MAX_ATTEMPTS', 5))        # falhas de uma mesma linha antes de descartá-la
+
+# Colunas de users que podem ser gravadas pelo buffer
+USER_COLUMNS = (
+    'username', 'first_name', 'last_name', 'is_active',
+    'name', 'phone', 'email', 'additional_data',
+    'welcome_video_sent', 'webhook_bot_access_sent', 'webhook_cadastro_sent', 'webhook_sent_at'
+)
+
+
+def write_user_rows(columns, rows):
+    """Grava várias linhas de users numa única instrução (upsert por telegram_id)"""
+    connection = create_connection()
+    if not connection:
+        return False
+
+    try:
+        cursor = connection.cursor()
+
+        placeholders = ', '.join(['%s'] * (len(columns) + 1))
+        updates = ', '.join(f"{column} = VALUES({column})" for column in columns)
+        query = f"""
+        INSERT INTO users (telegram_id, {', '.join(columns)})
+        VALUES {', '.join([f'({placeholders})'] * len(rows))}
+        ON DUPLICATE KEY UPDATE {updates}
+        """
+        cursor.execute(query, [value for row in rows for value in row])
+        connection.commit()
+        return True
+
+    except Error as e:
+        print(f"❌ Erro ao gravar dados de usuários: {e}")
+        return False
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+def database_reachable():
+    """Indica se o banco aceita conexões (para separar falhas de linhas de quedas do banco)"""
+    connection = create_connection()
+    if not connection:
+        return False
+    connection.close()
+    return True
+
+
+class UserWriteBuffer:
+    """
+    Buffer de gravação (write-behind) das atualizações da tabela users.
+
+    save_user, update_user_data e as marcações de vídeo de boas-vindas e
+    de webhooks registram só os campos alterados em memória e retornam na
+    hora. As alterações de um mesmo usuário se acumulam, e a cada
+    flush_interval segundos (ou quando batch_size usuários estão pendentes)
+    são gravadas com um INSERT ... ON DUPLICATE KEY UPDATE de várias linhas
+    por conjunto de colunas.
+
+    get() devolve os valores ainda não gravados, para que as leituras vejam
+    as próprias escritas. Se uma instrução em lote falhar, as linhas dela
+    são gravadas uma a uma, para que uma linha recusada pelo banco não
+    impeça a gravação das outras. As que falharem voltam para o buffer; uma
+    linha recusada max_attempts vezes é descartada (com o motivo no log),
+    mas nada é descartado enquanto o banco estiver fora do ar. stop() grava
+    o que restar.
+    """
+
+    def __init__(self, flush_interval=USER_WRITE_FLUSH_INTERVAL, batch_size=USER_WRITE_BATCH_SIZE,
+                 max_attempts=USER_WRITE_MAX_ATTEMPTS):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self._pending = {}
+        self._flushing = {}
+        self._attempts = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._loop = None
+        self._wake = None
+        self._task = None
+        self._stats = {'updates': 0, 'rows': 0, 'statements': 0, 'errors': 0, 'dropped': 0}
+
+    def start(self):
+        """Inicia a gravação periódica no loop em execução"""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        print(f"💾 Gravação em lote de usuários iniciada (a cada {self.flush_interval:g}s)")
+
+    async def stop(self):
+        """Interrompe a gravação periódica e grava o que estiver pendente"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await run_db(self.flush)
+        self._loop = None
+
+    def update(self, telegram_id, **fields):
+        """Registra campos alterados de um usuário; a gravação acontece em segundo plano"""
+        for column in fields:
+            if column not in USER_COLUMNS:
+                raise ValueError(f"Coluna de usuário desconhecida: {column}")
+
+        with self._lock:
+            self._pending.setdefault(telegram_id, {}).update(fields)
+            self._stats['updates'] += 1
+            full = len(self._pending) >= self.batch_size
+
+        # update() também é chamado nas threads do banco
+        if full and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def get(self, telegram_id):
+        """Campos do usuário ainda não gravados no banco (leitura das próprias escritas)"""
+        with self._lock:
+            fields = dict(self._flushing.get(telegram_id, {}))
+            fields.update(self._pending.get(telegram_id, {}))
+        return fields
+
+    def flush(self):
+        """Grava todas as alterações pendentes. Retorna False se alguma instrução falhou"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return True
+                self._flushing, self._pending = self._pending, {}
+
+            # Agrupar os usuários pelo conjunto de colunas alteradas
+            groups = {}
+            for telegram_id, fields in self._flushing.items():
+                columns = tuple(column for column in USER_COLUMNS if column in fields)
+                groups.setdefault(columns, []).append(
+                    (telegram_id,) + tuple(fields[column] for column in columns)
+                )
+
+            failed = {}
+            written = False
+            for columns, rows in groups.items():
+                for start in range(0, len(rows), self.batch_size):
+                    chunk = rows[start:start + self.batch_size]
+                    if self._write(columns, chunk):
+                        written = True
+                    elif len(chunk) == 1:
+                        failed[chunk[0][0]] = self._flushing[chunk[0][0]]
+                    else:
+                        # Gravar uma a uma para isolar as linhas recusadas
+                        for row in chunk:
+                            if self._write(columns, [row]):
+                                written = True
+                            else:
+                                failed[row[0]] = self._flushing[row[0]]
+
+            for telegram_id in self._flushing:
+                if telegram_id not in failed:
+                    self._attempts.pop(telegram_id, None)
+
+            # Se outras linhas foram gravadas (ou o banco responde) a falha é da própria linha
+            if failed and (written or database_reachable()):
+                for telegram_id in list(failed):
+                    attempts = self._attempts.get(telegram_id, 0) + 1
+                    if attempts < self.max_attempts:
+                        self._attempts[telegram_id] = attempts
+                        continue
+                    print(f"❌ Dados do usuário {telegram_id} descartados após {attempts} falhas de gravação: "
+                          f"{', '.join(failed[telegram_id])}")
+                    self._attempts.pop(telegram_id, None)
+                    self._stats['dropped'] += 1
+                    del failed[telegram_id]
+
+            with self._lock:
+                # Devolver as falhas sem sobrescrever alterações mais novas
+                for telegram_id, fields in failed.items():
+                    fields = dict(fields)
+                    fields.update(self._pending.get(telegram_id, {}))
+                    self._pending[telegram_id] = fields
+                self._flushing = {}
+
+            return not failed
+
+    def _write(self, columns, rows):
+        if write_user_rows(columns, rows):
+            self._stats['statements'] += 1
+            self._stats['rows'] += len(rows)
+            return True
+        self._stats['errors'] += 1
+        return False
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+            try:
+                if not await run_db(self.flush):
+                    print("⚠️ Gravação de usuários falhou; nova tentativa no próximo ciclo")
+            except Exception as e:
+                print(f"❌ Erro na gravação em lote de usuários: {e}")
+
+    def get_stats(self):
+        """Usuários pendentes, atualizações recebidas e linhas/instruções gravadas"""
+        with self._lock:
+            pending = len(self._pending) + len(self._flushing)
+        return dict(self._stats, pending=pending, running=self._task is not None)
+
+
+# Buffer compartilhado pelo bot
+user_write_buffer = UserWriteBuffer()
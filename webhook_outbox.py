@@ -0,0 +1,344 @@
+import os
+import json
+import asyncio
+from datetime import datetime, timedelta
+import aiohttp
+from dotenv import load_dotenv
+from database import create_connection, run_db, Error
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+# Configuração do envio de webhooks
+WEBHOOK_BATCH_SIZE = int(os.getenv('WEBHOOK_BATCH_SIZE', 20))          # eventos enviados por ciclo
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv('WEBHOOK_MAX_ATTEMPTS', 8))       # tentativas antes de descartar
+WEBHOOK_RETRY_BASE = float(os.getenv('WEBHOOK_RETRY_BASE', 5))         # segundos até a 1ª nova tentativa
+WEBHOOK_RETRY_MAX = float(os.getenv('WEBHOOK_RETRY_MAX', 3600))        # intervalo máximo entre tentativas
+WEBHOOK_POLL_INTERVAL = float(os.getenv('WEBHOOK_POLL_INTERVAL', 5))   # segundos entre verificações da fila
+WEBHOOK_TIMEOUT = float(os.getenv('WEBHOOK_TIMEOUT', 10))              # timeout de cada POST
+WEBHOOK_RETENTION_DAYS = int(os.getenv('WEBHOOK_RETENTION_DAYS', 7))   # dias mantendo eventos já enviados
+
+# Eventos que só podem ser enviados uma vez por usuário
+ONCE_PER_USER_EVENTS = ('bot_access', 'cadastro_concluido')
+
+
+def enqueue_webhook(webhook_url, webhook_data):
+    """Grava o evento na fila de envio (outbox). Retorna False se já houver um igual pendente"""
+    connection = create_connection()
+    if not connection:
+        return False
+
+    try:
+        cursor = connection.cursor()
+
+        event_type = webhook_data['event_type']
+        telegram_id = (webhook_data.get('user_data') or {}).get('telegram_id')
+
+        # Evitar duplicar eventos únicos enquanto o primeiro ainda não foi entregue
+        if event_type in ONCE_PER_USER_EVENTS and telegram_id:
+            cursor.execute(
+                "SELECT COUNT(*) FROM webhook_outbox WHERE telegram_id = %s AND event_type = %s AND status = 'pending'",
+                (telegram_id, event_type)
+            )
+            if cursor.fetchone()[0] > 0:
+                return False
+
+        cursor.execute("""
+            INSERT INTO webhook_outbox (event_type, telegram_id, webhook_url, payload, next_attempt_at)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (event_type, telegram_id, webhook_url, json.dumps(webhook_data, default=str), datetime.now()))
+        connection.commit()
+
+        return True
+
+    except Error as e:
+        print(f"❌ Erro ao enfileirar webhook: {e}")
+        return False
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+def fetch_due_webhooks(limit):
+    """Obtém os eventos pendentes cuja próxima tentativa já venceu"""
+    connection = create_connection()
+    if not connection:
+        return []
+
+    try:
+        cursor = connection.cursor(dictionary=True)
+
+        # Um único despachante por instância (numReplicas = 1), sem necessidade de lock
+        cursor.execute("""
+            SELECT id, event_type, telegram_id, webhook_url, payload, attempts
+            FROM webhook_outbox
+            WHERE status = 'pending' AND next_attempt_at <= %s
+            ORDER BY id
+            LIMIT %s
+        """, (datetime.now(), limit))
+        return cursor.fetchall()
+
+    except Error as e:
+        print(f"❌ Erro ao ler fila de webhooks: {e}")
+        return []
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+def mark_outbox_sent(outbox_ids):
+    """Marca um lote de eventos como entregues com um único UPDATE"""
+    if not outbox_ids:
+        return True
+
+    connection = create_connection()
+    if not connection:
+        return False
+
+    try:
+        cursor = connection.cursor()
+
+        placeholders = ', '.join(['%s'] * len(outbox_ids))
+        cursor.execute(
+            f"UPDATE webhook_outbox SET status = 'sent', sent_at = %s, last_error = NULL WHERE id IN ({placeholders})",
+            (datetime.now(), *outbox_ids)
+        )
+        connection.commit()
+
+        return True
+
+    except Error as e:
+        print(f"❌ Erro ao marcar webhooks como enviados: {e}")
+        return False
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+def mark_outbox_failed(outbox_id, attempts, error):
+    """Agenda nova tentativa com backoff exponencial ou descarta o evento (dead letter)"""
+    connection = create_connection()
+    if not connection:
+        return False
+
+    try:
+        cursor = connection.cursor()
+
+        error = str(error)[:500]
+        if attempts >= WEBHOOK_MAX_ATTEMPTS:
+            cursor.execute(
+                "UPDATE webhook_outbox SET status = 'dead', attempts = %s, last_error = %s WHERE id = %s",
+                (attempts, error, outbox_id)
+            )
+            print(f"❌ Webhook {outbox_id} descartado após {attempts} tentativas: {error}")
+        else:
+            delay = min(WEBHOOK_RETRY_BASE * (2 ** (attempts - 1)), WEBHOOK_RETRY_MAX)
+            cursor.execute(
+                "UPDATE webhook_outbox SET attempts = %s, last_error = %s, next_attempt_at = %s WHERE id = %s",
+                (attempts, error, datetime.now() + timedelta(seconds=delay), outbox_id)
+            )
+        connection.commit()
+
+        return True
+
+    except Error as e:
+        print(f"❌ Erro ao reagendar webhook: {e}")
+        return False
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+def retry_dead_webhooks():
+    """Devolve os eventos descartados para a fila. Retorna quantos foram reenfileirados"""
+    connection = create_connection()
+    if not connection:
+        return None
+
+    try:
+        cursor = connection.cursor()
+
+        cursor.execute(
+            "UPDATE webhook_outbox SET status = 'pending', attempts = 0, next_attempt_at = %s WHERE status = 'dead'",
+            (datetime.now(),)
+        )
+        connection.commit()
+
+        return cursor.rowcount
+
+    except Error as e:
+        print(f"❌ Erro ao reenfileirar webhooks: {e}")
+        return None
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+def purge_sent_webhooks(days=WEBHOOK_RETENTION_DAYS):
+    """Remove eventos entregues há mais de `days` dias"""
+    connection = create_connection()
+    if not connection:
+        return None
+
+    try:
+        cursor = connection.cursor()
+
+        cursor.execute(
+            "DELETE FROM webhook_outbox WHERE status = 'sent' AND sent_at < %s",
+            (datetime.now() - timedelta(days=days),)
+        )
+        connection.commit()
+
+        return cursor.rowcount
+
+    except Error as e:
+        print(f"❌ Erro ao limpar fila de webhooks: {e}")
+        return None
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+def get_outbox_stats():
+    """Conta os eventos da fila por status (pendentes, enviados e descartados)"""
+    stats = {'pending': 0, 'sent': 0, 'dead': 0}
+    connection = create_connection()
+    if not connection:
+        return stats
+
+    try:
+        cursor = connection.cursor()
+
+        cursor.execute("SELECT status, COUNT(*) FROM webhook_outbox GROUP BY status")
+        for status, count in cursor.fetchall():
+            stats[status] = count
+
+        return stats
+
+    except Error as e:
+        print(f"❌ Erro ao consultar fila de webhooks: {e}")
+        return stats
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+
+class WebhookDispatcher:
+    """
+    Envia os eventos da tabela webhook_outbox para o CRM em segundo plano.
+
+    Usa uma única sessão HTTP (conexões keep-alive) para todos os envios,
+    processa a fila em lotes de batch_size eventos enviados em paralelo e
+    reagenda as falhas com backoff exponencial até WEBHOOK_MAX_ATTEMPTS,
+    quando o evento passa para o status 'dead'.
+    """
+
+    def __init__(self, batch_size=WEBHOOK_BATCH_SIZE, poll_interval=WEBHOOK_POLL_INTERVAL):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._session = None
+        self._task = None
+        self._wake = None
+        self._last_purge = None
+        self._stats = {'delivered': 0, 'failed': 0}
+
+    def start(self):
+        """Inicia o despachante no loop em execução"""
+        if self._task is not None:
+            return
+        self._wake = asyncio.Event()
+        self._session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=WEBHOOK_TIMEOUT),
+            connector=aiohttp.TCPConnector(limit=self.batch_size)
+        )
+        self._task = asyncio.create_task(self._run())
+        print(f"🔗 Despachante de webhooks iniciado (lotes de {self.batch_size})")
+
+    async def stop(self):
+        """Interrompe o despachante; eventos pendentes continuam na tabela"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def notify(self):
+        """Acorda o despachante logo após um novo evento ser enfileirado"""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            try:
+                batch = await run_db(fetch_due_webhooks, self.batch_size)
+                if batch:
+                    results = await asyncio.gather(*(self._deliver(row) for row in batch))
+                    delivered = [row['id'] for row, ok in zip(batch, results) if ok]
+                    await run_db(mark_outbox_sent, delivered)
+
+                    # Lote cheio: provavelmente há mais eventos vencidos
+                    if len(batch) == self.batch_size:
+                        continue
+
+                await self._purge_if_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Erro no despachante de webhooks: {e}")
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver(self, row):
+        """Faz o POST de um evento. Retorna True se o CRM aceitou"""
+        try:
+            async with self._session.post(
+                row['webhook_url'],
+                data=row['payload'],
+                headers={'Content-Type': 'application/json'}
+            ) as response:
+                if not 200 <= response.status < 300:
+                    raise Exception(f"HTTP {response.status}")
+        except Exception as e:
+            print(f"❌ Erro ao enviar webhook {row['event_type']} (tentativa {row['attempts'] + 1}): {e}")
+            self._stats['failed'] += 1
+            await run_db(mark_outbox_failed, row['id'], row['attempts'] + 1, e)
+            return False
+
+        print(f"✅ Webhook enviado com sucesso: {row['event_type']}")
+        self._stats['delivered'] += 1
+
+        # Marcar no usuário se for bot_access ou cadastro_concluido
+        if row['event_type'] in ONCE_PER_USER_EVENTS and row['telegram_id']:
+            from flow_manager import mark_webhook_as_sent
+            await run_db(mark_webhook_as_sent, row['telegram_id'], row['event_type'])
+        return True
+
+    async def _purge_if_due(self):
+        now = datetime.now()
+        if self._last_purge is None or now - self._last_purge > timedelta(hours=1):
+            self._last_purge = now
+            await run_db(purge_sent_webhooks)
+
+    def get_stats(self):
+        """Retorna quantos eventos foram entregues e quantas tentativas falharam"""
+        return dict(self._stats, running=self._task is not None)
+
+
+# Despachante compartilhado pelo bot
+webhook_dispatcher = WebhookDispatcher()